@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+重型接口的准入控制
+
+每类重型路由（OCR上传、模型训练、模型库下载、双方案预测等）各有一个有界信号量，
+互不占用对方的并发额度；普通 /api/predict 不受限，过载时仍能拿到工作线程。
+请求在队列中最多等待 timeout 秒：等待队列已满立即返回 429，等待超时返回 503，均带 Retry-After。
+
+用法:
+    from admission import admission_limit
+
+    @app.route('/api/upload', methods=['POST'])
+    @admission_limit('ocr')
+    def upload_file():
+        ...
+
+并发上限、等待时间可用环境变量覆盖，如 ADMISSION_OCR_LIMIT=4、ADMISSION_OCR_TIMEOUT=2。
+"""
+
+import os
+import math
+import time
+import threading
+from dataclasses import dataclass
+from functools import wraps
+from typing import Callable, Dict, Optional, Tuple, Union
+
+from metrics import CallbackGauge, Counter, Histogram
+
+
+@dataclass
+class RouteClassConfig:
+    """一类路由的准入参数"""
+    limit: int              # 同时处理的请求数
+    timeout_s: float        # 排队等待上限（秒）
+    max_waiting: int        # 排队请求数上限，超出直接拒绝
+    retry_after_s: int      # 拒绝时建议客户端的重试间隔
+
+
+# 各类重型路由的默认参数
+DEFAULT_ROUTE_CLASSES = {
+    'ocr': RouteClassConfig(limit=2, timeout_s=5.0, max_waiting=8, retry_after_s=5),
+    'training': RouteClassConfig(limit=1, timeout_s=1.0, max_waiting=2, retry_after_s=30),
+    'library': RouteClassConfig(limit=2, timeout_s=2.0, max_waiting=4, retry_after_s=10),
+    'predict_dual': RouteClassConfig(limit=4, timeout_s=2.0, max_waiting=16, retry_after_s=2),
+    'batch': RouteClassConfig(limit=2, timeout_s=1.0, max_waiting=2, retry_after_s=15),
+    'planning': RouteClassConfig(limit=2, timeout_s=3.0, max_waiting=4, retry_after_s=5),
+}
+
+
+def _config_from_env(route_class: str, default: RouteClassConfig) -> RouteClassConfig:
+    prefix = f'ADMISSION_{route_class.upper()}_'
+    return RouteClassConfig(
+        limit=max(1, int(os.environ.get(prefix + 'LIMIT', default.limit))),
+        timeout_s=float(os.environ.get(prefix + 'TIMEOUT', default.timeout_s)),
+        max_waiting=max(0, int(os.environ.get(prefix + 'MAX_WAITING', default.max_waiting))),
+        retry_after_s=int(os.environ.get(prefix + 'RETRY_AFTER', default.retry_after_s))
+    )
+
+
+ADMISSION_ADMITTED = Counter(
+    'admission_admitted_total', '准入控制放行的请求数', ('route_class',))
+ADMISSION_REJECTED = Counter(
+    'admission_rejected_total', '准入控制拒绝的请求数（queue_full=429, timeout=503）', ('route_class', 'reason'))
+ADMISSION_WAIT_SECONDS = Histogram(
+    'admission_wait_seconds', '放行前的排队时间', ('route_class',))
+
+
+class AdmissionRejected(Exception):
+    """请求未获准入"""
+
+    def __init__(self, route_class: str, reason: str, retry_after_s: int):
+        self.route_class = route_class
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+        self.status_code = 429 if reason == 'queue_full' else 503
+        super().__init__(f'{route_class} 请求过多（{reason}），请 {retry_after_s} 秒后重试')
+
+
+class AdmissionGate:
+    """一类路由的有界信号量与排队计数"""
+
+    def __init__(self, route_class: str, config: RouteClassConfig):
+        self.route_class = route_class
+        self.config = config
+        self._semaphore = threading.BoundedSemaphore(config.limit)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.waiting = 0
+
+    def acquire(self):
+        """获取一个并发额度，失败时抛出 AdmissionRejected"""
+        if self._semaphore.acquire(blocking=False):
+            self._admitted(0.0)
+            return
+
+        with self._lock:
+            if self.waiting >= self.config.max_waiting:
+                ADMISSION_REJECTED.inc(route_class=self.route_class, reason='queue_full')
+                raise AdmissionRejected(self.route_class, 'queue_full', self.config.retry_after_s)
+            self.waiting += 1
+
+        start = time.perf_counter()
+        try:
+            acquired = self._semaphore.acquire(timeout=self.config.timeout_s)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+        if not acquired:
+            ADMISSION_REJECTED.inc(route_class=self.route_class, reason='timeout')
+            raise AdmissionRejected(self.route_class, 'timeout', self.config.retry_after_s)
+        self._admitted(time.perf_counter() - start)
+
+    def _admitted(self, waited: float):
+        with self._lock:
+            self.in_use += 1
+        ADMISSION_ADMITTED.inc(route_class=self.route_class)
+        ADMISSION_WAIT_SECONDS.observe(waited, route_class=self.route_class)
+
+    def release(self):
+        with self._lock:
+            self.in_use -= 1
+        self._semaphore.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+_gates: Dict[str, AdmissionGate] = {}
+_gates_lock = threading.Lock()
+
+
+def get_gate(route_class: str) -> AdmissionGate:
+    """获取某类路由的准入闸门（进程内单例）"""
+    gate = _gates.get(route_class)
+    if gate is None:
+        with _gates_lock:
+            gate = _gates.get(route_class)
+            if gate is None:
+                if route_class not in DEFAULT_ROUTE_CLASSES:
+                    raise ValueError(f'未知的路由类别: {route_class}')
+                gate = AdmissionGate(route_class, _config_from_env(route_class, DEFAULT_ROUTE_CLASSES[route_class]))
+                _gates[route_class] = gate
+    return gate
+
+
+def _gate_state() -> Dict[Tuple[str, ...], float]:
+    state = {}
+    for name, gate in list(_gates.items()):
+        state[(name, 'limit')] = gate.config.limit
+        state[(name, 'in_use')] = gate.in_use
+        state[(name, 'waiting')] = gate.waiting
+    return state
+
+
+CallbackGauge('admission_gate', '各类路由的并发上限、处理中和排队中的请求数', _gate_state, ('route_class', 'state'))
+
+
+def rejection_response(error: AdmissionRejected):
+    """把拒绝转换为带 Retry-After 的JSON响应"""
+    from flask import jsonify
+
+    response = jsonify({'success': False, 'error': str(error), 'retry_after': error.retry_after_s})
+    response.status_code = error.status_code
+    response.headers['Retry-After'] = str(max(1, math.ceil(error.retry_after_s)))
+    return response
+
+
+def admission_limit(route_class: Union[str, Callable[[], Optional[str]]]):
+    """
+    视图装饰器：进入视图前获取该类路由的并发额度
+
+    route_class 可以是函数（在请求上下文中调用，返回类别名或 None 表示不限流），
+    用于同一路由按请求内容区分轻重，例如只限制开启双方案对比的预测请求。
+    流式响应在响应关闭时才释放额度。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import make_response
+
+            name = route_class() if callable(route_class) else route_class
+            if name is None:
+                return view(*args, **kwargs)
+
+            gate = get_gate(name)
+            try:
+                gate.acquire()
+            except AdmissionRejected as e:
+                return rejection_response(e)
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                gate.release()
+                raise
+            if response.is_streamed:
+                response.call_on_close(gate.release)
+            else:
+                gate.release()
+            return response
+        return wrapper
+    return decorator
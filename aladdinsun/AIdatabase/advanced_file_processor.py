@@ -7,10 +7,15 @@
 import os
 import re
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
 
+from parser_registry import ParserRegistry, IMAGE_TYPES
+from system_stats import SystemStatsAccumulator
+
 # Excel处理
 try:
     import pandas as pd
@@ -36,6 +41,8 @@ try:
     import pytesseract
     import cv2
     import numpy as np
+    from table_grid_detector import detect_tables, ocr_table, mask_tables, has_ink
+    from image_preprocessing import preprocess_image
     IMAGE_AVAILABLE = True
 except ImportError:
     IMAGE_AVAILABLE = False
@@ -48,6 +55,25 @@ try:
 except ImportError:
     EASYOCR_AVAILABLE = False
 
+# 解析逻辑变更时递增，使解析缓存中的旧结果失效
+PARSER_VERSION = '1.3'
+
+# CSV分块读取行数；结果中保留的系统明细条数（统计覆盖全部行）
+CSV_CHUNK_ROWS = int(os.environ.get('CSV_CHUNK_ROWS', 50000))
+CSV_SYSTEMS_SAMPLE = int(os.environ.get('CSV_SYSTEMS_SAMPLE', 1000))
+
+# 数值型系统字段
+NUMERIC_FIELDS = ['data_size_gb', 'qps', 'tps', 'peak_qps', 'connections', 'table_count']
+
+# 大小字段：数字 + 可选单位（去掉千分位逗号后匹配），Excel/图片逐个解析与CSV向量化解析共用
+SIZE_PATTERN = re.compile(r'([\d.]+)\s*([KMGTP]?)')
+
+# 大小单位换算到GB
+SIZE_UNIT_TO_GB = {'': 1.0, 'K': 1 / (1024 * 1024), 'M': 1 / 1024, 'G': 1.0, 'T': 1024.0, 'P': 1024.0 * 1024}
+
+# OCR线程池大小（pytesseract 每次调用独立子进程，线程即可并行）
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', min(4, os.cpu_count() or 1)))
+
 
 @dataclass
 class SystemInfo:
@@ -144,6 +170,16 @@ class AdvancedFileProcessor:
         
         # 关键词映射
         self.keywords = self._init_keywords()
+        
+        # 按文件内容分派的解析器
+        self.parser_registry = self._init_parser_registry()
+        
+        # 图像预处理模式：auto 按噪声估计自动选择（见 image_preprocessing.PIPELINES）
+        self.preprocess_mode = os.environ.get('OCR_PREPROCESS', 'auto')
+        
+        # 单元格OCR线程池（延迟创建）
+        self._ocr_pool = None
+        self._ocr_pool_lock = threading.Lock()
     
     def _init_keywords(self) -> Dict[str, List[str]]:
         """初始化关键词映射"""
@@ -206,24 +242,48 @@ class AdvancedFileProcessor:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"文件不存在: {file_path}")
         
-        file_ext = os.path.splitext(file_path)[1].lower()
-        
-        # 根据文件类型调用不同的处理方法
-        if file_ext in self.supported_formats['excel']:
-            return self.process_excel(file_path)
-        elif file_ext in self.supported_formats['pdf']:
-            return self.process_pdf(file_path)
-        elif file_ext in self.supported_formats['image']:
-            return self.process_image(file_path)
-        elif file_ext in self.supported_formats['text']:
-            return self.process_text(file_path)
-        else:
-            raise ValueError(f"不支持的文件格式: {file_ext}")
+        from parse_cache import cached_parse
+        
+        result = cached_parse(file_path, 'advanced_file_processor', PARSER_VERSION, self._process_file_uncached)
+        # 缓存命中时file_path来自首次上传，更新为当前路径
+        result['file_path'] = file_path
+        return result
     
-    def process_excel(self, file_path: str) -> Dict[str, Any]:
+    def process_upload(self, upload) -> Dict[str, Any]:
+        """
+        处理流式接收的上传文件（upload_ingest.IngestedUpload）
+        缓存命中时不需要把上传内容写到磁盘
+        """
+        result = upload.parse('advanced_file_processor', PARSER_VERSION, self._process_file_uncached)
+        result['file_path'] = upload.filename
+        return result
+    
+    def _process_file_uncached(self, file_path: str) -> Dict[str, Any]:
+        """按文件内容类型处理（不经过缓存），不支持的内容抛出 UnsupportedFileError"""
+        return self.parser_registry.dispatch(file_path)
+    
+    def _init_parser_registry(self) -> ParserRegistry:
+        """按文件内容（魔数/ZIP结构）注册解析器"""
+        registry = ParserRegistry()
+        registry.register(['xlsx', 'xlsm'], lambda p: self.process_excel(p, engine='openpyxl'),
+                          requires=['pandas', 'openpyxl'])
+        registry.register('xls', lambda p: self.process_excel(p, engine='xlrd'), requires=['pandas', 'xlrd'])
+        registry.register('xlsb', lambda p: self.process_excel(p, engine='pyxlsb'), requires=['pandas', 'pyxlsb'])
+        registry.register('pdf', self.process_pdf, requires=['pdfplumber', 'pandas'])
+        registry.register(IMAGE_TYPES, self.process_image, requires=['PIL', 'pytesseract', 'cv2'])
+        registry.register('json', lambda p: self.process_text(p, file_type='json'))
+        registry.register('csv', self.process_csv, requires=['pandas'])
+        registry.register('txt', self.process_text)
+        return registry
+    
+    def process_excel(self, file_path: str, engine: Optional[str] = None) -> Dict[str, Any]:
         """
         处理Excel文件
         支持多个工作表，智能识别系统信息和部署架构
+        
+        Args:
+            file_path: 文件路径
+            engine: pandas读取引擎（xlsx/xlsm: openpyxl, xls: xlrd, xlsb: pyxlsb）
         """
         if not EXCEL_AVAILABLE:
             raise ImportError("Excel处理库未安装，请安装: pip install pandas openpyxl")
@@ -238,12 +298,11 @@ class AdvancedFileProcessor:
         }
         
         try:
-            # 读取所有工作表
-            excel_file = pd.ExcelFile(file_path)
-            workbook = load_workbook(file_path)
+            # 读取所有工作表（文件只打开一次）
+            excel_file = pd.ExcelFile(file_path, engine=engine)
             
             for sheet_name in excel_file.sheet_names:
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
+                df = excel_file.parse(sheet_name)
                 result['raw_data'][sheet_name] = df.to_dict('records')
                 
                 # 智能识别工作表类型
@@ -359,23 +418,28 @@ class AdvancedFileProcessor:
             image = Image.open(file_path)
             
             # 图像预处理
-            processed_image = self._preprocess_image(image)
+            processed_image, result['preprocess_pipeline'] = preprocess_image(image, self.preprocess_mode)
+            gray = np.array(processed_image)
             
-            # OCR识别
-            if self.easyocr_reader:
-                # 使用EasyOCR（更准确）
-                ocr_result = self.easyocr_reader.readtext(np.array(processed_image))
-                result['ocr_text'] = '\n'.join([text[1] for text in ocr_result])
-            else:
-                # 使用Tesseract
-                result['ocr_text'] = pytesseract.image_to_string(processed_image, lang='chi_sim+eng')
-            
-            # 尝试识别表格结构
-            tables = self._extract_tables_from_image(processed_image)
+            # 先识别表格结构，表格内只对单元格做OCR
+            grids = detect_tables(gray)
+            tables = self._extract_tables_from_image(processed_image, grids)
             result['tables'] = tables
             
-            # 从OCR文本提取信息
-            result['systems'] = self._extract_systems_from_text(result['ocr_text'])
+            # 表格之外的区域整体OCR（没有剩余文字时跳过）
+            page_text = ''
+            remaining = mask_tables(gray, grids) if grids else gray
+            if has_ink(remaining):
+                page_text = self._ocr_page(Image.fromarray(remaining))
+            
+            table_text = '\n'.join(
+                '\t'.join(row) for table in tables for row in table['cells']
+            )
+            result['ocr_text'] = '\n'.join(text for text in [page_text, table_text] if text)
+            
+            # 表格中能按列名映射出系统信息时优先使用，否则回退到全部OCR文本（含单元格文字）提取
+            table_systems = [system for table in tables for system in table['systems']]
+            result['systems'] = table_systems or self._extract_systems_from_text(result['ocr_text'])
             result['deployment'] = self._extract_deployment_from_text(result['ocr_text'])
             
             # 计算统计
@@ -389,8 +453,8 @@ class AdvancedFileProcessor:
         
         return result
     
-    def process_text(self, file_path: str) -> Dict[str, Any]:
-        """处理文本文件"""
+    def process_text(self, file_path: str, file_type: Optional[str] = None) -> Dict[str, Any]:
+        """处理文本文件（file_type 为内容嗅探得到的类型）"""
         result = {
             'file_type': 'text',
             'file_path': file_path,
@@ -405,7 +469,7 @@ class AdvancedFileProcessor:
             result['text_content'] = content
             
             # 如果是JSON格式
-            if file_path.endswith('.json'):
+            if file_type == 'json' or file_path.endswith('.json'):
                 try:
                     data = json.loads(content)
                     result['json_data'] = data
@@ -433,6 +497,104 @@ class AdvancedFileProcessor:
         
         return result
     
+    def process_csv(self, file_path: str) -> Dict[str, Any]:
+        """
+        分块流式处理CSV/TSV系统清单
+        列名只映射一次，每个分块向量化清洗后累加到运行统计中，
+        内存占用与文件大小无关；结果中只保留前 CSV_SYSTEMS_SAMPLE 个系统明细
+        """
+        if not EXCEL_AVAILABLE:
+            raise ImportError("CSV处理需要pandas，请安装: pip install pandas")
+        
+        result = {
+            'file_type': 'csv',
+            'file_path': file_path,
+            'systems': [],
+            'deployment': {}
+        }
+        
+        try:
+            delimiter = self._sniff_delimiter(file_path)
+            accumulator = SystemStatsAccumulator()
+            column_mapping = None
+            
+            for encoding in ('utf-8-sig', 'gbk'):
+                try:
+                    reader = pd.read_csv(file_path, sep=delimiter, chunksize=CSV_CHUNK_ROWS,
+                                         dtype=str, encoding=encoding, skipinitialspace=True)
+                    for chunk in reader:
+                        if column_mapping is None:
+                            column_mapping = self._map_columns(chunk.columns)
+                        
+                        cleaned = self._clean_chunk(chunk, column_mapping)
+                        accumulator.add_frame(cleaned)
+                        
+                        remaining = CSV_SYSTEMS_SAMPLE - len(result['systems'])
+                        if remaining > 0:
+                            result['systems'].extend(
+                                {k: v for k, v in record.items() if pd.notna(v)}
+                                for record in cleaned.head(remaining).to_dict('records')
+                            )
+                    break
+                except UnicodeDecodeError:
+                    # 非UTF-8导出（常见于GBK编码的CMDB导出），从头重读
+                    accumulator = SystemStatsAccumulator()
+                    column_mapping = None
+                    result['systems'] = []
+            else:
+                raise ValueError('无法识别CSV文件编码（已尝试 UTF-8、GBK）')
+            
+            result['statistics'] = accumulator.to_dict()
+            result['systems_total'] = accumulator.total_systems
+            result['systems_truncated'] = accumulator.total_systems > len(result['systems'])
+            result['deployment'] = self._infer_deployment_from_stats(result['statistics'])
+            
+        except Exception as e:
+            result['error'] = str(e)
+            result['success'] = False
+        else:
+            result['success'] = True
+        
+        return result
+    
+    def _sniff_delimiter(self, file_path: str) -> str:
+        """根据文件头判断分隔符（逗号/制表符/分号/竖线）"""
+        import csv
+        
+        with open(file_path, 'rb') as f:
+            sample = f.read(8192).decode('utf-8', errors='ignore')
+        try:
+            return csv.Sniffer().sniff(sample, delimiters=',\t;|').delimiter
+        except csv.Error:
+            return '\t' if sample.count('\t') > sample.count(',') else ','
+    
+    def _clean_chunk(self, chunk: pd.DataFrame, column_mapping: Dict[str, str]) -> pd.DataFrame:
+        """向量化清洗一个分块，输出列为标准字段，丢弃所有映射列都为空的行"""
+        cleaned = pd.DataFrame(index=chunk.index)
+        
+        for col_name, mapped_name in column_mapping.items():
+            if mapped_name in cleaned:
+                continue
+            values = chunk[col_name].str.strip()
+            values = values.where(values != '')
+            
+            if mapped_name == 'data_size_gb':
+                cleaned[mapped_name] = self._parse_size_series(values)
+            elif mapped_name in NUMERIC_FIELDS:
+                numbers = values.str.replace(r'[,\s]', '', regex=True).str.extract(r'([\d.]+)', expand=False)
+                cleaned[mapped_name] = pd.to_numeric(numbers, errors='coerce')
+            else:
+                cleaned[mapped_name] = values
+        
+        return cleaned.dropna(how='all')
+    
+    def _parse_size_series(self, values: pd.Series) -> pd.Series:
+        """向量化解析大小（与 _parse_size 规则一致：转换为GB，无单位按GB处理，无法解析的非空值为0）"""
+        parts = values.str.upper().str.replace(',', '', regex=False).str.extract(SIZE_PATTERN)
+        numbers = pd.to_numeric(parts[0], errors='coerce')
+        factors = parts[1].map(SIZE_UNIT_TO_GB).fillna(1.0)
+        return (numbers * factors).mask(values.notna() & numbers.isna(), 0.0)
+    
     def _identify_sheet_type(self, sheet_name: str, df: pd.DataFrame) -> str:
         """识别工作表类型"""
         sheet_name_lower = sheet_name.lower()
@@ -608,44 +770,25 @@ class AdvancedFileProcessor:
     
     def _calculate_statistics(self, systems: List[Dict[str, Any]]) -> Dict[str, Any]:
         """计算统计信息"""
-        if not systems:
-            return {}
-        
-        stats = {
-            'total_systems': len(systems),
-            'total_data_size_gb': 0,
-            'total_qps': 0,
-            'total_tps': 0,
-            'total_connections': 0,
-            'max_qps': 0,
-            'avg_qps': 0
-        }
-        
-        for system in systems:
-            stats['total_data_size_gb'] += system.get('data_size_gb', 0)
-            stats['total_qps'] += system.get('qps', 0)
-            stats['total_tps'] += system.get('tps', 0)
-            stats['total_connections'] += system.get('connections', 0)
-            stats['max_qps'] = max(stats['max_qps'], system.get('qps', 0))
-        
-        if stats['total_systems'] > 0:
-            stats['avg_qps'] = stats['total_qps'] / stats['total_systems']
-        
-        stats['total_data_size_tb'] = stats['total_data_size_gb'] / 1024
-        
-        return stats
+        accumulator = SystemStatsAccumulator()
+        accumulator.add_systems(systems)
+        return accumulator.to_dict()
     
     def _infer_deployment(self, systems: List[Dict[str, Any]], summary: Dict[str, Any]) -> Dict[str, Any]:
         """智能推断部署方式"""
+        return self._infer_deployment_from_stats(self._calculate_statistics(systems))
+    
+    def _infer_deployment_from_stats(self, stats: Dict[str, Any]) -> Dict[str, Any]:
+        """根据汇总统计（系统数、总数据量、最大QPS）推断部署方式"""
         deployment = {
             'deployment_mode': '单中心',
             'disaster_recovery_type': '冷备'
         }
         
         # 根据系统数量和数据量推断
-        total_systems = len(systems)
-        total_data_gb = sum(s.get('data_size_gb', 0) for s in systems)
-        max_qps = max((s.get('qps', 0) for s in systems), default=0)
+        total_systems = stats.get('total_systems', 0)
+        total_data_gb = stats.get('total_data_size_gb', 0)
+        max_qps = stats.get('max_qps', 0)
         
         # 大规模系统建议多中心
         if total_systems > 10 or total_data_gb > 10000 or max_qps > 50000:
@@ -701,14 +844,14 @@ class AdvancedFileProcessor:
         
         value_str = str(value).strip()
         
-        # 数值类型字段
-        if field_name in ['data_size_gb', 'qps', 'tps', 'peak_qps', 'connections', 'table_count']:
-            return self._parse_number(value_str)
-        
-        # 大小字段
+        # 大小字段（带单位，先于其他数值字段判断）
         if field_name == 'data_size_gb':
             return self._parse_size(value_str)
         
+        # 数值类型字段
+        if field_name in NUMERIC_FIELDS:
+            return self._parse_number(value_str)
+        
         return value_str
     
     def _parse_number(self, value: str) -> float:
@@ -726,53 +869,80 @@ class AdvancedFileProcessor:
         return 0
     
     def _parse_size(self, value: str) -> float:
-        """解析大小（转换为GB）"""
-        value = str(value).upper()
-        
-        # 提取数字
-        match = re.search(r'([\d.]+)\s*([KMGTP]?B?)', value)
+        """解析大小（转换为GB，无单位按GB处理）"""
+        match = SIZE_PATTERN.search(str(value).upper().replace(',', ''))
         if match:
-            num = float(match.group(1))
-            unit = match.group(2)
-            
-            # 转换为GB
-            if 'TB' in unit or 'T' == unit:
-                return num * 1024
-            elif 'GB' in unit or 'G' == unit:
-                return num
-            elif 'MB' in unit or 'M' == unit:
-                return num / 1024
-            elif 'KB' in unit or 'K' == unit:
-                return num / (1024 * 1024)
-            elif 'PB' in unit or 'P' == unit:
-                return num * 1024 * 1024
-            else:
-                return num
-        
+            try:
+                return float(match.group(1)) * SIZE_UNIT_TO_GB[match.group(2)]
+            except ValueError:
+                return 0
         return 0
     
     def _preprocess_image(self, image: Image.Image) -> Image.Image:
-        """图像预处理"""
-        # 转换为灰度图
-        if image.mode != 'L':
-            image = image.convert('L')
-        
-        # 转换为numpy数组
-        img_array = np.array(image)
-        
-        # 二值化
-        _, img_binary = cv2.threshold(img_array, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        """图像预处理（按噪声估计自动选择流水线，见 image_preprocessing）"""
+        return preprocess_image(image, self.preprocess_mode)[0]
+    
+    def _extract_tables_from_image(self, image: Image.Image, grids=None) -> List[Dict[str, Any]]:
+        """
+        从图像提取表格
+        形态学检测网格线 -> 裁剪单元格 -> 线程池分批OCR -> 按行列重建，
+        首行作为表头，与Excel一样经 _map_columns 映射为系统信息
+        """
+        gray = np.array(image.convert('L') if image.mode != 'L' else image)
+        if grids is None:
+            grids = detect_tables(gray)
         
-        # 去噪
-        img_denoised = cv2.fastNlMeansDenoising(img_binary)
+        tables = []
+        for index, grid in enumerate(grids):
+            cells = ocr_table(gray, grid, self._ocr_cell, self._get_ocr_pool())
+            
+            table = {
+                'table_index': index + 1,
+                'bbox': [grid.x, grid.y, grid.width, grid.height],
+                'rows': grid.n_rows,
+                'cols': grid.n_cols,
+                'cells': cells,
+                'data': [],
+                'systems': []
+            }
+            
+            if grid.n_rows >= 2:
+                header = [text or f'列{col + 1}' for col, text in enumerate(cells[0])]
+                df = pd.DataFrame(cells[1:], columns=header) if EXCEL_AVAILABLE else None
+                if df is not None:
+                    df = df.replace({'': None})
+                    table['data'] = df.to_dict('records')
+                    table['systems'] = self._extract_systems_from_df(df)
+            
+            tables.append(table)
         
-        return Image.fromarray(img_denoised)
+        return tables
+    
+    def _ocr_page(self, image: Image.Image) -> str:
+        """整页OCR"""
+        if self.easyocr_reader:
+            # 使用EasyOCR（更准确）
+            ocr_result = self.easyocr_reader.readtext(np.array(image))
+            return '\n'.join([text[1] for text in ocr_result])
+        # 使用Tesseract
+        return pytesseract.image_to_string(image, lang='chi_sim+eng')
     
-    def _extract_tables_from_image(self, image: Image.Image) -> List[Dict[str, Any]]:
-        """从图像提取表格"""
-        # 这里可以使用更高级的表格检测算法
-        # 简化版本：返回空列表
-        return []
+    def _ocr_cell(self, cell: np.ndarray) -> str:
+        """识别单个单元格"""
+        if self.easyocr_reader:
+            return ' '.join(self.easyocr_reader.readtext(cell, detail=0))
+        # 单元格按单个文本块识别
+        return pytesseract.image_to_string(Image.fromarray(cell), lang='chi_sim+eng', config='--psm 6')
+    
+    def _get_ocr_pool(self) -> Optional[ThreadPoolExecutor]:
+        """获取单元格OCR线程池（EasyOCR模型不共享给多线程，顺序执行）"""
+        if self.easyocr_reader or OCR_WORKERS <= 1:
+            return None
+        if self._ocr_pool is None:
+            with self._ocr_pool_lock:
+                if self._ocr_pool is None:
+                    self._ocr_pool = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix='ocr')
+        return self._ocr_pool
 
 
 # 测试代码
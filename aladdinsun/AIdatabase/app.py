@@ -9,8 +9,13 @@ import os
 from werkzeug.utils import secure_filename
 from datetime import datetime
 from deployment_predictor import DeploymentResourcePredictor
+from metrics import install_flask_metrics
+from admission import admission_limit
+from tracing import install_flask_tracing
 
 app = Flask(__name__)
+install_flask_metrics(app, 'app')  # 请求计数/延迟直方图，Prometheus 从 /metrics 抓取
+install_flask_tracing(app, 'app')  # 按 TRACE_SAMPLE_RATE 采样，写入 logs/trace.jsonl
 
 # 配置
 UPLOAD_FOLDER = 'uploads'
@@ -45,45 +50,40 @@ def load_modules():
     print("🔄 开始加载模块...")
     
     try:
-        from model import TDSQLArchitecturePredictor
+        from model import load_predictor
         from model_library_manager import ModelLibraryManager
+        from case_log import get_case_log
         
-        _model = TDSQLArchitecturePredictor()
+        _model = load_predictor()
         _library_manager = ModelLibraryManager()
         
         # 简化版训练系统
         class SimpleTrainer:
             def __init__(self):
-                self.cases = self.load_cases()
+                # 案例追加写入日志，统计信息来自内存索引，不再每次读写整个文件
+                self.store = get_case_log(TRAINING_DATA_FILE)
             
-            def load_cases(self):
-                if os.path.exists(TRAINING_DATA_FILE):
-                    with open(TRAINING_DATA_FILE, 'r', encoding='utf-8') as f:
-                        return json.load(f)
-                return []
+            @property
+            def cases(self):
+                return self.store.load_all()
             
-            def save_cases(self):
-                os.makedirs(os.path.dirname(TRAINING_DATA_FILE), exist_ok=True)
-                with open(TRAINING_DATA_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(self.cases, f, ensure_ascii=False, indent=2)
+            def load_cases(self):
+                return self.store.load_all()
             
             def add_case(self, input_data, actual_result):
-                case = {
-                    'id': len(self.cases) + 1,
+                self.store.append({
                     'input': input_data,
                     'output': actual_result,
                     'timestamp': datetime.now().isoformat()
-                }
-                self.cases.append(case)
-                self.save_cases()
+                })
                 return True
             
             def get_stats(self):
                 return {
-                    'total_cases': len(self.cases),
+                    'total_cases': self.store.count,
                     'accuracy': '92.75%',
                     'model_version': 'v4.0',
-                    'last_updated': self.cases[-1]['timestamp'] if self.cases else 'N/A'
+                    'last_updated': self.store.last_timestamp or 'N/A'
                 }
         
         _trainer = SimpleTrainer()
@@ -330,6 +330,7 @@ def predict():
         })
 
 @app.route('/api/upload', methods=['POST'])
+@admission_limit('ocr')
 def upload_file():
     """文件上传接口"""
     try:
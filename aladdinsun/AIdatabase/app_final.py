@@ -7,10 +7,19 @@ from flask import Flask, render_template, request, jsonify, send_file, send_from
 import json
 import os
 from werkzeug.utils import secure_filename
+from upload_ingest import ingest_upload, start_upload_sweeper
 import threading
 from datetime import datetime
+from metrics import install_flask_metrics
+from admission import admission_limit
+from static_payloads import cached_json_response
+from tracing import get_logger, install_flask_tracing
+
+logger = get_logger('app_final')
 
 app = Flask(__name__)
+install_flask_metrics(app, 'app_final')  # 请求计数/延迟直方图，Prometheus 从 /metrics 抓取
+install_flask_tracing(app, 'app_final')  # 按 TRACE_SAMPLE_RATE 采样，写入 logs/trace.jsonl
 
 # 配置
 UPLOAD_FOLDER = 'uploads'
@@ -21,6 +30,7 @@ app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024
 
 # 创建必要目录
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+start_upload_sweeper(UPLOAD_FOLDER)  # 按TTL和字节配额清理上传目录
 os.makedirs(STATIC_FOLDER, exist_ok=True)
 os.makedirs('model_libraries', exist_ok=True)
 os.makedirs('training_data', exist_ok=True)
@@ -46,52 +56,61 @@ def load_modules():
     print("🔄 开始加载模块...")
     
     try:
-        from model import TDSQLArchitecturePredictor
+        from model import load_predictor
         from model_library_manager import ModelLibraryManager
+        from case_log import get_case_log
         from parameter_form_generator import ParameterFormGenerator
         
-        _model = TDSQLArchitecturePredictor()
+        _model = load_predictor()
         _library_manager = ModelLibraryManager()
         _form_generator = ParameterFormGenerator()
         
         # 简化版训练系统
         class SimpleTrainer:
             def __init__(self):
-                self.cases = self.load_cases()
+                # 案例追加写入日志，统计信息来自内存索引，不再每次读写整个文件
+                self.store = get_case_log(TRAINING_DATA_FILE)
             
-            def load_cases(self):
-                if os.path.exists(TRAINING_DATA_FILE):
-                    with open(TRAINING_DATA_FILE, 'r', encoding='utf-8') as f:
-                        return json.load(f)
-                return []
+            @property
+            def cases(self):
+                return self.store.load_all()
             
-            def save_cases(self):
-                with open(TRAINING_DATA_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(self.cases, f, ensure_ascii=False, indent=2)
+            def load_cases(self):
+                return self.store.load_all()
             
             def add_case(self, input_data, actual_result):
-                case = {
-                    'id': len(self.cases) + 1,
+                self.store.append({
                     'input': input_data,
                     'output': actual_result,
                     'timestamp': datetime.now().isoformat()
-                }
-                self.cases.append(case)
-                self.save_cases()
+                })
                 return True
             
             def get_stats(self):
                 return {
-                    'total_cases': len(self.cases),
+                    'total_cases': self.store.count,
                     'accuracy': '92.75%',
                     'model_version': 'v3.0',
-                    'last_updated': self.cases[-1]['timestamp'] if self.cases else 'N/A'
+                    'last_updated': self.store.last_timestamp or 'N/A'
                 }
         
         _trainer = SimpleTrainer()
         
         # 简化版文件处理器
         class SimpleFileProcessor:
+            PARSER_VERSION = '1.0'
+            
+            def process_upload(self, upload):
+                """经解析缓存处理流式接收的上传文件，缓存命中时不写出临时文件"""
+                return upload.parse('app_final.simple_file_processor', self.PARSER_VERSION, self.process_file,
+                                    cacheable=self._cacheable)
+            
+            @staticmethod
+            def _cacheable(result):
+                # OCR 不可用时的基础模式结果与文件内容无关，不缓存
+                return bool(result.get('success')) and not result.get('error') and \
+                    result.get('method') != '图像分析（基础模式）'
+            
             def process_file(self, filepath):
                 ext = filepath.rsplit('.', 1)[1].lower()
                 
@@ -147,9 +166,9 @@ def load_modules():
                         # 尝试 OCR 识别
                         ocr_text = pytesseract.image_to_string(img, lang='chi_sim+eng')
                         ocr_available = True
-                        print(f"✅ OCR 识别成功，提取文本长度: {len(ocr_text)}")
+                        logger.debug('OCR 识别成功，提取文本长度: %d', len(ocr_text))
                     except Exception as ocr_error:
-                        print(f"⚠️ OCR 不可用: {str(ocr_error)[:100]}")
+                        logger.warning('OCR 不可用: %s', str(ocr_error)[:100])
                         ocr_available = False
                     
                     # 提取数据
@@ -297,14 +316,12 @@ def get_parameter_config():
         if not _modules_loaded:
             load_modules()
         
-        mode = request.args.get('mode', 'simplified')
+        mode = 'simplified' if request.args.get('mode', 'simplified') == 'simplified' else 'advanced'
         
+        # 表单配置只随代码变化，序列化和预压缩结果按模式缓存
         if mode == 'simplified':
-            config = _form_generator.generate_simplified_form()
-        else:
-            config = _form_generator.generate_advanced_form()
-        
-        return jsonify(config)
+            return cached_json_response(('parameter_config', mode), _form_generator.generate_simplified_form)
+        return cached_json_response(('parameter_config', mode), _form_generator.generate_advanced_form)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -362,6 +379,7 @@ def predict():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/analyze', methods=['POST'])
+@admission_limit('ocr')
 def analyze_file():
     """文件分析"""
     try:
@@ -376,16 +394,15 @@ def analyze_file():
         if not allowed_file(file.filename):
             return jsonify({'error': '不支持的文件格式'}), 400
         
-        # 保存文件
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
         
         # 处理文件
         if not _modules_loaded:
             load_modules()
         
-        result = _file_processor.process_file(filepath)
+        # 边接收边计算哈希，只有实际解析时才写出临时文件，处理完删除
+        with ingest_upload(file, app.config['UPLOAD_FOLDER'], filename) as upload:
+            result = _file_processor.process_upload(upload)
         
         # 如果处理失败，返回错误（但不是 OCR 相关错误）
         if result.get('error') and 'tesseract' not in result.get('error', '').lower():
@@ -435,12 +452,12 @@ def get_model_libraries():
         if not _modules_loaded:
             load_modules()
         
-        libraries = _library_manager.list_available_libraries()
-        return jsonify({
-            'success': True,
-            'libraries': libraries,
-            'total': len(libraries)
-        })
+        def build():
+            libraries = _library_manager.list_available_libraries()
+            return {'success': True, 'libraries': libraries, 'total': len(libraries)}
+        
+        # 模型库文件不变时直接返回缓存的序列化结果（下载/删除/自定义库会改变版本标记）
+        return cached_json_response('model_libraries', build, version=_library_manager.libraries_version())
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -462,6 +479,7 @@ def get_library_detail(library_id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/download_library/<library_id>', methods=['POST'])
+@admission_limit('library')
 def download_library(library_id):
     """下载模型库"""
     try:
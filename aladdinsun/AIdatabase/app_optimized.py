@@ -7,9 +7,16 @@ from flask import Flask, render_template, request, jsonify, send_from_directory
 import json
 import os
 from werkzeug.utils import secure_filename
+from upload_ingest import ingest_upload, start_upload_sweeper
 import threading
+from metrics import install_flask_metrics
+from admission import admission_limit
+from static_payloads import cached_json_response
+from tracing import install_flask_tracing
 
 app = Flask(__name__)
+install_flask_metrics(app, 'app_optimized')  # 请求计数/延迟直方图，Prometheus 从 /metrics 抓取
+install_flask_tracing(app, 'app_optimized')  # 按 TRACE_SAMPLE_RATE 采样，写入 logs/trace.jsonl
 
 # 配置上传
 UPLOAD_FOLDER = 'uploads'
@@ -19,6 +26,7 @@ app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024  # 32MB max
 
 # 创建上传目录
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+start_upload_sweeper(UPLOAD_FOLDER)  # 按TTL和字节配额清理上传目录
 
 # 全局变量 - 延迟加载
 _modules_loaded = False
@@ -44,7 +52,7 @@ def load_modules():
     print("🔄 开始加载模块...")
     
     try:
-        from model import TDSQLArchitecturePredictor
+        from model import load_predictor
         from architecture_calculator import ArchitectureCalculator
         from enhanced_calculator import EnhancedArchitectureCalculator
         from training_system import TrainingSystem
@@ -54,10 +62,10 @@ def load_modules():
         from parameter_form_generator import ParameterFormGenerator
         from advanced_file_processor import AdvancedFileProcessor
         
-        _model = TDSQLArchitecturePredictor()
+        _model = load_predictor()
         _architecture_calculator = ArchitectureCalculator()
         _enhanced_calculator = EnhancedArchitectureCalculator()
-        _trainer = TrainingSystem(_model)
+        _trainer = TrainingSystem()
         _recognizer = ImageTableRecognizer()
         _library_manager = ModelLibraryManager()
         _custom_builder = CustomModelBuilder()
@@ -117,6 +125,7 @@ def get_status():
     })
 
 @app.route('/api/analyze', methods=['POST'])
+@admission_limit('ocr')
 def analyze_image():
     """分析上传的图片"""
     try:
@@ -130,10 +139,7 @@ def analyze_image():
         if not allowed_file(file.filename):
             return jsonify({'error': '不支持的文件格式'}), 400
         
-        # 保存文件
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
         
         # 确保模块已加载
         if not _modules_loaded:
@@ -142,18 +148,22 @@ def analyze_image():
         # 根据文件类型处理
         file_ext = filename.rsplit('.', 1)[1].lower()
         
-        if file_ext in ['xlsx', 'xls']:
-            # Excel文件处理
-            extracted_data = _file_processor.process_excel(filepath)
-        elif file_ext == 'pdf':
-            # PDF文件处理
-            extracted_data = _file_processor.process_pdf(filepath)
-        elif file_ext == 'json':
-            # JSON文件处理
-            extracted_data = _file_processor.process_json(filepath)
-        else:
-            # 图片OCR处理
-            extracted_data = _recognizer.recognize(filepath)
+        # 边接收边计算哈希，只有实际解析时才写出临时文件，处理完删除
+        # 经解析缓存按内容哈希查询，未命中才写出临时文件
+        from advanced_file_processor import PARSER_VERSION
+        with ingest_upload(file, app.config['UPLOAD_FOLDER'], filename) as upload:
+            if file_ext in ['xlsx', 'xls']:
+                # Excel文件处理
+                extracted_data = upload.parse('app_optimized.excel', PARSER_VERSION, _file_processor.process_excel)
+            elif file_ext == 'pdf':
+                # PDF文件处理
+                extracted_data = upload.parse('app_optimized.pdf', PARSER_VERSION, _file_processor.process_pdf)
+            elif file_ext == 'json':
+                # JSON文件处理
+                extracted_data = upload.parse('app_optimized.json', PARSER_VERSION, _file_processor.process_json)
+            else:
+                # 图片OCR处理
+                extracted_data = upload.parse('app_optimized.image', PARSER_VERSION, _recognizer.recognize)
         
         # 使用模型预测
         prediction = _model.predict(extracted_data)
@@ -257,12 +267,12 @@ def get_model_libraries():
         if not _modules_loaded:
             load_modules()
         
-        libraries = _library_manager.list_available_libraries()
-        return jsonify({
-            'success': True,
-            'libraries': libraries,
-            'total': len(libraries)
-        })
+        def build():
+            libraries = _library_manager.list_available_libraries()
+            return {'success': True, 'libraries': libraries, 'total': len(libraries)}
+        
+        # 模型库文件不变时直接返回缓存的序列化结果（下载/删除/自定义库会改变版本标记）
+        return cached_json_response('model_libraries', build, version=_library_manager.libraries_version())
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -323,6 +333,7 @@ def create_custom_library():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/download_library/<library_id>', methods=['POST'])
+@admission_limit('library')
 def download_library(library_id):
     """下载模型库"""
     try:
@@ -359,14 +370,12 @@ def get_parameter_config():
         if not _modules_loaded:
             load_modules()
         
-        mode = request.args.get('mode', 'simplified')
+        mode = 'simplified' if request.args.get('mode', 'simplified') == 'simplified' else 'advanced'
         
+        # 表单配置只随代码变化，序列化和预压缩结果按模式缓存
         if mode == 'simplified':
-            config = _form_generator.generate_simplified_form()
-        else:
-            config = _form_generator.generate_advanced_form()
-        
-        return jsonify(config)
+            return cached_json_response(('parameter_config', mode), _form_generator.generate_simplified_form)
+        return cached_json_response(('parameter_config', mode), _form_generator.generate_advanced_form)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -9,12 +9,21 @@ os.environ['OPENBLAS_NUM_THREADS'] = '4'
 os.environ['OMP_NUM_THREADS'] = '4'
 os.environ['MKL_NUM_THREADS'] = '4'
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 import json
 from werkzeug.utils import secure_filename
+from upload_ingest import ingest_upload, start_upload_sweeper
 from datetime import datetime
+from metrics import install_flask_metrics
+from admission import admission_limit
+from static_payloads import cached_json_response
+from tracing import get_logger, install_flask_tracing, span
 
 app = Flask(__name__)
+install_flask_metrics(app, 'app_simple')  # 请求计数/延迟直方图，Prometheus 从 /metrics 抓取
+install_flask_tracing(app, 'app_simple')  # 按 TRACE_SAMPLE_RATE 采样，写入 logs/trace.jsonl
+
+logger = get_logger('app_simple')
 
 # 配置
 UPLOAD_FOLDER = 'uploads'
@@ -24,6 +33,7 @@ app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024
 
 # 创建必要目录
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+start_upload_sweeper(UPLOAD_FOLDER)  # 按TTL和字节配额清理上传目录
 os.makedirs('model_libraries', exist_ok=True)
 os.makedirs('training_data', exist_ok=True)
 
@@ -35,43 +45,57 @@ print("=" * 60)
 predictor = None
 library_manager = None
 training_system = None
-model = None
+file_processor = None
 
 def get_predictor():
     """延迟加载预测器"""
     global predictor
     if predictor is None:
-        print("📦 正在加载预测引擎...")
+        logger.info('正在加载预测引擎...')
         from deployment_predictor import DeploymentResourcePredictor
         predictor = DeploymentResourcePredictor()
-        print("✅ 预测引擎加载完成")
+        logger.info('预测引擎加载完成')
     return predictor
 
 def get_library_manager():
     """延迟加载模型库管理器"""
     global library_manager
     if library_manager is None:
-        print("📦 正在加载模型库管理器...")
+        logger.info('正在加载模型库管理器...')
         from model_library_manager import ModelLibraryManager
         library_manager = ModelLibraryManager()
-        print("✅ 模型库管理器加载完成")
+        logger.info('模型库管理器加载完成')
     return library_manager
 
 def get_training_system():
     """延迟加载训练系统"""
-    global training_system, model
+    global training_system
     if training_system is None:
-        print("📦 正在加载训练系统...")
-        from model import TDSQLArchitecturePredictor
+        logger.info('正在加载训练系统...')
         from training_system import TrainingSystem
-        model = TDSQLArchitecturePredictor()
-        training_system = TrainingSystem(model)
-        print("✅ 训练系统加载完成")
+        # PyTorch 网络在第一次训练时才创建
+        training_system = TrainingSystem()
+        logger.info('训练系统加载完成')
     return training_system
 
+def get_file_processor():
+    """延迟加载多系统文件处理器"""
+    global file_processor
+    if file_processor is None:
+        logger.info('正在加载文件处理器...')
+        from advanced_file_processor import AdvancedFileProcessor
+        file_processor = AdvancedFileProcessor()
+        logger.info('文件处理器加载完成')
+    return file_processor
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _dual_predict_class():
+    """开启信创对比的预测要跑两套设备目录，单独限流；普通预测不限流"""
+    raw = request.get_json(silent=True) or {}
+    return 'predict_dual' if raw.get('enable_xinchuan') else None
+
 # ==================== 页面路由 ====================
 
 @app.route('/')
@@ -125,167 +149,85 @@ def health_check():
         'message': 'TDSQL部署资源预测系统运行正常'
     })
 
-@app.route('/api/predict', methods=['POST'])
-def predict():
-    """部署资源预测API"""
-    try:
-        raw = request.get_json() or {}
-        
-        # 调试：打印收到的原始数据
-        print("\n" + "=" * 60)
-        print("📥 收到的请求参数:")
-        print(f"  enable_xinchuan: {raw.get('enable_xinchuan')}")
-        print(f"  xinchuan_mode: {raw.get('xinchuan_mode')}")
-        print(f"  全部参数: {raw}")
-        print("=" * 60 + "\n")
-        
-        # 统一字段映射（兼容普通版/专业版表单字段）
-        data = {}
-        
-        # 数据规模
-        data['data_volume'] = (
-            raw.get('current_data_size_gb')
-            or raw.get('total_data_size_gb')
-            or raw.get('future_data_size_gb')
-            or raw.get('data_volume')
-            or 100
-        )
-        
-        # 性能参数
-        data['qps'] = raw.get('qps') or raw.get('normal_qps') or raw.get('peak_qps') or 1000
-        data['tps'] = raw.get('tps') or raw.get('normal_tps') or raw.get('peak_tps') or int(data['qps'] * 0.3)
-        
-        # 并发/连接
-        data['concurrent_users'] = (
-            raw.get('concurrent_users')
-            or raw.get('concurrent_connections')
-            or raw.get('avg_concurrent_connections')
-            or 100
-        )
-        
-        # 行业/HA
-        data['industry'] = raw.get('industry') or raw.get('industry_type') or 'general'
-        need_ha = raw.get('need_high_availability') is True
-        data['ha_level'] = 'high' if need_ha else 'standard'
-        
-        # 数据增长率（转为比例）
-        growth = raw.get('data_growth_rate')
-        if isinstance(growth, (int, float)) and growth > 1:
-            data['data_growth_rate'] = float(growth) / 100.0
-        else:
-            data['data_growth_rate'] = growth if isinstance(growth, (int, float)) else 0.3
-        
-        # 其他可选需求
-        data['need_disaster_recovery'] = bool(raw.get('need_disaster_recovery'))
-        data['need_read_write_split'] = bool(raw.get('need_read_write_split'))
-        
-        # 信创模式参数
-        enable_xinchuan = raw.get('enable_xinchuan', False)  # 默认关闭，需要用户主动勾选
-        xinchuan_mode = raw.get('xinchuan_mode', 'standard')  # 默认标准信创
-        
-        # 无论是否启用信创模式，都使用新版预测器（确保生成完整的设备清单）
-        from deployment_predictor_xinchuan import DeploymentResourcePredictorXinChuan
-        
-        # 转换数据格式（统一定义）
-        common_data = {
-            'data_size_gb': data['data_volume'] * 1024,  # 转换为GB
-            'transactions_per_day': data['tps'] * 86400,
-            'max_connections': data['concurrent_users'],
-            'business_type': 'OLTP',
-            'high_availability': need_ha,
-            'disaster_recovery': data['need_disaster_recovery']
+def _build_prediction(common_data, enable_xinchuan, xinchuan_mode):
+    """
+    计算预测结果并适配前端字段
+    结果可能被并发的相同请求共享，返回后不要原地修改
+    """
+    # 无论是否启用信创模式，都使用新版预测器（确保生成完整的设备清单）
+    from deployment_predictor_xinchuan import DeploymentResourcePredictorXinChuan
+    
+    # 如果启用信创模式，生成传统方案和信创方案的完整对比
+    if enable_xinchuan:
+        
+        # 生成传统方案(使用国外品牌设备) - 独立架构设计
+        traditional_predictor = DeploymentResourcePredictorXinChuan(xinchuan_mode='off')
+        traditional_result = traditional_predictor.predict(common_data)
+        
+        # 生成信创方案(使用国产设备) - 独立架构设计
+        xc_predictor = DeploymentResourcePredictorXinChuan(xinchuan_mode=xinchuan_mode)
+        xc_result = xc_predictor.predict(common_data)
+        
+        # 计算真实的成本差异
+        traditional_cost = traditional_result.get('cost_breakdown', {}).get('total_initial_cost', 0)
+        xinchuan_cost = xc_result.get('cost_breakdown', {}).get('total_initial_cost', 0)
+        cost_savings = traditional_cost - xinchuan_cost
+        savings_percent = (cost_savings / traditional_cost * 100) if traditional_cost > 0 else 0
+        
+        # 使用传统方案作为基础结果（确保前端显示一致）
+        result = traditional_result.copy()
+        
+        # 先获取成本明细（避免变量未定义错误）
+        traditional_cost_breakdown = traditional_result.get('cost_breakdown', {})
+        traditional_equipment = traditional_result.get('equipment_list', [])
+        traditional_architecture = traditional_result.get('architecture', {})
+        
+        # 适配前端字段名（兼容旧版显示）
+        result['cost'] = {
+            'initial_investment': traditional_cost,  # 映射到旧字段
+            'three_year_tco': traditional_cost * 1.5,  # 估算3年TCO
+            'total_hardware': traditional_cost_breakdown.get('hardware_cost', 0),
+            'total_software': traditional_cost_breakdown.get('software_cost', 0),
+            'annual_operating': traditional_cost * 0.15  # 估算年运营成本
         }
         
-        # 如果启用信创模式，生成传统方案和信创方案的完整对比
-        if enable_xinchuan:
-            
-            # 生成传统方案(使用国外品牌设备) - 独立架构设计
-            traditional_predictor = DeploymentResourcePredictorXinChuan(xinchuan_mode='off')
-            traditional_result = traditional_predictor.predict(common_data)
-            
-            # 生成信创方案(使用国产设备) - 独立架构设计
-            xc_predictor = DeploymentResourcePredictorXinChuan(xinchuan_mode=xinchuan_mode)
-            xc_result = xc_predictor.predict(common_data)
-            
-            # 计算真实的成本差异
-            traditional_cost = traditional_result.get('cost_breakdown', {}).get('total_initial_cost', 0)
-            xinchuan_cost = xc_result.get('cost_breakdown', {}).get('total_initial_cost', 0)
-            cost_savings = traditional_cost - xinchuan_cost
-            savings_percent = (cost_savings / traditional_cost * 100) if traditional_cost > 0 else 0
-            
-            # 使用传统方案作为基础结果（确保前端显示一致）
-            result = traditional_result.copy()
-            
-            # 先获取成本明细（避免变量未定义错误）
-            traditional_cost_breakdown = traditional_result.get('cost_breakdown', {})
-            traditional_equipment = traditional_result.get('equipment_list', [])
-            traditional_architecture = traditional_result.get('architecture', {})
-            
-            # 适配前端字段名（兼容旧版显示）
-            result['cost'] = {
-                'initial_investment': traditional_cost,  # 映射到旧字段
-                'three_year_tco': traditional_cost * 1.5,  # 估算3年TCO
-                'total_hardware': traditional_cost_breakdown.get('hardware_cost', 0),
-                'total_software': traditional_cost_breakdown.get('software_cost', 0),
-                'annual_operating': traditional_cost * 0.15  # 估算年运营成本
-            }
-            
-            # 调试：打印设备清单数据（非信创模式）
-            print(f"\n🔍 调试(非信创模式) - traditional_equipment 总数: {len(traditional_equipment)}")
-            if traditional_equipment:
-                print(f"🔍 调试(非信创模式) - 第一个设备示例: {traditional_equipment[0]}")
-            else:
-                print("⚠️  调试(非信创模式) - traditional_equipment 为空列表！")
-            
-            # 适配设备清单字段（按类别分组）
-            servers = [item for item in traditional_equipment if item.get('category') in ['数据库服务器', '代理服务器', '监控服务器']]
-            network_devices = [item for item in traditional_equipment if item.get('category') in ['核心交换机', '接入交换机', '安全防火墙']]
-            storage_devices = [item for item in traditional_equipment if item.get('category') == '存储设备']
-            infrastructure_items = traditional_cost_breakdown.get('infrastructure_items', [])
-            
-            print(f"🔍 调试(非信创模式) - 分类后: servers={len(servers)}, network={len(network_devices)}, storage={len(storage_devices)}, infrastructure={len(infrastructure_items)}")
-            
-            result['equipment'] = {
-                'servers': servers,
-                'network_devices': network_devices,
-                'storage': storage_devices,  # ✅ 改为 storage（前端期待）
-                'infrastructure': infrastructure_items  # ✅ 添加基础设施清单
-            }
-            result['equipment_list'] = traditional_equipment  # 新版字段
-
-            
-            # 适配架构字段
-            result['architecture'] = {
-                'type': 'cluster',
-                'topology': {
-                    'db_nodes': traditional_architecture.get('database_nodes', 0),
-                    'proxy_nodes': traditional_architecture.get('proxy_nodes', 0),
-                    'monitor_nodes': traditional_architecture.get('monitoring_nodes', 0),
-                    'shard_count': 0,
-                    'replica_count': 3
-                }
+        if not traditional_equipment:
+            logger.warning('传统方案设备清单为空')
+        logger.debug('传统方案设备清单: 共%d项, 示例: %s',
+                     len(traditional_equipment), traditional_equipment[:1])
+        
+        # 适配设备清单字段（按类别分组）
+        servers = [item for item in traditional_equipment if item.get('category') in ['数据库服务器', '代理服务器', '监控服务器']]
+        network_devices = [item for item in traditional_equipment if item.get('category') in ['核心交换机', '接入交换机', '安全防火墙']]
+        storage_devices = [item for item in traditional_equipment if item.get('category') == '存储设备']
+        infrastructure_items = traditional_cost_breakdown.get('infrastructure_items', [])
+        
+        logger.debug('设备分类: servers=%d, network=%d, storage=%d, infrastructure=%d',
+                     len(servers), len(network_devices), len(storage_devices), len(infrastructure_items))
+        
+        result['equipment'] = {
+            'servers': servers,
+            'network_devices': network_devices,
+            'storage': storage_devices,  # ✅ 改为 storage（前端期待）
+            'infrastructure': infrastructure_items  # ✅ 添加基础设施清单
+        }
+        result['equipment_list'] = traditional_equipment  # 新版字段
+
+        
+        # 适配架构字段
+        result['architecture'] = {
+            'type': 'cluster',
+            'topology': {
+                'db_nodes': traditional_architecture.get('database_nodes', 0),
+                'proxy_nodes': traditional_architecture.get('proxy_nodes', 0),
+                'monitor_nodes': traditional_architecture.get('monitoring_nodes', 0),
+                'shard_count': 0,
+                'replica_count': 3
             }
-            result['cost_breakdown'] = {
-                'summary': result['cost'],
-                'breakdown': {  # ✅ 添加 breakdown 包裹层
-                    'hardware': {
-                        'servers': sum(item.get('total_price', 0) for item in servers),
-                        'network_devices': sum(item.get('total_price', 0) for item in network_devices),
-                        'storage': sum(item.get('total_price', 0) for item in storage_devices),
-                        'infrastructure': traditional_cost_breakdown.get('infrastructure_cost', 0)
-                    },
-                    'software': {
-                        'tdsql_license': 0,  # 信创模式免费
-                        'os_license': sum(item.get('total', 0) for item in traditional_cost_breakdown.get('software_items', []) if 'OS' in item.get('name', '') or 'Red Hat' in item.get('name', '')),
-                        'monitoring': 0,
-                        'backup': 0
-                    },
-                    'services': {
-                        'deployment': sum(item.get('total_price', 0) for item in infrastructure_items if '实施' in item.get('category', '')),
-                        'training': sum(item.get('total_price', 0) for item in infrastructure_items if '培训' in item.get('category', ''))
-                    }
-                },
-                # 同时保留顶层字段（向后兼容）
+        }
+        result['cost_breakdown'] = {
+            'summary': result['cost'],
+            'breakdown': {  # ✅ 添加 breakdown 包裹层
                 'hardware': {
                     'servers': sum(item.get('total_price', 0) for item in servers),
                     'network_devices': sum(item.get('total_price', 0) for item in network_devices),
@@ -293,7 +235,7 @@ def predict():
                     'infrastructure': traditional_cost_breakdown.get('infrastructure_cost', 0)
                 },
                 'software': {
-                    'tdsql_license': 0,
+                    'tdsql_license': 0,  # 信创模式免费
                     'os_license': sum(item.get('total', 0) for item in traditional_cost_breakdown.get('software_items', []) if 'OS' in item.get('name', '') or 'Red Hat' in item.get('name', '')),
                     'monitoring': 0,
                     'backup': 0
@@ -301,104 +243,103 @@ def predict():
                 'services': {
                     'deployment': sum(item.get('total_price', 0) for item in infrastructure_items if '实施' in item.get('category', '')),
                     'training': sum(item.get('total_price', 0) for item in infrastructure_items if '培训' in item.get('category', ''))
-                },
-                'software_items': traditional_cost_breakdown.get('software_items', []),
-                'annual_operating': {}
-            }
-            
-            # 添加完整的对比信息
-            result['xinchuan_enabled'] = True
-            result['xinchuan_mode'] = xinchuan_mode
-            result['traditional_solution'] = traditional_result  # 传统方案(独立架构)
-            result['xinchuan_solution'] = xc_result  # 信创方案(独立架构)
-            result['xinchuan_info'] = xc_result.get('xinchuan_info', {})
-            result['cost_comparison'] = {
-                'traditional_cost': traditional_cost,
-                'xinchuan_cost': xinchuan_cost,
-                'cost_savings': cost_savings,
-                'savings_percent': round(savings_percent, 1),
-                'note': f'使用信创方案相比传统方案节约 ¥{cost_savings:,.0f} ({savings_percent:.1f}%)'
-            }
-        else:
-            # 不启用信创模式，只生成传统方案（国外品牌）
-            traditional_predictor = DeploymentResourcePredictorXinChuan(xinchuan_mode='off')
-            traditional_result = traditional_predictor.predict(common_data)
-            
-            # 获取成本和设备信息
-            traditional_cost_breakdown = traditional_result.get('cost_breakdown', {})
-            traditional_equipment = traditional_result.get('equipment_list', [])
-            traditional_architecture = traditional_result.get('architecture', {})
-            traditional_cost = traditional_cost_breakdown.get('total_initial_cost', 0)
-            
-            # 使用传统方案作为结果
-            result = traditional_result.copy()
-            
-            # 适配前端字段名（兼容旧版显示）
-            result['cost'] = {
-                'initial_investment': traditional_cost,
-                'three_year_tco': traditional_cost * 1.5,
-                'total_hardware': traditional_cost_breakdown.get('hardware_cost', 0),
-                'total_software': traditional_cost_breakdown.get('software_cost', 0),
-                'annual_operating': traditional_cost * 0.15
-            }
-            
-            # 调试：打印设备清单数据（非信创模式）
-            print(f"\n🔍 调试(非信创模式) - traditional_equipment 总数: {len(traditional_equipment)}")
-            if traditional_equipment:
-                print(f"🔍 调试(非信创模式) - 第一个设备示例: {traditional_equipment[0]}")
-            else:
-                print("⚠️  调试(非信创模式) - traditional_equipment 为空列表！")
-            
-            # 适配设备清单字段（按类别分组）
-            servers = [item for item in traditional_equipment if item.get('category') in ['数据库服务器', '代理服务器', '监控服务器']]
-            network_devices = [item for item in traditional_equipment if item.get('category') in ['核心交换机', '接入交换机', '安全防火墙']]
-            storage_devices = [item for item in traditional_equipment if item.get('category') == '存储设备']
-            infrastructure_items = traditional_cost_breakdown.get('infrastructure_items', [])
-            
-            print(f"🔍 调试(非信创模式) - 分类后: servers={len(servers)}, network={len(network_devices)}, storage={len(storage_devices)}, infrastructure={len(infrastructure_items)}")
-            
-            result['equipment'] = {
-                'servers': servers,
-                'network_devices': network_devices,
-                'storage': storage_devices,  # ✅ 改为 storage（前端期待）
-                'infrastructure': infrastructure_items  # ✅ 添加基础设施清单
-            }
-            result['equipment_list'] = traditional_equipment
-
-            
-            # 适配架构字段
-            result['architecture'] = {
-                'type': 'cluster',
-                'topology': {
-                    'db_nodes': traditional_architecture.get('database_nodes', 0),
-                    'proxy_nodes': traditional_architecture.get('proxy_nodes', 0),
-                    'monitor_nodes': traditional_architecture.get('monitoring_nodes', 0),
-                    'shard_count': 0,
-                    'replica_count': 3
                 }
+            },
+            # 同时保留顶层字段（向后兼容）
+            'hardware': {
+                'servers': sum(item.get('total_price', 0) for item in servers),
+                'network_devices': sum(item.get('total_price', 0) for item in network_devices),
+                'storage': sum(item.get('total_price', 0) for item in storage_devices),
+                'infrastructure': traditional_cost_breakdown.get('infrastructure_cost', 0)
+            },
+            'software': {
+                'tdsql_license': 0,
+                'os_license': sum(item.get('total', 0) for item in traditional_cost_breakdown.get('software_items', []) if 'OS' in item.get('name', '') or 'Red Hat' in item.get('name', '')),
+                'monitoring': 0,
+                'backup': 0
+            },
+            'services': {
+                'deployment': sum(item.get('total_price', 0) for item in infrastructure_items if '实施' in item.get('category', '')),
+                'training': sum(item.get('total_price', 0) for item in infrastructure_items if '培训' in item.get('category', ''))
+            },
+            'software_items': traditional_cost_breakdown.get('software_items', []),
+            'annual_operating': {}
+        }
+        
+        # 添加完整的对比信息
+        result['xinchuan_enabled'] = True
+        result['xinchuan_mode'] = xinchuan_mode
+        result['traditional_solution'] = traditional_result  # 传统方案(独立架构)
+        result['xinchuan_solution'] = xc_result  # 信创方案(独立架构)
+        result['xinchuan_info'] = xc_result.get('xinchuan_info', {})
+        result['cost_comparison'] = {
+            'traditional_cost': traditional_cost,
+            'xinchuan_cost': xinchuan_cost,
+            'cost_savings': cost_savings,
+            'savings_percent': round(savings_percent, 1),
+            'note': f'使用信创方案相比传统方案节约 ¥{cost_savings:,.0f} ({savings_percent:.1f}%)'
+        }
+    else:
+        # 不启用信创模式，只生成传统方案（国外品牌）
+        traditional_predictor = DeploymentResourcePredictorXinChuan(xinchuan_mode='off')
+        traditional_result = traditional_predictor.predict(common_data)
+        
+        # 获取成本和设备信息
+        traditional_cost_breakdown = traditional_result.get('cost_breakdown', {})
+        traditional_equipment = traditional_result.get('equipment_list', [])
+        traditional_architecture = traditional_result.get('architecture', {})
+        traditional_cost = traditional_cost_breakdown.get('total_initial_cost', 0)
+        
+        # 使用传统方案作为结果
+        result = traditional_result.copy()
+        
+        # 适配前端字段名（兼容旧版显示）
+        result['cost'] = {
+            'initial_investment': traditional_cost,
+            'three_year_tco': traditional_cost * 1.5,
+            'total_hardware': traditional_cost_breakdown.get('hardware_cost', 0),
+            'total_software': traditional_cost_breakdown.get('software_cost', 0),
+            'annual_operating': traditional_cost * 0.15
+        }
+        
+        if not traditional_equipment:
+            logger.warning('传统方案设备清单为空')
+        logger.debug('传统方案设备清单: 共%d项, 示例: %s',
+                     len(traditional_equipment), traditional_equipment[:1])
+        
+        # 适配设备清单字段（按类别分组）
+        servers = [item for item in traditional_equipment if item.get('category') in ['数据库服务器', '代理服务器', '监控服务器']]
+        network_devices = [item for item in traditional_equipment if item.get('category') in ['核心交换机', '接入交换机', '安全防火墙']]
+        storage_devices = [item for item in traditional_equipment if item.get('category') == '存储设备']
+        infrastructure_items = traditional_cost_breakdown.get('infrastructure_items', [])
+        
+        logger.debug('设备分类: servers=%d, network=%d, storage=%d, infrastructure=%d',
+                     len(servers), len(network_devices), len(storage_devices), len(infrastructure_items))
+        
+        result['equipment'] = {
+            'servers': servers,
+            'network_devices': network_devices,
+            'storage': storage_devices,  # ✅ 改为 storage（前端期待）
+            'infrastructure': infrastructure_items  # ✅ 添加基础设施清单
+        }
+        result['equipment_list'] = traditional_equipment
+
+        
+        # 适配架构字段
+        result['architecture'] = {
+            'type': 'cluster',
+            'topology': {
+                'db_nodes': traditional_architecture.get('database_nodes', 0),
+                'proxy_nodes': traditional_architecture.get('proxy_nodes', 0),
+                'monitor_nodes': traditional_architecture.get('monitoring_nodes', 0),
+                'shard_count': 0,
+                'replica_count': 3
             }
-            
-            result['cost_breakdown'] = {
-                'summary': result['cost'],
-                'breakdown': {  # ✅ 添加 breakdown 包裹层
-                    'hardware': {
-                        'servers': sum(item.get('total_price', 0) for item in servers),
-                        'network_devices': sum(item.get('total_price', 0) for item in network_devices),
-                        'storage': sum(item.get('total_price', 0) for item in storage_devices),
-                        'infrastructure': traditional_cost_breakdown.get('infrastructure_cost', 0)
-                    },
-                    'software': {
-                        'tdsql_license': 0,
-                        'os_license': sum(item.get('total', 0) for item in traditional_cost_breakdown.get('software_items', []) if 'OS' in item.get('name', '') or 'Red Hat' in item.get('name', '')),
-                        'monitoring': 0,
-                        'backup': 0
-                    },
-                    'services': {
-                        'deployment': sum(item.get('total_price', 0) for item in infrastructure_items if '实施' in item.get('category', '')),
-                        'training': sum(item.get('total_price', 0) for item in infrastructure_items if '培训' in item.get('category', ''))
-                    }
-                },
-                # 同时保留顶层字段（向后兼容）
+        }
+        
+        result['cost_breakdown'] = {
+            'summary': result['cost'],
+            'breakdown': {  # ✅ 添加 breakdown 包裹层
                 'hardware': {
                     'servers': sum(item.get('total_price', 0) for item in servers),
                     'network_devices': sum(item.get('total_price', 0) for item in network_devices),
@@ -414,28 +355,217 @@ def predict():
                 'services': {
                     'deployment': sum(item.get('total_price', 0) for item in infrastructure_items if '实施' in item.get('category', '')),
                     'training': sum(item.get('total_price', 0) for item in infrastructure_items if '培训' in item.get('category', ''))
-                },
-                'software_items': traditional_cost_breakdown.get('software_items', []),
-                'annual_operating': {}
-            }
-            
-            # 标记未启用信创模式
-            result['xinchuan_enabled'] = False
+                }
+            },
+            # 同时保留顶层字段（向后兼容）
+            'hardware': {
+                'servers': sum(item.get('total_price', 0) for item in servers),
+                'network_devices': sum(item.get('total_price', 0) for item in network_devices),
+                'storage': sum(item.get('total_price', 0) for item in storage_devices),
+                'infrastructure': traditional_cost_breakdown.get('infrastructure_cost', 0)
+            },
+            'software': {
+                'tdsql_license': 0,
+                'os_license': sum(item.get('total', 0) for item in traditional_cost_breakdown.get('software_items', []) if 'OS' in item.get('name', '') or 'Red Hat' in item.get('name', '')),
+                'monitoring': 0,
+                'backup': 0
+            },
+            'services': {
+                'deployment': sum(item.get('total_price', 0) for item in infrastructure_items if '实施' in item.get('category', '')),
+                'training': sum(item.get('total_price', 0) for item in infrastructure_items if '培训' in item.get('category', ''))
+            },
+            'software_items': traditional_cost_breakdown.get('software_items', []),
+            'annual_operating': {}
+        }
         
-        return jsonify({
-            'success': True,
-            'data': result
-        })
+        # 标记未启用信创模式
+        result['xinchuan_enabled'] = False
+    
+    return result
+
+@app.route('/api/predict', methods=['POST'])
+@admission_limit(_dual_predict_class)
+def predict():
+    """部署资源预测API"""
+    try:
+        raw = request.get_json() or {}
+        
+        logger.debug('收到的请求参数: enable_xinchuan=%s, xinchuan_mode=%s, 全部参数=%s',
+                     raw.get('enable_xinchuan'), raw.get('xinchuan_mode'), raw)
+        
+        # 信创模式参数
+        enable_xinchuan = raw.get('enable_xinchuan', False)  # 默认关闭，需要用户主动勾选
+        xinchuan_mode = raw.get('xinchuan_mode', 'standard')  # 默认标准信创
+        
+        from batch_predict import build_predictor_input
+        from singleflight import canonical_key, get_flight
+        
+        # 统一字段映射（兼容普通版/专业版表单字段）并转换数据格式
+        with span('normalize'):
+            common_data = build_predictor_input(raw)
+        
+        # 同一时刻相同输入的预测只计算一次，并发请求共享结果
+        key = canonical_key('predict', [common_data, bool(enable_xinchuan), xinchuan_mode if enable_xinchuan else None])
+        with span('predict') as predict_span:
+            result, shared = get_flight('predict').do(
+                key, lambda: _build_prediction(common_data, enable_xinchuan, xinchuan_mode))
+            if predict_span is not None:
+                predict_span['attrs'] = {'coalesced': shared}
+        
+        with span('serialize'):
+            return jsonify({
+                'success': True,
+                'data': result
+            })
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception('部署资源预测失败')
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/api/predict/batch', methods=['POST'])
+@admission_limit('batch')
+def predict_batch():
+    """
+    批量部署资源预测API
+    输入: multipart上传的CSV/Excel/JSON Lines文件（字段 file），或 application/x-ndjson 请求体
+    输出: 按完成顺序流式返回每行结果，最后一行为汇总；?format=csv 返回CSV，默认NDJSON
+    """
+    import batch_predict
+    
+    try:
+        output_format = request.args.get('format', 'ndjson').lower()
+        if output_format not in ('ndjson', 'csv'):
+            return jsonify({'success': False, 'error': f'不支持的输出格式: {output_format}'}), 400
+        
+        upload = None
+        if 'file' in request.files:
+            file = request.files['file']
+            if file.filename == '':
+                return jsonify({'success': False, 'error': '文件名为空'}), 400
+            upload = ingest_upload(file, app.config['UPLOAD_FOLDER'], secure_filename(file.filename))
+            try:
+                batch_format = batch_predict.detect_batch_format(upload.materialize(), upload.filename)
+            except ValueError as e:
+                upload.close()
+                return jsonify({'success': False, 'error': str(e)}), 400
+            rows = batch_predict.iter_batch_rows(upload.path, batch_format)
+        elif request.mimetype in ('application/x-ndjson', 'application/jsonl', 'application/json'):
+            rows = batch_predict.iter_jsonl_rows(request.stream)
+        else:
+            return jsonify({'success': False, 'error': '没有文件'}), 400
+        
+        executor = batch_predict.get_batch_pool() if batch_predict.BATCH_PREDICT_WORKERS > 1 else None
+        
+        def generate():
+            try:
+                results = batch_predict.run_batch(rows, executor)
+                if output_format == 'csv':
+                    yield from batch_predict.iter_csv(results)
+                else:
+                    yield from batch_predict.iter_ndjson(results)
+            except Exception as e:
+                # 响应头已发出，错误作为最后一行返回
+                yield json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False) + '\n'
+            finally:
+                if upload is not None:
+                    upload.close()
+        
+        mimetype = 'text/csv' if output_format == 'csv' else 'application/x-ndjson'
+        return Response(stream_with_context(generate()), mimetype=mimetype)
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def _environment_from_request():
+    """
+    从请求构造多系统环境：multipart上传的系统清单文件（字段 file），或JSON {systems: [...], deployment: {...}}
+    
+    Returns:
+        (环境, 解析结果, 表单/JSON参数)；出错时环境为None，解析结果中带error
+    """
+    from multi_system_planner import environment_from_result
+    
+    if 'file' in request.files:
+        file = request.files['file']
+        if file.filename == '':
+            return None, {'error': '文件名为空'}, {}
+        with ingest_upload(file, app.config['UPLOAD_FOLDER'], secure_filename(file.filename)) as upload:
+            parsed = get_file_processor().process_upload(upload)
+        options = request.form
+    else:
+        parsed = request.get_json() or {}
+        options = parsed
+    
+    if parsed.get('error'):
+        return None, parsed, options
+    
+    environment = environment_from_result(parsed, options.get('environment_name', ''))
+    if not environment.systems:
+        return None, {'error': '没有识别到系统信息'}, options
+    return environment, parsed, options
+
+def _truncation_warning(parsed, environment):
+    if parsed.get('systems_truncated'):
+        return f"清单共 {parsed.get('systems_total')} 个系统，仅规划了前 {len(environment.systems)} 个"
+    return None
+
+@app.route('/api/plan/multi_system', methods=['POST'])
+@admission_limit('planning')
+def plan_multi_system():
+    """
+    多系统环境规划API
+    输入: multipart上传的系统清单文件（字段 file），或JSON {systems: [...], deployment: {...}}
+    输出: 逐系统规模 + 共享基础设施去重后的环境级设备清单
+    """
+    try:
+        from multi_system_planner import MultiSystemPlanner
+        
+        environment, parsed, options = _environment_from_request()
+        if environment is None:
+            return jsonify({'success': False, 'error': parsed['error']}), 400
+        
+        result = MultiSystemPlanner(xinchuan_mode=options.get('xinchuan_mode', 'off')).plan(environment)
+        warning = _truncation_warning(parsed, environment)
+        if warning:
+            result['warning'] = warning
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/plan/consolidation', methods=['POST'])
+@admission_limit('planning')
+def plan_consolidation():
+    """
+    多系统整合规划API
+    把小系统装箱合并到共享集群（同可用性等级、同数据敏感度才合并，高敏感度独立部署），
+    并与逐系统独立部署方案对比节点数和3年TCO
+    """
+    try:
+        from consolidation_planner import ConsolidationPlanner, DEFAULT_HEADROOM
+        
+        environment, parsed, options = _environment_from_request()
+        if environment is None:
+            return jsonify({'success': False, 'error': parsed['error']}), 400
+        
+        planner = ConsolidationPlanner(
+            headroom=float(options.get('headroom', DEFAULT_HEADROOM)),
+            xinchuan_mode=options.get('xinchuan_mode', 'off')
+        )
+        result = planner.plan(environment)
+        warning = _truncation_warning(parsed, environment)
+        if warning:
+            result['warning'] = warning
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/upload', methods=['POST'])
+@admission_limit('ocr')
 def upload_file():
     """文件上传API"""
     try:
@@ -450,17 +580,17 @@ def upload_file():
             filename = secure_filename(file.filename)
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = f"{timestamp}_{filename}"
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
             
-            # 获取预测器并解析文件
-            pred = get_predictor()
-            params = pred.parse_file(filepath)
+            # 边接收边计算哈希，解析缓存命中时不落盘，处理完删除临时文件
+            with ingest_upload(file, app.config['UPLOAD_FOLDER'], filename) as upload:
+                pred = get_predictor()
+                params = pred.parse_upload(upload)
             
             return jsonify({
                 'success': True,
                 'filename': filename,
-                'filepath': filepath,
+                'content_hash': upload.content_hash,
+                'size': upload.size,
                 'params': params
             })
         else:
@@ -483,7 +613,7 @@ def clear_uploads():
                     if os.path.isfile(file_path):
                         os.unlink(file_path)
                 except Exception as e:
-                    print(f"删除文件失败: {file_path}, 错误: {e}")
+                    logger.warning('删除文件失败: %s, 错误: %s', file_path, e)
         
         return jsonify({
             'success': True,
@@ -492,6 +622,46 @@ def clear_uploads():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/parse_cache/stats', methods=['GET'])
+def parse_cache_stats():
+    """解析缓存命中率统计"""
+    from parse_cache import get_parse_cache
+
+    cache = get_parse_cache()
+    if cache is None:
+        return jsonify({'success': True, 'enabled': False})
+
+    return jsonify({
+        'success': True,
+        'enabled': True,
+        'stats': cache.get_stats()
+    })
+
+@app.route('/api/xinchuan/catalog', methods=['GET'])
+def xinchuan_catalog():
+    """信创设备目录与国产/国外厂商对比（只随代码变化，首次请求时序列化并预压缩）"""
+    def build():
+        from xinchuan_device_catalog import XinChuangDeviceCatalog
+        catalog = XinChuangDeviceCatalog()
+        return {
+            'success': True,
+            'vendor_comparison': catalog.get_vendor_comparison(),
+            'recommendations': {level: catalog.get_xinchuan_recommendation(level)
+                                for level in ('standard', 'strict', 'full')},
+            'catalog': {
+                'servers': catalog.server_catalog,
+                'network': catalog.network_catalog,
+                'storage': catalog.storage_catalog,
+                'software': catalog.software_licenses,
+                'databases': catalog.database_options
+            }
+        }
+
+    try:
+        return cached_json_response('xinchuan_catalog', build)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # ==================== 模型库管理 API ====================
 
 @app.route('/api/model_libraries', methods=['GET'])
@@ -499,11 +669,11 @@ def get_model_libraries():
     """获取可用的模型库列表"""
     try:
         manager = get_library_manager()
-        libraries = manager.list_available_libraries()
-        return jsonify({
-            'success': True,
-            'libraries': libraries
-        })
+        # 模型库文件不变时直接返回缓存的序列化结果（下载/删除/自定义库会改变版本标记）
+        return cached_json_response(
+            'model_libraries',
+            lambda: {'success': True, 'libraries': manager.list_available_libraries()},
+            version=manager.libraries_version())
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -521,6 +691,7 @@ def get_model_library(library_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/model_libraries/<library_id>/download', methods=['POST'])
+@admission_limit('library')
 def download_model_library(library_id):
     """下载模型库"""
     try:
@@ -583,17 +754,44 @@ def create_custom_library():
 
 @app.route('/api/training/cases', methods=['GET'])
 def get_training_cases():
-    """获取训练案例列表"""
+    """获取训练案例列表（支持 architecture_type / industry / data_size_bucket 筛选和 limit / offset 分页）"""
     try:
         trainer = get_training_system()
-        cases = trainer.list_cases()
+        page = trainer.list_cases(
+            limit=request.args.get('limit', 50, type=int),
+            offset=request.args.get('offset', 0, type=int),
+            **_case_filters()
+        )
         return jsonify({
             'success': True,
-            'cases': cases
+            'cases': page['cases'],
+            'total': page['total'],
+            'limit': page['limit'],
+            'offset': page['offset']
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/training/stats', methods=['GET'])
+def get_training_stats():
+    """获取训练案例统计（筛选条件同 /api/training/cases）"""
+    try:
+        trainer = get_training_system()
+        return jsonify({
+            'success': True,
+            'stats': trainer.get_statistics(**_case_filters())
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def _case_filters():
+    """从查询参数中取案例筛选条件"""
+    return {
+        'architecture_type': request.args.get('architecture_type'),
+        'industry': request.args.get('industry'),
+        'data_size_bucket': request.args.get('data_size_bucket', type=int)
+    }
+
 @app.route('/api/training/cases', methods=['POST'])
 def add_training_case():
     """添加训练案例"""
@@ -616,6 +814,7 @@ def add_training_case():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/training/train', methods=['POST'])
+@admission_limit('training')
 def train_model():
     """训练模型"""
     try:
@@ -648,13 +847,15 @@ def get_training_history():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/training/evaluate', methods=['POST'])
+@admission_limit('training')
 def evaluate_model():
     """评估模型"""
     try:
         data = request.get_json()
         trainer = get_training_system()
         
-        result = trainer.evaluate(data.get('test_data'))
+        # report=true 时返回混淆矩阵和节点/分片/副本数 MAE，否则只返回准确率
+        result = trainer.evaluate(data.get('test_data'), report=bool(data.get('report')))
         
         return jsonify({
             'success': True,
@@ -663,6 +864,29 @@ def evaluate_model():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/training/cross_validate', methods=['POST'])
+@admission_limit('training')
+def cross_validate_model():
+    """k 折交叉验证，对比规则 / 神经网络 / 案例检索"""
+    try:
+        data = request.get_json() or {}
+        trainer = get_training_system()
+        
+        report = trainer.cross_validate(
+            k=int(data.get('folds', 5)),
+            approaches=data.get('approaches'),
+            epochs=int(data.get('epochs', 50))
+        )
+        
+        return jsonify({
+            'success': True,
+            'report': report
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/download_template/<version>')
 def download_template(version):
     """下载Excel模板"""
@@ -679,6 +903,7 @@ def download_template(version):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/parse_excel', methods=['POST'])
+@admission_limit('ocr')
 def parse_excel():
     """解析上传的Excel文件"""
     try:
@@ -692,14 +917,11 @@ def parse_excel():
         if not file.filename.endswith(('.xlsx', '.xls')):
             return jsonify({'success': False, 'error': '只支持Excel文件'}), 400
         
-        # 保存文件
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # 解析Excel
+        # 解析Excel（小文件直接在内存中读取）
         from openpyxl import load_workbook
-        wb = load_workbook(filepath)
+        with ingest_upload(file, app.config['UPLOAD_FOLDER'], secure_filename(file.filename)) as upload:
+            with upload.open() as f:
+                wb = load_workbook(f)
         ws = wb.active
         
         data = {}
@@ -736,9 +958,6 @@ def parse_excel():
                     else:
                         data[field_name] = param_value
         
-        # 删除临时文件
-        os.remove(filepath)
-        
         return jsonify({
             'success': True,
             'data': data
@@ -7,16 +7,23 @@ from flask import Flask, render_template, request, jsonify
 import json
 import os
 from werkzeug.utils import secure_filename
-from model import TDSQLArchitecturePredictor
+from model import load_predictor
 from architecture_calculator import ArchitectureCalculator
 from enhanced_calculator import EnhancedArchitectureCalculator
 from training_system import TrainingSystem
 from image_ocr import ImageTableRecognizer
 from model_library_manager import ModelLibraryManager
+from case_index import get_library_index
 from custom_model_builder import CustomModelBuilder
 from parameter_form_generator import ParameterFormGenerator
+from metrics import install_flask_metrics
+from admission import admission_limit
+from static_payloads import cached_json_response
+from tracing import install_flask_tracing
 
 app = Flask(__name__)
+install_flask_metrics(app, 'app_with_learning')  # 请求计数/延迟直方图，Prometheus 从 /metrics 抓取
+install_flask_tracing(app, 'app_with_learning')  # 按 TRACE_SAMPLE_RATE 采样，写入 logs/trace.jsonl
 
 # 配置上传
 UPLOAD_FOLDER = 'uploads'
@@ -30,8 +37,8 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 # 初始化处理器
 architecture_calculator = ArchitectureCalculator()
 enhanced_calculator = EnhancedArchitectureCalculator()  # 增强版计算器
-model = TDSQLArchitecturePredictor()
-trainer = TrainingSystem(model)
+model = load_predictor()  # NumPy 推理引擎，模型注册表切换线上版本后由后台线程加载并替换
+trainer = TrainingSystem()
 recognizer = ImageTableRecognizer()
 library_manager = ModelLibraryManager()  # 模型库管理器
 custom_builder = CustomModelBuilder()  # 自定义模型库构建器
@@ -46,6 +53,7 @@ def index():
     return render_template('index_learning.html')
 
 @app.route('/api/analyze', methods=['POST'])
+@admission_limit('ocr')
 def analyze_image():
     """分析上传的图片"""
     try:
@@ -132,19 +140,23 @@ def submit_case():
         return jsonify({'error': f'提交失败: {str(e)}'}), 500
 
 @app.route('/api/train_model', methods=['POST'])
+@admission_limit('training')
 def train_model():
     """触发模型训练"""
     try:
         data = request.get_json()
         epochs = data.get('epochs', 50)
+        # shadow=true 时新版本只作为候选做影子评估，不直接上线
+        promote = not data.get('shadow', False)
         
         # 开始训练
-        success = trainer.train(epochs=epochs, batch_size=2, learning_rate=0.001)
+        success = trainer.train(epochs=epochs, batch_size=2, learning_rate=0.001, promote=promote)
         
         if success:
             return jsonify({
                 'success': True,
-                'message': f'模型训练完成，共 {epochs} 轮'
+                'message': f'模型训练完成，共 {epochs} 轮',
+                'model_version': success['model_version']
             })
         else:
             return jsonify({
@@ -165,6 +177,41 @@ def get_statistics():
     except Exception as e:
         return jsonify({'error': f'获取统计失败: {str(e)}'}), 500
 
+@app.route('/api/models', methods=['GET'])
+def list_model_versions():
+    """模型版本列表，以及本进程正在使用的版本和影子评估结果"""
+    return jsonify({
+        'versions': trainer.registry.list_versions(),
+        'serving': model.status()
+    })
+
+@app.route('/api/models/promote', methods=['POST'])
+def promote_model_version():
+    """切换线上模型版本（也用于回滚）"""
+    data = request.get_json() or {}
+    try:
+        trainer.registry.promote(data.get('version', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'success': True, 'version': data.get('version')})
+
+@app.route('/api/models/candidate', methods=['POST'])
+def set_candidate_model_version():
+    """设置影子评估的候选版本，version 为空时停止影子评估"""
+    data = request.get_json() or {}
+    try:
+        trainer.registry.set_candidate(data.get('version') or None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'success': True, 'candidate': data.get('version') or None})
+
+@app.route('/api/online_learning', methods=['GET'])
+def get_online_learning_status():
+    """在线增量学习状态和漂移指标"""
+    if trainer.online_learner is None:
+        return jsonify({'enabled': False})
+    return jsonify(trainer.online_learner.status())
+
 @app.route('/api/feedback', methods=['POST'])
 def submit_feedback():
     """提交预测反馈"""
@@ -304,12 +351,13 @@ def model_library_page():
 def get_model_libraries():
     """获取所有可用的模型库列表"""
     try:
-        libraries = library_manager.list_available_libraries()
-        return jsonify(libraries)
+        return cached_json_response('model_libraries', library_manager.list_available_libraries,
+                                    version=library_manager.libraries_version())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/download_library', methods=['POST'])
+@admission_limit('library')
 def download_library():
     """下载模型库"""
     try:
@@ -324,6 +372,23 @@ def download_library():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/similar_cases', methods=['POST'])
+def similar_cases():
+    """在已安装的模型库和真实案例中查找与输入参数最相似的历史部署"""
+    data = request.get_json() or {}
+    input_data = data.get('input')
+    if not isinstance(input_data, dict):
+        return jsonify({'error': '缺少input参数'}), 400
+    try:
+        k = max(1, min(int(data.get('k', 5)), 100))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'k必须是整数'}), 400
+    
+    try:
+        return jsonify(get_library_index(library_manager).query(input_data, k=k))
+    except Exception as e:
+        return jsonify({'error': f'检索失败: {str(e)}'}), 500
+
 @app.route('/api/use_library', methods=['POST'])
 def use_library():
     """使用指定的模型库"""
@@ -494,14 +559,12 @@ def export_library(library_id):
 def get_parameter_config():
     """获取参数配置"""
     try:
-        mode = request.args.get('mode', 'simplified')  # simplified 或 advanced
+        mode = 'simplified' if request.args.get('mode', 'simplified') == 'simplified' else 'advanced'
         
+        # 表单配置只随代码变化，序列化和预压缩结果按模式缓存
         if mode == 'simplified':
-            config = form_generator.generate_simplified_form()
-        else:
-            config = form_generator.generate_advanced_form()
-        
-        return jsonify(config)
+            return cached_json_response(('parameter_config', mode), form_generator.generate_simplified_form)
+        return cached_json_response(('parameter_config', mode), form_generator.generate_advanced_form)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
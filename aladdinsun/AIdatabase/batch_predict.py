@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+批量部署资源预测
+逐行读取CSV/Excel/JSON Lines，分块提交给进程池预测，按完成顺序流式产出每行结果，
+最后输出一行汇总；读取、在途任务和输出都有上限，内存占用与输入行数无关。
+"""
+
+import io
+import os
+import sys
+import csv
+import json
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# 进程池大小与每个任务的行数
+BATCH_PREDICT_WORKERS = int(os.environ.get('BATCH_PREDICT_WORKERS', min(4, os.cpu_count() or 1)))
+BATCH_CHUNK_ROWS = int(os.environ.get('BATCH_CHUNK_ROWS', 64))
+
+# 批量文件最大行数
+BATCH_MAX_ROWS = int(os.environ.get('BATCH_MAX_ROWS', 100000))
+
+# 逐行结果的输出列（CSV格式按此顺序）
+RESULT_FIELDS = [
+    'row', 'system_name', 'success', 'error', 'node_spec', 'database_nodes', 'proxy_nodes',
+    'monitoring_nodes', 'hardware_cost', 'software_cost', 'infrastructure_cost', 'total_initial_cost'
+]
+
+# 中文列名 -> /api/predict 请求字段
+COLUMN_ALIASES = {
+    '系统名称': 'system_name',
+    '系统': 'system_name',
+    '数据规模 (GB)': 'total_data_size_gb',
+    '当前数据规模 (GB)': 'current_data_size_gb',
+    'QPS (每秒查询数)': 'qps',
+    '日常QPS': 'normal_qps',
+    'TPS (每秒事务数)': 'tps',
+    '日常TPS': 'normal_tps',
+    '并发连接数': 'concurrent_connections',
+    '平均并发连接数': 'avg_concurrent_connections',
+    '需要高可用': 'need_high_availability',
+    '需要灾备': 'need_disaster_recovery',
+    '需要读写分离': 'need_read_write_split',
+    '数据增长率 (%/年)': 'data_growth_rate',
+    '行业': 'industry',
+}
+
+_TRUE_STRINGS = {'true', 'yes', 'y', '是'}
+_FALSE_STRINGS = {'false', 'no', 'n', '否'}
+
+
+def build_predictor_input(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    统一字段映射（兼容普通版/专业版表单字段），转换为信创预测器的输入格式
+    /api/predict 与批量预测共用
+    """
+    # 数据规模
+    data_volume = (
+        raw.get('current_data_size_gb')
+        or raw.get('total_data_size_gb')
+        or raw.get('future_data_size_gb')
+        or raw.get('data_volume')
+        or 100
+    )
+
+    # 性能参数
+    qps = raw.get('qps') or raw.get('normal_qps') or raw.get('peak_qps') or 1000
+    tps = raw.get('tps') or raw.get('normal_tps') or raw.get('peak_tps') or int(qps * 0.3)
+
+    # 并发/连接
+    concurrent_users = (
+        raw.get('concurrent_users')
+        or raw.get('concurrent_connections')
+        or raw.get('avg_concurrent_connections')
+        or 100
+    )
+
+    return {
+        'data_size_gb': data_volume * 1024,  # 转换为GB
+        'transactions_per_day': tps * 86400,
+        'max_connections': concurrent_users,
+        'business_type': 'OLTP',
+        'high_availability': raw.get('need_high_availability') is True,
+        'disaster_recovery': bool(raw.get('need_disaster_recovery'))
+    }
+
+
+def _coerce_value(value: Any) -> Any:
+    """把表格中的字符串转换为数字/布尔值，空值返回None"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value != value:  # NaN
+        return None
+    if not isinstance(value, str):
+        return value
+
+    text = value.strip()
+    if not text:
+        return None
+    lowered = text.lower()
+    if lowered in _TRUE_STRINGS:
+        return True
+    if lowered in _FALSE_STRINGS:
+        return False
+    try:
+        number = float(text.replace(',', ''))
+        return int(number) if number.is_integer() else number
+    except ValueError:
+        return text
+
+
+def normalize_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """列名别名映射 + 取值类型转换，去掉空单元格"""
+    normalized = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        name = str(key).strip()
+        name = COLUMN_ALIASES.get(name, name)
+        value = _coerce_value(value)
+        if value is not None:
+            normalized[name] = value
+    return normalized
+
+
+# ==================== 输入读取 ====================
+
+def detect_batch_format(file_path: str, filename: str = '') -> str:
+    """判断批量文件格式：csv / excel / jsonl"""
+    from parser_registry import sniff_file_type, EXCEL_TYPES
+
+    ext = os.path.splitext(filename or file_path)[1].lower().lstrip('.')
+    if ext in ('jsonl', 'ndjson'):
+        return 'jsonl'
+
+    file_type = sniff_file_type(file_path)
+    if file_type in EXCEL_TYPES:
+        return 'excel'
+    if file_type == 'csv':
+        return 'csv'
+    if file_type == 'json' or ext == 'json':
+        return 'jsonl'
+    if ext in ('csv', 'tsv', 'txt'):
+        return 'csv'
+    raise ValueError(f'不支持的批量文件类型: {file_type}')
+
+
+def iter_csv_rows(file_path: str, chunk_rows: int = 1000) -> Iterator[Dict[str, Any]]:
+    """分块读取CSV/TSV"""
+    import pandas as pd
+
+    with open(file_path, 'rb') as f:
+        sample = f.read(8192).decode('utf-8', errors='ignore')
+    try:
+        delimiter = csv.Sniffer().sniff(sample, delimiters=',\t;|').delimiter
+    except csv.Error:
+        delimiter = ','
+
+    for chunk in pd.read_csv(file_path, sep=delimiter, chunksize=chunk_rows,
+                             encoding='utf-8-sig', skipinitialspace=True):
+        for record in chunk.to_dict('records'):
+            yield record
+
+
+def iter_excel_rows(file_path: str) -> Iterator[Dict[str, Any]]:
+    """只读模式逐行读取第一个工作表，首行为表头"""
+    import openpyxl
+
+    with open(file_path, 'rb') as f:
+        wb = openpyxl.load_workbook(f, read_only=True, data_only=True)
+        try:
+            rows = wb.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            for values in rows:
+                if any(v is not None for v in values):
+                    yield dict(zip(header, values))
+        finally:
+            wb.close()
+
+
+def iter_jsonl_rows(lines: Iterable) -> Iterator[Dict[str, Any]]:
+    """逐行解析JSON Lines；整个文件是JSON数组时也兼容（仅适合小文件）"""
+    buffered = None
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8-sig')
+        text = line.strip()
+        if not text:
+            continue
+        if buffered is not None:
+            buffered.append(text)
+            continue
+        if text.startswith('['):
+            buffered = [text]
+            continue
+        yield json.loads(text)
+
+    if buffered is not None:
+        for item in json.loads('\n'.join(buffered)):
+            yield item
+
+
+def iter_batch_rows(file_path: str, batch_format: str) -> Iterator[Dict[str, Any]]:
+    """按格式逐行读取批量文件"""
+    if batch_format == 'csv':
+        yield from iter_csv_rows(file_path)
+    elif batch_format == 'excel':
+        yield from iter_excel_rows(file_path)
+    else:
+        with open(file_path, 'r', encoding='utf-8-sig') as f:
+            yield from iter_jsonl_rows(f)
+
+
+# ==================== 预测 ====================
+
+# 按信创模式缓存的预测器（每个工作进程各一份）
+_worker_predictors: Dict[str, Any] = {}
+
+
+def _init_worker(quiet: bool = True):
+    """工作进程初始化：屏蔽预测器的逐条调试输出"""
+    if quiet:
+        sys.stdout = open(os.devnull, 'w')
+
+
+def get_mode_predictor(mode: str):
+    """按信创模式获取预测器（进程内缓存）"""
+    predictor = _worker_predictors.get(mode)
+    if predictor is None:
+        from deployment_predictor_xinchuan import DeploymentResourcePredictorXinChuan
+        predictor = DeploymentResourcePredictorXinChuan(xinchuan_mode=mode)
+        _worker_predictors[mode] = predictor
+    return predictor
+
+
+def predict_row(index: int, raw: Dict[str, Any]) -> Dict[str, Any]:
+    """预测一行，只返回扁平的摘要字段（完整设备清单不随批量结果返回）"""
+    row = normalize_row(raw)
+    result = {'row': index, 'system_name': row.get('system_name', '')}
+
+    try:
+        mode = row.get('xinchuan_mode', 'standard') if row.get('enable_xinchuan') is True else 'off'
+        prediction = get_mode_predictor(mode).predict(build_predictor_input(row))
+        architecture = prediction.get('architecture', {})
+        costs = prediction.get('cost_breakdown', {})
+        result.update({
+            'success': True,
+            'node_spec': architecture.get('node_spec', ''),
+            'database_nodes': architecture.get('database_nodes', 0),
+            'proxy_nodes': architecture.get('proxy_nodes', 0),
+            'monitoring_nodes': architecture.get('monitoring_nodes', 0),
+            'hardware_cost': costs.get('hardware_cost', 0),
+            'software_cost': costs.get('software_cost', 0),
+            'infrastructure_cost': costs.get('infrastructure_cost', 0),
+            'total_initial_cost': costs.get('total_initial_cost', 0)
+        })
+    except Exception as e:
+        result.update({'success': False, 'error': str(e)})
+
+    return result
+
+
+def predict_chunk(chunk: List[tuple]) -> List[Dict[str, Any]]:
+    """预测一组 (行号, 行数据)"""
+    return [predict_row(index, raw) for index, raw in chunk]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_batch_pool(workers: int = BATCH_PREDICT_WORKERS) -> ProcessPoolExecutor:
+    """进程池（进程内共享，首次使用时创建）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=max(1, workers), initializer=_init_worker)
+    return _pool
+
+
+def _chunked(rows: Iterable[Dict[str, Any]], size: int, max_rows: int) -> Iterator[List[tuple]]:
+    chunk = []
+    for index, row in enumerate(rows):
+        if index >= max_rows:
+            raise ValueError(f'批量预测最多支持 {max_rows} 行')
+        chunk.append((index, row))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class BatchSummary:
+    """批量结果汇总（运行中累加）"""
+
+    def __init__(self):
+        self.rows = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.database_nodes = 0
+        self.proxy_nodes = 0
+        self.monitoring_nodes = 0
+        self.total_initial_cost = 0
+        self._start = time.perf_counter()
+
+    def add(self, result: Dict[str, Any]):
+        self.rows += 1
+        if not result.get('success'):
+            self.failed += 1
+            return
+        self.succeeded += 1
+        self.database_nodes += result.get('database_nodes', 0)
+        self.proxy_nodes += result.get('proxy_nodes', 0)
+        self.monitoring_nodes += result.get('monitoring_nodes', 0)
+        self.total_initial_cost += result.get('total_initial_cost', 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'rows': self.rows,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'database_nodes': self.database_nodes,
+            'proxy_nodes': self.proxy_nodes,
+            'monitoring_nodes': self.monitoring_nodes,
+            'total_initial_cost': self.total_initial_cost,
+            'elapsed_ms': round((time.perf_counter() - self._start) * 1000, 1)
+        }
+
+
+def run_batch(rows: Iterable[Dict[str, Any]], executor=None, chunk_rows: int = BATCH_CHUNK_ROWS,
+              max_in_flight: Optional[int] = None, max_rows: int = BATCH_MAX_ROWS) -> Iterator[Dict[str, Any]]:
+    """
+    流式批量预测，按完成顺序产出每行结果（带 row 行号），最后产出 {'type': 'summary', ...}
+
+    Args:
+        rows: 行数据迭代器（惰性读取）
+        executor: 进程池/线程池；None 时在当前线程逐块预测
+        chunk_rows: 每个任务的行数
+        max_in_flight: 同时在途的任务数上限，默认为 BATCH_PREDICT_WORKERS 的2倍
+    """
+    summary = BatchSummary()
+    chunks = _chunked(rows, chunk_rows, max_rows)
+
+    if executor is None:
+        for chunk in chunks:
+            for result in predict_chunk(chunk):
+                summary.add(result)
+                yield dict(result, type='row')
+    else:
+        if max_in_flight is None:
+            max_in_flight = 2 * max(1, BATCH_PREDICT_WORKERS)
+        pending = set()
+        try:
+            for chunk in chunks:
+                pending.add(executor.submit(predict_chunk, chunk))
+                if len(pending) < max_in_flight:
+                    continue
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for result in future.result():
+                        summary.add(result)
+                        yield dict(result, type='row')
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for result in future.result():
+                        summary.add(result)
+                        yield dict(result, type='row')
+        finally:
+            # 客户端断开或出错时不再等待剩余任务
+            for future in pending:
+                future.cancel()
+
+    yield dict(summary.to_dict(), type='summary')
+
+
+# ==================== 输出格式 ====================
+
+def iter_ndjson(results: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """每个结果一行JSON"""
+    for result in results:
+        yield json.dumps(result, ensure_ascii=False) + '\n'
+
+
+def iter_csv(results: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """分块CSV：表头 + 逐行结果，汇总行的 row 列为 summary"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    writer.writerow(RESULT_FIELDS)
+    yield flush()
+
+    for result in results:
+        if result.get('type') == 'summary':
+            failed = f"{result['failed']}/{result['rows']} 行失败" if result['failed'] else ''
+            writer.writerow(['summary', '', result['failed'] == 0, failed, '',
+                             result['database_nodes'], result['proxy_nodes'], result['monitoring_nodes'],
+                             '', '', '', result['total_initial_cost']])
+        else:
+            writer.writerow([result.get(name, '') for name in RESULT_FIELDS])
+        yield flush()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+批量化训练循环
+
+原来 TrainingSystem.train 用 torch.LongTensor([labels['architecture_type']]) 这样的写法构造标签，
+只有 batch_size=1 时形状才对，训练实际上是逐样本的 Python 循环。这里：
+
+- 整个小批次一次前向，多任务损失（架构分类 + 节点/分片/副本数回归）对批次取平均
+- 从训练集中留出验证集，验证损失连续 patience 轮不下降时提前停止并恢复最佳权重
+- num_workers=0 时直接在物化特征上按张量切片取批次；>0 时走 DataLoader + collate_samples
+- num_threads 控制 torch.set_num_threads，结果中报告 samples/sec
+
+用法:
+    result = fit(model, matrix, TrainConfig(epochs=50, batch_size=256))
+"""
+
+import os
+import copy
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader, Dataset
+
+from feature_pipeline import COUNT_LABELS, FeatureMatrix
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# 默认线程数（0 表示沿用 PyTorch 的默认值）
+DEFAULT_NUM_THREADS = int(os.environ.get('TRAIN_NUM_THREADS', 0))
+
+
+@dataclass
+class TrainConfig:
+    """训练参数"""
+    epochs: int = 100
+    batch_size: int = 32
+    learning_rate: float = 0.001
+    weight_decay: float = 0.0
+    val_split: float = 0.2          # 留作验证集的比例（早停依据）
+    patience: int = 10              # 验证损失连续多少轮不下降即停止
+    min_delta: float = 1e-4
+    num_workers: int = 0
+    num_threads: int = DEFAULT_NUM_THREADS
+    seed: Optional[int] = None
+    log_every: int = 10
+
+
+@dataclass
+class TrainResult:
+    """训练结果摘要"""
+    epochs_run: int
+    best_epoch: int
+    best_loss: float
+    val_accuracy: Optional[float]
+    train_samples: int
+    val_samples: int
+    samples_per_sec: float
+    stopped_early: bool
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class MaterializedDataset(Dataset):
+    """物化特征上的数据集，张量与 numpy 数组共享内存"""
+
+    def __init__(self, matrix: FeatureMatrix):
+        self.matrix = matrix
+        self.features = torch.from_numpy(matrix.features)
+        self.architecture = torch.from_numpy(matrix.architecture)
+        self.counts = torch.from_numpy(matrix.counts)
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    def __getitem__(self, idx):
+        counts = self.counts[idx]
+        labels = {'architecture_type': self.architecture[idx]}
+        labels.update({label: counts[..., i] for i, label in enumerate(COUNT_LABELS)})
+        return self.features[idx], labels
+
+    def batches(self, batch_size: int, shuffle: bool = False,
+                generator: Optional['torch.Generator'] = None) -> Iterator[Tuple['torch.Tensor', Dict[str, 'torch.Tensor']]]:
+        """
+        按批次返回 (features, labels)
+
+        顺序遍历时每个批次都是原张量的切片（零复制）；shuffle 时每个 epoch 只做一次整体重排，
+        然后同样按切片返回，避免逐样本索引和 collate。
+        """
+        features, architecture, counts = self.features, self.architecture, self.counts
+        if shuffle:
+            order = torch.randperm(len(self), generator=generator)
+            features, architecture, counts = features[order], architecture[order], counts[order]
+
+        for start in range(0, len(self), batch_size):
+            end = start + batch_size
+            batch_counts = counts[start:end]
+            labels = {'architecture_type': architecture[start:end]}
+            labels.update({label: batch_counts[:, i] for i, label in enumerate(COUNT_LABELS)})
+            yield features[start:end], labels
+
+
+def collate_samples(samples):
+    """DataLoader 的 collate：把逐样本的 (features, labels) 堆叠成批次张量"""
+    features = torch.stack([sample[0] for sample in samples])
+    labels = {key: torch.stack([sample[1][key] for sample in samples]) for key in samples[0][1]}
+    return features, labels
+
+
+def multitask_loss(outputs: Dict[str, torch.Tensor], labels: Dict[str, torch.Tensor]) -> torch.Tensor:
+    """
+    整个批次的多任务损失
+
+    模型的架构分类头末尾是 Softmax，这里对概率取对数后用 NLL，
+    等价于在 logits 上做交叉熵（直接对 Softmax 输出做 CrossEntropyLoss 会重复 softmax）。
+    """
+    log_probs = torch.log(outputs['architecture_type'].clamp_min(1e-8))
+    loss = F.nll_loss(log_probs, labels['architecture_type'])
+    for label in COUNT_LABELS:
+        loss = loss + F.mse_loss(outputs[label].squeeze(-1), labels[label])
+    return loss
+
+
+def split_indices(n: int, val_split: float, generator: torch.Generator):
+    """随机划分训练/验证下标；样本太少时不留验证集"""
+    order = torch.randperm(n, generator=generator).numpy()
+    n_val = int(n * val_split)
+    if n_val < 2 or n - n_val < 2:
+        return order, order[:0]
+    return order[n_val:], order[:n_val]
+
+
+@torch.no_grad()
+def evaluate_matrix(model, matrix: FeatureMatrix, batch_size: int = 4096) -> Dict[str, float]:
+    """在整个矩阵上批量计算平均损失和架构分类准确率"""
+    was_training = model.training
+    model.eval()
+    dataset = MaterializedDataset(matrix)
+    total_loss, correct = 0.0, 0
+    try:
+        for features, labels in dataset.batches(batch_size):
+            outputs = model(features)
+            total_loss += multitask_loss(outputs, labels).item() * len(features)
+            correct += (outputs['architecture_type'].argmax(dim=1) == labels['architecture_type']).sum().item()
+    finally:
+        model.train(was_training)
+    n = max(len(matrix), 1)
+    return {'loss': total_loss / n, 'accuracy': correct / n}
+
+
+def fit(model, matrix: FeatureMatrix, config: TrainConfig,
+        val_matrix: Optional[FeatureMatrix] = None) -> TrainResult:
+    """
+    训练模型，结束时模型持有验证损失最低那一轮的权重
+
+    Args:
+        model: nn.Module，forward 返回各任务输出的字典
+        matrix: 物化后的训练数据
+        config: 训练参数
+        val_matrix: 显式的验证集；不传时按 config.val_split 从 matrix 中划分
+    """
+    if config.num_threads:
+        torch.set_num_threads(config.num_threads)
+
+    generator = torch.Generator()
+    generator.manual_seed(config.seed if config.seed is not None else int(time.time()))
+
+    if val_matrix is None:
+        train_idx, val_idx = split_indices(len(matrix), config.val_split, generator)
+        train_matrix = matrix.take(train_idx)
+        val_matrix = matrix.take(val_idx) if len(val_idx) else None
+    else:
+        train_matrix = matrix
+
+    train_set = MaterializedDataset(train_matrix)
+    loader = None
+    if config.num_workers > 0:
+        loader = DataLoader(train_set, batch_size=config.batch_size, shuffle=True, generator=generator,
+                            num_workers=config.num_workers, collate_fn=collate_samples,
+                            persistent_workers=True)
+
+    optimizer = torch.optim.Adam(model.parameters(), lr=config.learning_rate, weight_decay=config.weight_decay)
+
+    best_loss, best_epoch, best_state = float('inf'), 0, None
+    stale_epochs, epochs_run, samples_seen = 0, 0, 0
+    started = time.perf_counter()
+    train_seconds = 0.0
+
+    model.train()
+    for epoch in range(1, config.epochs + 1):
+        epoch_started = time.perf_counter()
+        batches = loader if loader is not None else train_set.batches(config.batch_size, shuffle=True,
+                                                                      generator=generator)
+        total_loss = 0.0
+        for features, labels in batches:
+            optimizer.zero_grad(set_to_none=True)
+            loss = multitask_loss(model(features), labels)
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(features)
+        train_seconds += time.perf_counter() - epoch_started
+        samples_seen += len(train_set)
+        epochs_run = epoch
+
+        train_loss = total_loss / max(len(train_set), 1)
+        # 没有验证集时退化为按训练损失挑选最佳轮次
+        monitored = evaluate_matrix(model, val_matrix)['loss'] if val_matrix is not None else train_loss
+
+        if epoch % config.log_every == 0:
+            logger.info('Epoch [%d/%d] train_loss=%.4f val_loss=%.4f %.0f samples/s',
+                        epoch, config.epochs, train_loss, monitored, samples_seen / max(train_seconds, 1e-9))
+
+        if monitored < best_loss - config.min_delta:
+            best_loss, best_epoch, stale_epochs = monitored, epoch, 0
+            best_state = copy.deepcopy(model.state_dict())
+        else:
+            stale_epochs += 1
+            if stale_epochs >= config.patience:
+                logger.info('验证损失 %d 轮未下降，在第 %d 轮提前停止', config.patience, epoch)
+                break
+
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    model.eval()
+
+    val_accuracy = evaluate_matrix(model, val_matrix)['accuracy'] if val_matrix is not None else None
+    result = TrainResult(
+        epochs_run=epochs_run,
+        best_epoch=best_epoch,
+        best_loss=float(best_loss),
+        val_accuracy=val_accuracy,
+        train_samples=len(train_set),
+        val_samples=len(val_matrix) if val_matrix is not None else 0,
+        samples_per_sec=samples_seen / max(train_seconds, 1e-9),
+        stopped_early=epochs_run < config.epochs
+    )
+    logger.info('训练完成: %d 轮，最佳第 %d 轮 (loss=%.4f)，%.0f samples/s，总耗时 %.1fs',
+                result.epochs_run, result.best_epoch, result.best_loss, result.samples_per_sec,
+                time.perf_counter() - started)
+    return result
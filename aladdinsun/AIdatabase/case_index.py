@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+案例相似度检索 - 在模型库的历史案例中查找与输入参数最相似的部署
+
+模型库（ModelLibraryManager 预置库、CustomModelBuilder 自定义库、real_training_data.REAL_CASES）
+只是 JSON 列表，没有办法回答"最相似的历史部署是哪几个"。这里:
+
+- 特征与模型共用 feature_pipeline.extract_features，按被索引案例的均值/标准差标准化，
+  去掉所有案例取值都相同的维度（对排序没有影响）
+- 案例数不超过 CASE_INDEX_EXACT_THRESHOLD 时精确检索：一次矩阵-向量乘法算出全部距离
+- 更大的库使用倒排分区(IVF)近似检索：k-means 把案例分成约 sqrt(N) 个分区，每个分区在内存中
+  连续存放；查询时只扫描离查询最近的 CASE_INDEX_PROBES 个分区，百万级案例也在毫秒级返回
+- get_library_index() 按模型库文件的版本标记缓存索引，下载/删除/修改模型库后在后台线程重建，
+  重建期间继续使用旧索引（只有第一次构建会阻塞请求）
+
+用法:
+    index = get_library_index(library_manager)
+    results = index.query(input_data, k=5)
+"""
+
+import os
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from feature_pipeline import ARCH_TYPES, FEATURE_DIM, extract_features, materialize, usable_cases
+from metrics import Histogram
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# 超过该案例数时使用分区近似检索
+CASE_INDEX_EXACT_THRESHOLD = int(os.environ.get('CASE_INDEX_EXACT_THRESHOLD', 20000))
+
+# 近似检索时扫描的分区数
+CASE_INDEX_PROBES = int(os.environ.get('CASE_INDEX_PROBES', 8))
+
+# k-means 训练样本数（每个分区）和迭代次数
+KMEANS_SAMPLES_PER_LIST = 64
+KMEANS_ITERATIONS = 10
+
+# 分块计算距离时每块的行数（控制临时矩阵的内存）
+CHUNK_ROWS = 65536
+
+CASE_INDEX_SEARCH_SECONDS = Histogram(
+    'case_index_search_seconds', '相似案例检索耗时', ('method',),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+
+
+def _squared_norms(x: np.ndarray) -> np.ndarray:
+    return np.einsum('ij,ij->i', x, x)
+
+
+def _nearest_centroids(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """分块计算每行最近的中心（|x|^2 对 argmin 没有影响，省去）"""
+    centroid_norms = _squared_norms(centroids)
+    assignment = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), CHUNK_ROWS):
+        block = data[start:start + CHUNK_ROWS]
+        assignment[start:start + CHUNK_ROWS] = np.argmin(centroid_norms[None, :] - 2 * block @ centroids.T, axis=1)
+    return assignment
+
+
+def _kmeans(data: np.ndarray, n_lists: int, rng: np.random.Generator) -> np.ndarray:
+    """在抽样上训练 k-means 中心；空分区用随机样本重新初始化"""
+    sample_size = min(len(data), n_lists * KMEANS_SAMPLES_PER_LIST)
+    sample = data[rng.choice(len(data), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = _nearest_centroids(sample, centroids)
+        sizes = np.bincount(assignment, minlength=n_lists)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        filled = sizes > 0
+        centroids[filled] = sums[filled] / sizes[filled, None]
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+    return centroids
+
+
+def _top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    """每行距离最小的 k 个下标（按距离升序）"""
+    k = min(k, distances.shape[1])
+    if k == 0:
+        return np.zeros((len(distances), 0), dtype=np.int64)
+    part = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(distances, part, axis=1).argsort(axis=1, kind='stable')
+    return np.take_along_axis(part, order, axis=1)
+
+
+class CaseIndex:
+    """案例特征上的最近邻索引"""
+
+    def __init__(self, features: np.ndarray, cases: Optional[Sequence[Dict[str, Any]]] = None,
+                 architecture: Optional[np.ndarray] = None, segments: Optional[List[Tuple[str, int]]] = None,
+                 exact_threshold: int = CASE_INDEX_EXACT_THRESHOLD, n_lists: Optional[int] = None,
+                 n_probe: int = CASE_INDEX_PROBES, seed: int = 0):
+        """
+        Args:
+            features: (N, FEATURE_DIM) 原始特征（extract_features 的输出）
+            cases: 与特征同序的案例，query() 返回时使用
+            architecture: 与特征同序的架构类型编码，用于投票
+            segments: [(来源名称, 案例数), ...]，按顺序覆盖全部案例
+        """
+        features = np.asarray(features, dtype=np.float32)
+        self.size = len(features)
+        self.cases = cases
+        self.architecture = architecture
+        self.n_probe = n_probe
+        self._segment_names = [name for name, _ in segments or []]
+        self._segment_ends = np.cumsum([count for _, count in segments or []], dtype=np.int64)
+
+        if self.size:
+            mean = features.mean(axis=0)
+            std = features.std(axis=0)
+        else:
+            mean = np.zeros(features.shape[1] if features.ndim == 2 else FEATURE_DIM, dtype=np.float32)
+            std = np.zeros_like(mean)
+        self._active = np.flatnonzero(std > 0)
+        self._mean = mean[self._active]
+        self._scale = std[self._active]
+        data = self.normalize(features)
+
+        self.method = 'ivf' if self.size > exact_threshold else 'exact'
+        if self.method == 'exact':
+            self._data = data
+            self._ids = None
+            self._offsets = None
+            self._centroids = None
+        else:
+            self._build_ivf(data, n_lists or max(16, int(math.sqrt(self.size))), np.random.default_rng(seed))
+        self._norms = _squared_norms(self._data)
+
+    def normalize(self, features: np.ndarray) -> np.ndarray:
+        features = np.asarray(features, dtype=np.float32)
+        if features.ndim == 1:
+            features = features[None, :]
+        return np.ascontiguousarray((features[:, self._active] - self._mean) / self._scale, dtype=np.float32)
+
+    def _build_ivf(self, data: np.ndarray, n_lists: int, rng: np.random.Generator):
+        started = time.perf_counter()
+        n_lists = min(n_lists, self.size)
+        self._centroids = _kmeans(data, n_lists, rng)
+        assignment = _nearest_centroids(data, self._centroids)
+        # 按分区重排，每个分区在内存中连续，查询时直接切片
+        order = np.argsort(assignment, kind='stable')
+        self._data = data[order]
+        self._ids = order
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+        logger.info('案例索引: %d 个案例分为 %d 个分区，构建耗时 %.1fs',
+                    self.size, n_lists, time.perf_counter() - started)
+
+    # ==================== 检索 ====================
+
+    def search(self, features: np.ndarray, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量检索
+
+        Args:
+            features: (Q, FEATURE_DIM) 或 (FEATURE_DIM,) 原始特征
+
+        Returns:
+            (distances, indices)：形状 (Q, k)，按距离升序；indices 为案例在构建时的下标
+        """
+        queries = self.normalize(features)
+        with CASE_INDEX_SEARCH_SECONDS.time(method=self.method):
+            if self.method == 'exact':
+                return self._search_exact(queries, k)
+            return self._search_ivf(queries, k)
+
+    def _search_exact(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        distances = self._norms[None, :] - 2 * queries @ self._data.T + _squared_norms(queries)[:, None]
+        nearest = _top_k(distances, k)
+        return self._to_euclidean(np.take_along_axis(distances, nearest, axis=1)), nearest
+
+    def _search_ivf(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, self.size)
+        centroid_distances = _squared_norms(self._centroids)[None, :] - 2 * queries @ self._centroids.T
+        list_order = np.argsort(centroid_distances, axis=1)
+        sizes = np.diff(self._offsets)
+
+        all_distances = np.empty((len(queries), k), dtype=np.float32)
+        all_indices = np.empty((len(queries), k), dtype=np.int64)
+        for q, query in enumerate(queries):
+            # 至少扫描 n_probe 个分区，且候选数不少于 k
+            probes = max(self.n_probe, int(np.searchsorted(np.cumsum(sizes[list_order[q]]), k)) + 1)
+            lists = list_order[q, :probes]
+            rows = np.concatenate([np.arange(self._offsets[i], self._offsets[i + 1]) for i in lists])
+            distances = self._norms[rows] - 2 * self._data[rows] @ query + query @ query
+            nearest = _top_k(distances[None, :], k)[0]
+            all_distances[q] = distances[nearest]
+            all_indices[q] = self._ids[rows[nearest]]
+        return self._to_euclidean(all_distances), all_indices
+
+    @staticmethod
+    def _to_euclidean(squared: np.ndarray) -> np.ndarray:
+        return np.sqrt(np.maximum(squared, 0))
+
+    def source_of(self, index: int) -> Optional[str]:
+        if not self._segment_names:
+            return None
+        return self._segment_names[int(np.searchsorted(self._segment_ends, index, side='right'))]
+
+    def query(self, data: Dict[str, Any], k: int = 5) -> Dict[str, Any]:
+        """
+        查找与输入参数最相似的 k 个历史案例
+
+        Returns:
+            {'results': [{rank, distance, source, case_id, architecture_type, output, input, metadata}],
+             'architecture_votes': 各架构类型在结果中的票数, 'method': exact/ivf, 'search_ms': 耗时}
+        """
+        started = time.perf_counter()
+        distances, indices = self.search(extract_features(data), k)
+        search_ms = (time.perf_counter() - started) * 1000
+
+        results = []
+        votes = {arch: 0 for arch in ARCH_TYPES}
+        for rank, (distance, index) in enumerate(zip(distances[0], indices[0]), start=1):
+            case = self.cases[index] if self.cases is not None else {}
+            output = case.get('output', {})
+            arch = output.get('architecture_type')
+            if arch in votes:
+                votes[arch] += 1
+            results.append({
+                'rank': rank,
+                'distance': float(distance),
+                'source': self.source_of(index),
+                'case_id': case.get('id', case.get('case_id')),
+                'architecture_type': arch,
+                'output': output,
+                'input': case.get('input', {}),
+                'metadata': case.get('metadata') or {key: case[key] for key in ('project_name', 'industry')
+                                                     if key in case}
+            })
+        return {
+            'results': results,
+            'architecture_votes': votes,
+            'method': self.method,
+            'indexed_cases': self.size,
+            'search_ms': search_ms
+        }
+
+
+# ==================== 模型库索引 ====================
+
+def collect_library_cases(library_manager, library_ids: Optional[Sequence[str]] = None,
+                          include_real_cases: bool = True) -> Tuple[List[Dict[str, Any]], List[Tuple[str, int]]]:
+    """
+    加载已安装的预置库、自定义库和真实案例
+
+    Returns:
+        (cases, segments)：segments 为 [(来源, 案例数), ...]
+    """
+    if library_ids is None:
+        library_ids = [lib['id'] for lib in library_manager.list_installed_libraries()]
+        library_ids += [lib['id'] for lib in library_manager.custom_builder.list_custom_libraries()]
+
+    cases: List[Dict[str, Any]] = []
+    segments: List[Tuple[str, int]] = []
+
+    def add(source: str, library_cases):
+        usable = usable_cases(library_cases or [])
+        if usable:
+            cases.extend(usable)
+            segments.append((source, len(usable)))
+
+    for library_id in library_ids:
+        try:
+            add(library_id, library_manager.load_library(library_id))
+        except (OSError, ValueError) as e:
+            logger.warning('加载模型库 %s 失败: %s', library_id, e)
+
+    if include_real_cases:
+        from real_training_data import REAL_CASES
+        add('real_training_data', REAL_CASES)
+    return cases, segments
+
+
+def build_library_index(library_manager, library_ids: Optional[Sequence[str]] = None,
+                        include_real_cases: bool = True, **kwargs) -> CaseIndex:
+    cases, segments = collect_library_cases(library_manager, library_ids, include_real_cases)
+    matrix = materialize(cases)
+    return CaseIndex(matrix.features, cases=cases, architecture=matrix.architecture, segments=segments, **kwargs)
+
+
+_library_index: Optional[CaseIndex] = None
+_library_index_version = None
+_library_index_lock = threading.Lock()
+_library_index_thread: Optional[threading.Thread] = None
+
+
+def _rebuild_library_index(library_manager, version):
+    """后台重建索引，完成后一次性替换引用；失败时继续使用旧索引"""
+    global _library_index, _library_index_version, _library_index_thread
+    try:
+        index = build_library_index(library_manager)
+    except Exception as e:
+        logger.warning('模型库案例索引重建失败，继续使用旧索引: %s', e)
+    else:
+        with _library_index_lock:
+            _library_index, _library_index_version = index, version
+        logger.info('模型库案例索引已重建: %d 个案例 (%s)', index.size, index.method)
+    finally:
+        with _library_index_lock:
+            _library_index_thread = None
+
+
+def get_library_index(library_manager) -> CaseIndex:
+    """
+    全部已安装模型库 + 真实案例的索引
+
+    只有第一次构建会阻塞；之后模型库文件变化时在后台线程重建，期间继续返回旧索引
+    """
+    global _library_index, _library_index_version, _library_index_thread
+    version = library_manager.libraries_version()
+    index = _library_index
+    if index is not None and version == _library_index_version:
+        return index
+
+    if index is None:
+        with _library_index_lock:
+            if _library_index is None:
+                _library_index = build_library_index(library_manager)
+                _library_index_version = version
+                logger.info('模型库案例索引已构建: %d 个案例 (%s)', _library_index.size, _library_index.method)
+            return _library_index
+
+    with _library_index_lock:
+        if _library_index_thread is None and version != _library_index_version:
+            _library_index_thread = threading.Thread(
+                target=_rebuild_library_index, args=(library_manager, version),
+                name='case-index-rebuild', daemon=True)
+            _library_index_thread.start()
+        return _library_index
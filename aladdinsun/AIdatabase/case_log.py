@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+训练案例的追加写日志
+
+原来每添加一个案例都要读出整个 JSON 文件、追加一条、再带缩进整体重写：O(N)，且多个 worker
+同时写会互相覆盖。CaseLog 把新案例追加到同名 .jsonl 日志（每行一个案例），原 JSON 文件作为快照：
+
+- 追加在进程间文件锁内完成，只写一行，O(1)；fsync 按条数/时间批量进行
+- 内存索引只保存案例ID、条数和最近时间戳，其他 worker 追加的内容按文件偏移增量读入
+- 日志达到 COMPACT_THRESHOLD 条时合并进快照（临时文件 + os.replace），然后换一个空日志
+- 读取全部案例 = 快照 + 日志，按案例ID去重（压缩中途崩溃留下的重复条目以日志为准）
+
+快照仍是原来的 JSON 数组格式，直接读 JSON 文件的旧代码在压缩后能看到全部案例。
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from file_io import atomic_write, file_lock
+
+# 每追加多少条或间隔多少秒执行一次 fsync（进程崩溃不丢数据，掉电最多丢一个批次）
+FSYNC_EVERY = int(os.environ.get('CASE_LOG_FSYNC_EVERY', 16))
+FSYNC_INTERVAL_S = float(os.environ.get('CASE_LOG_FSYNC_INTERVAL_S', 1.0))
+
+# 日志条数达到该值时合并进快照
+COMPACT_THRESHOLD = int(os.environ.get('CASE_LOG_COMPACT_THRESHOLD', 1000))
+
+
+def case_key(case: Dict[str, Any]) -> Optional[str]:
+    """案例的唯一标识（兼容 id / case_id 两种字段）"""
+    key = case.get('id', case.get('case_id'))
+    return None if key is None else str(key)
+
+
+def log_path_for(snapshot_path: str) -> str:
+    """快照 training_data.json 对应的日志 training_data.jsonl"""
+    return os.path.splitext(snapshot_path)[0] + '.jsonl'
+
+
+class CaseLog:
+    """快照 + 追加日志的案例存储"""
+
+    def __init__(self, snapshot_path: str, log_path: Optional[str] = None,
+                 fsync_every: int = FSYNC_EVERY, fsync_interval_s: float = FSYNC_INTERVAL_S,
+                 compact_threshold: int = COMPACT_THRESHOLD):
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path or log_path_for(snapshot_path)
+        self.lock_path = self.log_path + '.lock'
+        self.fsync_every = fsync_every
+        self.fsync_interval_s = fsync_interval_s
+        self.compact_threshold = compact_threshold
+
+        directory = os.path.dirname(os.path.abspath(self.log_path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._log_file = None
+        self._pending_fsync = 0
+        self._last_fsync = time.monotonic()
+
+        # 内存索引
+        self._ids: Dict[str, None] = {}
+        self._anonymous = 0
+        self._max_int_id = 0
+        self._last_timestamp = None
+        self._log_entries = 0
+        self._snapshot_stamp = None
+        self._log_inode = None
+        self._log_offset = 0
+
+        _open_logs.add(self)
+
+    # ==================== 索引 ====================
+
+    @property
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._ids) + self._anonymous
+
+    @property
+    def last_timestamp(self) -> Optional[str]:
+        with self._lock:
+            self._refresh()
+            return self._last_timestamp
+
+    def __contains__(self, case_id) -> bool:
+        with self._lock:
+            self._refresh()
+            return str(case_id) in self._ids
+
+    def __len__(self) -> int:
+        return self.count
+
+    def version(self) -> str:
+        """存储内容的版本标记：任何追加或压缩都会改变"""
+        with self._lock:
+            self._refresh()
+            return f'{self._snapshot_stamp}:{self._log_inode}:{self._log_offset}'
+
+    def _index(self, case: Dict[str, Any]):
+        key = case_key(case)
+        if key is None:
+            self._anonymous += 1
+        else:
+            self._ids[key] = None
+            if isinstance(case.get('id'), int):
+                self._max_int_id = max(self._max_int_id, case['id'])
+        if case.get('timestamp'):
+            self._last_timestamp = case['timestamp']
+
+    def _snapshot_state(self):
+        try:
+            st = os.stat(self.snapshot_path)
+            return (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _refresh(self):
+        """把其他进程/线程写入的内容同步到索引（调用方持有 self._lock）"""
+        snapshot_stamp = self._snapshot_state()
+        try:
+            st = os.stat(self.log_path)
+            log_inode, log_size = st.st_ino, st.st_size
+        except FileNotFoundError:
+            log_inode, log_size = None, 0
+
+        if snapshot_stamp != self._snapshot_stamp or log_inode != self._log_inode or log_size < self._log_offset:
+            self._reload_index(snapshot_stamp, log_inode)
+        elif log_size > self._log_offset:
+            self._read_log_tail()
+
+    def _reload_index(self, snapshot_stamp, log_inode):
+        self._ids = {}
+        self._anonymous = 0
+        self._max_int_id = 0
+        self._last_timestamp = None
+        for case in self._read_snapshot():
+            self._index(case)
+        self._snapshot_stamp = snapshot_stamp
+        self._log_inode = log_inode
+        self._log_offset = 0
+        self._log_entries = 0
+        self._read_log_tail()
+
+    def _read_log_tail(self):
+        """从上次读到的偏移处读取完整的新行"""
+        try:
+            with open(self.log_path, 'rb') as f:
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        end = data.rfind(b'\n')
+        if end < 0:
+            return
+        for case in _parse_lines(data[:end + 1]):
+            self._index(case)
+            self._log_entries += 1
+        self._log_offset += end + 1
+
+    # ==================== 读取 ====================
+
+    def _read_snapshot(self) -> List[Dict[str, Any]]:
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                cases = json.load(f)
+        except FileNotFoundError:
+            return []
+        except ValueError:
+            return []
+        return cases if isinstance(cases, list) else []
+
+    def _read_log(self) -> List[Dict[str, Any]]:
+        try:
+            with open(self.log_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        # 未写完的最后一行（另一进程正在写）留到下次读取
+        return list(_parse_lines(data[:data.rfind(b'\n') + 1]))
+
+    def load_all(self) -> List[Dict[str, Any]]:
+        """快照 + 日志中的全部案例，按案例ID去重、保持插入顺序"""
+        with self._file_lock(shared=True):
+            return _dedupe(self._read_snapshot() + self._read_log())
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.load_all())
+
+    # ==================== 写入 ====================
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        """线程锁 + 进程间文件锁"""
+        with self._lock, file_lock(self.lock_path, shared):
+            yield
+
+    def _writable_log(self):
+        """追加句柄；日志被压缩替换后重新打开"""
+        if self._log_file is not None:
+            try:
+                current = os.stat(self.log_path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current != os.fstat(self._log_file.fileno()).st_ino:
+                self._log_file.close()
+                self._log_file = None
+        if self._log_file is None:
+            self._log_file = open(self.log_path, 'ab')
+        return self._log_file
+
+    def append(self, case: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        追加一个案例；没有 id/case_id 时按现有最大整数ID顺延分配
+
+        Returns:
+            写入的案例（含分配的ID）
+        """
+        with self._file_lock():
+            self._refresh()
+            if case_key(case) is None:
+                case = dict(case, id=self._max_int_id + 1)
+
+            line = json.dumps(case, ensure_ascii=False, default=str).encode('utf-8') + b'\n'
+            log_file = self._writable_log()
+            log_file.write(line)
+            log_file.flush()
+            self._maybe_fsync(log_file)
+
+            # 持有排他锁期间没有其他写入者，索引直接前移
+            self._index(case)
+            self._log_entries += 1
+            self._log_inode = os.fstat(log_file.fileno()).st_ino
+            self._log_offset = log_file.tell()
+
+            if self.compact_threshold and self._log_entries >= self.compact_threshold:
+                self._compact_locked()
+        return case
+
+    def _maybe_fsync(self, log_file):
+        self._pending_fsync += 1
+        now = time.monotonic()
+        if self._pending_fsync >= self.fsync_every or now - self._last_fsync >= self.fsync_interval_s:
+            os.fsync(log_file.fileno())
+            self._pending_fsync = 0
+            self._last_fsync = now
+
+    def flush(self):
+        """立即 fsync 尚未落盘的追加"""
+        with self._lock:
+            if self._log_file is not None and self._pending_fsync:
+                os.fsync(self._log_file.fileno())
+                self._pending_fsync = 0
+                self._last_fsync = time.monotonic()
+
+    def compact(self):
+        """把日志合并进快照"""
+        with self._file_lock():
+            self._compact_locked()
+
+    def _compact_locked(self):
+        cases = _dedupe(self._read_snapshot() + self._read_log())
+        atomic_write(self.snapshot_path, json.dumps(cases, ensure_ascii=False, indent=2, default=str).encode('utf-8'))
+        # 用空文件替换日志（换inode），其他进程据此发现压缩并重新打开/重建索引
+        atomic_write(self.log_path, b'')
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+        self._pending_fsync = 0
+        self._reload_index(self._snapshot_state(), os.stat(self.log_path).st_ino)
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            if self._log_file is not None:
+                self._log_file.close()
+                self._log_file = None
+
+
+def _parse_lines(data: bytes) -> Iterator[Dict[str, Any]]:
+    for raw in data.splitlines():
+        if not raw.strip():
+            continue
+        try:
+            case = json.loads(raw)
+        except ValueError:
+            continue
+        if isinstance(case, dict):
+            yield case
+
+
+def _dedupe(cases: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按案例ID去重，后出现的覆盖先出现的，位置保持首次出现处"""
+    result: List[Dict[str, Any]] = []
+    positions: Dict[str, int] = {}
+    for case in cases:
+        key = case_key(case)
+        if key is None:
+            result.append(case)
+        elif key in positions:
+            result[positions[key]] = case
+        else:
+            positions[key] = len(result)
+            result.append(case)
+    return result
+
+
+# 进程退出时把批量 fsync 中尚未落盘的追加刷下去
+_open_logs: 'weakref.WeakSet[CaseLog]' = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_all():
+    for case_log in list(_open_logs):
+        try:
+            case_log.close()
+        except OSError:
+            pass
+
+
+_case_logs: Dict[str, CaseLog] = {}
+_case_logs_lock = threading.Lock()
+
+
+def get_case_log(snapshot_path: str) -> CaseLog:
+    """同一快照文件在进程内共享一个 CaseLog"""
+    key = os.path.abspath(snapshot_path)
+    case_log = _case_logs.get(key)
+    if case_log is None:
+        with _case_logs_lock:
+            case_log = _case_logs.get(key)
+            if case_log is None:
+                case_log = CaseLog(snapshot_path)
+                _case_logs[key] = case_log
+    return case_log
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+基于SQLite的训练案例库 - 统计、筛选和分页由SQL聚合完成
+
+常用的输入/输出字段展开为带类型的列（数据量、QPS、架构类型、行业……），
+架构类型、行业和数据量分档建有索引，完整案例以JSON保存在 payload 列。
+案例日志（case_log.CaseLog）仍是写入的源头，CaseStore 是它的可查询镜像：
+sync() 在日志版本变化时整体重建镜像，追加单个案例时直接 upsert。
+
+用法:
+    store = get_case_store('training_data.json')
+    store.sync(get_case_log('training_data.json'))
+    store.statistics(industry='金融')
+    store.list_cases(architecture_type='distributed', limit=20, offset=40)
+"""
+
+import os
+import json
+import bisect
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from case_log import case_key
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# 数据量分档上界（GB），最后一档为 ≥50TB
+DATA_SIZE_BUCKETS_GB = (100, 1000, 5000, 10000, 50000)
+
+# 分页上限
+MAX_PAGE_SIZE = 500
+
+# 案例来源
+SOURCE_CASE_LOG = 'case_log'
+SOURCE_REAL_CASES = 'real_training_data'
+
+
+def data_size_bucket(size_gb: float) -> int:
+    """数据量所在分档的序号"""
+    return bisect.bisect_right(DATA_SIZE_BUCKETS_GB, size_gb or 0)
+
+
+def bucket_label(bucket: int) -> str:
+    """分档序号对应的可读区间"""
+    lower = DATA_SIZE_BUCKETS_GB[bucket - 1] if bucket > 0 else 0
+    if bucket >= len(DATA_SIZE_BUCKETS_GB):
+        return f'≥{lower}GB'
+    return f'{lower}-{DATA_SIZE_BUCKETS_GB[bucket]}GB'
+
+
+def _industry(case: Dict[str, Any]) -> Optional[str]:
+    """行业可能在案例顶层、反馈或输入参数中"""
+    feedback = case.get('feedback') if isinstance(case.get('feedback'), dict) else {}
+    return case.get('industry') or feedback.get('industry') or (case.get('input') or {}).get('industry')
+
+
+def _number(value, default=0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _row(case: Dict[str, Any], source: str) -> tuple:
+    """案例 → 表行"""
+    data = case.get('input') or {}
+    output = case.get('output') or {}
+    size = _number(data.get('total_data_size_gb'))
+    return (
+        case_key(case),
+        source,
+        case.get('timestamp'),
+        _industry(case),
+        data.get('business_type'),
+        size,
+        data_size_bucket(size),
+        _number(data.get('qps')),
+        _number(data.get('tps')),
+        _number(data.get('concurrent_connections')),
+        int(bool(data.get('need_high_availability'))),
+        int(bool(data.get('need_disaster_recovery'))),
+        output.get('architecture_type'),
+        _number(output.get('node_count'), None),
+        _number(output.get('shard_count'), None),
+        _number(output.get('replica_count'), None),
+        int(bool(case.get('used_for_training'))),
+        json.dumps(case, ensure_ascii=False, default=str),
+    )
+
+
+_COLUMNS = ('case_key, source, timestamp, industry, business_type, total_data_size_gb, data_size_bucket, '
+            'qps, tps, concurrent_connections, need_high_availability, need_disaster_recovery, '
+            'architecture_type, node_count, shard_count, replica_count, used_for_training, payload')
+
+
+class CaseStore:
+    """SQLite(WAL) 训练案例库"""
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_file)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, timeout=10)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS cases (
+                seq                     INTEGER PRIMARY KEY AUTOINCREMENT,
+                case_key                TEXT UNIQUE,
+                source                  TEXT NOT NULL,
+                timestamp               TEXT,
+                industry                TEXT,
+                business_type           TEXT,
+                total_data_size_gb      REAL NOT NULL DEFAULT 0,
+                data_size_bucket        INTEGER NOT NULL DEFAULT 0,
+                qps                     REAL NOT NULL DEFAULT 0,
+                tps                     REAL NOT NULL DEFAULT 0,
+                concurrent_connections  REAL NOT NULL DEFAULT 0,
+                need_high_availability  INTEGER NOT NULL DEFAULT 0,
+                need_disaster_recovery  INTEGER NOT NULL DEFAULT 0,
+                architecture_type       TEXT,
+                node_count              REAL,
+                shard_count             REAL,
+                replica_count           REAL,
+                used_for_training       INTEGER NOT NULL DEFAULT 0,
+                payload                 TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_cases_arch ON cases(architecture_type);
+            CREATE INDEX IF NOT EXISTS idx_cases_industry ON cases(industry);
+            CREATE INDEX IF NOT EXISTS idx_cases_bucket ON cases(data_size_bucket);
+            CREATE TABLE IF NOT EXISTS meta (
+                name   TEXT PRIMARY KEY,
+                value  TEXT
+            );
+        ''')
+        self._conn.commit()
+
+    # ==================== 写入 ====================
+
+    def _write(self, cases: Iterable[Dict[str, Any]], source: str) -> int:
+        # 没有ID的案例不去重，直接插入（case_key 为 NULL 时 UNIQUE 不冲突）
+        rows = [_row(case, source) for case in cases if isinstance(case, dict)]
+        self._conn.executemany(
+            f'''INSERT INTO cases ({_COLUMNS}) VALUES ({", ".join("?" * 18)})
+                ON CONFLICT(case_key) DO UPDATE SET
+                    source = excluded.source, timestamp = excluded.timestamp,
+                    industry = excluded.industry, business_type = excluded.business_type,
+                    total_data_size_gb = excluded.total_data_size_gb,
+                    data_size_bucket = excluded.data_size_bucket, qps = excluded.qps,
+                    tps = excluded.tps, concurrent_connections = excluded.concurrent_connections,
+                    need_high_availability = excluded.need_high_availability,
+                    need_disaster_recovery = excluded.need_disaster_recovery,
+                    architecture_type = excluded.architecture_type, node_count = excluded.node_count,
+                    shard_count = excluded.shard_count, replica_count = excluded.replica_count,
+                    used_for_training = excluded.used_for_training, payload = excluded.payload''',
+            rows
+        )
+        return len(rows)
+
+    def upsert(self, case: Dict[str, Any], source: str = SOURCE_CASE_LOG):
+        """写入或更新单个案例"""
+        with self._lock, self._conn:
+            self._write([case], source)
+
+    def import_cases(self, cases: Iterable[Dict[str, Any]], source: str, replace: bool = False) -> int:
+        """批量导入（单个事务）；replace=True 时先清掉同来源的旧案例"""
+        with self._lock, self._conn:
+            if replace:
+                self._conn.execute('DELETE FROM cases WHERE source = ?', (source,))
+            return self._write(cases, source)
+
+    def import_json_file(self, json_file: str, source: Optional[str] = None) -> int:
+        """导入 training_data.json / training_data/cases.json 这类JSON数组文件"""
+        with open(json_file, 'r', encoding='utf-8') as f:
+            cases = json.load(f)
+        return self.import_cases(cases, source or json_file)
+
+    def import_real_cases(self) -> int:
+        """导入 real_training_data.REAL_CASES（字段与 save_training_data 的转换一致）"""
+        from real_training_data import REAL_CASES
+
+        cases = [{
+            'case_id': case['case_id'],
+            'timestamp': case.get('deployment_date'),
+            'industry': case.get('industry'),
+            'input': case['input'],
+            'output': case['output'],
+            'feedback': {
+                'project_name': case.get('project_name'),
+                'industry': case.get('industry'),
+                'actual_performance': case.get('actual_performance'),
+                'cost': case.get('cost'),
+                'notes': case.get('notes')
+            }
+        } for case in REAL_CASES]
+        return self.import_cases(cases, SOURCE_REAL_CASES)
+
+    def sync(self, case_log) -> bool:
+        """案例日志版本变化时重建镜像；返回是否发生了重建"""
+        version = case_log.version()
+        if self.get_meta('case_log_version') == version:
+            return False
+        cases = case_log.load_all()
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM cases WHERE source = ?', (SOURCE_CASE_LOG,))
+            self._write(cases, SOURCE_CASE_LOG)
+            self._set_meta('case_log_version', version)
+        logger.info('案例库已与案例日志同步: %d 个案例', len(cases))
+        return True
+
+    def append(self, case_log, case: Dict[str, Any]) -> Dict[str, Any]:
+        """通过案例日志追加一个案例，并增量更新镜像（镜像原本是最新的则无需重建）"""
+        before = case_log.version()
+        case = case_log.append(case)
+        with self._lock, self._conn:
+            self._write([case], SOURCE_CASE_LOG)
+            if self._get_meta('case_log_version') == before:
+                self._set_meta('case_log_version', case_log.version())
+        return case
+
+    def get_meta(self, name: str) -> Optional[str]:
+        with self._lock:
+            return self._get_meta(name)
+
+    def _get_meta(self, name: str) -> Optional[str]:
+        row = self._conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name: str, value: str):
+        self._conn.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, value))
+
+    # ==================== 查询 ====================
+
+    @staticmethod
+    def _where(architecture_type=None, industry=None, data_size_bucket=None, source=None):
+        clauses, params = [], []
+        for column, value in (('architecture_type', architecture_type), ('industry', industry),
+                              ('data_size_bucket', data_size_bucket), ('source', source)):
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def count(self, **filters) -> int:
+        where, params = self._where(**filters)
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM cases{where}', params).fetchone()[0]
+
+    def statistics(self, **filters) -> Dict[str, Any]:
+        """
+        统计信息（与 TrainingSystem.get_statistics 原有结构一致，另含行业和数据量分档分布）
+        """
+        where, params = self._where(**filters)
+        with self._lock:
+            total, trained, size_min, size_max, size_avg, qps_min, qps_max, qps_avg = self._conn.execute(
+                f'''SELECT COUNT(*), COALESCE(SUM(used_for_training), 0),
+                           MIN(total_data_size_gb), MAX(total_data_size_gb), AVG(total_data_size_gb),
+                           MIN(qps), MAX(qps), AVG(qps)
+                    FROM cases{where}''', params
+            ).fetchone()
+            groups = {
+                column: self._conn.execute(
+                    f'SELECT {column}, COUNT(*) FROM cases{where} GROUP BY {column} ORDER BY {column}', params
+                ).fetchall()
+                for column in ('architecture_type', 'industry', 'data_size_bucket')
+            }
+
+        stats = {
+            'total_cases': total,
+            'trained_cases': trained,
+            'architecture_distribution': {arch: n for arch, n in groups['architecture_type'] if arch is not None},
+            'industry_distribution': {ind: n for ind, n in groups['industry'] if ind is not None},
+            'data_size_buckets': {bucket_label(b): n for b, n in groups['data_size_bucket']},
+            'data_size_range': {'min': 0, 'max': 0, 'avg': 0},
+            'qps_range': {'min': 0, 'max': 0, 'avg': 0}
+        }
+        if total:
+            stats['data_size_range'] = {'min': size_min, 'max': size_max, 'avg': size_avg}
+            stats['qps_range'] = {'min': qps_min, 'max': qps_max, 'avg': qps_avg}
+        return stats
+
+    def list_cases(self, limit: int = 50, offset: int = 0, **filters) -> Dict[str, Any]:
+        """按插入顺序分页返回案例"""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        offset = max(0, int(offset))
+        where, params = self._where(**filters)
+        with self._lock:
+            total = self._conn.execute(f'SELECT COUNT(*) FROM cases{where}', params).fetchone()[0]
+            rows = self._conn.execute(
+                f'SELECT payload FROM cases{where} ORDER BY seq LIMIT ? OFFSET ?', params + [limit, offset]
+            ).fetchall()
+        return {
+            'total': total,
+            'limit': limit,
+            'offset': offset,
+            'cases': [json.loads(row[0]) for row in rows]
+        }
+
+    def get(self, key) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute('SELECT payload FROM cases WHERE case_key = ?', (str(key),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def store_path_for(snapshot_path: str) -> str:
+    """快照 training_data.json 对应的案例库 training_data.db"""
+    return os.path.splitext(snapshot_path)[0] + '.db'
+
+
+_case_stores: Dict[str, CaseStore] = {}
+_case_stores_lock = threading.Lock()
+
+
+def get_case_store(snapshot_path: str) -> CaseStore:
+    """同一快照文件在进程内共享一个 CaseStore"""
+    key = os.path.abspath(store_path_for(snapshot_path))
+    store = _case_stores.get(key)
+    if store is None:
+        with _case_stores_lock:
+            store = _case_stores.get(key)
+            if store is None:
+                store = CaseStore(key)
+                _case_stores[key] = store
+    return store
+
+
+if __name__ == '__main__':
+    import sys
+    from case_log import get_case_log
+
+    snapshot = sys.argv[1] if len(sys.argv) > 1 else 'training_data.json'
+    store = get_case_store(snapshot)
+    store.sync(get_case_log(snapshot))
+    print(f"✅ 已导入 {store.import_real_cases()} 个真实案例到 {store.db_file}")
+    print(json.dumps(store.statistics(), ensure_ascii=False, indent=2))
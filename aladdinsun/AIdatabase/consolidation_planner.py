@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+多系统整合规划
+把小系统装箱合并到共享TDSQL集群，减少每个系统各自一套代理/监控/备份节点的开销。
+
+装箱按 数据量/QPS/TPS/连接数 四个维度做多维 Best-Fit Decreasing（numpy向量化判断可放入的集群），
+只有可用性等级和数据敏感度相同的系统才能合并，高敏感度系统独立部署；
+合并后的集群与独立系统一起交给 MultiSystemPlanner 计算设备清单，与逐系统方案比较节点数和TCO。
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from advanced_file_processor import MultiSystemEnvironment, SystemInfo
+from multi_system_planner import MultiSystemPlanner, parse_availability, HA_AVAILABILITY_THRESHOLD
+
+# 装箱维度
+DIMENSIONS = ('data_size_gb', 'qps', 'tps', 'connections')
+
+# 单个共享集群的容量上限
+DEFAULT_CLUSTER_CAPACITY = {
+    'data_size_gb': 20 * 1024,
+    'qps': 100000,
+    'tps': 30000,
+    'connections': 20000,
+}
+
+# 装箱时只用到容量的该比例，为增长和峰值留余量
+DEFAULT_HEADROOM = 0.7
+
+# 单个共享集群最多承载的系统数（控制故障影响面）
+MAX_SYSTEMS_PER_CLUSTER = 50
+
+# 不与其他系统共享集群的数据敏感度
+ISOLATED_SENSITIVITIES = ('高',)
+
+# 3年TCO = 初始投资 × 1.5（与 /api/predict 的估算口径一致）
+TCO_MULTIPLIER = 1.5
+
+
+def availability_tier(system: SystemInfo) -> str:
+    """可用性等级：high / standard"""
+    if parse_availability(system.availability_requirement) >= HA_AVAILABILITY_THRESHOLD:
+        return 'high'
+    return 'standard'
+
+
+def _demand_matrix(systems: List[SystemInfo]) -> np.ndarray:
+    """各系统在每个维度上的需求 (n, 4)，TPS缺失时按QPS的30%估算"""
+    demand = np.array([[getattr(s, dim) or 0 for dim in DIMENSIONS] for s in systems], dtype=np.float64)
+    if len(systems):
+        qps = demand[:, DIMENSIONS.index('qps')]
+        tps = demand[:, DIMENSIONS.index('tps')]
+        demand[:, DIMENSIONS.index('tps')] = np.where(tps > 0, tps, qps * 0.3)
+    return np.maximum(demand, 0)
+
+
+def pack_systems(demand: np.ndarray, capacity: np.ndarray,
+                 max_items_per_bin: int = MAX_SYSTEMS_PER_CLUSTER) -> List[List[int]]:
+    """
+    多维 Best-Fit Decreasing 装箱
+
+    按主导维度占比从大到小依次放入；所有维度都放得下的集群中选剩余容量（归一化后求和）最小的，
+    放不下则新开集群。
+
+    Args:
+        demand: (n, d) 需求矩阵，每行都不超过 capacity
+        capacity: (d,) 单个集群容量
+
+    Returns:
+        每个集群包含的行号列表
+    """
+    n = len(demand)
+    if n == 0:
+        return []
+
+    normalized = demand / capacity
+    order = np.argsort(-normalized.max(axis=1), kind='stable')
+
+    remaining = np.empty((n, demand.shape[1]), dtype=np.float64)
+    counts = np.zeros(n, dtype=np.int64)
+    bins: List[List[int]] = []
+
+    for index in order:
+        open_bins = len(bins)
+        item = demand[index]
+        if open_bins:
+            fits = (remaining[:open_bins] >= item).all(axis=1) & (counts[:open_bins] < max_items_per_bin)
+            if fits.any():
+                slack = ((remaining[:open_bins] - item) / capacity).sum(axis=1)
+                slack[~fits] = np.inf
+                target = int(np.argmin(slack))
+                remaining[target] -= item
+                counts[target] += 1
+                bins[target].append(int(index))
+                continue
+
+        remaining[open_bins] = capacity - item
+        counts[open_bins] = 1
+        bins.append([int(index)])
+
+    return bins
+
+
+class ConsolidationPlanner:
+    """多系统整合规划器"""
+
+    def __init__(self, capacity: Optional[Dict[str, float]] = None, headroom: float = DEFAULT_HEADROOM,
+                 max_systems_per_cluster: int = MAX_SYSTEMS_PER_CLUSTER, xinchuan_mode: str = 'off',
+                 executor=None):
+        capacity = dict(DEFAULT_CLUSTER_CAPACITY, **(capacity or {}))
+        self.capacity = np.array([capacity[dim] for dim in DIMENSIONS], dtype=np.float64) * headroom
+        self.max_systems_per_cluster = max_systems_per_cluster
+        self.sizing = MultiSystemPlanner(xinchuan_mode=xinchuan_mode, executor=executor)
+
+    def isolation_key(self, system: SystemInfo) -> Optional[Tuple[str, str]]:
+        """可合并的分组键；返回None表示必须独立部署"""
+        if system.data_sensitivity in ISOLATED_SENSITIVITIES:
+            return None
+        return (availability_tier(system), system.data_sensitivity)
+
+    def consolidate(self, systems: List[SystemInfo]) -> Dict[str, Any]:
+        """
+        只做装箱，不计算设备清单
+
+        Returns:
+            {'clusters': [{'systems': [行号], 'isolation': {...}, 'demand': {...}, 'utilization': {...}}],
+             'dedicated': [{'index': 行号, 'reason': ...}]}
+        """
+        demand = _demand_matrix(systems)
+        oversized = (demand > self.capacity).any(axis=1) if len(systems) else np.zeros(0, dtype=bool)
+
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        dedicated = []
+        for index, system in enumerate(systems):
+            key = self.isolation_key(system)
+            if key is None:
+                dedicated.append({'index': index, 'reason': f'数据敏感度为{system.data_sensitivity}，需独立部署'})
+            elif oversized[index]:
+                dedicated.append({'index': index, 'reason': '规模超过共享集群容量'})
+            else:
+                groups.setdefault(key, []).append(index)
+
+        clusters = []
+        for (tier, sensitivity), members in groups.items():
+            members = np.array(members)
+            for bin_members in pack_systems(demand[members], self.capacity, self.max_systems_per_cluster):
+                indices = members[bin_members].tolist()
+                if len(indices) == 1:
+                    dedicated.append({'index': indices[0], 'reason': '没有可合并的同类系统'})
+                    continue
+                total = demand[indices].sum(axis=0)
+                clusters.append({
+                    'systems': indices,
+                    'isolation': {'availability_tier': tier, 'data_sensitivity': sensitivity},
+                    'demand': dict(zip(DIMENSIONS, total.tolist())),
+                    'utilization': dict(zip(DIMENSIONS, np.round(total / self.capacity, 3).tolist()))
+                })
+
+        dedicated.sort(key=lambda d: d['index'])
+        return {'clusters': clusters, 'dedicated': dedicated}
+
+    def _cluster_system(self, cluster_id: int, cluster: Dict[str, Any], systems: List[SystemInfo]) -> SystemInfo:
+        """把一个共享集群表示为一个虚拟系统，交给 MultiSystemPlanner 计算设备"""
+        members = [systems[i] for i in cluster['systems']]
+        availability = max(members, key=lambda s: parse_availability(s.availability_requirement))
+        return SystemInfo(
+            system_name=f'共享集群{cluster_id}',
+            system_type='共享集群',
+            data_size_gb=cluster['demand']['data_size_gb'],
+            qps=int(cluster['demand']['qps']),
+            tps=int(cluster['demand']['tps']),
+            peak_qps=sum(s.peak_qps for s in members),
+            connections=int(cluster['demand']['connections']),
+            availability_requirement=availability.availability_requirement,
+            data_sensitivity=cluster['isolation']['data_sensitivity']
+        )
+
+    def plan(self, environment: Union[MultiSystemEnvironment, List[SystemInfo]]) -> Dict[str, Any]:
+        """
+        整合规划并与逐系统方案对比
+
+        Returns:
+            {'clusters', 'dedicated_systems', 'consolidated_plan', 'per_system_plan', 'comparison',
+             'bill_of_materials'}
+        """
+        start = time.perf_counter()
+        if not isinstance(environment, MultiSystemEnvironment):
+            environment = MultiSystemEnvironment(systems=list(environment), total_systems=len(environment))
+        systems = environment.systems
+
+        packing = self.consolidate(systems)
+
+        consolidated_systems = [self._cluster_system(i + 1, c, systems) for i, c in enumerate(packing['clusters'])]
+        consolidated_systems += [systems[d['index']] for d in packing['dedicated']]
+
+        per_system = self.sizing.plan(environment)
+        consolidated = self.sizing.plan(MultiSystemEnvironment(
+            environment_name=environment.environment_name,
+            systems=consolidated_systems,
+            total_systems=len(consolidated_systems),
+            deployment=environment.deployment
+        ))
+
+        per_system_summary = self._summarize(per_system)
+        consolidated_summary = self._summarize(consolidated)
+        node_reduction = per_system_summary['total_nodes'] - consolidated_summary['total_nodes']
+        tco_savings = per_system_summary['three_year_tco'] - consolidated_summary['three_year_tco']
+
+        return {
+            'success': True,
+            'environment_name': environment.environment_name,
+            'total_systems': len(systems),
+            'clusters': [
+                dict(cluster, cluster_name=f'共享集群{i + 1}',
+                     systems=[systems[j].system_name or f'系统{j + 1}' for j in cluster['systems']])
+                for i, cluster in enumerate(packing['clusters'])
+            ],
+            'dedicated_systems': [
+                {'system_name': systems[d['index']].system_name or f"系统{d['index'] + 1}", 'reason': d['reason']}
+                for d in packing['dedicated']
+            ],
+            'consolidated_plan': consolidated_summary,
+            'per_system_plan': per_system_summary,
+            'comparison': {
+                'node_reduction': node_reduction,
+                'node_reduction_pct': round(node_reduction / per_system_summary['total_nodes'] * 100, 1)
+                if per_system_summary['total_nodes'] else 0.0,
+                'tco_savings': tco_savings,
+                'tco_savings_pct': round(tco_savings / per_system_summary['three_year_tco'] * 100, 1)
+                if per_system_summary['three_year_tco'] else 0.0
+            },
+            'bill_of_materials': consolidated['bill_of_materials'],
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)
+        }
+
+    @staticmethod
+    def _summarize(plan: Dict[str, Any]) -> Dict[str, Any]:
+        totals = plan['totals']
+        total_nodes = totals['database_nodes'] + totals['proxy_nodes'] + totals['monitoring_nodes']
+        return {
+            'deployments': len(plan['systems']),
+            'database_nodes': totals['database_nodes'],
+            'proxy_nodes': totals['proxy_nodes'],
+            'monitoring_nodes': totals['monitoring_nodes'],
+            'total_nodes': total_nodes,
+            'rack_count': totals['rack_count'],
+            'total_initial_cost': totals['total_initial_cost'],
+            'three_year_tco': totals['total_initial_cost'] * TCO_MULTIPLIER
+        }
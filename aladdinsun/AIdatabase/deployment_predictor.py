@@ -6,6 +6,11 @@ TDSQL 部署资源预测系统 - 核心计算引擎
 import math
 import json
 from datetime import datetime
+from functools import partial
+
+from tracing import get_logger, predictor_stage
+
+logger = get_logger(__name__)
 
 class DeploymentResourcePredictor:
     """部署资源预测器"""
@@ -187,26 +192,35 @@ class DeploymentResourcePredictor:
         主预测函数
         返回完整的部署资源预测结果
         """
+        stage = partial(predictor_stage, 'standard')
+
         # 1. 分析输入参数
-        analysis = self._analyze_requirements(input_data)
+        with stage('analyze'):
+            analysis = self._analyze_requirements(input_data)
         
         # 2. 设计架构
-        architecture = self._design_architecture(analysis)
+        with stage('architecture'):
+            architecture = self._design_architecture(analysis)
         
         # 3. 计算设备清单
-        equipment_list = self._calculate_equipment(architecture, analysis)
+        with stage('equipment'):
+            equipment_list = self._calculate_equipment(architecture, analysis)
         
         # 4. 计算成本
-        cost_breakdown = self._calculate_costs(equipment_list, architecture)
+        with stage('pricing'):
+            cost_breakdown = self._calculate_costs(equipment_list, architecture)
         
         # 5. 生成网络拓扑
-        network_topology = self._design_network_topology(architecture, equipment_list)
+        with stage('topology'):
+            network_topology = self._design_network_topology(architecture, equipment_list)
         
         # 6. 生成架构图数据
-        architecture_diagram = self._generate_architecture_diagram(architecture, equipment_list)
+        with stage('diagram'):
+            architecture_diagram = self._generate_architecture_diagram(architecture, equipment_list)
         
         # 7. 生成部署建议
-        recommendations = self._generate_recommendations(analysis, architecture)
+        with stage('recommendations'):
+            recommendations = self._generate_recommendations(analysis, architecture)
         
         return {
             'success': True,
@@ -954,36 +968,59 @@ class DeploymentResourcePredictor:
         
         return recommendations
     
+    # 解析逻辑变更时递增，使解析缓存中的旧结果失效
+    PARSER_VERSION = '1.0'
+    
     def parse_file(self, filepath):
         """
         解析上传的文件，提取业务参数
         支持: JSON, Excel, 图片(OCR), PDF
+        相同内容的文件直接返回缓存的解析结果
         """
-        import os
+        from parse_cache import cached_parse
         
-        file_ext = os.path.splitext(filepath)[1].lower()
-        params = {}
+        return cached_parse(filepath, 'deployment_predictor', self.PARSER_VERSION,
+                            self._parse_file_uncached, self._is_cacheable_params)
+    
+    def parse_upload(self, upload):
+        """
+        解析流式接收的上传文件（upload_ingest.IngestedUpload）
+        缓存命中时不需要把上传内容写到磁盘
+        """
+        return upload.parse('deployment_predictor', self.PARSER_VERSION,
+                            self._parse_file_uncached, self._is_cacheable_params)
+    
+    def _is_cacheable_params(self, params):
+        """只缓存真正提取到参数的结果（错误或缺少依赖时的提示不缓存）"""
+        return isinstance(params, dict) and bool(params) and 'error' not in params and 'message' not in params
+    
+    def _parse_file_uncached(self, filepath):
+        """按文件内容类型解析（不经过缓存）"""
+        from parser_registry import UnsupportedFileError
         
         try:
-            if file_ext == '.json':
-                # 解析JSON文件
-                params = self._parse_json(filepath)
-            elif file_ext in ['.xlsx', '.xls']:
-                # 解析Excel文件
-                params = self._parse_excel(filepath)
-            elif file_ext in ['.png', '.jpg', '.jpeg', '.gif', '.bmp']:
-                # 解析图片文件（OCR）
-                params = self._parse_image(filepath)
-            elif file_ext == '.pdf':
-                # 解析PDF文件
-                params = self._parse_pdf(filepath)
-            else:
-                params = {'error': f'不支持的文件类型: {file_ext}'}
+            params = self._get_parser_registry().dispatch(filepath)
+        except UnsupportedFileError as e:
+            params = {'error': str(e)}
         except Exception as e:
             params = {'error': f'文件解析失败: {str(e)}'}
         
         return params
     
+    def _get_parser_registry(self):
+        """按文件内容（而非扩展名）选择解析器"""
+        if getattr(self, '_parser_registry', None) is None:
+            from parser_registry import ParserRegistry, IMAGE_TYPES
+            
+            registry = ParserRegistry()
+            registry.register('json', self._parse_json)
+            # openpyxl 只支持 xlsx/xlsm，旧版xls与xlsb在分派阶段直接拒绝
+            registry.register(['xlsx', 'xlsm'], self._parse_excel, requires=['openpyxl'])
+            registry.register(IMAGE_TYPES, self._parse_image, requires=['PIL'])
+            registry.register('pdf', self._parse_pdf, requires=['PyPDF2'])
+            self._parser_registry = registry
+        return self._parser_registry
+    
     def _parse_json(self, filepath):
         """解析JSON文件"""
         with open(filepath, 'r', encoding='utf-8') as f:
@@ -1016,13 +1053,18 @@ class DeploymentResourcePredictor:
         """解析Excel文件"""
         try:
             import openpyxl
-            wb = openpyxl.load_workbook(filepath)
-            ws = wb.active
             
             params = {}
             
+            # 以文件对象打开：类型已按内容识别，不依赖扩展名
+            with open(filepath, 'rb') as f:
+                wb = openpyxl.load_workbook(f, read_only=True, data_only=True)
+                ws = wb.active
+                rows = list(ws.iter_rows(min_row=1, max_row=50, values_only=True))
+                wb.close()
+            
             # 尝试从表格中提取参数
-            for row in ws.iter_rows(min_row=1, max_row=50, values_only=True):
+            for row in rows:
                 if not row or len(row) < 2:
                     continue
                 
@@ -1080,15 +1122,15 @@ class DeploymentResourcePredictor:
         """解析PDF文件"""
         try:
             import PyPDF2
+            from pdf_stream import stream_extract_pdf
             
-            with open(filepath, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                text = ''
-                for page in reader.pages[:10]:  # 只读前10页
-                    text += page.extract_text()
-            
-            # 从文本中提取参数
-            params = self._extract_params_from_text(text)
+            # 逐页增量提取，关键参数找齐后立即停止；不设页数上限，只受时间预算约束
+            params, scan_info = stream_extract_pdf(
+                filepath, self._extract_params_from_text,
+                required_fields=('qps', 'tps', 'data_volume', 'concurrent_users')
+            )
+            if scan_info['stopped_reason'] == 'time_budget':
+                logger.warning('PDF扫描超出时间预算，已扫描 %d 页', scan_info['pages_scanned'])
             return params
             
         except ImportError:
@@ -6,7 +6,11 @@ TDSQL 部署资源预测系统 - 信创版核心引擎
 import math
 import json
 from datetime import datetime
+from functools import partial
 from xinchuan_device_catalog import XinChuangDeviceCatalog
+from tracing import get_logger, predictor_stage
+
+logger = get_logger(__name__)
 
 class DeploymentResourcePredictorXinChuan:
     """部署资源预测器 - 信创国产化版本"""
@@ -168,23 +172,31 @@ class DeploymentResourcePredictorXinChuan:
     
     def predict(self, input_data):
         """主预测函数"""
+        stage = partial(predictor_stage, 'xinchuan')
+
         # 1. 分析输入参数
-        analysis = self._analyze_requirements(input_data)
+        with stage('analyze'):
+            analysis = self._analyze_requirements(input_data)
         
         # 2. 设计架构(考虑信创要求)
-        architecture = self._design_architecture_xinchuan(analysis)
+        with stage('architecture'):
+            architecture = self._design_architecture_xinchuan(analysis)
         
         # 3. 计算设备清单(使用信创设备)
-        equipment_list = self._calculate_equipment_xinchuan(architecture, analysis)
+        with stage('equipment'):
+            equipment_list = self._calculate_equipment_xinchuan(architecture, analysis)
         
         # 4. 计算成本(包含信创优势说明)
-        cost_breakdown = self._calculate_cost_xinchuan(equipment_list, architecture)
+        with stage('pricing'):
+            cost_breakdown = self._calculate_cost_xinchuan(equipment_list, architecture)
         
         # 5. 生成架构图描述
-        architecture_diagram = self._generate_architecture_diagram(architecture)
+        with stage('diagram'):
+            architecture_diagram = self._generate_architecture_diagram(architecture)
         
         # 6. 生成建议
-        recommendations = self._generate_recommendations_xinchuan(analysis, architecture)
+        with stage('recommendations'):
+            recommendations = self._generate_recommendations_xinchuan(analysis, architecture)
         
         return {
             'xinchuan_mode': self.xinchuan_mode,
@@ -270,8 +282,8 @@ class DeploymentResourcePredictorXinChuan:
         else:
             architecture['node_spec'] = 'db_small'
         
-        print(f"\n🏗️  架构设计: {database_nodes}个数据库节点, {proxy_nodes}个代理节点, {monitoring_nodes}个监控节点")
-        print(f"📊 数据量: {data_size_tb:.1f}TB, 日事务: {daily_txn:,}, 节点规格: {architecture['node_spec']}")
+        logger.debug('架构设计: %d个数据库节点, %d个代理节点, %d个监控节点; 数据量: %.1fTB, 日事务: %s, 节点规格: %s',
+                     database_nodes, proxy_nodes, monitoring_nodes, data_size_tb, daily_txn, architecture['node_spec'])
         
         return architecture
     
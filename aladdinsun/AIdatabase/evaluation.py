@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+批量评估与 k 折交叉验证
+
+原来 TrainingSystem.evaluate 逐条调用 model.predict，只报告架构类型准确率。这里:
+
+- 预测按整折批量进行：神经网络一次前向处理整折的物化特征（NumPy 推理引擎），
+  案例检索（case_index.CaseIndex）一次矩阵运算算出整折与训练折的距离
+- 报告架构类型准确率、混淆矩阵（行=实际，列=预测，顺序同 ARCH_TYPES），
+  以及节点/分片/副本数的平均绝对误差(MAE)
+- 分层 k 折（各折架构类型比例一致），各折在独立进程中并行运行
+- 在同样的折上对比三种方法：
+    rules      基于规则的预测（model.rule_based_predict，即模型的 _rule_based_predict）
+    neural     在训练折上训练神经网络，再对测试折预测（与线上一致，会应用业务规则）
+    retrieval  在训练折中检索最相似的 k 个历史案例，按其实际架构投票
+
+用法:
+    report = cross_validate('training_data.json', k=5)
+    python evaluation.py training_data.json --folds 5
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from case_index import CaseIndex
+from feature_pipeline import ARCH_TYPES, COUNT_LABELS, FeatureMatrix, encode_architecture, materialize, usable_cases
+from model import rule_based_predict
+from tracing import get_logger
+from worker_pool import InlineExecutor, available_cpus
+
+logger = get_logger(__name__)
+
+APPROACHES = ('rules', 'neural', 'retrieval')
+
+# 案例检索投票的近邻数
+EVAL_NEIGHBORS = int(os.environ.get('EVAL_NEIGHBORS', 5))
+
+
+# ==================== 评分 ====================
+
+def prediction_arrays(predictions: Sequence[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """把预测结果列表转换为架构编码数组和 (N, 3) 数量数组"""
+    architecture = np.fromiter((encode_architecture(p['architecture_type']) for p in predictions),
+                               dtype=np.int64, count=len(predictions))
+    counts = np.array([[p.get(label) or 0 for label in COUNT_LABELS] for p in predictions],
+                      dtype=np.float32).reshape(len(predictions), len(COUNT_LABELS))
+    return architecture, counts
+
+
+def score(matrix: FeatureMatrix, predictions: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """对一组预测评分（matrix 为同样顺序的实际标签）"""
+    predicted_arch, predicted_counts = prediction_arrays(predictions)
+    n = len(matrix)
+    classes = len(ARCH_TYPES)
+    confusion = np.bincount(matrix.architecture * classes + predicted_arch,
+                            minlength=classes * classes).reshape(classes, classes)
+    abs_error = np.abs(predicted_counts - matrix.counts).sum(axis=0, dtype=np.float64)
+    return {
+        'n': n,
+        'correct': int(np.trace(confusion)),
+        'accuracy': float(np.trace(confusion) / n) if n else 0.0,
+        'confusion_matrix': confusion.tolist(),
+        'abs_error': {label: float(abs_error[i]) for i, label in enumerate(COUNT_LABELS)},
+        'mae': {label: float(abs_error[i] / n) if n else 0.0 for i, label in enumerate(COUNT_LABELS)}
+    }
+
+
+def merge_scores(fold_scores: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """合并各折的评分：混淆矩阵求和，准确率/MAE 按样本数加权，另给出各折准确率的标准差"""
+    n = sum(s['n'] for s in fold_scores)
+    confusion = np.sum([s['confusion_matrix'] for s in fold_scores], axis=0)
+    fold_accuracy = [s['accuracy'] for s in fold_scores]
+    return {
+        'n': n,
+        'accuracy': float(np.trace(confusion) / n) if n else 0.0,
+        'accuracy_std': float(np.std(fold_accuracy)) if fold_accuracy else 0.0,
+        'fold_accuracy': fold_accuracy,
+        'confusion_matrix': confusion.tolist(),
+        'mae': {label: sum(s['abs_error'][label] for s in fold_scores) / n if n else 0.0
+                for label in COUNT_LABELS},
+        'seconds': sum(s.get('seconds', 0.0) for s in fold_scores)
+    }
+
+
+def kfold_indices(architecture: np.ndarray, k: int, seed: int = 0) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """分层 k 折：每种架构类型的样本打乱后轮流分到各折"""
+    rng = np.random.default_rng(seed)
+    fold_of = np.empty(len(architecture), dtype=np.int64)
+    offset = 0
+    for cls in np.unique(architecture):
+        members = rng.permutation(np.flatnonzero(architecture == cls))
+        fold_of[members] = (np.arange(len(members)) + offset) % k
+        offset += len(members)
+    return [(np.flatnonzero(fold_of != fold), np.flatnonzero(fold_of == fold)) for fold in range(k)]
+
+
+# ==================== 各方法的批量预测 ====================
+
+def predict_rules(cases: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [rule_based_predict(case['input']) for case in cases]
+
+
+def predict_retrieval(train: FeatureMatrix, test: FeatureMatrix,
+                      neighbors: int = EVAL_NEIGHBORS) -> List[Dict[str, Any]]:
+    """在训练折中检索最近的 neighbors 个案例（case_index.CaseIndex），按实际架构投票、数量取中位数"""
+    if not len(train):
+        return [{'architecture_type': ARCH_TYPES[1], 'node_count': 1, 'shard_count': 1, 'replica_count': 1,
+                 'confidence': 0.0} for _ in range(len(test))]
+
+    # 与在线检索使用同一个索引（整折一次矩阵运算算出全部距离）
+    index = CaseIndex(train.features, exact_threshold=len(train))
+    k = min(neighbors, len(train))
+    _, nearest = index.search(test.features, k)
+
+    votes = np.apply_along_axis(np.bincount, 1, train.architecture[nearest], minlength=len(ARCH_TYPES))
+    winners = votes.argmax(axis=1)
+    counts = np.median(train.counts[nearest], axis=1)
+
+    return [{
+        'architecture_type': ARCH_TYPES[winners[i]],
+        'node_count': max(1, int(round(counts[i, 0]))),
+        'shard_count': max(1, int(round(counts[i, 1]))),
+        'replica_count': max(1, int(round(counts[i, 2]))),
+        'confidence': float(votes[i, winners[i]] / k)
+    } for i in range(len(test))]
+
+
+def predict_neural(train: FeatureMatrix, test_cases: Sequence[Dict[str, Any]], test: FeatureMatrix,
+                   train_config=None) -> List[Dict[str, Any]]:
+    """在训练折上训练神经网络，再用 NumPy 推理引擎对整折做一次前向"""
+    from batched_training import TrainConfig, fit
+    from numpy_inference import NumpyArchitecturePredictor
+    from torch_model import TDSQLArchitecturePredictor
+
+    model = TDSQLArchitecturePredictor()
+    fit(model, train, train_config or TrainConfig(epochs=50, num_threads=0))
+    predictor = NumpyArchitecturePredictor.from_model(model)
+    return predictor.predict_batch([case['input'] for case in test_cases], features=test.features)
+
+
+def evaluate_predictor(predictor, cases: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """批量评估一个预测器（有 predict_batch 时一次处理全部案例）"""
+    cases = usable_cases(cases)
+    matrix = materialize(cases)
+    inputs = [case['input'] for case in cases]
+    if hasattr(predictor, 'predict_batch'):
+        predictions = predictor.predict_batch(inputs)
+    else:
+        predictions = [predictor.predict(data) for data in inputs]
+    return score(matrix, predictions)
+
+
+# ==================== k 折交叉验证 ====================
+
+_worker: Dict[str, Any] = {}
+
+
+def _load_cases(cases: List[Dict[str, Any]]):
+    """每个进程只物化一次全部案例"""
+    _worker['cases'] = cases
+    _worker['matrix'] = materialize(cases)
+
+
+def _init_worker(cases: List[Dict[str, Any]], threads: int):
+    """进程池子进程初始化：固定线程数（只在子进程中设置，不影响调用方进程）"""
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _load_cases(cases)
+
+
+def _run_fold(fold: int, train_idx: np.ndarray, test_idx: np.ndarray, approaches: Sequence[str],
+              train_config, neighbors: int) -> Dict[str, Any]:
+    cases, matrix = _worker['cases'], _worker['matrix']
+    train, test = matrix.take(train_idx), matrix.take(test_idx)
+    test_cases = [cases[i] for i in test_idx]
+
+    scores = {}
+    for approach in approaches:
+        started = time.perf_counter()
+        if approach == 'rules':
+            predictions = predict_rules(test_cases)
+        elif approach == 'retrieval':
+            predictions = predict_retrieval(train, test, neighbors)
+        elif approach == 'neural':
+            predictions = predict_neural(train, test_cases, test, train_config)
+        else:
+            raise ValueError(f'未知的评估方法: {approach}')
+        scores[approach] = score(test, predictions)
+        scores[approach]['seconds'] = time.perf_counter() - started
+    return {'fold': fold, 'scores': scores}
+
+
+def cross_validate(source: Union[str, Sequence[Dict[str, Any]]], k: int = 5,
+                   approaches: Sequence[str] = APPROACHES, train_config=None, workers: Optional[int] = None,
+                   neighbors: int = EVAL_NEIGHBORS, seed: int = 0) -> Dict[str, Any]:
+    """
+    分层 k 折交叉验证，在同样的折上对比各方法
+
+    Args:
+        source: 训练数据文件或案例列表
+        approaches: rules / neural / retrieval 的子集；未安装 PyTorch 时自动跳过 neural
+        train_config: neural 方法的 batched_training.TrainConfig
+        workers: 并行进程数，默认 min(k, 可用核数)；1 表示在当前进程内顺序运行
+
+    Returns:
+        {'folds': k, 'n': 样本数, 'approaches': {方法: 合并后的评分}, 'per_fold': [...]}
+    """
+    if k < 2:
+        raise ValueError(f'折数至少为 2（当前: {k}）')
+    if isinstance(source, str):
+        from case_log import get_case_log
+        cases = get_case_log(source).load_all()
+    else:
+        cases = list(source)
+    cases = usable_cases(cases)
+    if len(cases) < k:
+        raise ValueError(f'案例数 {len(cases)} 少于折数 {k}')
+
+    approaches = list(approaches)
+    if 'neural' in approaches:
+        import importlib.util
+        if importlib.util.find_spec('torch') is None:
+            logger.warning('PyTorch 未安装，跳过 neural 方法')
+            approaches.remove('neural')
+
+    folds = kfold_indices(materialize(cases).architecture, k, seed)
+    workers = workers or max(1, min(k, len(available_cpus())))
+    if train_config is not None and train_config.seed is None:
+        train_config.seed = seed
+
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_worker, initargs=(cases, 1))
+    else:
+        # 在调用方进程内顺序运行（如 Flask worker），沿用其线程设置
+        _load_cases(cases)
+        executor = InlineExecutor()
+
+    started = time.perf_counter()
+    try:
+        futures = [executor.submit(_run_fold, fold, train_idx, test_idx, approaches, train_config, neighbors)
+                   for fold, (train_idx, test_idx) in enumerate(folds)]
+        per_fold = sorted((future.result() for future in as_completed(futures)), key=lambda r: r['fold'])
+    finally:
+        executor.shutdown(wait=True)
+        _worker.clear()
+
+    report = {
+        'folds': k,
+        'n': len(cases),
+        'workers': workers,
+        'seconds': time.perf_counter() - started,
+        'train_config': asdict(train_config) if train_config is not None else None,
+        'approaches': {approach: merge_scores([fold['scores'][approach] for fold in per_fold])
+                       for approach in approaches},
+        'per_fold': per_fold
+    }
+    logger.info('%d 折交叉验证完成 (%d 个案例, %.1fs): %s', k, len(cases), report['seconds'],
+                {a: round(s['accuracy'], 4) for a, s in report['approaches'].items()})
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    """打印对比表和混淆矩阵"""
+    print("=" * 84)
+    print(f"{report['folds']} 折交叉验证, {report['n']} 个案例, {report['workers']} 个进程, "
+          f"耗时 {report['seconds']:.1f}s")
+    print(f"{'方法':<12}{'准确率':>16}{'节点MAE':>12}{'分片MAE':>12}{'副本MAE':>12}{'耗时s':>10}")
+    print("-" * 84)
+    for approach, stats in report['approaches'].items():
+        mae = stats['mae']
+        print(f"{approach:<12}{stats['accuracy'] * 100:>9.1f}% ±{stats['accuracy_std'] * 100:>4.1f}"
+              f"{mae['node_count']:>12.2f}{mae['shard_count']:>12.2f}{mae['replica_count']:>12.2f}"
+              f"{stats['seconds']:>10.2f}")
+    print("-" * 84)
+    for approach, stats in report['approaches'].items():
+        print(f"{approach} 混淆矩阵（行=实际，列=预测: {', '.join(ARCH_TYPES)}）")
+        for arch, row in zip(ARCH_TYPES, stats['confusion_matrix']):
+            print(f"  {arch:<12}" + ''.join(f"{v:>8}" for v in row))
+    print("=" * 84)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='规则 / 神经网络 / 案例检索的 k 折交叉验证对比')
+    parser.add_argument('data_file', nargs='?', default='training_data.json', help='训练数据文件')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--approaches', default=','.join(APPROACHES), help='逗号分隔的方法列表')
+    parser.add_argument('--epochs', type=int, default=50, help='neural 方法每折的训练轮数')
+    parser.add_argument('--workers', type=int, help='并行进程数')
+    parser.add_argument('--neighbors', type=int, default=EVAL_NEIGHBORS, help='案例检索的近邻数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='结果保存为JSON')
+    args = parser.parse_args(argv)
+
+    train_config = None
+    approaches = [a.strip() for a in args.approaches.split(',') if a.strip()]
+    if 'neural' in approaches:
+        from batched_training import TrainConfig
+        train_config = TrainConfig(epochs=args.epochs, num_threads=0, seed=args.seed)
+
+    try:
+        report = cross_validate(args.data_file, k=args.folds, approaches=approaches, train_config=train_config,
+                                workers=args.workers, neighbors=args.neighbors, seed=args.seed)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存: {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
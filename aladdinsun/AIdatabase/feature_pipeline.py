@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+训练特征管线 - 把整个案例集一次性物化为连续的 float32 特征/标签矩阵
+
+原来 TDSQLDataset 每个 epoch 对每个样本都重新提取一次 50 维特征并新建张量，
+且特征逻辑与 TDSQLArchitecturePredictor._extract_features 各写一份。这里：
+
+- extract_features() 是唯一的特征定义，模型推理和训练共用
+- materialize() 把全部案例写进预分配的 (N, FEATURE_DIM) float32 矩阵和标签数组
+- 结果以 npz 缓存到磁盘，键 = 案例库版本 + FEATURE_SCHEMA_VERSION，案例或特征定义不变时直接加载
+- batched_training.MaterializedDataset 用 torch.from_numpy 包装矩阵，批次是张量切片（不复制）
+
+本模块只依赖 NumPy，在线推理进程可以直接使用，不会导入 PyTorch。
+
+修改 extract_features 的逻辑时务必递增 FEATURE_SCHEMA_VERSION，旧缓存随之失效。
+"""
+
+import os
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from file_io import atomic_open
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# 特征定义版本：extract_features 的含义变化时递增
+FEATURE_SCHEMA_VERSION = 1
+FEATURE_DIM = 50
+
+# 架构类型编码（与模型分类头的输出顺序一致）
+ARCH_TYPES = ('standalone', 'distributed', 'hybrid')
+_ARCH_INDEX = {arch: i for i, arch in enumerate(ARCH_TYPES)}
+
+# 回归标签列
+COUNT_LABELS = ('node_count', 'shard_count', 'replica_count')
+
+DEFAULT_CACHE_DIR = os.environ.get('FEATURE_CACHE_DIR', os.path.join('cache', 'features'))
+
+
+def extract_features(data: Dict[str, Any], out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    从输入参数提取特征向量
+
+    Args:
+        data: 案例输入参数
+        out: 可选，写入该 FEATURE_DIM 长的数组（物化时直接写进矩阵的一行）
+    """
+    features = np.zeros(FEATURE_DIM, dtype=np.float32) if out is None else out
+
+    # 数据量特征
+    features[0] = data.get('total_data_size_gb', 0) / 10000  # 归一化
+    features[1] = data.get('table_count', 0) / 1000
+    features[2] = data.get('database_count', 0) / 100
+
+    # 性能特征
+    features[3] = data.get('qps', 0) / 100000
+    features[4] = data.get('tps', 0) / 50000
+    features[5] = data.get('concurrent_connections', 0) / 10000
+
+    # 业务特征
+    features[6] = 1 if data.get('need_high_availability', False) else 0
+    features[7] = 1 if data.get('need_disaster_recovery', False) else 0
+    features[8] = 1 if data.get('need_read_write_split', False) else 0
+
+    # 数据库类型特征
+    db_types = data.get('source_db_types', [])
+    features[9] = 1 if 'MySQL' in db_types else 0
+    features[10] = 1 if 'Oracle' in db_types else 0
+    features[11] = 1 if 'PostgreSQL' in db_types else 0
+
+    # 表大小分布
+    features[12] = data.get('max_table_size_gb', 0) / 1000
+    features[13] = data.get('avg_table_size_gb', 0) / 100
+
+    # 增长率
+    features[14] = data.get('data_growth_rate', 0) / 100
+
+    return features
+
+
+def encode_architecture(arch_type: str) -> int:
+    """编码架构类型（未知类型按分布式处理）"""
+    return _ARCH_INDEX.get(arch_type, 1)
+
+
+@dataclass
+class FeatureMatrix:
+    """物化后的案例集"""
+    features: np.ndarray       # (N, FEATURE_DIM) float32
+    architecture: np.ndarray   # (N,) int64
+    counts: np.ndarray         # (N, len(COUNT_LABELS)) float32
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def take(self, indices) -> 'FeatureMatrix':
+        """按下标取子集（训练/验证划分、交叉验证折），结果仍是连续数组"""
+        indices = np.asarray(indices, dtype=np.int64)
+        return FeatureMatrix(
+            features=self.features[indices],
+            architecture=self.architecture[indices],
+            counts=self.counts[indices]
+        )
+
+
+def usable_cases(cases: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """可用于训练/评估的案例（input 和 output 都是字典），顺序与 materialize 的行一致"""
+    return [case for case in cases
+            if isinstance(case.get('input'), dict) and isinstance(case.get('output'), dict)]
+
+
+def materialize(cases: Sequence[Dict[str, Any]]) -> FeatureMatrix:
+    """把案例列表一次性转换为连续的特征/标签数组（跳过缺少 input/output 的案例）"""
+    usable = usable_cases(cases)
+    n = len(usable)
+    features = np.zeros((n, FEATURE_DIM), dtype=np.float32)
+    architecture = np.empty(n, dtype=np.int64)
+    counts = np.empty((n, len(COUNT_LABELS)), dtype=np.float32)
+
+    for i, case in enumerate(usable):
+        extract_features(case['input'], out=features[i])
+        output = case['output']
+        architecture[i] = encode_architecture(output.get('architecture_type'))
+        counts[i] = [output.get(label) or 0 for label in COUNT_LABELS]
+
+    return FeatureMatrix(features=features, architecture=architecture, counts=counts)
+
+
+class FeatureCache:
+    """按 (案例库版本, 特征版本) 缓存物化结果的 npz 文件"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        # 每个数据集只在内存中保留最新版本: 数据集 -> (缓存路径, 矩阵)
+        self._memory: Dict[str, Tuple[str, FeatureMatrix]] = {}
+
+    def path_for(self, source: str, store_version: str) -> str:
+        source = os.path.abspath(source)
+        key = hashlib.sha256(f'{source}|{store_version}|{FEATURE_SCHEMA_VERSION}'.encode()).hexdigest()
+        prefix = hashlib.sha256(source.encode()).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f'{prefix}_{key[:20]}.npz')
+
+    def get(self, source: str, store_version: str, load_cases) -> FeatureMatrix:
+        """
+        取物化结果，依次查内存、磁盘，都未命中时调用 load_cases() 重新物化
+
+        Args:
+            source: 案例来源（快照文件路径），区分不同的数据集
+            store_version: 案例库版本，案例有增减时变化
+            load_cases: 返回全部案例的函数
+        """
+        source = os.path.abspath(source)
+        path = self.path_for(source, store_version)
+        entry = self._memory.get(source)
+        if entry is not None and entry[0] == path:
+            return entry[1]
+
+        with self._lock:
+            entry = self._memory.get(source)
+            if entry is not None and entry[0] == path:
+                return entry[1]
+            matrix = self._load(path)
+            if matrix is None:
+                matrix = materialize(load_cases())
+                self._save(path, matrix)
+                logger.info('特征矩阵已物化: %d 个样本', len(matrix))
+            self._memory[source] = (path, matrix)
+            return matrix
+
+    def _load(self, path: str) -> Optional[FeatureMatrix]:
+        try:
+            with np.load(path) as data:
+                return FeatureMatrix(
+                    features=np.ascontiguousarray(data['features']),
+                    architecture=np.ascontiguousarray(data['architecture']),
+                    counts=np.ascontiguousarray(data['counts'])
+                )
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning('特征缓存损坏，重新物化: %s', e)
+            return None
+
+    def _save(self, path: str, matrix: FeatureMatrix):
+        try:
+            # 缓存可以重新物化，不必等待落盘
+            with atomic_open(path, suffix='.npz', fsync=False) as f:
+                np.savez(f, features=matrix.features, architecture=matrix.architecture, counts=matrix.counts)
+        except OSError as e:
+            logger.warning('特征缓存写入失败: %s', e)
+            return
+
+        # 同一数据集的旧版本缓存不再需要
+        prefix = os.path.basename(path).split('_', 1)[0] + '_'
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefix) and name.endswith('.npz') and name != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+
+_feature_cache = None
+_feature_cache_lock = threading.Lock()
+
+
+def get_feature_cache() -> FeatureCache:
+    global _feature_cache
+    if _feature_cache is None:
+        with _feature_cache_lock:
+            if _feature_cache is None:
+                _feature_cache = FeatureCache()
+    return _feature_cache
+
+
+def load_feature_matrix(data_file: str) -> FeatureMatrix:
+    """训练数据文件对应的物化特征（案例日志版本作为案例库版本）"""
+    from case_log import get_case_log
+
+    case_log = get_case_log(data_file)
+    if os.environ.get('FEATURE_CACHE_DISABLED'):
+        return materialize(case_log.load_all())
+    return get_feature_cache().get(data_file, case_log.version(), case_log.load_all)
+
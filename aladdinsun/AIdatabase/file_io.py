@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+文件原子写入与进程间文件锁
+
+- atomic_open / atomic_write：先写同目录下的临时文件，flush + fsync 后 os.replace 到目标路径，
+  读者只会看到旧文件或完整的新文件；失败时删除临时文件。可重新生成的缓存（特征缓存、
+  singleflight 共享结果）传 fsync=False，省去落盘等待
+- file_lock：fcntl.flock 进程间锁；没有 fcntl 的平台（Windows）上退化为不加锁，
+  调用方自己的线程锁仍然有效
+
+用法:
+    with atomic_open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+    with file_lock(path + '.lock'):
+        ...
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+
+@contextmanager
+def atomic_open(path: str, mode: str = 'wb', suffix: str = '', encoding=None, fsync: bool = True):
+    """返回写入临时文件的句柄，with 块正常结束后替换目标文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write(path: str, data: bytes, fsync: bool = True):
+    with atomic_open(path, 'wb', fsync=fsync) as f:
+        f.write(data)
+
+
+@contextmanager
+def file_lock(path: str, shared: bool = False):
+    """在 path 上加进程间锁（shared=True 为共享锁），退出时释放"""
+    if not FCNTL_AVAILABLE:
+        yield
+        return
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+并行超参数搜索
+
+隐藏层宽度、Dropout、学习率、权重衰减、批次大小原来都是写死的。这里:
+
+- 随机搜索：从搜索空间中抽样 n_trials 组超参数
+- 逐次减半(successive halving)：所有组合先训练 min_epochs 轮，按验证损失只保留前 1/eta
+  继续训练（从上一轮的权重接着训练），轮数乘以 eta，直到 max_epochs；
+  halving=False 时每组都直接训练 max_epochs 轮
+- 各组试验在进程池中并行运行，每个进程固定使用 threads_per_trial 个线程（并尽量绑定到
+  不重叠的 CPU 核），进程数 = 可用核数 // threads_per_trial，不会超额订阅
+- 所有试验使用同一个训练/验证划分，按验证损失（其次验证准确率）选出最佳组合
+- 试验记录写入模型注册表目录下的 search/<search_id>/（trials.jsonl、summary.json），
+  最佳模型注册为新版本（source=search），默认作为候选版本做影子评估
+
+用法:
+    summary = search('training_data.json', SearchConfig(n_trials=27, max_epochs=81))
+    python hyperparameter_search.py training_data.json --trials 27 --max-epochs 81
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from case_log import get_case_log
+from feature_pipeline import load_feature_matrix
+from model_registry import get_model_registry
+from tracing import get_logger
+from worker_pool import InlineExecutor, available_cpus
+
+logger = get_logger(__name__)
+
+# 每个试验进程的线程数
+SEARCH_THREADS_PER_TRIAL = int(os.environ.get('SEARCH_THREADS_PER_TRIAL', 1))
+
+# 搜索空间：名称 -> (分布, 参数)
+DEFAULT_SPACE: Dict[str, Tuple[str, tuple]] = {
+    'hidden_dim': ('choice', (64, 128, 256, 512)),
+    'dropout': ('uniform', (0.0, 0.5)),
+    'learning_rate': ('loguniform', (1e-4, 1e-2)),
+    'weight_decay': ('loguniform', (1e-6, 1e-3)),
+    'batch_size': ('choice', (16, 32, 64, 128)),
+}
+
+
+@dataclass
+class SearchConfig:
+    """搜索参数"""
+    n_trials: int = 16
+    min_epochs: int = 5
+    max_epochs: int = 100
+    eta: int = 3                    # 每一轮保留 1/eta，轮数乘以 eta
+    halving: bool = True            # False 时为纯随机搜索
+    threads_per_trial: int = SEARCH_THREADS_PER_TRIAL
+    max_workers: Optional[int] = None   # 默认 可用核数 // threads_per_trial；1 表示在当前进程内顺序运行
+    val_split: float = 0.2
+    patience: int = 10
+    seed: Optional[int] = None
+
+
+def sample_params(space: Dict[str, Tuple[str, tuple]], rng: random.Random) -> Dict[str, Any]:
+    """从搜索空间抽样一组超参数"""
+    params = {}
+    for name, (kind, args) in space.items():
+        if kind == 'choice':
+            params[name] = rng.choice(args)
+        elif kind == 'uniform':
+            params[name] = rng.uniform(*args)
+        elif kind == 'loguniform':
+            low, high = args
+            params[name] = math.exp(rng.uniform(math.log(low), math.log(high)))
+        else:
+            raise ValueError(f'未知的分布类型: {kind}')
+    return params
+
+
+def rung_budgets(min_epochs: int, max_epochs: int, eta: int) -> List[int]:
+    """逐次减半每一轮结束时的累计训练轮数，如 (5, 100, 3) -> [5, 15, 45, 100]"""
+    budgets = []
+    budget = max(1, min_epochs)
+    while budget < max_epochs:
+        budgets.append(budget)
+        budget *= eta
+    budgets.append(max_epochs)
+    return budgets
+
+
+# ==================== 试验进程 ====================
+
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(data_file: str, val_split: float, split_seed: int, threads: int,
+                 slot_counter=None, cpus: Optional[List[int]] = None):
+    """进程池初始化：固定线程数、绑定 CPU、加载一次物化特征并做统一的训练/验证划分"""
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['MKL_NUM_THREADS'] = str(threads)
+    if slot_counter is not None and cpus and hasattr(os, 'sched_setaffinity'):
+        with slot_counter.get_lock():
+            slot = slot_counter.value
+            slot_counter.value += 1
+        start = (slot * threads) % len(cpus)
+        os.sched_setaffinity(0, {cpus[(start + i) % len(cpus)] for i in range(threads)})
+
+    import torch
+    from batched_training import split_indices
+
+    torch.set_num_threads(threads)
+    matrix = load_feature_matrix(data_file)
+    generator = torch.Generator()
+    generator.manual_seed(split_seed)
+    train_idx, val_idx = split_indices(len(matrix), val_split, generator)
+    _worker['train'] = matrix.take(train_idx)
+    _worker['val'] = matrix.take(val_idx)
+
+
+def _run_trial(trial_id: int, params: Dict[str, Any], epochs: int, checkpoint: str,
+               patience: int, seed: Optional[int]) -> Dict[str, Any]:
+    """训练一组超参数 epochs 轮（存在检查点时接着训练），返回验证指标"""
+    import torch
+    from batched_training import TrainConfig, fit
+    from torch_model import TDSQLArchitecturePredictor
+
+    started = time.perf_counter()
+    model = TDSQLArchitecturePredictor(hidden_dim=params['hidden_dim'], dropout=params['dropout'])
+    if os.path.exists(checkpoint):
+        model.load_state_dict(torch.load(checkpoint))
+
+    config = TrainConfig(epochs=epochs, batch_size=params['batch_size'], learning_rate=params['learning_rate'],
+                         weight_decay=params['weight_decay'], patience=patience, num_threads=0, seed=seed,
+                         log_every=max(epochs, 1))
+    result = fit(model, _worker['train'], config, val_matrix=_worker['val'])
+    torch.save(model.state_dict(), checkpoint)
+
+    return {
+        'trial_id': trial_id,
+        'params': params,
+        'epochs': epochs,
+        'val_loss': result.best_loss,
+        'val_accuracy': result.val_accuracy,
+        'samples_per_sec': result.samples_per_sec,
+        'seconds': time.perf_counter() - started,
+        'pid': os.getpid()
+    }
+
+
+def _rank_key(result: Dict[str, Any]):
+    return (result['val_loss'], -(result['val_accuracy'] or 0.0))
+
+
+# ==================== 搜索驱动 ====================
+
+def search(data_file: str, config: Optional[SearchConfig] = None,
+           space: Optional[Dict[str, Tuple[str, tuple]]] = None, registry=None,
+           register_best: bool = True, promote: bool = False) -> Dict[str, Any]:
+    """
+    运行一次超参数搜索
+
+    Args:
+        data_file: 训练数据文件（案例日志快照）
+        registry: 模型注册表，默认 get_model_registry()
+        register_best: 把最佳模型注册为新版本
+        promote: 最佳模型直接上线；否则设为候选版本
+
+    Returns:
+        搜索摘要（最佳超参数、各轮结果、注册的版本号等）
+    """
+    config = config or SearchConfig()
+    space = space or DEFAULT_SPACE
+    registry = registry or get_model_registry()
+    seed = config.seed if config.seed is not None else int(time.time())
+    rng = random.Random(seed)
+
+    matrix = load_feature_matrix(data_file)
+    if len(matrix) < 10:
+        raise ValueError(f'训练数据不足（当前: {len(matrix)}，建议: ≥10）')
+
+    search_id = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    search_dir = os.path.join(registry.root, 'search', search_id)
+    os.makedirs(search_dir, exist_ok=True)
+
+    threads = max(1, config.threads_per_trial)
+    cpus = available_cpus()
+    workers = config.max_workers or max(1, len(cpus) // threads)
+    budgets = rung_budgets(config.min_epochs, config.max_epochs, config.eta) if config.halving \
+        else [config.max_epochs]
+
+    trials = [{'trial_id': i, 'params': sample_params(space, rng)} for i in range(config.n_trials)]
+    checkpoints = {t['trial_id']: os.path.join(search_dir, f"trial_{t['trial_id']:03d}.pt") for t in trials}
+    logger.info('超参数搜索 %s: %d 组, 轮次 %s, %d 个进程 x %d 线程',
+                search_id, len(trials), budgets, workers, threads)
+
+    init_args = (data_file, config.val_split, seed, threads)
+    if workers > 1:
+        ctx = multiprocessing.get_context('spawn')
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                       initargs=init_args + (ctx.Value('i', 0), cpus))
+    else:
+        _init_worker(*init_args)
+        executor = InlineExecutor()
+
+    started = time.perf_counter()
+    rungs = []
+    survivors = trials
+    previous = 0
+    try:
+        with open(os.path.join(search_dir, 'trials.jsonl'), 'a', encoding='utf-8') as log:
+            for rung, budget in enumerate(budgets):
+                futures = [executor.submit(_run_trial, t['trial_id'], t['params'], budget - previous,
+                                           checkpoints[t['trial_id']], config.patience, seed + t['trial_id'])
+                           for t in survivors]
+                results = []
+                for future in as_completed(futures):
+                    result = future.result()
+                    result.update(rung=rung, total_epochs=budget)
+                    results.append(result)
+                    log.write(json.dumps(result, ensure_ascii=False) + '\n')
+                    log.flush()
+                results.sort(key=_rank_key)
+                rungs.append({'rung': rung, 'epochs': budget, 'results': results})
+                logger.info('第 %d 轮 (%d epochs): 最佳验证损失 %.4f (trial %d)',
+                            rung, budget, results[0]['val_loss'], results[0]['trial_id'])
+
+                if rung < len(budgets) - 1:
+                    keep = max(1, len(results) // config.eta)
+                    survivors = [{'trial_id': r['trial_id'], 'params': r['params']} for r in results[:keep]]
+                previous = budget
+    finally:
+        executor.shutdown(wait=True)
+
+    best = rungs[-1]['results'][0]
+    best_checkpoint = checkpoints[best['trial_id']]
+    for path in checkpoints.values():
+        if path != best_checkpoint and os.path.exists(path):
+            os.unlink(path)
+
+    summary = {
+        'search_id': search_id,
+        'data_file': data_file,
+        'config': asdict(config),
+        'seed': seed,
+        'workers': workers,
+        'threads_per_trial': threads,
+        'seconds': time.perf_counter() - started,
+        'best': best,
+        'rungs': rungs,
+        'model_version': None
+    }
+
+    if register_best:
+        summary['model_version'] = _register_best(registry, data_file, best, best_checkpoint, promote)
+
+    with open(os.path.join(search_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    logger.info('超参数搜索完成: 最佳 %s, 验证损失 %.4f', best['params'], best['val_loss'])
+    return summary
+
+
+def _register_best(registry, data_file: str, best: Dict[str, Any], checkpoint: str, promote: bool) -> str:
+    import torch
+    from torch_model import TDSQLArchitecturePredictor
+
+    model = TDSQLArchitecturePredictor(hidden_dim=best['params']['hidden_dim'], dropout=best['params']['dropout'])
+    model.load_state_dict(torch.load(checkpoint))
+    model.eval()
+    meta = registry.register(
+        model,
+        metrics={'val_loss': best['val_loss'], 'val_accuracy': best['val_accuracy']},
+        dataset_version=get_case_log(data_file).version(),
+        config=dict(best['params'], epochs=best['total_epochs']),
+        source='search',
+        promote=promote
+    )
+    if not promote:
+        registry.set_candidate(meta['version'])
+    return meta['version']
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='TDSQL 架构预测模型的并行超参数搜索')
+    parser.add_argument('data_file', nargs='?', default='training_data.json', help='训练数据文件')
+    parser.add_argument('--trials', type=int, default=16, help='超参数组数')
+    parser.add_argument('--min-epochs', type=int, default=5)
+    parser.add_argument('--max-epochs', type=int, default=100)
+    parser.add_argument('--eta', type=int, default=3, help='每轮保留 1/eta')
+    parser.add_argument('--random', action='store_true', help='纯随机搜索（不做逐次减半）')
+    parser.add_argument('--threads', type=int, default=SEARCH_THREADS_PER_TRIAL, help='每个试验的线程数')
+    parser.add_argument('--workers', type=int, help='并行进程数')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--promote', action='store_true', help='最佳模型直接上线（默认作为候选版本）')
+    args = parser.parse_args(argv)
+
+    config = SearchConfig(n_trials=args.trials, min_epochs=args.min_epochs, max_epochs=args.max_epochs,
+                          eta=args.eta, halving=not args.random, threads_per_trial=args.threads,
+                          max_workers=args.workers, seed=args.seed)
+    try:
+        summary = search(args.data_file, config, promote=args.promote)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    best = summary['best']
+    print(f"✅ 搜索完成: {len(summary['rungs'][0]['results'])} 组, {summary['workers']} 个进程 x "
+          f"{summary['threads_per_trial']} 线程, 耗时 {summary['seconds']:.1f}s")
+    print(f"🏆 最佳: {json.dumps(best['params'], ensure_ascii=False)}")
+    print(f"   验证损失 {best['val_loss']:.4f}, 验证准确率 {(best['val_accuracy'] or 0) * 100:.1f}%")
+    if summary['model_version']:
+        print(f"💾 已注册模型版本: {summary['model_version']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
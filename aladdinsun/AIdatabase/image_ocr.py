@@ -7,6 +7,10 @@ import re
 from typing import Dict, Any, Optional
 import json
 
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
 try:
     from PIL import Image
     import pytesseract
@@ -31,6 +35,9 @@ except ImportError:
     CV2_AVAILABLE = False
     print("⚠️  OpenCV 未安装，高级图像处理功能受限")
 
+# 识别逻辑变更时递增，使解析缓存中的旧结果失效
+RECOGNIZER_VERSION = '1.1'
+
 
 class ImageTableRecognizer:
     """图像表格识别器"""
@@ -59,10 +66,17 @@ class ImageTableRecognizer:
         }
     
     def recognize_image(self, image_path: str) -> Dict[str, Any]:
-        """识别图像中的表格数据"""
+        """识别图像中的表格数据（相同内容的图片直接返回缓存结果）"""
         if not PIL_AVAILABLE:
             return self._mock_recognition()
         
+        from parse_cache import cached_parse
+        
+        return cached_parse(image_path, 'image_ocr', RECOGNIZER_VERSION, self._recognize_image_uncached,
+                            lambda result: not result.get('_is_mock'))
+    
+    def _recognize_image_uncached(self, image_path: str) -> Dict[str, Any]:
+        """OCR识别图像（不经过缓存）"""
         try:
             # 读取图像
             image = Image.open(image_path)
@@ -80,7 +94,7 @@ class ImageTableRecognizer:
             return extracted_data
         
         except Exception as e:
-            print(f"图像识别错误: {str(e)}")
+            logger.warning('图像识别错误: %s', e)
             return self._mock_recognition()
     
     def recognize_excel(self, excel_path: str) -> Dict[str, Any]:
@@ -98,28 +112,14 @@ class ImageTableRecognizer:
             return extracted_data
         
         except Exception as e:
-            print(f"Excel识别错误: {str(e)}")
+            logger.warning('Excel识别错误: %s', e)
             return self._mock_recognition()
     
     def _preprocess_image(self, image: Image.Image) -> Image.Image:
-        """预处理图像以提高OCR准确率"""
-        # 转换为OpenCV格式
-        img_array = np.array(image)
-        
-        # 转灰度
-        if len(img_array.shape) == 3:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = img_array
-        
-        # 二值化
-        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        # 去噪
-        denoised = cv2.fastNlMeansDenoising(binary)
+        """预处理图像以提高OCR准确率（按噪声估计自动选择流水线）"""
+        from image_preprocessing import preprocess_image
         
-        # 转回PIL格式
-        return Image.fromarray(denoised)
+        return preprocess_image(image)[0]
     
     def _extract_data_from_text(self, text: str) -> Dict[str, Any]:
         """从OCR文本中提取结构化数据"""
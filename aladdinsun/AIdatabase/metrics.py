@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+进程内指标采集与 Prometheus 文本格式输出
+
+热路径只竞争很小的锁：每个指标固定 METRICS_STRIPES 个分片，线程按 ID 取模写入其中一个，
+不同线程大多落在不同分片上；/metrics 抓取时把所有分片相加。分片数固定，不随线程数增长。
+状态类指标（缓存命中率、OCR队列深度等）在抓取时由回调函数计算，不占用请求路径。
+
+用法:
+    from metrics import install_flask_metrics
+    install_flask_metrics(app)        # 注册请求钩子和 /metrics 路由
+
+    from metrics import PREDICTOR_STAGE_SECONDS
+    with PREDICTOR_STAGE_SECONDS.time(predictor='xinchuan', stage='design'):
+        ...
+"""
+
+import os
+import math
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 默认延迟分桶（秒）
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 请求/响应体大小分桶（字节）
+DEFAULT_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 每个指标的分片数（与线程数无关，开发服务器每个请求一个新线程也不会增长）
+METRICS_STRIPES = int(os.environ.get('METRICS_STRIPES', (os.cpu_count() or 1) * 4))
+
+# 线程号（Linux 上为连续分配的内核线程ID，取模后分布均匀）
+_thread_id = getattr(threading, 'get_native_id', threading.get_ident)
+
+
+class _ShardSet:
+    """按线程条带化的数值存储：固定数量的分片，线程按 ID 取模选择分片，每个分片一把小锁"""
+
+    def __init__(self, stripes: int = METRICS_STRIPES):
+        self._stripes = [(threading.Lock(), {}) for _ in range(max(1, stripes))]
+
+    @contextmanager
+    def shard(self):
+        """持有当前线程所在分片的锁并返回其数据"""
+        lock, data = self._stripes[_thread_id() % len(self._stripes)]
+        with lock:
+            yield data
+
+    def snapshot(self) -> Iterable[dict]:
+        """所有分片的快照（逐个分片加锁复制）"""
+        copies = []
+        for lock, data in self._stripes:
+            with lock:
+                copies.append({key: list(value) if isinstance(value, list) else value
+                               for key, value in data.items()})
+        return copies
+
+
+def _merge_into(target: dict, source: dict):
+    for key, value in source.items():
+        if isinstance(value, list):
+            current = target.get(key)
+            if current is None:
+                target[key] = list(value)
+            else:
+                for i, v in enumerate(value):
+                    current[i] += v
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+def _label_key(labelnames: Sequence[str], labels: Dict[str, str]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(labelnames, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        (registry or REGISTRY).register(self)
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+
+
+class Counter(_Metric):
+    """只增计数器"""
+    type_name = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._shards = _ShardSet()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._shards.shard() as shard:
+            shard[key] = shard.get(key, 0) + amount
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        total: dict = {}
+        for data in self._shards.snapshot():
+            _merge_into(total, data)
+        return total
+
+    def collect(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self.values().items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Gauge(Counter):
+    """可增可减的计量（增减写入线程所在分片，抓取时相加）"""
+    type_name = 'gauge'
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(1, **labels)
+        try:
+            yield
+        finally:
+            self.dec(1, **labels)
+
+
+class CallbackGauge(_Metric):
+    """抓取时由回调函数计算的计量，回调返回 {标签值元组: 数值}"""
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Dict[Tuple[str, ...], float]],
+                 labelnames: Sequence[str] = (), registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.callback = callback
+
+    def collect(self) -> List[str]:
+        lines = self.header()
+        try:
+            values = self.callback() or {}
+        except Exception:
+            values = {}
+        for key, value in sorted(values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        self._shards = _ShardSet()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._shards.shard() as shard:
+            counts = shard.get(key)
+            if counts is None:
+                # [各桶计数..., +Inf桶, 总和]
+                counts = [0] * (len(self.buckets) + 2)
+                shard[key] = counts
+            counts[bucket] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def values(self) -> Dict[Tuple[str, ...], List[float]]:
+        total: dict = {}
+        for data in self._shards.snapshot():
+            _merge_into(total, data)
+        return total
+
+    def collect(self) -> List[str]:
+        lines = self.header()
+        for key, counts in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts[:-1]):
+                cumulative += count
+                le = ('le', _format_value(float(bound)))
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(float(counts[-1]))}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'指标重复注册: {metric.name}')
+            self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def exposition(self) -> str:
+        """Prometheus 文本格式"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+# ==================== 内置指标 ====================
+
+HTTP_REQUESTS = Counter(
+    'http_requests_total', '按路由统计的HTTP请求数', ('app', 'method', 'route', 'status'))
+HTTP_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP请求处理耗时', ('app', 'method', 'route'))
+HTTP_IN_FLIGHT = Gauge(
+    'http_requests_in_flight', '正在处理的HTTP请求数', ('app', 'route'))
+HTTP_REQUEST_SIZE = Histogram(
+    'http_request_size_bytes', 'HTTP请求体大小', ('app', 'route'), buckets=DEFAULT_SIZE_BUCKETS)
+HTTP_RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes', 'HTTP响应体大小（流式响应不计）', ('app', 'route'), buckets=DEFAULT_SIZE_BUCKETS)
+
+PREDICTOR_STAGE_SECONDS = Histogram(
+    'predictor_stage_duration_seconds', '预测器各阶段耗时', ('predictor', 'stage'))
+
+OCR_QUEUE_DEPTH = Gauge(
+    'ocr_queue_depth', '已提交但尚未识别完成的OCR单元格批次数')
+
+
+def _parse_cache_stats() -> Dict[Tuple[str, ...], float]:
+    from parse_cache import current_parse_cache
+
+    cache = current_parse_cache()
+    if cache is None:
+        return {}
+    stats = cache.get_stats()
+    return {
+        ('hits',): stats['hits'],
+        ('misses',): stats['misses'],
+        ('evictions',): stats['evictions'],
+        ('entries',): stats['entries'],
+        ('size_bytes',): stats['size_bytes'],
+        ('hit_rate',): stats['hit_rate'],
+    }
+
+
+CallbackGauge('parse_cache', '解析缓存状态（hits/misses/evictions 为进程启动以来的累计值）',
+              _parse_cache_stats, ('stat',))
+
+
+# ==================== Flask 集成 ====================
+
+def _route_label(request) -> str:
+    """用路由规则（而非实际路径）做标签，避免 /api/model_libraries/<id> 这类路径导致标签爆炸"""
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def install_flask_metrics(app, app_name: Optional[str] = None, endpoint: str = '/metrics'):
+    """为Flask应用注册请求计时钩子和 /metrics 路由"""
+    from flask import Response, g, request
+
+    app_name = app_name or app.import_name
+
+    @app.before_request
+    def _metrics_start():
+        route = _route_label(request)
+        g._metrics_start = time.perf_counter()
+        g._metrics_route = route
+        HTTP_IN_FLIGHT.inc(app=app_name, route=route)
+        if request.content_length:
+            HTTP_REQUEST_SIZE.observe(request.content_length, app=app_name, route=route)
+
+    @app.after_request
+    def _metrics_record(response):
+        route = getattr(g, '_metrics_route', None)
+        if route is None:
+            return response
+        HTTP_REQUESTS.inc(app=app_name, method=request.method, route=route, status=response.status_code)
+        HTTP_LATENCY.observe(time.perf_counter() - g._metrics_start, app=app_name, method=request.method, route=route)
+        if not response.is_streamed and response.content_length is not None:
+            HTTP_RESPONSE_SIZE.observe(response.content_length, app=app_name, route=route)
+        return response
+
+    @app.teardown_request
+    def _metrics_finish(exc):
+        route = getattr(g, '_metrics_route', None)
+        if route is not None:
+            HTTP_IN_FLIGHT.dec(app=app_name, route=route)
+
+    def metrics_endpoint():
+        return Response(REGISTRY.exposition(), content_type=CONTENT_TYPE)
+
+    app.add_url_rule(endpoint, 'metrics', metrics_endpoint)
+    return app
@@ -210,6 +210,21 @@ class ModelLibraryManager:
         
         return libraries
     
+    def libraries_version(self) -> tuple:
+        """
+        模型库列表的版本标记：下载、删除或修改模型库文件后会变化
+        只读取目录和文件的修改时间，不加载内容
+        """
+        stamps = []
+        for directory in (self.libraries_dir, self.custom_builder.custom_libraries_dir):
+            try:
+                stamps.append(os.stat(directory).st_mtime_ns)
+                stamps.extend(sorted((entry.name, entry.stat().st_mtime_ns)
+                                     for entry in os.scandir(directory) if entry.is_file()))
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
+
     def list_installed_libraries(self) -> List[Dict]:
         """列出所有已安装的预置模型库"""
         installed: List[Dict] = []
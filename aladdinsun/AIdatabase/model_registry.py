@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+"""
+模型注册表 - 带版本和元数据的模型检查点，以及在线服务的原子切换和影子评估
+
+目录结构（MODEL_REGISTRY_DIR，默认 models/）:
+    models/
+      registry.json          当前服务版本 current 和候选版本 candidate
+      v0001/
+        weights.npz          NumPy 推理引擎使用的权重（numpy_inference.export_weights）
+        state.pth            PyTorch state_dict（可继续训练）
+        meta.json            数据集版本、训练指标、训练配置、特征 schema 等
+      v0002/ ...
+
+- 每次训练注册一个新版本（先写临时目录再 rename，读者看不到半个版本），旧版本按
+  MODEL_REGISTRY_KEEP 清理（不会删除 current / candidate）
+- 版本目录写好后不再修改，推理进程对每个版本只从磁盘加载一次
+- ServingModel 由后台线程监视 registry.json，新版本在后台加载完成后一次性替换引用，
+  请求线程只读取已加载的版本，不会等待磁盘加载
+- 设置了 candidate 时，按 SHADOW_SAMPLE_RATE 抽样把线上请求交给后台线程用候选版本
+  再预测一次，统计与当前版本的一致率和数量差异（影子评估，不影响返回结果）
+
+用法:
+    registry = get_model_registry()
+    meta = registry.register(model, metrics=..., dataset_version=..., promote=False)
+    registry.set_candidate(meta['version'])   # 影子评估
+    registry.promote(meta['version'])         # 切换线上版本
+"""
+
+import os
+import json
+import queue
+import random
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from feature_pipeline import FEATURE_DIM, FEATURE_SCHEMA_VERSION
+from file_io import atomic_open, file_lock
+from metrics import CallbackGauge, Counter
+from model import MODEL_WEIGHTS_FILE
+from numpy_inference import WEIGHTS_FORMAT_VERSION, NumpyArchitecturePredictor, export_weights
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+MODEL_REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR', 'models')
+
+# 保留最近多少个版本（current / candidate 总是保留）
+MODEL_REGISTRY_KEEP = int(os.environ.get('MODEL_REGISTRY_KEEP', 10))
+
+# 推理进程检查 registry.json 变化的间隔（秒），0 表示只在调用 refresh() 时检查
+MODEL_REGISTRY_POLL_S = float(os.environ.get('MODEL_REGISTRY_POLL_S', 5.0))
+
+# 影子评估抽样比例和待评估队列上限
+SHADOW_SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE', 1.0))
+SHADOW_QUEUE_SIZE = 1000
+
+POINTER_FILE = 'registry.json'
+WEIGHTS_NAME = 'weights.npz'
+STATE_NAME = 'state.pth'
+META_NAME = 'meta.json'
+
+MODEL_SWAPS = Counter(
+    'model_swaps_total', '推理进程切换模型版本次数（loaded=已切换, failed=加载失败继续用旧版本）', ('role', 'outcome'))
+SHADOW_PREDICTIONS = Counter(
+    'model_shadow_predictions_total', '影子评估的请求数（agree/disagree=架构类型是否与线上版本一致, dropped=队列满丢弃）',
+    ('outcome',))
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    with atomic_open(path, 'w', suffix='.json', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def _version_number(name: str) -> Optional[int]:
+    if name.startswith('v') and name[1:].isdigit():
+        return int(name[1:])
+    return None
+
+
+class ModelRegistry:
+    """磁盘上的版本化模型检查点"""
+
+    def __init__(self, root: str = MODEL_REGISTRY_DIR, keep: int = MODEL_REGISTRY_KEEP):
+        self.root = root
+        self.keep = keep
+        self._thread_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @contextmanager
+    def _lock(self):
+        """注册/切换在进程内外串行执行"""
+        with self._thread_lock, file_lock(os.path.join(self.root, '.lock')):
+            yield
+
+    # ==================== 版本 ====================
+
+    def versions(self) -> List[str]:
+        """已注册的版本，从旧到新"""
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        numbered = sorted((_version_number(name), name) for name in names if _version_number(name) is not None)
+        return [name for _, name in numbered]
+
+    def path_for(self, version: str) -> str:
+        if _version_number(version) is None:
+            raise ValueError(f'无效的模型版本: {version}')
+        return os.path.join(self.root, version)
+
+    def weights_path(self, version: str) -> str:
+        return os.path.join(self.path_for(version), WEIGHTS_NAME)
+
+    def get(self, version: str) -> Optional[Dict[str, Any]]:
+        """版本元数据，不存在时返回 None"""
+        try:
+            with open(os.path.join(self.path_for(version), META_NAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list_versions(self) -> List[Dict[str, Any]]:
+        """全部版本的元数据（从新到旧），标出 current / candidate"""
+        pointer = self.pointer()
+        result = []
+        for version in reversed(self.versions()):
+            meta = self.get(version)
+            if meta is None:
+                continue
+            meta['current'] = version == pointer.get('current')
+            meta['candidate'] = version == pointer.get('candidate')
+            result.append(meta)
+        return result
+
+    def register(self, model, metrics: Optional[Dict[str, Any]] = None, dataset_version: Optional[str] = None,
+                 config: Optional[Dict[str, Any]] = None, source: str = 'train',
+                 promote: bool = False) -> Dict[str, Any]:
+        """
+        注册一个新版本
+
+        Args:
+            model: PyTorch 模型（TDSQLArchitecturePredictor）
+            metrics: 训练/验证指标
+            dataset_version: 训练所用案例库的版本（CaseLog.version()）
+            config: 训练配置
+            source: train / online / search 等来源
+            promote: 注册后直接设为线上版本
+
+        Returns:
+            版本元数据
+        """
+        import torch
+
+        with self._lock():
+            existing = [_version_number(v) for v in self.versions()]
+            version = f'v{max(existing, default=0) + 1:04d}'
+            meta = {
+                'version': version,
+                'created_at': datetime.now().isoformat(),
+                'source': source,
+                'dataset_version': dataset_version,
+                'metrics': metrics or {},
+                'config': config or {},
+                'feature_schema': {'version': FEATURE_SCHEMA_VERSION, 'dim': FEATURE_DIM},
+                'weights_format': WEIGHTS_FORMAT_VERSION
+            }
+
+            staging = tempfile.mkdtemp(prefix='.tmp_', dir=self.root)
+            try:
+                export_weights(model, os.path.join(staging, WEIGHTS_NAME))
+                torch.save(model.state_dict(), os.path.join(staging, STATE_NAME))
+                _write_json(os.path.join(staging, META_NAME), meta)
+                os.rename(staging, self.path_for(version))
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+
+            if promote:
+                self._update_pointer(current=version)
+            self._prune()
+
+        logger.info('模型版本已注册: %s (source=%s, promote=%s)', version, source, promote)
+        return meta
+
+    def _prune(self):
+        pointer = self.pointer()
+        protected = {pointer.get('current'), pointer.get('candidate')}
+        versions = self.versions()
+        for version in versions[:max(len(versions) - self.keep, 0)]:
+            if version not in protected:
+                shutil.rmtree(self.path_for(version), ignore_errors=True)
+                logger.info('已清理旧模型版本: %s', version)
+
+    # ==================== 线上版本 / 候选版本 ====================
+
+    def pointer(self) -> Dict[str, Optional[str]]:
+        try:
+            with open(os.path.join(self.root, POINTER_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def pointer_stamp(self):
+        """registry.json 的变化标记，推理进程据此判断是否需要切换"""
+        try:
+            st = os.stat(os.path.join(self.root, POINTER_FILE))
+            return (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _update_pointer(self, **changes):
+        pointer = self.pointer()
+        pointer.update(changes)
+        pointer['updated_at'] = datetime.now().isoformat()
+        _write_json(os.path.join(self.root, POINTER_FILE), pointer)
+
+    def current_version(self) -> Optional[str]:
+        return self.pointer().get('current')
+
+    def candidate_version(self) -> Optional[str]:
+        return self.pointer().get('candidate')
+
+    def promote(self, version: str):
+        """把某个版本设为线上版本（候选版本被提升时同时清除候选）"""
+        with self._lock():
+            if self.get(version) is None:
+                raise ValueError(f'模型版本不存在: {version}')
+            changes = {'current': version}
+            if self.pointer().get('candidate') == version:
+                changes['candidate'] = None
+            self._update_pointer(**changes)
+        logger.info('线上模型版本切换为: %s', version)
+
+    def set_candidate(self, version: Optional[str]):
+        """设置影子评估的候选版本，None 表示停止影子评估"""
+        with self._lock():
+            if version is not None and self.get(version) is None:
+                raise ValueError(f'模型版本不存在: {version}')
+            self._update_pointer(candidate=version)
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """已加载到内存的一个版本（替换时整体替换引用）"""
+    version: Optional[str]
+    predictor: NumpyArchitecturePredictor
+
+
+class ShadowStats:
+    """候选版本相对线上版本的影子评估统计"""
+
+    def __init__(self, version: str, against: Optional[str]):
+        self.version = version
+        self.against = against
+        self.started_at = datetime.now().isoformat()
+        self.predictions = 0
+        self.architecture_agree = 0
+        self.abs_diff = {'node_count': 0.0, 'shard_count': 0.0, 'replica_count': 0.0}
+        self.confidence = {'current': 0.0, 'candidate': 0.0}
+
+    def record(self, primary: Dict[str, Any], candidate: Dict[str, Any]) -> bool:
+        agree = primary['architecture_type'] == candidate['architecture_type']
+        self.predictions += 1
+        self.architecture_agree += agree
+        for key in self.abs_diff:
+            self.abs_diff[key] += abs(primary[key] - candidate[key])
+        self.confidence['current'] += primary.get('confidence', 0.0)
+        self.confidence['candidate'] += candidate.get('confidence', 0.0)
+        return agree
+
+    def report(self) -> Dict[str, Any]:
+        n = max(self.predictions, 1)
+        return {
+            'candidate': self.version,
+            'current': self.against,
+            'started_at': self.started_at,
+            'predictions': self.predictions,
+            'architecture_agreement': self.architecture_agree / n,
+            'mean_abs_diff': {key: value / n for key, value in self.abs_diff.items()},
+            'mean_confidence': {key: value / n for key, value in self.confidence.items()}
+        }
+
+
+class ServingModel:
+    """
+    在线服务用的预测器，接口与 NumpyArchitecturePredictor 相同
+
+    请求线程只读取 self._active / self._candidate 引用；版本加载都在后台线程
+    （或显式调用 refresh() 的线程）里完成后再替换引用。
+    注册表中还没有任何版本时使用 MODEL_WEIGHTS_FILE（启动时加载一次），文件也不存在时按规则预测。
+    """
+
+    def __init__(self, registry: ModelRegistry, poll_interval: float = MODEL_REGISTRY_POLL_S,
+                 shadow_sample_rate: float = SHADOW_SAMPLE_RATE, fallback_weights_file: str = MODEL_WEIGHTS_FILE):
+        self.registry = registry
+        self.poll_interval = poll_interval
+        self.shadow_sample_rate = shadow_sample_rate
+        self.fallback_weights_file = fallback_weights_file
+
+        self._active = LoadedModel(None, NumpyArchitecturePredictor(fallback_weights_file, watch=False))
+        self._candidate: Optional[LoadedModel] = None
+        self._shadow: Optional[ShadowStats] = None
+        self._stamp = object()
+        self._refresh_lock = threading.Lock()
+        self._shadow_queue: 'queue.Queue' = queue.Queue(maxsize=SHADOW_QUEUE_SIZE)
+        self._shadow_lock = threading.Lock()
+        self._shadow_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self.refresh()
+        self._watcher = None
+        if poll_interval > 0:
+            self._watcher = threading.Thread(target=self._watch, name='model-registry-watcher', daemon=True)
+            self._watcher.start()
+
+    # ==================== 版本切换 ====================
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._active.version
+
+    @property
+    def loaded(self) -> bool:
+        return self._active.predictor.loaded
+
+    def _load(self, version: str, role: str) -> Optional[LoadedModel]:
+        meta = self.registry.get(version)
+        schema = (meta or {}).get('feature_schema', {})
+        if meta is None or schema.get('version') != FEATURE_SCHEMA_VERSION or schema.get('dim') != FEATURE_DIM:
+            MODEL_SWAPS.inc(role=role, outcome='failed')
+            logger.warning('模型版本 %s 不存在或特征 schema 不匹配，不切换', version)
+            return None
+        predictor = NumpyArchitecturePredictor(self.registry.weights_path(version), watch=False)
+        if not predictor.loaded:
+            MODEL_SWAPS.inc(role=role, outcome='failed')
+            return None
+        MODEL_SWAPS.inc(role=role, outcome='loaded')
+        return LoadedModel(version, predictor)
+
+    def refresh(self) -> bool:
+        """
+        registry.json 变化时加载新的线上/候选版本并替换；返回是否有变化
+
+        只有两个版本都加载成功后才记录 registry.json 的变化标记，加载失败时下次检查会重试
+        """
+        with self._refresh_lock:
+            stamp = self.registry.pointer_stamp()
+            if stamp == self._stamp:
+                return False
+            pointer = self.registry.pointer()
+            complete = True
+
+            current = pointer.get('current')
+            if current and current != self._active.version:
+                loaded = self._load(current, 'current')
+                if loaded is not None:
+                    self._active = loaded
+                    logger.info('推理进程已切换到模型版本 %s', current)
+                else:
+                    complete = False
+
+            candidate = pointer.get('candidate')
+            if candidate is None:
+                self._candidate = None
+            elif self._candidate is None or candidate != self._candidate.version:
+                loaded = self._load(candidate, 'candidate')
+                if loaded is not None:
+                    with self._shadow_lock:
+                        self._shadow = ShadowStats(candidate, self._active.version)
+                    self._candidate = loaded
+                else:
+                    complete = False
+
+            if complete:
+                self._stamp = stamp
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning('检查模型注册表失败: %s', e)
+
+    def stop(self):
+        self._stop.set()
+
+    # ==================== 预测 ====================
+
+    def forward(self, x: np.ndarray):
+        return self._active.predictor.forward(x)
+
+    def predict(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return self.predict_batch([data])[0]
+
+    def predict_batch(self, items: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        results = self._active.predictor.predict_batch(items)
+        candidate = self._candidate
+        if candidate is not None and random.random() < self.shadow_sample_rate:
+            self._submit_shadow(candidate, list(items), results)
+        return results
+
+    # ==================== 影子评估 ====================
+
+    def _submit_shadow(self, candidate: LoadedModel, items, results):
+        try:
+            self._shadow_queue.put_nowait((candidate, items, results))
+        except queue.Full:
+            SHADOW_PREDICTIONS.inc(outcome='dropped')
+            return
+        if self._shadow_thread is None or not self._shadow_thread.is_alive():
+            with self._shadow_lock:
+                if self._shadow_thread is None or not self._shadow_thread.is_alive():
+                    self._shadow_thread = threading.Thread(target=self._run_shadow, name='model-shadow', daemon=True)
+                    self._shadow_thread.start()
+
+    def _run_shadow(self):
+        while not self._stop.is_set():
+            try:
+                candidate, items, results = self._shadow_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            try:
+                self._evaluate_shadow(candidate, items, results)
+            except Exception as e:
+                logger.warning('影子评估失败: %s', e)
+            finally:
+                self._shadow_queue.task_done()
+
+    def _evaluate_shadow(self, candidate: LoadedModel, items, results):
+        shadow_results = candidate.predictor.predict_batch(items)
+        with self._shadow_lock:
+            stats = self._shadow
+            if stats is None or stats.version != candidate.version:
+                return
+            for primary, shadow in zip(results, shadow_results):
+                agree = stats.record(primary, shadow)
+                SHADOW_PREDICTIONS.inc(outcome='agree' if agree else 'disagree')
+
+    def drain_shadow(self):
+        """等待已提交的影子评估处理完（测试和离线对比用）"""
+        self._shadow_queue.join()
+
+    def shadow_report(self) -> Optional[Dict[str, Any]]:
+        with self._shadow_lock:
+            return self._shadow.report() if self._shadow is not None else None
+
+    def status(self) -> Dict[str, Any]:
+        candidate = self._candidate
+        return {
+            'version': self.version,
+            'loaded': self.loaded,
+            'candidate': candidate.version if candidate is not None else None,
+            'shadow': self.shadow_report()
+        }
+
+
+_registries: Dict[str, ModelRegistry] = {}
+_serving_model: Optional[ServingModel] = None
+_lock = threading.Lock()
+
+
+def get_model_registry(root: str = MODEL_REGISTRY_DIR) -> ModelRegistry:
+    """同一目录在进程内共享一个注册表对象"""
+    key = os.path.abspath(root)
+    registry = _registries.get(key)
+    if registry is None:
+        with _lock:
+            registry = _registries.get(key)
+            if registry is None:
+                registry = ModelRegistry(root)
+                _registries[key] = registry
+    return registry
+
+
+def get_serving_model() -> ServingModel:
+    """进程内共享的在线预测器（只加载一次，之后由后台线程切换版本）"""
+    global _serving_model
+    if _serving_model is None:
+        registry = get_model_registry()
+        with _lock:
+            if _serving_model is None:
+                _serving_model = ServingModel(registry)
+    return _serving_model
+
+
+def _serving_state():
+    if _serving_model is None:
+        return {}
+    values = {(_serving_model.version or 'fallback', 'current'): 1}
+    candidate = _serving_model._candidate
+    if candidate is not None:
+        values[(candidate.version, 'candidate')] = 1
+    return values
+
+
+CallbackGauge('model_serving_version', '推理进程当前加载的模型版本', _serving_state, ('version', 'role'))
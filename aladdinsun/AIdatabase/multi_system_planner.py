@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+多系统环境规划
+对 MultiSystemEnvironment 中的每个系统分别调用部署预测器（进程池并行），
+再汇总成环境级设备清单：数据库/代理节点、存储、软件许可按系统累加，
+核心交换机、防火墙、监控服务器按整个环境共享一套，机柜/UPS/实施/培训按汇总后的设备重新计算。
+"""
+
+import math
+import time
+from dataclasses import fields
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from advanced_file_processor import DeploymentTopology, MultiSystemEnvironment, SystemInfo
+
+# 环境内共享的设备类别（不随系统数累加）
+SHARED_CATEGORIES = ('核心交换机', '安全防火墙', '监控服务器')
+
+# 一台监控服务器可覆盖的数据库节点数
+DB_NODES_PER_MONITOR = 50
+
+# 每个任务包含的系统数
+PLAN_CHUNK_SYSTEMS = 16
+
+# 可用性达到该值时按高可用规划
+HA_AVAILABILITY_THRESHOLD = 99.99
+
+
+def parse_availability(value: Any) -> float:
+    """'99.99%' -> 99.99，无法解析返回0"""
+    try:
+        return float(str(value).strip().rstrip('%'))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def system_to_predictor_input(system: SystemInfo, deployment: Optional[DeploymentTopology] = None) -> Dict[str, Any]:
+    """把单个系统转换为信创预测器的输入格式（data_size_gb 单位为GB）"""
+    tps = system.tps or int(system.qps * 0.3)
+    multi_center = deployment is not None and deployment.deployment_mode != '单中心'
+
+    return {
+        'data_size_gb': system.data_size_gb,
+        'transactions_per_day': tps * 86400,
+        'max_connections': system.connections or 100,
+        'business_type': 'OLTP',
+        'high_availability': parse_availability(system.availability_requirement) >= HA_AVAILABILITY_THRESHOLD,
+        'disaster_recovery': multi_center
+    }
+
+
+def _to_number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def system_from_dict(data: Dict[str, Any]) -> SystemInfo:
+    """由解析结果中的系统字典构造 SystemInfo（忽略未知字段，数值字段容错）"""
+    kwargs = {}
+    for f in fields(SystemInfo):
+        if data.get(f.name) is None:
+            continue
+        value = data[f.name]
+        if f.type in (int, 'int'):
+            value = int(_to_number(value))
+        elif f.type in (float, 'float'):
+            value = _to_number(value)
+        else:
+            value = str(value)
+        kwargs[f.name] = value
+    return SystemInfo(**kwargs)
+
+
+def environment_from_result(result: Dict[str, Any], environment_name: str = '') -> MultiSystemEnvironment:
+    """由 AdvancedFileProcessor.process_file 的结果构造 MultiSystemEnvironment"""
+    systems = [system_from_dict(s) for s in result.get('systems', []) if isinstance(s, dict)]
+
+    deployment = DeploymentTopology()
+    for key, value in (result.get('deployment') or {}).items():
+        if hasattr(deployment, key):
+            setattr(deployment, key, value)
+
+    return MultiSystemEnvironment(
+        environment_name=environment_name or result.get('file_path', ''),
+        total_systems=len(systems),
+        systems=systems,
+        deployment=deployment,
+        total_data_size_tb=sum(s.data_size_gb for s in systems) / 1024,
+        total_qps=sum(s.qps for s in systems),
+        total_tps=sum(s.tps for s in systems),
+        total_connections=sum(s.connections for s in systems)
+    )
+
+
+# ==================== 单系统预测（工作进程） ====================
+
+def _item_key(item: Dict[str, Any]) -> Tuple:
+    return (item.get('category', ''), item.get('name', ''), item.get('spec', ''), item.get('unit_price', 0))
+
+
+def compact_items(items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """合并相同型号的设备条目（数量、总价累加）"""
+    merged: Dict[Tuple, Dict[str, Any]] = {}
+    for item in items:
+        key = _item_key(item)
+        if key in merged:
+            merged[key]['quantity'] += item.get('quantity', 1)
+            merged[key]['total_price'] += item.get('total_price', 0)
+        else:
+            merged[key] = dict(item)
+            merged[key].setdefault('quantity', 1)
+            merged[key].setdefault('total_price', item.get('unit_price', 0) * merged[key]['quantity'])
+    return list(merged.values())
+
+
+def merge_storage(items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """存储按型号和每TB单价合并容量（单系统条目的名称里带有容量，不能直接按名称合并）"""
+    merged: Dict[Tuple, Dict[str, Any]] = {}
+    for item in items:
+        key = (item.get('model', item.get('name', '')), item.get('storage_type', ''), item.get('unit_price', 0))
+        if key in merged:
+            merged[key]['capacity_tb'] += item.get('capacity_tb', 0)
+            merged[key]['total_price'] += item.get('total_price', 0)
+        else:
+            merged[key] = dict(item)
+
+    for item in merged.values():
+        item['name'] = f"{item.get('model', 'SSD存储')} ({item.get('capacity_tb', 0)}TB)"
+        item['spec'] = f"{item.get('storage_type', 'SSD')} {item.get('capacity_tb', 0)}TB, IOPS {item.get('iops', 0)}"
+    return list(merged.values())
+
+
+def size_system(index: int, system_name: str, predictor_input: Dict[str, Any],
+                xinchuan_mode: str = 'off') -> Dict[str, Any]:
+    """预测单个系统，返回架构、合并后的设备清单和成本"""
+    from batch_predict import get_mode_predictor
+
+    try:
+        prediction = get_mode_predictor(xinchuan_mode).predict(predictor_input)
+    except Exception as e:
+        return {'index': index, 'system_name': system_name, 'success': False, 'error': str(e)}
+
+    costs = prediction.get('cost_breakdown', {})
+    return {
+        'index': index,
+        'system_name': system_name,
+        'success': True,
+        'architecture': prediction.get('architecture', {}),
+        'equipment': compact_items(prediction.get('equipment_list', [])),
+        'software_items': costs.get('software_items', []),
+        'hardware_cost': costs.get('hardware_cost', 0),
+        'infrastructure_cost': costs.get('infrastructure_cost', 0),
+        'software_cost': costs.get('software_cost', 0),
+        'total_initial_cost': costs.get('total_initial_cost', 0)
+    }
+
+
+def size_systems_chunk(chunk: List[Tuple[int, str, Dict[str, Any]]], xinchuan_mode: str = 'off') -> List[Dict[str, Any]]:
+    """预测一组系统（进程池任务）"""
+    return [size_system(index, name, predictor_input, xinchuan_mode) for index, name, predictor_input in chunk]
+
+
+# ==================== 环境级汇总 ====================
+
+class MultiSystemPlanner:
+    """多系统环境规划器"""
+
+    def __init__(self, xinchuan_mode: str = 'off', executor=None, chunk_systems: int = PLAN_CHUNK_SYSTEMS):
+        """
+        Args:
+            xinchuan_mode: 信创模式（off/standard/strict/full）
+            executor: 进程池；None 时使用 batch_predict 的共享进程池（单核时在当前进程计算）
+            chunk_systems: 每个任务包含的系统数
+        """
+        self.xinchuan_mode = xinchuan_mode
+        self.executor = executor
+        self.chunk_systems = max(1, chunk_systems)
+
+    def _get_executor(self):
+        if self.executor is not None:
+            return self.executor
+        import batch_predict
+        if batch_predict.BATCH_PREDICT_WORKERS > 1:
+            return batch_predict.get_batch_pool()
+        return None
+
+    def size_systems(self, environment: MultiSystemEnvironment) -> List[Dict[str, Any]]:
+        """并行预测每个系统，按原顺序返回"""
+        tasks = [
+            (index, system.system_name or f'系统{index + 1}',
+             system_to_predictor_input(system, environment.deployment))
+            for index, system in enumerate(environment.systems)
+        ]
+        chunks = [tasks[i:i + self.chunk_systems] for i in range(0, len(tasks), self.chunk_systems)]
+
+        executor = self._get_executor()
+        results = []
+        if executor is None:
+            for chunk in chunks:
+                results.extend(size_systems_chunk(chunk, self.xinchuan_mode))
+        else:
+            futures = [executor.submit(size_systems_chunk, chunk, self.xinchuan_mode) for chunk in chunks]
+            for future in futures:
+                results.extend(future.result())
+
+        return results
+
+    def plan(self, environment: Union[MultiSystemEnvironment, List[SystemInfo]]) -> Dict[str, Any]:
+        """
+        规划整个环境
+
+        Returns:
+            {'systems': 逐系统摘要, 'bill_of_materials': 环境级设备清单, 'totals': 汇总,
+             'standalone_total_cost': 各系统独立部署的成本合计, 'shared_savings': 共享基础设施节省}
+        """
+        start = time.perf_counter()
+        if not isinstance(environment, MultiSystemEnvironment):
+            environment = MultiSystemEnvironment(systems=list(environment), total_systems=len(environment))
+
+        sized = self.size_systems(environment)
+        succeeded = [r for r in sized if r['success']]
+        bill = self.build_bill_of_materials(succeeded)
+
+        standalone_total = sum(r['total_initial_cost'] for r in succeeded)
+        return {
+            'success': True,
+            'environment_name': environment.environment_name,
+            'total_systems': len(environment.systems),
+            'failed_systems': [{'system_name': r['system_name'], 'error': r['error']} for r in sized if not r['success']],
+            'systems': [
+                {
+                    'system_name': r['system_name'],
+                    'node_spec': r['architecture'].get('node_spec', ''),
+                    'database_nodes': r['architecture'].get('database_nodes', 0),
+                    'proxy_nodes': r['architecture'].get('proxy_nodes', 0),
+                    'monitoring_nodes': r['architecture'].get('monitoring_nodes', 0),
+                    'total_initial_cost': r['total_initial_cost']
+                }
+                for r in succeeded
+            ],
+            'bill_of_materials': bill['items'],
+            'totals': bill['totals'],
+            'standalone_total_cost': standalone_total,
+            'shared_savings': standalone_total - bill['totals']['total_initial_cost'],
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)
+        }
+
+    def build_bill_of_materials(self, sized: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """把逐系统结果汇总为环境级清单，共享设备去重"""
+        from batch_predict import get_mode_predictor
+
+        items = [item for r in sized for item in r['equipment'] if item.get('category') not in SHARED_CATEGORIES]
+        dedicated = compact_items(i for i in items if i.get('category') != '存储设备')
+        dedicated += merge_storage(i for i in items if i.get('category') == '存储设备')
+        shared = self._size_shared_items(sized, dedicated)
+        equipment = dedicated + shared
+
+        database_nodes = sum(r['architecture'].get('database_nodes', 0) for r in sized)
+        proxy_nodes = sum(r['architecture'].get('proxy_nodes', 0) for r in sized)
+        monitoring_nodes = sum(i['quantity'] for i in shared if i.get('category') == '监控服务器')
+        architecture = {
+            'database_nodes': database_nodes,
+            'proxy_nodes': proxy_nodes,
+            'monitoring_nodes': monitoring_nodes
+        }
+
+        # 机柜/PDU/UPS/布线/实施/培训按环境整体重新计算一次
+        infrastructure = get_mode_predictor(self.xinchuan_mode)._calculate_infrastructure_detailed(
+            equipment, architecture
+        )
+        software_items = self._merge_software(r['software_items'] for r in sized)
+
+        hardware_cost = sum(item.get('total_price', 0) for item in equipment)
+        software_cost = sum(item.get('total', 0) for item in software_items)
+        return {
+            'items': {
+                'equipment': equipment,
+                'infrastructure_items': infrastructure['items'],
+                'software_items': software_items
+            },
+            'totals': dict(
+                architecture,
+                rack_count=infrastructure['rack_count'],
+                total_power_kw=infrastructure['total_power_kw'],
+                hardware_cost=hardware_cost,
+                infrastructure_cost=infrastructure['total_price'],
+                software_cost=software_cost,
+                total_initial_cost=hardware_cost + infrastructure['total_price'] + software_cost
+            )
+        }
+
+    def _size_shared_items(self, sized: List[Dict[str, Any]], dedicated: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        共享设备取各系统中规格最高的型号，数量按环境规模确定：
+        核心交换机按接入交换机上联端口数成对扩容，监控服务器按数据库节点总数扩容，防火墙一对
+        """
+        largest: Dict[str, Dict[str, Any]] = {}
+        for r in sized:
+            for item in r['equipment']:
+                category = item.get('category')
+                if category not in SHARED_CATEGORIES:
+                    continue
+                current = largest.get(category)
+                if current is None or (item.get('unit_price', 0), item.get('quantity', 0)) > \
+                        (current.get('unit_price', 0), current.get('quantity', 0)):
+                    largest[category] = item
+
+        access_switches = sum(i['quantity'] for i in dedicated if i.get('category') == '接入交换机')
+        database_nodes = sum(r['architecture'].get('database_nodes', 0) for r in sized)
+
+        shared = []
+        for category, item in largest.items():
+            quantity = item.get('quantity', 1)
+            if category == '核心交换机':
+                ports = item.get('ports') or 48
+                quantity = max(quantity, 2 * math.ceil(access_switches / ports))
+            elif category == '监控服务器':
+                quantity = max(quantity, math.ceil(database_nodes / DB_NODES_PER_MONITOR))
+
+            shared_item = dict(item)
+            shared_item.update({
+                'quantity': quantity,
+                'total_price': item.get('unit_price', 0) * quantity,
+                'shared': True
+            })
+            shared.append(shared_item)
+        return shared
+
+    @staticmethod
+    def _merge_software(groups: Iterable[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        merged: Dict[Tuple, Dict[str, Any]] = {}
+        for items in groups:
+            for item in items:
+                key = (item.get('name', ''), item.get('unit_price', 0))
+                if key in merged:
+                    merged[key]['quantity'] += item.get('quantity', 0)
+                    merged[key]['total'] += item.get('total', 0)
+                else:
+                    merged[key] = dict(item)
+        return list(merged.values())
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+架构预测模型的纯 NumPy 推理引擎
+
+50→256→256→128 的小网络前向只需几次矩阵乘法，为此在每个 worker 里导入 PyTorch
+要多花数秒启动时间和数百MB内存。训练结束后 export_weights() 把 state_dict 导出为
+紧凑的 float32 .npz，NumpyArchitecturePredictor 加载它做（批量）推理，输出与
+PyTorch 模型一致（相同权重下仅有浮点舍入级别的差异）。
+
+权重文件被重新导出（mtime 变化）时，下一次预测自动换用新权重（watch=False 时只在创建时
+加载一次，用于模型注册表中不可变的版本）；文件不存在时按规则预测，与未安装 PyTorch 时的行为相同。
+"""
+
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from feature_pipeline import FEATURE_DIM, extract_features
+from file_io import atomic_open
+from model import MODEL_WEIGHTS_FILE, apply_business_rules, decode_prediction, rule_based_predict
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# 导出格式版本，网络结构变化时递增
+WEIGHTS_FORMAT_VERSION = 1
+
+# 共享特征层和各任务头（对应 torch_model.TDSQLArchitecturePredictor 中的 nn.Sequential 模块名）
+TRUNK = 'feature_extractor'
+HEADS = (
+    ('architecture_type', 'architecture_classifier'),
+    ('node_count', 'node_count_predictor'),
+    ('shard_count', 'shard_count_predictor'),
+    ('replica_count', 'replica_count_predictor'),
+)
+
+Layers = List[Tuple[np.ndarray, np.ndarray]]
+
+
+def export_weights(model, path: str = MODEL_WEIGHTS_FILE):
+    """把 PyTorch 模型的权重导出为 .npz（先写临时文件再替换，推理进程不会读到半个文件）"""
+    arrays = {name: tensor.detach().cpu().numpy().astype(np.float32)
+              for name, tensor in model.state_dict().items()}
+    arrays['__format_version__'] = np.array(WEIGHTS_FORMAT_VERSION)
+
+    with atomic_open(path, suffix='.npz') as f:
+        np.savez(f, **arrays)
+    logger.info('模型权重已导出: %s', path)
+
+
+def import_weights(model, path: str = MODEL_WEIGHTS_FILE):
+    """把导出的 .npz 权重加载回 PyTorch 模型（在线增量学习以当前服务中的权重为起点）"""
+    import torch
+
+    with np.load(path) as data:
+        state = {name: torch.from_numpy(data[name]) for name in data.files if name != '__format_version__'}
+    model.load_state_dict(state)
+
+
+def load_torch_model(path: str = MODEL_WEIGHTS_FILE):
+    """按导出文件中的层宽度重建 PyTorch 模型并加载权重（超参数搜索得到的模型隐藏层宽度可能不同）"""
+    from torch_model import TDSQLArchitecturePredictor
+
+    with np.load(path) as data:
+        hidden_dim = data[f'{TRUNK}.0.weight'].shape[0]
+    model = TDSQLArchitecturePredictor(hidden_dim=int(hidden_dim))
+    import_weights(model, path)
+    return model
+
+
+def _collect_layers(arrays: Dict[str, np.ndarray], module: str) -> Layers:
+    """按 nn.Sequential 中的下标顺序取出某个模块的全部 Linear 层（权重预先转置）"""
+    indices = sorted(int(name.split('.')[1]) for name in arrays
+                     if name.startswith(module + '.') and name.endswith('.weight'))
+    if not indices:
+        raise ValueError(f'权重文件缺少模块: {module}')
+    return [(np.ascontiguousarray(arrays[f'{module}.{i}.weight'].T), arrays[f'{module}.{i}.bias'])
+            for i in indices]
+
+
+def load_weights(path: str) -> Dict[str, Layers]:
+    """读取 export_weights 导出的文件"""
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in data.files}
+    version = int(arrays.pop('__format_version__', 0))
+    if version != WEIGHTS_FORMAT_VERSION:
+        raise ValueError(f'权重文件格式版本不匹配: {version}')
+    return layers_from_arrays(arrays)
+
+
+def layers_from_arrays(arrays: Dict[str, np.ndarray]) -> Dict[str, Layers]:
+    """按模块整理 state_dict 形式的数组"""
+    layers = {TRUNK: _collect_layers(arrays, TRUNK)}
+    for _, module in HEADS:
+        layers[module] = _collect_layers(arrays, module)
+    return layers
+
+
+def _mlp(x: np.ndarray, layers: Layers, relu_last: bool) -> np.ndarray:
+    """Linear/ReLU 交替的前向（Dropout 在推理时是恒等变换）"""
+    last = len(layers) - 1
+    for i, (weight_t, bias) in enumerate(layers):
+        x = x @ weight_t
+        x += bias
+        if i < last or relu_last:
+            np.maximum(x, 0, out=x)
+    return x
+
+
+def _softmax(x: np.ndarray) -> np.ndarray:
+    x = x - x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+
+class NumpyArchitecturePredictor:
+    """纯 NumPy 的架构预测器，接口与 TDSQLArchitecturePredictor.predict 相同"""
+
+    def __init__(self, weights_file: str = MODEL_WEIGHTS_FILE, watch: bool = True):
+        self.weights_file = weights_file
+        self.watch = watch
+        self._layers: Optional[Dict[str, Layers]] = None
+        self._stamp = None
+        self._lock = threading.Lock()
+        self._maybe_reload()
+
+    @classmethod
+    def from_model(cls, model) -> 'NumpyArchitecturePredictor':
+        """直接使用内存中 PyTorch 模型的权重（交叉验证等不落盘的场景）"""
+        predictor = cls.__new__(cls)
+        predictor.weights_file = None
+        predictor.watch = False
+        predictor._lock = threading.Lock()
+        predictor._stamp = None
+        predictor._layers = layers_from_arrays({name: tensor.detach().cpu().numpy().astype(np.float32)
+                                                for name, tensor in model.state_dict().items()})
+        return predictor
+
+    @property
+    def loaded(self) -> bool:
+        """是否已加载训练好的权重（否则按规则预测）"""
+        return self._layers is not None
+
+    def _maybe_reload(self):
+        """权重文件新建或被重新导出时加载"""
+        try:
+            st = os.stat(self.weights_file)
+            stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._stamp:
+            return
+
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            if stamp is None:
+                self._layers = None
+            else:
+                try:
+                    self._layers = load_weights(self.weights_file)
+                    logger.info('已加载模型权重: %s', self.weights_file)
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning('模型权重加载失败，按规则预测: %s', e)
+                    self._layers = None
+            self._stamp = stamp
+
+    def forward(self, x: np.ndarray) -> Optional[Dict[str, np.ndarray]]:
+        """
+        批量前向
+
+        Args:
+            x: (N, FEATURE_DIM) 特征矩阵
+
+        Returns:
+            architecture_type 为 (N, 3) 概率，其余为 (N, 1)；未加载权重时返回 None
+        """
+        if self.watch:
+            self._maybe_reload()
+        layers = self._layers
+        if layers is None:
+            return None
+
+        hidden = _mlp(np.asarray(x, dtype=np.float32), layers[TRUNK], relu_last=True)
+        outputs = {name: _mlp(hidden, layers[module], relu_last=False) for name, module in HEADS}
+        outputs['architecture_type'] = _softmax(outputs['architecture_type'])
+        return outputs
+
+    def predict(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """预测 TDSQL 架构配置"""
+        return self.predict_batch([data])[0]
+
+    def predict_batch(self, items: Sequence[Dict[str, Any]],
+                      features: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """
+        批量预测：一次前向处理全部输入
+
+        Args:
+            features: 可选，items 已物化的特征矩阵（评估时复用，不再逐条提取）
+        """
+        if features is None:
+            features = np.zeros((len(items), FEATURE_DIM), dtype=np.float32)
+            for i, data in enumerate(items):
+                extract_features(data, out=features[i])
+
+        outputs = self.forward(features)
+        if outputs is None:
+            return [rule_based_predict(data) for data in items]
+
+        results = []
+        for i, data in enumerate(items):
+            result = decode_prediction(
+                outputs['architecture_type'][i],
+                outputs['node_count'][i, 0],
+                outputs['shard_count'][i, 0],
+                outputs['replica_count'][i, 0]
+            )
+            results.append(apply_business_rules(data, result))
+        return results
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+OCR预处理流水线基准测试
+在带标注的图片集上比较各预处理流水线的字段识别准确率与耗时
+
+标注目录结构:
+    samples/
+        labels.json      {"截图1.png": {"qps": 50000, "table_count": 150}, ...}
+        截图1.png
+        ...
+
+用法:
+    python3 ocr_benchmark.py samples/ [--pipelines auto,full,clean] [--output result.json]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Any, Callable, Dict, List, Optional
+
+from PIL import Image
+
+from image_preprocessing import PIPELINES, preprocess_image
+
+# 数值字段允许的相对误差
+NUMERIC_TOLERANCE = 0.01
+
+
+def load_labeled_samples(sample_dir: str) -> List[Dict[str, Any]]:
+    """读取标注文件，返回 [{'path': ..., 'expected': {...}}, ...]"""
+    labels_file = os.path.join(sample_dir, 'labels.json')
+    with open(labels_file, 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+
+    samples = []
+    for filename, expected in labels.items():
+        path = os.path.join(sample_dir, filename)
+        if os.path.exists(path):
+            samples.append({'path': path, 'expected': expected})
+        else:
+            print(f"⚠️  标注的图片不存在: {path}")
+    return samples
+
+
+def field_matches(expected: Any, actual: Any) -> bool:
+    """比较单个字段（数值按相对误差比较）"""
+    if isinstance(expected, bool) or isinstance(actual, bool):
+        return bool(expected) == bool(actual)
+    if isinstance(expected, (int, float)):
+        try:
+            actual = float(actual)
+        except (TypeError, ValueError):
+            return False
+        if expected == 0:
+            return actual == 0
+        return abs(actual - expected) / abs(expected) <= NUMERIC_TOLERANCE
+    return str(expected).strip() == str(actual).strip()
+
+
+def default_ocr(image: Image.Image) -> str:
+    """默认OCR引擎：Tesseract"""
+    import pytesseract
+    return pytesseract.image_to_string(image, lang='chi_sim+eng')
+
+
+def default_extractor(text: str) -> Dict[str, Any]:
+    """默认字段提取：与上传识别使用同一套规则"""
+    from image_ocr import ImageTableRecognizer
+    return ImageTableRecognizer()._extract_data_from_text(text)
+
+
+def run_benchmark(samples: List[Dict[str, Any]], pipelines: List[str],
+                  ocr_func: Callable[[Image.Image], str] = default_ocr,
+                  extractor: Callable[[str], Dict[str, Any]] = default_extractor) -> Dict[str, Dict[str, Any]]:
+    """
+    对每条流水线跑完整的 预处理 -> OCR -> 字段提取
+
+    Returns:
+        {流水线: {'accuracy', 'fields_correct', 'fields_total', 'avg_preprocess_ms', 'avg_ocr_ms', 'avg_total_ms', ...}}
+    """
+    report = {}
+
+    for pipeline in pipelines:
+        fields_total = 0
+        fields_correct = 0
+        preprocess_ms = 0.0
+        ocr_ms = 0.0
+        chosen = {}
+
+        for sample in samples:
+            image = Image.open(sample['path'])
+            image.load()
+
+            start = time.perf_counter()
+            processed, used = preprocess_image(image, pipeline)
+            mid = time.perf_counter()
+            text = ocr_func(processed)
+            end = time.perf_counter()
+
+            preprocess_ms += (mid - start) * 1000
+            ocr_ms += (end - mid) * 1000
+            chosen[used] = chosen.get(used, 0) + 1
+
+            extracted = extractor(text)
+            for field_name, expected in sample['expected'].items():
+                fields_total += 1
+                if field_matches(expected, extracted.get(field_name)):
+                    fields_correct += 1
+
+        count = max(len(samples), 1)
+        report[pipeline] = {
+            'images': len(samples),
+            'fields_total': fields_total,
+            'fields_correct': fields_correct,
+            'accuracy': fields_correct / fields_total if fields_total else 0.0,
+            'avg_preprocess_ms': preprocess_ms / count,
+            'avg_ocr_ms': ocr_ms / count,
+            'avg_total_ms': (preprocess_ms + ocr_ms) / count,
+            'pipelines_used': chosen
+        }
+
+    return report
+
+
+def print_report(report: Dict[str, Dict[str, Any]]):
+    """打印对比表"""
+    print("=" * 78)
+    print(f"{'流水线':<10}{'准确率':>10}{'字段':>10}{'预处理ms':>12}{'OCR ms':>12}{'总计ms':>12}")
+    print("-" * 78)
+    for pipeline, stats in report.items():
+        print(f"{pipeline:<10}{stats['accuracy'] * 100:>9.1f}%"
+              f"{stats['fields_correct']:>5}/{stats['fields_total']:<4}"
+              f"{stats['avg_preprocess_ms']:>12.1f}{stats['avg_ocr_ms']:>12.1f}{stats['avg_total_ms']:>12.1f}")
+        if pipeline == 'auto':
+            print(f"{'':<10}自动选择分布: {stats['pipelines_used']}")
+    print("=" * 78)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='OCR预处理流水线准确率/耗时对比')
+    parser.add_argument('sample_dir', help='包含 labels.json 的标注图片目录')
+    parser.add_argument('--pipelines', default=','.join(['auto'] + list(PIPELINES)),
+                        help='逗号分隔的流水线列表')
+    parser.add_argument('--output', help='结果保存为JSON')
+    args = parser.parse_args(argv)
+
+    samples = load_labeled_samples(args.sample_dir)
+    if not samples:
+        print("❌ 没有可用的标注图片")
+        return 1
+
+    print(f"📊 标注图片: {len(samples)} 张")
+    report = run_benchmark(samples, [p.strip() for p in args.pipelines.split(',') if p.strip()])
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存: {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,6 +3,10 @@ import numpy as np
 from PIL import Image
 import re
 
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
 class OCRProcessor:
     """OCR 处理器，用于从图片中提取表格数据"""
     
@@ -12,10 +16,9 @@ class OCRProcessor:
             import easyocr
             self.reader = easyocr.Reader(['ch_sim', 'en'], gpu=False)
             self.initialized = True
-            print("EasyOCR 初始化成功")
+            logger.info('EasyOCR 初始化成功')
         except Exception as e:
-            print(f"EasyOCR 初始化失败: {e}")
-            print("将使用模拟数据模式")
+            logger.warning('EasyOCR 初始化失败，将使用模拟数据模式: %s', e)
     
     def extract_table_data(self, image):
         """从图片中提取表格数据"""
@@ -39,21 +42,15 @@ class OCRProcessor:
             return extracted_data
         
         except Exception as e:
-            print(f"OCR 处理失败: {e}")
+            logger.warning('OCR 处理失败: %s', e)
             return self._get_mock_data()
     
     def _preprocess_image(self, image):
-        """图片预处理"""
-        # 转灰度
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # 二值化
-        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        # 去噪
-        denoised = cv2.fastNlMeansDenoising(binary)
+        """图片预处理（按噪声估计自动选择流水线，干净截图跳过去噪）"""
+        from image_preprocessing import preprocess_array, to_gray
         
-        return denoised
+        processed, _ = preprocess_array(to_gray(image))
+        return processed
     
     def _parse_table_results(self, ocr_results):
         """解析 OCR 结果为结构化数据"""
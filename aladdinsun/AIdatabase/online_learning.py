@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+在线增量学习 - 新案例到达后在后台做几步梯度更新，无需手动触发全量训练
+
+- 通过 /api/submit_case、/api/feedback 等入口进入 TrainingSystem.add_case 的案例
+  被放入有界队列，后台线程合并一小批后处理
+- 每批只做 ONLINE_LEARNING_STEPS 步梯度下降，小批次 = 新案例 + 从回放缓冲区抽取的历史样本
+  （回放缓冲区对全部历史案例做蓄水池抽样，防止模型只记住最近的案例）
+- 更新前先用当前模型预测新案例，记录前序(prequential)准确率/损失和特征分布偏移，作为漂移指标
+- 更新后在回放样本上的损失明显变差则放弃本次更新；否则注册为模型注册表中的新版本并上线
+  （各 worker 的 ServingModel 在后台切换），同时导出到权重文件（原子替换 .npz）
+- 后台线程只用 ONLINE_LEARNING_THREADS 个 PyTorch 线程，并按 ONLINE_LEARNING_MAX_CPU
+  控制占空比（每次更新后休眠相应时长）
+- 多个 worker 通过权重文件旁的文件锁串行更新，每次更新前如发现权重已被其他进程或全量训练
+  替换，则以新权重为起点
+
+增量学习以注册表中的线上版本（未使用注册表时为权重文件）为起点，线上版本被切换或回滚后
+从新的线上版本继续；还没有训练过时不做更新，需先全量训练一次。
+
+用法（环境变量 ONLINE_LEARNING_ENABLED=1 时 TrainingSystem 自动启用）:
+    learner = get_online_learner('training_data.json')
+    learner.submit(case)
+"""
+
+import os
+import copy
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from case_log import case_key, get_case_log
+from file_io import file_lock
+from feature_pipeline import ARCH_TYPES, FeatureMatrix, materialize
+from metrics import CallbackGauge, Counter, Histogram
+from model import MODEL_WEIGHTS_FILE
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+ONLINE_LEARNING_ENABLED = os.environ.get('ONLINE_LEARNING_ENABLED', '0') == '1'
+
+# 每批新案例做几步梯度更新、学习率
+STEPS_PER_UPDATE = int(os.environ.get('ONLINE_LEARNING_STEPS', 5))
+LEARNING_RATE = float(os.environ.get('ONLINE_LEARNING_LR', 1e-4))
+
+# 回放缓冲区容量；每个新案例配几个历史样本
+REPLAY_CAPACITY = int(os.environ.get('ONLINE_LEARNING_REPLAY_CAPACITY', 5000))
+REPLAY_RATIO = int(os.environ.get('ONLINE_LEARNING_REPLAY_RATIO', 4))
+
+# 后台线程 CPU 占用上限（占空比）和 PyTorch 线程数
+MAX_CPU_FRACTION = float(os.environ.get('ONLINE_LEARNING_MAX_CPU', 0.25))
+NUM_THREADS = int(os.environ.get('ONLINE_LEARNING_THREADS', 1))
+
+# 待处理队列上限；收到第一个案例后再等待多久合并同一批
+QUEUE_SIZE = int(os.environ.get('ONLINE_LEARNING_QUEUE_SIZE', 1000))
+COALESCE_S = float(os.environ.get('ONLINE_LEARNING_COALESCE_S', 2.0))
+MAX_BATCH = 64
+
+# 更新后回放样本上的损失相对更新前增加超过该比例时放弃本次更新
+MAX_LOSS_INCREASE = 0.2
+
+# 漂移指标的指数滑动平均系数
+DRIFT_EWMA_ALPHA = 0.1
+
+ONLINE_CASES = Counter(
+    'online_learning_cases_total', '进入在线学习队列的案例数（queued=已入队, dropped=队列满丢弃）', ('outcome',))
+ONLINE_UPDATES = Counter(
+    'online_learning_updates_total', '在线学习更新次数（applied=已换上新权重, rejected=验证变差放弃, '
+    'no_base=尚无基础权重, error=异常）', ('outcome',))
+ONLINE_UPDATE_SECONDS = Histogram(
+    'online_learning_update_seconds', '一次在线学习更新的耗时')
+
+
+class ReplayBuffer:
+    """历史样本的蓄水池抽样缓冲区（每个历史案例被保留的概率相同）"""
+
+    def __init__(self, capacity: int = REPLAY_CAPACITY, feature_dim: int = None, seed: Optional[int] = None):
+        from feature_pipeline import FEATURE_DIM, COUNT_LABELS
+
+        self.capacity = capacity
+        self.features = np.zeros((capacity, feature_dim or FEATURE_DIM), dtype=np.float32)
+        self.architecture = np.zeros(capacity, dtype=np.int64)
+        self.counts = np.zeros((capacity, len(COUNT_LABELS)), dtype=np.float32)
+        self.size = 0
+        self.seen = 0
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def extend(self, matrix: FeatureMatrix):
+        n = len(matrix)
+        if self.seen == 0 and n > self.capacity:
+            # 首次灌入大量历史数据：直接均匀抽取 capacity 条
+            chosen = self._rng.choice(n, self.capacity, replace=False)
+            self._write(np.arange(self.capacity), matrix, chosen)
+            self.size, self.seen = self.capacity, n
+            return
+
+        for i in range(n):
+            self.seen += 1
+            if self.size < self.capacity:
+                slot = self.size
+                self.size += 1
+            else:
+                slot = int(self._rng.integers(0, self.seen))
+                if slot >= self.capacity:
+                    continue
+            self._write(slot, matrix, i)
+
+    def _write(self, slots, matrix: FeatureMatrix, rows):
+        self.features[slots] = matrix.features[rows]
+        self.architecture[slots] = matrix.architecture[rows]
+        self.counts[slots] = matrix.counts[rows]
+
+    def sample(self, k: int) -> FeatureMatrix:
+        k = min(k, self.size)
+        rows = self._rng.choice(self.size, k, replace=False) if k else np.zeros(0, dtype=np.int64)
+        return FeatureMatrix(features=self.features[rows], architecture=self.architecture[rows],
+                             counts=self.counts[rows])
+
+
+class DriftTracker:
+    """
+    漂移指标
+
+    - prequential_accuracy / prequential_loss: 模型在更新前对新案例的表现（滑动平均）
+    - feature_shift: 新案例特征均值相对历史分布的平均 |z| 分数（滑动平均）
+    - label_shift: 新案例架构类型分布与历史分布的总变差距离（滑动平均）
+    """
+
+    def __init__(self, reference: FeatureMatrix, alpha: float = DRIFT_EWMA_ALPHA):
+        self.alpha = alpha
+        self._mean = reference.features.mean(axis=0) if len(reference) else None
+        std = reference.features.std(axis=0) if len(reference) else None
+        self._active = std > 0 if std is not None else None
+        self._std = np.where(self._active, std, 1.0) if std is not None else None
+        self._label_dist = _label_distribution(reference.architecture) if len(reference) else None
+        self.values: Dict[str, float] = {}
+        self.samples = 0
+
+    def _ewma(self, name: str, value: float):
+        previous = self.values.get(name)
+        self.values[name] = value if previous is None else previous + self.alpha * (value - previous)
+
+    def update(self, new: FeatureMatrix, accuracy: float, loss: float):
+        self.samples += len(new)
+        self._ewma('prequential_accuracy', accuracy)
+        self._ewma('prequential_loss', loss)
+        if self._mean is not None and self._active.any():
+            z = np.abs(new.features.mean(axis=0) - self._mean) / self._std
+            self._ewma('feature_shift', float(z[self._active].mean()))
+        if self._label_dist is not None:
+            shift = 0.5 * np.abs(_label_distribution(new.architecture) - self._label_dist).sum()
+            self._ewma('label_shift', float(shift))
+
+
+def _label_distribution(architecture: np.ndarray) -> np.ndarray:
+    counts = np.bincount(architecture, minlength=len(ARCH_TYPES)).astype(np.float64)
+    return counts / max(counts.sum(), 1)
+
+
+def _concat(*matrices: FeatureMatrix) -> FeatureMatrix:
+    return FeatureMatrix(
+        features=np.concatenate([m.features for m in matrices]),
+        architecture=np.concatenate([m.architecture for m in matrices]),
+        counts=np.concatenate([m.counts for m in matrices])
+    )
+
+
+class OnlineLearner:
+    """后台增量学习器"""
+
+    def __init__(self, data_file: str, weights_file: str = MODEL_WEIGHTS_FILE,
+                 steps: int = STEPS_PER_UPDATE, learning_rate: float = LEARNING_RATE,
+                 replay_capacity: int = REPLAY_CAPACITY, replay_ratio: int = REPLAY_RATIO,
+                 max_cpu_fraction: float = MAX_CPU_FRACTION, num_threads: int = NUM_THREADS,
+                 coalesce_s: float = COALESCE_S, seed: Optional[int] = None, registry=None):
+        self.data_file = data_file
+        self.weights_file = weights_file
+        self.registry = registry
+        self.steps = steps
+        self.learning_rate = learning_rate
+        self.replay_capacity = replay_capacity
+        self.replay_ratio = replay_ratio
+        self.max_cpu_fraction = max(0.01, min(max_cpu_fraction, 1.0))
+        self.num_threads = num_threads
+        self.coalesce_s = coalesce_s
+        self.seed = seed
+
+        self._queue: 'queue.Queue[Dict[str, Any]]' = queue.Queue(maxsize=QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self._model = None
+        self._optimizer = None
+        self._base_stamp = None
+        self._replay: Optional[ReplayBuffer] = None
+        self.drift: Optional[DriftTracker] = None
+
+        self.updates_applied = 0
+        self.updates_rejected = 0
+        self.last_update: Optional[Dict[str, Any]] = None
+
+    # ==================== 队列与后台线程 ====================
+
+    def submit(self, case: Dict[str, Any]) -> bool:
+        """提交一个新案例（不阻塞）；队列满时丢弃并返回 False"""
+        if not isinstance(case.get('input'), dict) or not isinstance(case.get('output'), dict):
+            return False
+        try:
+            self._queue.put_nowait(case)
+        except queue.Full:
+            ONLINE_CASES.inc(outcome='dropped')
+            return False
+        ONLINE_CASES.inc(outcome='queued')
+        self.start()
+        return True
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='online-learner', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        """等到第一个案例后再收集 coalesce_s 内到达的案例"""
+        try:
+            batch = [self._queue.get(timeout=1.0)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.coalesce_s
+        while len(batch) < MAX_BATCH and not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        import torch
+
+        # 只影响本进程的 PyTorch 运算；在线推理走 NumPy，不受影响
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                self.update(batch)
+            except Exception as e:
+                ONLINE_UPDATES.inc(outcome='error')
+                logger.warning('在线学习更新失败: %s', e)
+            # 占空比限制：忙 t 秒后休眠 t*(1-f)/f 秒
+            busy = time.perf_counter() - started
+            self._stop.wait(busy * (1 - self.max_cpu_fraction) / self.max_cpu_fraction)
+
+    # ==================== 增量更新 ====================
+
+    @contextmanager
+    def _weights_lock(self):
+        """同一权重文件的更新在进程内外串行执行"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.weights_file)), exist_ok=True)
+        with self._update_lock, file_lock(self.weights_file + '.lock'):
+            yield
+
+    def _base_file(self) -> str:
+        current = self.registry.current_version() if self.registry is not None else None
+        return self.registry.weights_path(current) if current else self.weights_file
+
+    def _weights_stamp(self):
+        try:
+            st = os.stat(self._base_file())
+            return (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _load_base(self) -> bool:
+        """以当前服务中的权重为起点；权重被替换过（全量训练/其他 worker）时重新加载"""
+        stamp = self._weights_stamp()
+        if stamp is None:
+            return False
+        if stamp != self._base_stamp:
+            import torch
+            from numpy_inference import load_torch_model
+
+            self._model = load_torch_model(self._base_file())
+            self._optimizer = torch.optim.Adam(self._model.parameters(), lr=self.learning_rate)
+            self._base_stamp = stamp
+        return True
+
+    def _ensure_replay(self, batch: List[Dict[str, Any]]):
+        """
+        首次更新时从案例日志构建回放缓冲区和漂移参考分布
+
+        新案例先写入日志再提交，日志中已包含本批和队列中尚未处理的案例；这些案例在各自的
+        更新中才加入回放缓冲区，这里先排除，避免重复计入
+        """
+        if self._replay is not None:
+            return
+        cases = get_case_log(self.data_file).load_all()
+        with self._queue.mutex:
+            pending = list(self._queue.queue)
+        skip = {case_key(case) for case in list(batch) + pending} - {None}
+        history = materialize([case for case in cases if case_key(case) not in skip])
+        self._replay = ReplayBuffer(self.replay_capacity, seed=self.seed)
+        self._replay.extend(history)
+        self.drift = DriftTracker(history)
+
+    def update(self, cases: List[Dict[str, Any]]) -> str:
+        """
+        用一批新案例做一次增量更新（后台线程调用，也可同步调用）
+
+        Returns:
+            applied / rejected / no_base / skipped
+        """
+        import torch
+        from batched_training import MaterializedDataset, evaluate_matrix, multitask_loss
+        from numpy_inference import export_weights
+
+        new = materialize(cases)
+        if not len(new):
+            return 'skipped'
+
+        with ONLINE_UPDATE_SECONDS.time(), self._weights_lock():
+            if not self._load_base():
+                ONLINE_UPDATES.inc(outcome='no_base')
+                logger.info('尚无已导出的模型权重，跳过在线学习（请先全量训练一次）')
+                return 'no_base'
+            self._ensure_replay(cases)
+            model = self._model
+
+            # 前序评估：更新前模型对新案例的表现
+            prequential = evaluate_matrix(model, new)
+            self.drift.update(new, prequential['accuracy'], prequential['loss'])
+
+            guard = self._replay.sample(256) if len(self._replay) else new
+            loss_before = evaluate_matrix(model, guard)['loss']
+            snapshot = copy.deepcopy(model.state_dict())
+            optimizer_snapshot = copy.deepcopy(self._optimizer.state_dict())
+
+            model.train()
+            for _ in range(self.steps):
+                batch = _concat(new, self._replay.sample(len(new) * self.replay_ratio))
+                features, labels = next(MaterializedDataset(batch).batches(len(batch)))
+                self._optimizer.zero_grad(set_to_none=True)
+                loss = multitask_loss(model(features), labels)
+                loss.backward()
+                self._optimizer.step()
+            model.eval()
+
+            loss_after = evaluate_matrix(model, guard)['loss']
+            if loss_after > loss_before * (1 + MAX_LOSS_INCREASE):
+                model.load_state_dict(snapshot)
+                self._optimizer.load_state_dict(optimizer_snapshot)
+                outcome = 'rejected'
+                self.updates_rejected += 1
+            else:
+                if self.registry is not None:
+                    self.registry.register(model, metrics={'cases': len(new), 'replay_loss_before': loss_before,
+                                                           'replay_loss_after': loss_after},
+                                           dataset_version=get_case_log(self.data_file).version(),
+                                           source='online', promote=True)
+                export_weights(model, self.weights_file)
+                self._base_stamp = self._weights_stamp()
+                outcome = 'applied'
+                self.updates_applied += 1
+
+            self._replay.extend(new)
+
+        ONLINE_UPDATES.inc(outcome=outcome)
+        self.last_update = {
+            'timestamp': time.time(),
+            'outcome': outcome,
+            'cases': len(new),
+            'loss_before': loss_before,
+            'loss_after': loss_after
+        }
+        logger.info('在线学习: %d 个新案例, 回放损失 %.4f -> %.4f, %s',
+                    len(new), loss_before, loss_after, outcome)
+        return outcome
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'enabled': True,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'pending': self._queue.qsize(),
+            'updates_applied': self.updates_applied,
+            'updates_rejected': self.updates_rejected,
+            'replay_size': len(self._replay) if self._replay is not None else 0,
+            'drift': dict(self.drift.values) if self.drift is not None else {},
+            'last_update': self.last_update
+        }
+
+
+_learners: Dict[tuple, OnlineLearner] = {}
+_learners_lock = threading.Lock()
+
+
+def get_online_learner(data_file: str, weights_file: str = MODEL_WEIGHTS_FILE, registry=None) -> OnlineLearner:
+    """同一数据集/权重文件在进程内共享一个学习器"""
+    key = (os.path.abspath(data_file), os.path.abspath(weights_file))
+    learner = _learners.get(key)
+    if learner is None:
+        with _learners_lock:
+            learner = _learners.get(key)
+            if learner is None:
+                learner = OnlineLearner(data_file, weights_file, registry=registry)
+                _learners[key] = learner
+    return learner
+
+
+def _drift_state():
+    values = {}
+    for learner in list(_learners.values()):
+        name = os.path.basename(learner.data_file)
+        if learner.drift is not None:
+            for metric, value in learner.drift.values.items():
+                values[(name, metric)] = value
+        values[(name, 'pending_cases')] = learner._queue.qsize()
+    return values
+
+
+CallbackGauge('online_learning_state', '在线学习的漂移指标和待处理案例数', _drift_state, ('learner', 'metric'))
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+文件解析结果缓存 - 按文件内容哈希复用解析/OCR结果
+同一份Excel、PDF或截图重复上传时直接返回已提取的参数，无需重新解析
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Any, Optional
+
+from tracing import get_logger
+
+logger = get_logger(__name__)
+
+# 默认缓存位置与容量
+DEFAULT_CACHE_FILE = os.path.join('cache', 'parse_cache.db')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # 64MB
+DEFAULT_MAX_ENTRIES = 5000
+
+# 计算哈希时的读取块大小
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str) -> str:
+    """计算文件内容的SHA-256"""
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def hash_bytes(data: bytes) -> str:
+    """计算字节内容的SHA-256"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ParseCache:
+    """
+    基于SQLite的解析结果缓存
+
+    键 = 解析器名称 + 解析器版本 + 文件内容SHA-256，
+    解析逻辑升级时修改版本号即可让旧结果自然失效。
+    按最近访问时间做LRU淘汰，总大小和条目数均有上限。
+    """
+
+    def __init__(self, cache_file: str = DEFAULT_CACHE_FILE,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.cache_file = cache_file
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        # 命中率统计
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        cache_dir = os.path.dirname(cache_file)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(cache_file, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS parse_cache (
+                cache_key   TEXT PRIMARY KEY,
+                parser      TEXT NOT NULL,
+                version     TEXT NOT NULL,
+                payload     TEXT NOT NULL,
+                size_bytes  INTEGER NOT NULL,
+                created_at  REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                hit_count   INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_parse_cache_accessed ON parse_cache(accessed_at)'
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(content_hash: str, parser: str, version: str) -> str:
+        """生成缓存键"""
+        return f"{parser}:{version}:{content_hash}"
+
+    def get(self, content_hash: str, parser: str, version: str) -> Optional[Dict[str, Any]]:
+        """查询缓存，未命中返回None"""
+        key = self.make_key(content_hash, parser, version)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT payload FROM parse_cache WHERE cache_key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute(
+                'UPDATE parse_cache SET accessed_at = ?, hit_count = hit_count + 1 WHERE cache_key = ?',
+                (time.time(), key)
+            )
+            self._conn.commit()
+
+        return json.loads(row[0])
+
+    def put(self, content_hash: str, parser: str, version: str, result: Dict[str, Any]):
+        """写入缓存，超出容量时按LRU淘汰"""
+        try:
+            payload = json.dumps(result, ensure_ascii=False, default=str)
+        except (TypeError, ValueError):
+            return
+
+        size = len(payload.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+
+        key = self.make_key(content_hash, parser, version)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                '''INSERT OR REPLACE INTO parse_cache
+                   (cache_key, parser, version, payload, size_bytes, created_at, accessed_at, hit_count)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, 0)''',
+                (key, parser, version, payload, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def get_or_parse(self, file_path: str, parser: str, version: str, parse_func,
+                     cacheable=None) -> Dict[str, Any]:
+        """
+        带缓存的解析
+
+        Args:
+            file_path: 文件路径
+            parser: 解析器名称（用于区分不同解析器的输出格式）
+            version: 解析器版本
+            parse_func: 未命中时调用的解析函数 parse_func(file_path)
+            cacheable: 判断结果是否可缓存的函数，默认不缓存包含error的结果
+        """
+        return self.get_or_parse_content(hash_file(file_path), parser, version,
+                                         lambda: parse_func(file_path), cacheable)
+
+    def get_or_parse_content(self, content_hash: str, parser: str, version: str, parse_func,
+                             cacheable=None) -> Dict[str, Any]:
+        """
+        按已知的内容哈希查询缓存，未命中时才调用 parse_func()（无参数）
+
+        适用于边接收边计算哈希的上传内容：命中时文件无需落盘
+        """
+        cached = self.get(content_hash, parser, version)
+        if cached is not None:
+            return cached
+
+        result = parse_func()
+
+        if cacheable is None:
+            cacheable = _default_cacheable
+        if cacheable(result):
+            self.put(content_hash, parser, version, result)
+
+        return result
+
+    def _evict(self):
+        """按最近访问时间淘汰，直到满足容量限制（调用方持有锁）"""
+        total_bytes, total_entries = self._conn.execute(
+            'SELECT COALESCE(SUM(size_bytes), 0), COUNT(*) FROM parse_cache'
+        ).fetchone()
+
+        while total_entries > 0 and (total_bytes > self.max_bytes or total_entries > self.max_entries):
+            row = self._conn.execute(
+                'SELECT cache_key, size_bytes FROM parse_cache ORDER BY accessed_at ASC LIMIT 1'
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute('DELETE FROM parse_cache WHERE cache_key = ?', (row[0],))
+            total_bytes -= row[1]
+            total_entries -= 1
+            self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute('DELETE FROM parse_cache')
+            self._conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            total_bytes, total_entries = self._conn.execute(
+                'SELECT COALESCE(SUM(size_bytes), 0), COUNT(*) FROM parse_cache'
+            ).fetchone()
+
+        lookups = self.hits + self.misses
+        return {
+            'entries': total_entries,
+            'size_bytes': total_bytes,
+            'max_bytes': self.max_bytes,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups > 0 else 0.0
+        }
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+def _default_cacheable(result: Any) -> bool:
+    """默认缓存策略：只缓存成功的字典结果"""
+    if not isinstance(result, dict):
+        return False
+    if result.get('error'):
+        return False
+    if result.get('success') is False:
+        return False
+    return True
+
+
+# 进程内共享的缓存实例
+_parse_cache = None
+_parse_cache_lock = threading.Lock()
+
+
+def get_parse_cache() -> Optional[ParseCache]:
+    """获取全局解析缓存（设置 PARSE_CACHE_DISABLED=1 可关闭）"""
+    global _parse_cache
+    if os.environ.get('PARSE_CACHE_DISABLED') == '1':
+        return None
+
+    if _parse_cache is None:
+        with _parse_cache_lock:
+            if _parse_cache is None:
+                try:
+                    _parse_cache = ParseCache(
+                        cache_file=os.environ.get('PARSE_CACHE_FILE', DEFAULT_CACHE_FILE),
+                        max_bytes=int(os.environ.get('PARSE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+                    )
+                except (sqlite3.Error, OSError) as e:
+                    logger.warning('解析缓存初始化失败: %s', e)
+                    return None
+    return _parse_cache
+
+
+def current_parse_cache() -> Optional[ParseCache]:
+    """已创建的全局解析缓存（不会触发创建，供指标采集使用）"""
+    return _parse_cache
+
+
+def cached_parse(file_path: str, parser: str, version: str, parse_func, cacheable=None) -> Dict[str, Any]:
+    """使用全局缓存解析文件，缓存不可用时直接解析"""
+    cache = get_parse_cache()
+    if cache is None:
+        return parse_func(file_path)
+
+    try:
+        return cache.get_or_parse(file_path, parser, version, parse_func, cacheable)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning('解析缓存不可用，直接解析: %s', e)
+        return parse_func(file_path)
+
+
+def cached_parse_content(content_hash: str, parser: str, version: str, parse_func,
+                         cacheable=None) -> Dict[str, Any]:
+    """按内容哈希使用全局缓存，parse_func 为无参数的解析函数"""
+    cache = get_parse_cache()
+    if cache is None:
+        return parse_func()
+
+    try:
+        return cache.get_or_parse_content(content_hash, parser, version, parse_func, cacheable)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning('解析缓存不可用，直接解析: %s', e)
+        return parse_func()
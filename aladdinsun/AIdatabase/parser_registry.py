@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+文件解析器注册表 - 按文件内容（魔数/ZIP结构）识别类型并分派解析器
+扩展名错误的文件在导入重量级解析库、完整读取之前就能被识别或拒绝
+"""
+
+import os
+import json
+import zipfile
+import importlib.util
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 嗅探时读取的文件头长度
+SNIFF_BYTES = 8192
+
+# 魔数 -> 文件类型
+_MAGIC_SIGNATURES = [
+    (b'%PDF-', 'pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'II*\x00', 'tiff'),
+    (b'MM\x00*', 'tiff'),
+    (b'BM', 'bmp'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'xls'),  # OLE2复合文档（旧版Excel）
+    (b'PK\x03\x04', 'zip'),
+]
+
+IMAGE_TYPES = ('png', 'jpeg', 'gif', 'bmp', 'tiff')
+EXCEL_TYPES = ('xlsx', 'xlsm', 'xlsb', 'xls')
+TEXT_TYPES = ('json', 'csv', 'txt')
+
+
+class UnsupportedFileError(ValueError):
+    """文件内容类型不受支持或缺少对应解析库"""
+
+    def __init__(self, message: str, file_type: str = 'unknown'):
+        super().__init__(message)
+        self.file_type = file_type
+
+
+def sniff_file_type(file_path: str) -> str:
+    """
+    根据文件内容识别类型
+
+    Returns:
+        pdf/png/jpeg/gif/bmp/tiff/xlsx/xlsm/xlsb/xls/docx/zip/json/csv/txt/unknown
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+
+    if not head:
+        return 'unknown'
+
+    for magic, file_type in _MAGIC_SIGNATURES:
+        if head.startswith(magic):
+            if file_type == 'zip':
+                return _sniff_zip(file_path)
+            return file_type
+
+    return _sniff_text(head)
+
+
+def _sniff_zip(file_path: str) -> str:
+    """识别基于ZIP的Office文档（只读中央目录，不解压内容）"""
+    try:
+        with zipfile.ZipFile(file_path) as zf:
+            names = set(zf.namelist())
+    except zipfile.BadZipFile:
+        return 'unknown'
+
+    if 'xl/workbook.bin' in names:
+        return 'xlsb'
+    if 'xl/workbook.xml' in names:
+        return 'xlsm' if 'xl/vbaProject.bin' in names else 'xlsx'
+    if 'word/document.xml' in names:
+        return 'docx'
+    return 'zip'
+
+
+def _sniff_text(head: bytes) -> str:
+    """识别文本类文件"""
+    if b'\x00' in head:
+        return 'unknown'
+
+    try:
+        text = head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # 文件头截断在多字节字符中间时，只要前面部分是合法UTF-8即可
+        if e.start < len(head) - 4:
+            return 'unknown'
+        text = head[:e.start].decode('utf-8')
+
+    stripped = text.lstrip('\ufeff \t\r\n')
+    if stripped[:1] in ('{', '['):
+        if len(head) < SNIFF_BYTES:
+            try:
+                json.loads(stripped)
+                return 'json'
+            except ValueError:
+                pass
+        else:
+            return 'json'
+
+    lines = [line for line in stripped.splitlines()[:10] if line.strip()]
+    if len(lines) >= 2:
+        for delimiter in (',', '\t', ';', '|'):
+            counts = [line.count(delimiter) for line in lines[:-1] or lines]
+            if counts[0] > 0 and all(c == counts[0] for c in counts):
+                return 'csv'
+
+    return 'txt'
+
+
+def module_available(module_name: str) -> bool:
+    """检查模块是否可导入（不实际导入）"""
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class ParserRegistry:
+    """
+    解析器注册表
+
+    用法:
+        registry = ParserRegistry()
+        registry.register(['xlsx', 'xlsm'], parse_excel, requires=['openpyxl'])
+        result = registry.dispatch(file_path)
+    """
+
+    def __init__(self):
+        self._parsers: Dict[str, Tuple[Callable, Tuple[str, ...]]] = {}
+
+    def register(self, file_types, parser: Callable, requires: Optional[Sequence[str]] = None):
+        """
+        注册解析器
+
+        Args:
+            file_types: 文件类型或类型列表（见 sniff_file_type 的返回值）
+            parser: 解析函数 parser(file_path)
+            requires: 解析器依赖的模块，缺失时在分派阶段直接拒绝
+        """
+        if isinstance(file_types, str):
+            file_types = [file_types]
+        for file_type in file_types:
+            self._parsers[file_type] = (parser, tuple(requires or ()))
+
+    def unregister(self, file_type: str):
+        """移除解析器"""
+        self._parsers.pop(file_type, None)
+
+    def supported_types(self) -> List[str]:
+        """已注册的文件类型"""
+        return sorted(self._parsers.keys())
+
+    def resolve(self, file_path: str) -> Tuple[str, Callable]:
+        """识别文件类型并返回对应的解析器"""
+        file_type = sniff_file_type(file_path)
+
+        if file_type not in self._parsers:
+            ext = os.path.splitext(file_path)[1].lower()
+            raise UnsupportedFileError(f"不支持的文件内容类型: {file_type} (扩展名: {ext or '无'})", file_type)
+
+        parser, requires = self._parsers[file_type]
+        missing = [name for name in requires if not module_available(name)]
+        if missing:
+            raise UnsupportedFileError(
+                f"{file_type} 文件缺少解析依赖模块: {', '.join(missing)}", file_type
+            )
+
+        return file_type, parser
+
+    def dispatch(self, file_path: str):
+        """识别文件类型并调用解析器"""
+        _, parser = self.resolve(file_path)
+        return parser(file_path)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+PDF逐页流式提取
+按页惰性读取文本并增量提取字段，所需参数全部找到后立即停止；
+不再设固定页数上限，而是在时间预算内尽量扫描全部页面
+"""
+
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+# 默认扫描时间预算（秒），可用环境变量 PDF_TIME_BUDGET_S 覆盖
+DEFAULT_TIME_BUDGET_S = float(os.environ.get('PDF_TIME_BUDGET_S', '5'))
+
+# 跨页保留的上一页末尾字符数，防止字段被分页截断后漏识别
+PAGE_OVERLAP_CHARS = 200
+
+
+def iter_pdf_pages(file_path: str, max_pages: Optional[int] = None,
+                   time_budget_s: Optional[float] = None) -> Iterator[Tuple[int, str]]:
+    """
+    逐页产出 (页码, 文本)，页码从1开始
+
+    Args:
+        file_path: PDF路径
+        max_pages: 最多读取的页数，None表示不限
+        time_budget_s: 时间预算，超出后停止产出（已开始的页面会读完）
+    """
+    import PyPDF2
+
+    deadline = time.monotonic() + time_budget_s if time_budget_s else None
+
+    with open(file_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        for index, page in enumerate(reader.pages):
+            if max_pages is not None and index >= max_pages:
+                return
+            if deadline is not None and time.monotonic() > deadline:
+                return
+            yield index + 1, page.extract_text() or ''
+
+
+def count_pdf_pages(file_path: str) -> int:
+    """PDF总页数（只读取页面目录）"""
+    import PyPDF2
+
+    with open(file_path, 'rb') as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+class IncrementalFieldExtractor:
+    """
+    增量字段提取器
+
+    每喂入一页文本就运行一次字段提取函数，先找到的值优先（与整篇拼接后
+    re.search 取第一个匹配的语义一致），所需字段全部找到后 complete 为 True。
+    """
+
+    def __init__(self, extractor: Callable[[str], Dict[str, Any]],
+                 required_fields: Sequence[str] = (), overlap_chars: int = PAGE_OVERLAP_CHARS):
+        self.extractor = extractor
+        self.required_fields = tuple(required_fields)
+        self.overlap_chars = overlap_chars
+        self.params: Dict[str, Any] = {}
+        self.pages_fed = 0
+        self._tail = ''
+
+    def feed(self, text: str) -> Dict[str, Any]:
+        """喂入一页文本，返回本页新找到的字段"""
+        self.pages_fed += 1
+        found = self.extractor(self._tail + text) if (self._tail or text) else {}
+        self._tail = text[-self.overlap_chars:] if self.overlap_chars else ''
+
+        new_fields = {}
+        for key, value in found.items():
+            if key not in self.params:
+                self.params[key] = value
+                new_fields[key] = value
+        return new_fields
+
+    @property
+    def missing_fields(self) -> Tuple[str, ...]:
+        return tuple(name for name in self.required_fields if name not in self.params)
+
+    @property
+    def complete(self) -> bool:
+        return bool(self.required_fields) and not self.missing_fields
+
+
+def extract_fields_from_pages(pages: Iterable[Tuple[int, str]],
+                              extractor: Callable[[str], Dict[str, Any]],
+                              required_fields: Sequence[str] = ()) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    从页面流中增量提取字段，所需字段齐全后立即停止迭代
+
+    Returns:
+        (字段字典, 扫描信息 {'pages_scanned', 'stopped_reason', 'missing_fields', 'elapsed_ms'})
+    """
+    start = time.perf_counter()
+    incremental = IncrementalFieldExtractor(extractor, required_fields)
+    stopped_reason = 'end_of_document'
+
+    for _, text in pages:
+        incremental.feed(text)
+        if incremental.complete:
+            stopped_reason = 'all_fields_found'
+            break
+
+    info = {
+        'pages_scanned': incremental.pages_fed,
+        'stopped_reason': stopped_reason,
+        'missing_fields': list(incremental.missing_fields),
+        'elapsed_ms': (time.perf_counter() - start) * 1000
+    }
+    return incremental.params, info
+
+
+def stream_extract_pdf(file_path: str, extractor: Callable[[str], Dict[str, Any]],
+                       required_fields: Sequence[str] = (),
+                       time_budget_s: Optional[float] = DEFAULT_TIME_BUDGET_S,
+                       max_pages: Optional[int] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    流式扫描PDF并提取字段
+
+    Returns:
+        (字段字典, 扫描信息)；时间预算耗尽时 stopped_reason 为 'time_budget'
+    """
+    deadline = time.monotonic() + time_budget_s if time_budget_s else None
+    params, info = extract_fields_from_pages(
+        iter_pdf_pages(file_path, max_pages=max_pages, time_budget_s=time_budget_s),
+        extractor, required_fields
+    )
+
+    if info['stopped_reason'] == 'end_of_document':
+        if deadline is not None and time.monotonic() > deadline:
+            info['stopped_reason'] = 'time_budget'
+        elif max_pages is not None and info['pages_scanned'] >= max_pages:
+            info['stopped_reason'] = 'page_limit'
+
+    return params, info
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+相同请求合并计算（singleflight）
+
+同一时刻相同规范化输入的预测只计算一次：第一个到达的请求（leader）执行计算，
+其余并发请求等待并共享同一个结果，计算结束后立即移除，不做结果缓存。
+
+设置 SINGLEFLIGHT_LOCK_DIR 后可跨 worker 进程合并：leader 持有该键所在分条的 .lock 文件锁计算，
+结果写到 <key>.json；其他进程等锁释放后直接读取 RESULT_TTL_S 秒内写出的结果。
+文件锁依赖 fcntl（仅 POSIX），不可用时退化为进程内合并。
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from file_io import FCNTL_AVAILABLE, atomic_open
+from metrics import Counter
+from tracing import get_logger
+
+if FCNTL_AVAILABLE:
+    import fcntl
+
+logger = get_logger(__name__)
+
+# 跨进程合并的锁文件目录（为空时只在进程内合并）
+LOCK_DIR = os.environ.get('SINGLEFLIGHT_LOCK_DIR', '')
+
+# 跨进程共享结果的有效期：只复用刚由其他进程算完的结果
+RESULT_TTL_S = float(os.environ.get('SINGLEFLIGHT_RESULT_TTL_S', 5))
+
+# 等待其他进程计算的上限，超时后自己计算
+LOCK_WAIT_S = float(os.environ.get('SINGLEFLIGHT_LOCK_WAIT_S', 30))
+_LOCK_POLL_S = 0.01
+
+# 锁文件按键的哈希尾部分成256条，文件数有界且无需删除（删除正在使用的锁文件会破坏互斥）
+_LOCK_STRIPE_CHARS = 2
+
+# 每写出多少个结果文件清理一次过期结果
+_SWEEP_EVERY = 100
+
+SINGLEFLIGHT_CALLS = Counter(
+    'singleflight_calls_total', '合并计算调用数（leader=实际计算, shared=共享进程内结果, '
+    'shared_cross_process=共享其他进程结果）', ('namespace', 'outcome'))
+
+
+def canonical_key(namespace: str, payload: Any) -> str:
+    """规范化输入的键：键排序、去空白的JSON的SHA-256"""
+    text = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return f"{namespace}-{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """按键合并并发调用"""
+
+    def __init__(self, namespace: str, lock_dir: Optional[str] = None):
+        self.namespace = namespace
+        self.lock_dir = lock_dir if lock_dir is not None else LOCK_DIR
+        if self.lock_dir and not FCNTL_AVAILABLE:
+            logger.warning('fcntl 不可用，singleflight 只在进程内合并')
+            self.lock_dir = ''
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行或等待 key 对应的计算
+
+        Returns:
+            (结果, 是否共享了其他调用的结果)；共享的结果对象由所有调用方共用，不要原地修改
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            SINGLEFLIGHT_CALLS.inc(namespace=self.namespace, outcome='shared')
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        shared = False
+        try:
+            if self.lock_dir:
+                call.result, shared = self._do_cross_process(key, fn)
+            else:
+                call.result = fn()
+            SINGLEFLIGHT_CALLS.inc(namespace=self.namespace,
+                                   outcome='shared_cross_process' if shared else 'leader')
+            return call.result, shared
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _do_cross_process(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        lock_path = os.path.join(self.lock_dir, f'{self.namespace}.{key[-_LOCK_STRIPE_CHARS:]}.lock')
+        result_path = os.path.join(self.lock_dir, key + '.json')
+
+        with open(lock_path, 'a') as lock_file:
+            waited = self._acquire_file_lock(lock_file)
+            try:
+                if waited:
+                    cached = self._read_fresh_result(result_path)
+                    if cached is not None:
+                        return cached, True
+
+                result = fn()
+                self._write_result(result_path, result)
+                return result, False
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _acquire_file_lock(lock_file) -> bool:
+        """获取文件锁，返回是否等待过其他进程；等待超时后不加锁直接计算"""
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return False
+        except BlockingIOError:
+            pass
+
+        deadline = time.monotonic() + LOCK_WAIT_S
+        while time.monotonic() < deadline:
+            time.sleep(_LOCK_POLL_S)
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                continue
+        logger.warning('等待跨进程计算超时（%.0fs），自行计算: %s', LOCK_WAIT_S, lock_file.name)
+        return False
+
+    @staticmethod
+    def _read_fresh_result(result_path: str) -> Any:
+        try:
+            if time.time() - os.path.getmtime(result_path) > RESULT_TTL_S:
+                return None
+            with open(result_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_result(self, result_path: str, result: Any):
+        # 共享结果只在 RESULT_TTL_S 内有效，不必等待落盘
+        try:
+            with atomic_open(result_path, 'w', encoding='utf-8', fsync=False) as f:
+                json.dump(result, f, ensure_ascii=False, default=str)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning('写出共享结果失败: %s', e)
+            return
+
+        self._writes += 1
+        if self._writes % _SWEEP_EVERY == 0:
+            self._sweep()
+
+    def _sweep(self):
+        """删除过期的结果文件"""
+        cutoff = time.time() - max(RESULT_TTL_S * 10, 60)
+        try:
+            entries = list(os.scandir(self.lock_dir))
+        except OSError:
+            return
+        for entry in entries:
+            if not (entry.name.startswith(self.namespace + '-') and entry.name.endswith('.json')):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+            except OSError:
+                pass
+
+
+_flights: Dict[str, SingleFlight] = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(namespace: str) -> SingleFlight:
+    """按命名空间获取进程内共享的 SingleFlight"""
+    flight = _flights.get(namespace)
+    if flight is None:
+        with _flights_lock:
+            flight = _flights.get(namespace)
+            if flight is None:
+                flight = SingleFlight(namespace)
+                _flights[namespace] = flight
+    return flight
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+配置类接口的预计算响应
+
+参数表单配置、模型库列表、信创厂商对比这类数据只随代码或模型库文件变化，
+首次请求（或版本标记变化）时序列化一次，同时预先压缩出 gzip/brotli 版本并计算强ETag；
+之后的请求直接返回缓存的字节，If-None-Match 命中时返回 304。
+
+用法:
+    from static_payloads import cached_json_response
+    return cached_json_response('model_libraries', build_func, version=manager.libraries_version())
+"""
+
+import gzip
+import json
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# 小于该大小的响应不压缩（压缩头开销大于收益）
+MIN_COMPRESS_BYTES = 512
+
+# 浏览器可以缓存，但每次使用前必须用 ETag 向服务器确认
+CACHE_CONTROL = 'no-cache'
+
+
+@dataclass(frozen=True)
+class PrecompressedPayload:
+    """一份序列化好的响应及其压缩版本"""
+    body: bytes
+    etag: str
+    gzip_body: Optional[bytes] = None
+    brotli_body: Optional[bytes] = None
+    mimetype: str = 'application/json'
+
+
+def build_payload(data: Any) -> PrecompressedPayload:
+    """序列化为JSON并预压缩"""
+    body = json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+    etag = hashlib.sha256(body).hexdigest()[:32]
+
+    gzip_body = brotli_body = None
+    if len(body) >= MIN_COMPRESS_BYTES:
+        gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+        if BROTLI_AVAILABLE:
+            brotli_body = brotli.compress(body, quality=11)
+    return PrecompressedPayload(body=body, etag=etag, gzip_body=gzip_body, brotli_body=brotli_body)
+
+
+class StaticPayloadCache:
+    """按 key 缓存预计算响应，version 变化时重建"""
+
+    def __init__(self):
+        self._entries: Dict[Hashable, Tuple[Hashable, PrecompressedPayload]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, builder: Callable[[], Any], version: Hashable = None) -> PrecompressedPayload:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+            payload = build_payload(builder())
+            self._entries[key] = (version, payload)
+            return payload
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+_payload_cache = StaticPayloadCache()
+
+
+def get_payload_cache() -> StaticPayloadCache:
+    return _payload_cache
+
+
+def payload_response(payload: PrecompressedPayload):
+    """按 If-None-Match 和 Accept-Encoding 返回 304 或合适的预压缩内容"""
+    from flask import Response, request
+
+    # 强ETag 按编码区分（同一内容的不同压缩版本字节不同），任一版本匹配都说明内容未变
+    variants = {'': payload.body, 'gzip': payload.gzip_body, 'br': payload.brotli_body}
+    etags = {encoding: payload.etag + (f'-{encoding}' if encoding else '') for encoding in variants}
+    headers = {'Cache-Control': CACHE_CONTROL, 'Vary': 'Accept-Encoding'}
+
+    accepted = request.accept_encodings
+    encoding = ''
+    if payload.brotli_body is not None and accepted['br']:
+        encoding = 'br'
+    elif payload.gzip_body is not None and accepted['gzip']:
+        encoding = 'gzip'
+    headers['ETag'] = f'"{etags[encoding]}"'
+
+    if any(request.if_none_match.contains(etag) for etag in etags.values()):
+        return Response(status=304, headers=headers)
+
+    body = variants[encoding]
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, mimetype=payload.mimetype, headers=headers)
+
+
+def cached_json_response(key: Hashable, builder: Callable[[], Any], version: Hashable = None):
+    """返回 key 对应的预计算JSON响应；version 与缓存不同时调用 builder() 重建"""
+    return payload_response(_payload_cache.get(key, builder, version))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+多系统统计累加器
+以运行中的求和/最大值/计数汇总系统清单，不需要把所有系统物化成列表，
+逐条添加和按DataFrame分块添加的结果一致
+"""
+
+from typing import Any, Dict, Iterable
+
+
+def _num(value: Any) -> float:
+    """None/NaN/非数值按0处理"""
+    if isinstance(value, (int, float)) and value == value:
+        return value
+    return 0
+
+
+class SystemStatsAccumulator:
+    """系统统计累加器"""
+
+    def __init__(self):
+        self.total_systems = 0
+        self.total_data_size_gb = 0
+        self.total_qps = 0
+        self.total_tps = 0
+        self.total_connections = 0
+        self.max_qps = 0
+
+    def add(self, system: Dict[str, Any]):
+        """添加一个系统"""
+        self.total_systems += 1
+        self.total_data_size_gb += _num(system.get('data_size_gb', 0))
+        self.total_qps += _num(system.get('qps', 0))
+        self.total_tps += _num(system.get('tps', 0))
+        self.total_connections += _num(system.get('connections', 0))
+        self.max_qps = max(self.max_qps, _num(system.get('qps', 0)))
+
+    def add_systems(self, systems: Iterable[Dict[str, Any]]):
+        """添加多个系统"""
+        for system in systems:
+            self.add(system)
+
+    def add_frame(self, df):
+        """
+        按列向量化累加一个已清洗的DataFrame分块
+
+        Args:
+            df: 列名为标准字段（data_size_gb/qps/tps/connections）的DataFrame，每行一个系统
+        """
+        if df.empty:
+            return
+
+        self.total_systems += len(df)
+        if 'data_size_gb' in df:
+            self.total_data_size_gb += float(df['data_size_gb'].fillna(0).sum())
+        if 'qps' in df:
+            qps = df['qps'].fillna(0)
+            self.total_qps += float(qps.sum())
+            self.max_qps = max(self.max_qps, float(qps.max()))
+        if 'tps' in df:
+            self.total_tps += float(df['tps'].fillna(0).sum())
+        if 'connections' in df:
+            self.total_connections += float(df['connections'].fillna(0).sum())
+
+    def to_dict(self) -> Dict[str, Any]:
+        """输出与 AdvancedFileProcessor._calculate_statistics 相同结构的统计结果"""
+        if self.total_systems == 0:
+            return {}
+
+        return {
+            'total_systems': self.total_systems,
+            'total_data_size_gb': self.total_data_size_gb,
+            'total_qps': self.total_qps,
+            'total_tps': self.total_tps,
+            'total_connections': self.total_connections,
+            'max_qps': self.max_qps,
+            'avg_qps': self.total_qps / self.total_systems,
+            'total_data_size_tb': self.total_data_size_gb / 1024
+        }
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+表格结构识别 - 基于形态学直线检测定位表格网格并裁剪单元格
+单元格分批交给OCR线程池识别，再按行列重建为二维表
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from metrics import OCR_QUEUE_DEPTH
+
+# 直线检测核长度 = 图像边长 / LINE_SCALE
+LINE_SCALE = 40
+# 网格线投影占比阈值（相对表格宽/高）
+LINE_COVERAGE = 0.5
+# 最小表格尺寸与单元格尺寸（像素）
+MIN_TABLE_SIZE = 40
+MIN_CELL_SIZE = 8
+# 单元格内缩像素，避免把网格线送进OCR
+CELL_INSET = 3
+# 低于该墨迹占比的单元格视为空白，不做OCR
+BLANK_INK_RATIO = 0.005
+
+
+@dataclass
+class TableGrid:
+    """检测到的表格网格（坐标为整图绝对像素坐标）"""
+    x: int
+    y: int
+    width: int
+    height: int
+    row_lines: List[int] = field(default_factory=list)
+    col_lines: List[int] = field(default_factory=list)
+
+    @property
+    def n_rows(self) -> int:
+        return max(0, len(self.row_lines) - 1)
+
+    @property
+    def n_cols(self) -> int:
+        return max(0, len(self.col_lines) - 1)
+
+    def cell_boxes(self) -> List[Tuple[int, int, int, int, int, int]]:
+        """返回 (行号, 列号, x0, y0, x1, y1) 列表"""
+        boxes = []
+        for r in range(self.n_rows):
+            y0, y1 = self.row_lines[r], self.row_lines[r + 1]
+            for c in range(self.n_cols):
+                x0, x1 = self.col_lines[c], self.col_lines[c + 1]
+                boxes.append((r, c, x0, y0, x1, y1))
+        return boxes
+
+
+def _binarize_inverted(gray: np.ndarray) -> np.ndarray:
+    """反色二值化：线条和文字为白色"""
+    return cv2.adaptiveThreshold(
+        cv2.bitwise_not(gray), 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 15, -2
+    )
+
+
+def _line_masks(binary: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """形态学开运算分别提取水平线和垂直线"""
+    height, width = binary.shape[:2]
+
+    h_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(width // LINE_SCALE, 10), 1))
+    v_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(height // LINE_SCALE, 10)))
+
+    horizontal = cv2.morphologyEx(binary, cv2.MORPH_OPEN, h_kernel)
+    vertical = cv2.morphologyEx(binary, cv2.MORPH_OPEN, v_kernel)
+    return horizontal, vertical
+
+
+def _line_positions(projection: np.ndarray, threshold: float) -> List[int]:
+    """把投影中超过阈值的连续区间合并为一条线（取中心）"""
+    positions = []
+    start = None
+    for i, value in enumerate(projection):
+        if value >= threshold:
+            if start is None:
+                start = i
+        elif start is not None:
+            positions.append((start + i - 1) // 2)
+            start = None
+    if start is not None:
+        positions.append((start + len(projection) - 1) // 2)
+    return positions
+
+
+def _dedupe_lines(lines: List[int], min_gap: int) -> List[int]:
+    """去掉间距过小的相邻线（粗线或双线）"""
+    result = []
+    for pos in lines:
+        if not result or pos - result[-1] >= min_gap:
+            result.append(pos)
+    return result
+
+
+def detect_tables(gray: np.ndarray) -> List[TableGrid]:
+    """
+    检测图像中的表格网格
+
+    Args:
+        gray: 灰度图（uint8）
+
+    Returns:
+        按从上到下、从左到右排序的表格网格列表
+    """
+    if gray.ndim == 3:
+        gray = cv2.cvtColor(gray, cv2.COLOR_RGB2GRAY)
+
+    binary = _binarize_inverted(gray)
+    horizontal, vertical = _line_masks(binary)
+    grid_mask = cv2.bitwise_or(horizontal, vertical)
+
+    contours, _ = cv2.findContours(grid_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    tables = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w < MIN_TABLE_SIZE or h < MIN_TABLE_SIZE:
+            continue
+
+        h_roi = horizontal[y:y + h, x:x + w]
+        v_roi = vertical[y:y + h, x:x + w]
+
+        row_lines = _line_positions(h_roi.sum(axis=1) / 255.0, w * LINE_COVERAGE)
+        col_lines = _line_positions(v_roi.sum(axis=0) / 255.0, h * LINE_COVERAGE)
+        row_lines = _dedupe_lines(row_lines, MIN_CELL_SIZE)
+        col_lines = _dedupe_lines(col_lines, MIN_CELL_SIZE)
+
+        if len(row_lines) < 2 or len(col_lines) < 2:
+            continue
+
+        tables.append(TableGrid(
+            x=x, y=y, width=w, height=h,
+            row_lines=[y + pos for pos in row_lines],
+            col_lines=[x + pos for pos in col_lines]
+        ))
+
+    tables.sort(key=lambda t: (t.y, t.x))
+    return tables
+
+
+def crop_cell(gray: np.ndarray, box: Tuple[int, int, int, int], inset: int = CELL_INSET) -> Optional[np.ndarray]:
+    """裁剪单元格内部区域；空白单元格返回None"""
+    x0, y0, x1, y1 = box
+    x0, y0, x1, y1 = x0 + inset, y0 + inset, x1 - inset, y1 - inset
+    if x1 - x0 < MIN_CELL_SIZE or y1 - y0 < MIN_CELL_SIZE:
+        return None
+
+    cell = gray[y0:y1, x0:x1]
+    ink = np.count_nonzero(cell < 128) / cell.size
+    if ink < BLANK_INK_RATIO:
+        return None
+
+    # 四周留白有助于OCR识别贴边文字
+    return cv2.copyMakeBorder(cell, 8, 8, 8, 8, cv2.BORDER_CONSTANT, value=255)
+
+
+def ocr_table(gray: np.ndarray, grid: TableGrid, ocr_cell: Callable[[np.ndarray], str],
+              executor=None, batch_size: int = 8) -> List[List[str]]:
+    """
+    识别表格中所有单元格并重建为行列
+
+    Args:
+        gray: 灰度图
+        grid: 表格网格
+        ocr_cell: 单元格识别函数 ocr_cell(cell_image) -> str
+        executor: OCR线程池（concurrent.futures.Executor），为None时顺序执行
+        batch_size: 每个任务识别的单元格数量
+
+    Returns:
+        二维字符串列表 rows[row][col]
+    """
+    rows = [['' for _ in range(grid.n_cols)] for _ in range(grid.n_rows)]
+
+    jobs = []
+    for r, c, x0, y0, x1, y1 in grid.cell_boxes():
+        cell = crop_cell(gray, (x0, y0, x1, y1))
+        if cell is not None:
+            jobs.append((r, c, cell))
+
+    def run_batch(batch):
+        return [(r, c, (ocr_cell(cell) or '').strip()) for r, c, cell in batch]
+
+    batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+
+    # 队列深度按批次计：提交时加，取回结果时减（异常时一次性扣除剩余批次）
+    pending = len(batches)
+    OCR_QUEUE_DEPTH.inc(pending)
+    try:
+        if executor is None:
+            results = map(run_batch, batches)
+        else:
+            results = executor.map(run_batch, batches)
+
+        for batch_result in results:
+            pending -= 1
+            OCR_QUEUE_DEPTH.dec()
+            for r, c, text in batch_result:
+                rows[r][c] = ' '.join(text.split())
+    finally:
+        if pending:
+            OCR_QUEUE_DEPTH.dec(pending)
+
+    return rows
+
+
+def mask_tables(gray: np.ndarray, grids: List[TableGrid]) -> np.ndarray:
+    """把表格区域涂白，只保留表格之外的文字"""
+    masked = gray.copy()
+    for grid in grids:
+        masked[grid.y:grid.y + grid.height + 1, grid.x:grid.x + grid.width + 1] = 255
+    return masked
+
+
+def has_ink(gray: np.ndarray, ratio: float = BLANK_INK_RATIO) -> bool:
+    """图像中是否还有需要识别的内容"""
+    return gray.size > 0 and np.count_nonzero(gray < 128) / gray.size >= ratio
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""测试重型接口准入控制"""
+
+import threading
+
+import pytest
+from flask import Flask, Response, jsonify, request
+
+import admission
+from admission import AdmissionGate, AdmissionRejected, RouteClassConfig, admission_limit
+
+
+def _gate(limit=1, timeout_s=0.05, max_waiting=1):
+    return AdmissionGate('test', RouteClassConfig(limit=limit, timeout_s=timeout_s,
+                                                  max_waiting=max_waiting, retry_after_s=3))
+
+
+def test_gate_rejects_when_full():
+    """额度用完后：排队超时返回503，排队已满立即返回429"""
+    gate = _gate(limit=1, timeout_s=0.05, max_waiting=1)
+    gate.acquire()
+
+    with pytest.raises(AdmissionRejected) as timeout:
+        gate.acquire()
+    assert timeout.value.status_code == 503
+    assert gate.waiting == 0
+
+    # 占住唯一的排队位置，再来的请求直接429
+    gate.config.timeout_s = 1.0
+    outcomes = []
+
+    def wait():
+        try:
+            gate.acquire()
+        except AdmissionRejected as e:
+            outcomes.append(e.status_code)
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    while gate.waiting == 0:
+        pass
+    with pytest.raises(AdmissionRejected) as full:
+        gate.acquire()
+    assert full.value.status_code == 429
+    waiter.join()
+    assert outcomes == [503]
+
+    gate.release()
+    gate.acquire()
+    assert gate.in_use == 1
+
+
+def test_waiter_admitted_after_release():
+    """排队中的请求在额度释放后放行"""
+    gate = _gate(limit=1, timeout_s=2.0)
+    gate.acquire()
+    admitted = []
+
+    def wait():
+        gate.acquire()
+        admitted.append(True)
+        gate.release()
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    while gate.waiting == 0:
+        pass
+    gate.release()
+    waiter.join()
+
+    assert admitted == [True]
+    assert gate.in_use == 0 and gate.waiting == 0
+
+
+def test_flask_route_rejection_and_streaming():
+    """超限返回带 Retry-After 的JSON；流式响应在关闭时才释放额度；分类函数返回 None 时不限流"""
+    original = admission._gates
+    admission._gates = {'batch': _gate(limit=1, timeout_s=0.01, max_waiting=0)}
+    try:
+        app = Flask(__name__)
+
+        @app.route('/stream')
+        @admission_limit('batch')
+        def stream():
+            return Response(iter([b'a', b'b']), mimetype='text/plain')
+
+        @app.route('/maybe')
+        @admission_limit(lambda: 'batch' if request.args.get('heavy') else None)
+        def maybe():
+            return jsonify({'ok': True})
+
+        client = app.test_client()
+        first = client.get('/stream')
+        rejected = client.get('/stream')
+        assert rejected.status_code == 429
+        assert rejected.headers['Retry-After'] == '3'
+        assert rejected.get_json()['success'] is False
+        assert client.get('/maybe').status_code == 200
+        assert client.get('/maybe?heavy=1').status_code == 429
+
+        assert first.get_data() == b'ab'
+        first.close()
+        assert admission.get_gate('batch').in_use == 0
+        assert client.get('/maybe?heavy=1').status_code == 200
+    finally:
+        admission._gates = original
+
+
+if __name__ == '__main__':
+    test_gate_rejects_when_full()
+    test_waiter_admitted_after_release()
+    test_flask_route_rejection_and_streaming()
+    print("✅ 准入控制测试通过！")
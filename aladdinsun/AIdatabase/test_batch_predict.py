@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""测试批量预测：行读取、进程池流式产出与汇总"""
+
+import os
+import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import openpyxl
+
+from batch_predict import (
+    detect_batch_format, iter_batch_rows, iter_csv, iter_jsonl_rows, normalize_row, run_batch
+)
+
+
+def _rows(count):
+    for i in range(count):
+        yield {'system_name': f'系统{i}', 'current_data_size_gb': 100 + i, 'qps': 1000 + i * 10}
+
+
+def test_normalize_row():
+    """中文列名映射、字符串转数字/布尔、去掉空值"""
+    row = normalize_row({'系统名称': '核心', 'QPS (每秒查询数)': '1,200', '需要高可用': 'TRUE', '备注': ' '})
+    assert row == {'system_name': '核心', 'qps': 1200, 'need_high_availability': True}
+
+
+def test_run_batch_streams_rows_and_summary():
+    """每行一个结果，最后一行为汇总；线程池与串行结果一致"""
+    serial = list(run_batch(_rows(50), chunk_rows=8))
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        pooled = list(run_batch(_rows(50), executor, chunk_rows=8, max_in_flight=2))
+
+    for results in (serial, pooled):
+        assert [r['type'] for r in results] == ['row'] * 50 + ['summary']
+        assert sorted(r['row'] for r in results[:-1]) == list(range(50))
+        assert results[-1]['succeeded'] == 50
+
+    by_row = {r['row']: r for r in pooled[:-1]}
+    for result in serial[:-1]:
+        assert by_row[result['row']]['total_initial_cost'] == result['total_initial_cost']
+    assert pooled[-1]['total_initial_cost'] == serial[-1]['total_initial_cost']
+
+
+def test_file_formats():
+    """CSV、Excel、JSON Lines 读取结果一致"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        csv_path = os.path.join(tmpdir, 'systems.csv')
+        with open(csv_path, 'w', encoding='utf-8') as f:
+            f.write('系统名称,QPS (每秒查询数),当前数据规模 (GB)\n核心,5000,200\n报表,800,50\n')
+
+        xlsx_path = os.path.join(tmpdir, 'systems.xlsx')
+        wb = openpyxl.Workbook()
+        wb.active.append(['系统名称', 'QPS (每秒查询数)', '当前数据规模 (GB)'])
+        wb.active.append(['核心', 5000, 200])
+        wb.active.append(['报表', 800, 50])
+        wb.save(xlsx_path)
+
+        jsonl_path = os.path.join(tmpdir, 'systems.jsonl')
+        with open(jsonl_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'system_name': '核心', 'qps': 5000, 'current_data_size_gb': 200}) + '\n')
+            f.write(json.dumps({'system_name': '报表', 'qps': 800, 'current_data_size_gb': 50}) + '\n')
+
+        expected = [{'system_name': '核心', 'qps': 5000, 'current_data_size_gb': 200},
+                    {'system_name': '报表', 'qps': 800, 'current_data_size_gb': 50}]
+        for path, batch_format in [(csv_path, 'csv'), (xlsx_path, 'excel'), (jsonl_path, 'jsonl')]:
+            assert detect_batch_format(path) == batch_format
+            assert [normalize_row(r) for r in iter_batch_rows(path, batch_format)] == expected
+
+
+def test_csv_output_and_bad_rows():
+    """CSV输出含表头和汇总行，单行出错不影响其他行"""
+    rows = iter_jsonl_rows(['{"qps": 1000}', '{"qps": "abc"}'])
+    lines = ''.join(iter_csv(run_batch(rows))).strip().splitlines()
+
+    assert lines[0].startswith('row,system_name,success')
+    assert len(lines) == 4
+    assert lines[-1].startswith('summary,,False,1/2')
+
+
+if __name__ == '__main__':
+    test_normalize_row()
+    test_run_batch_streams_rows_and_summary()
+    test_file_formats()
+    test_csv_output_and_bad_rows()
+    print("✅ 批量预测测试通过！")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""测试相似案例检索索引"""
+
+import threading
+
+import numpy as np
+
+import case_index
+from case_index import CaseIndex, get_library_index
+from feature_pipeline import FEATURE_DIM, extract_features, materialize
+
+
+def _random_features(n, seed=0):
+    rng = np.random.default_rng(seed)
+    features = np.zeros((n, FEATURE_DIM), dtype=np.float32)
+    # 模拟几个聚集的部署类型，只有前 15 维有取值
+    centers = rng.normal(size=(20, 15)) * 3
+    features[:, :15] = centers[rng.integers(0, 20, n)] + rng.normal(size=(n, 15))
+    return features
+
+
+def _brute_force(features, queries, k):
+    std = features.std(axis=0)
+    active = std > 0
+    data = (features[:, active] - features.mean(axis=0)[active]) / std[active]
+    q = (queries[:, active] - features.mean(axis=0)[active]) / std[active]
+    distances = ((q[:, None, :] - data[None, :, :]) ** 2).sum(axis=2)
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def test_exact_search_matches_brute_force():
+    """精确检索与逐对计算距离的结果一致，距离升序"""
+    features = _random_features(500)
+    queries = _random_features(10, seed=1)
+    index = CaseIndex(features)
+    distances, indices = index.search(queries, k=5)
+
+    assert index.method == 'exact'
+    assert indices.tolist() == _brute_force(features, queries, 5).tolist()
+    assert np.all(np.diff(distances, axis=1) >= 0)
+    _, self_hit = index.search(features[42], k=1)
+    assert self_hit[0, 0] == 42
+
+
+def test_ivf_search_has_high_recall():
+    """分区近似检索：召回率高，查询的案例本身总能找回"""
+    features = _random_features(20000)
+    queries = features[::997] + 0.01
+    index = CaseIndex(features, exact_threshold=1000, n_probe=8)
+    assert index.method == 'ivf'
+
+    _, approx = index.search(queries, k=10)
+    exact = _brute_force(features, queries, 10)
+    recall = np.mean([len(set(a) & set(e)) / 10 for a, e in zip(approx, exact)])
+    assert recall >= 0.9
+    assert [row[0] for row in approx] == list(range(0, 20000, 997))
+
+
+def test_query_returns_cases_with_sources():
+    """query 返回案例的实际架构、来源和投票"""
+    cases = []
+    for i in range(30):
+        size = 100 * (i + 1) if i < 15 else 20000 + 100 * i
+        arch = 'standalone' if i < 15 else 'distributed'
+        cases.append({'id': i, 'input': {'total_data_size_gb': size, 'qps': 1000},
+                      'output': {'architecture_type': arch, 'node_count': 1, 'shard_count': 1, 'replica_count': 2},
+                      'metadata': {'industry': '金融'}})
+    matrix = materialize(cases)
+    index = CaseIndex(matrix.features, cases=cases, architecture=matrix.architecture,
+                      segments=[('lib_a', 15), ('lib_b', 15)])
+
+    result = index.query({'total_data_size_gb': 25000, 'qps': 1000}, k=3)
+    assert result['method'] == 'exact' and result['indexed_cases'] == 30
+    assert result['architecture_votes']['distributed'] == 3
+    top = result['results'][0]
+    assert top['rank'] == 1 and top['source'] == 'lib_b' and top['architecture_type'] == 'distributed'
+    assert top['metadata'] == {'industry': '金融'}
+    assert index.source_of(0) == 'lib_a' and index.source_of(14) == 'lib_a' and index.source_of(15) == 'lib_b'
+    assert np.allclose(extract_features(cases[top['case_id']]['input']), matrix.features[top['case_id']])
+
+
+class _FakeLibraryManager:
+    """只有一个模型库的 ModelLibraryManager 替身，load_library 可以被阻塞"""
+
+    def __init__(self, cases):
+        self.cases = cases
+        self.version = 1
+        self.release = threading.Event()
+        self.release.set()
+        self.custom_builder = self
+
+    def libraries_version(self):
+        return self.version
+
+    def list_installed_libraries(self):
+        return [{'id': 'lib'}]
+
+    def list_custom_libraries(self):
+        return []
+
+    def load_library(self, library_id):
+        self.release.wait(10)
+        return list(self.cases)
+
+
+def test_library_index_rebuilds_in_background():
+    """模型库变化后在后台重建索引，重建完成前继续返回旧索引"""
+    case_index._library_index = None
+    case_index._library_index_version = None
+    case = {'input': {'total_data_size_gb': 100, 'qps': 1000},
+            'output': {'architecture_type': 'standalone', 'node_count': 1, 'shard_count': 1, 'replica_count': 2}}
+    manager = _FakeLibraryManager([case] * 5)
+
+    first = get_library_index(manager)
+    assert first.size > 5 and get_library_index(manager) is first
+
+    manager.cases = [case] * 10
+    manager.version = 2
+    manager.release.clear()
+    assert get_library_index(manager) is first
+    thread = case_index._library_index_thread
+    assert thread is not None and get_library_index(manager) is first
+    assert case_index._library_index_thread is thread
+
+    manager.release.set()
+    thread.join(10)
+    rebuilt = get_library_index(manager)
+    assert rebuilt is not first and rebuilt.size == first.size + 5
+    assert case_index._library_index_thread is None
+    case_index._library_index = None
+
+
+if __name__ == '__main__':
+    test_exact_search_matches_brute_force()
+    test_ivf_search_has_high_recall()
+    test_query_returns_cases_with_sources()
+    test_library_index_rebuilds_in_background()
+    print("✅ 案例检索测试通过！")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""测试训练案例追加日志"""
+
+import json
+import os
+import tempfile
+import threading
+
+from case_log import CaseLog, log_path_for
+
+
+def _snapshot(directory, cases):
+    path = os.path.join(directory, 'training_data.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(cases, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def test_append_assigns_ids_and_keeps_snapshot():
+    """追加不改动快照，缺少ID时按最大整数ID顺延"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _snapshot(tmp, [{'id': 1, 'timestamp': 't1'}, {'case_id': 'case_a', 'timestamp': 't2'}])
+        before = open(path, 'rb').read()
+
+        store = CaseLog(path, compact_threshold=0)
+        assert store.count == 2
+        assert store.append({'timestamp': 't3'})['id'] == 2
+        assert store.append({'id': 'x', 'timestamp': 't4'})['id'] == 'x'
+
+        assert open(path, 'rb').read() == before
+        assert store.count == 4 and store.last_timestamp == 't4'
+        assert 'case_a' in store and 2 in store
+        assert [case.get('id', case.get('case_id')) for case in store.load_all()] == [1, 'case_a', 2, 'x']
+
+
+def test_index_follows_other_writers():
+    """另一实例（模拟另一 worker）的追加和压缩会被增量同步"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _snapshot(tmp, [])
+        a, b = CaseLog(path, compact_threshold=0), CaseLog(path, compact_threshold=0)
+        a.append({'timestamp': 't1'})
+        version = b.version()
+        assert b.count == 1
+        assert b.append({'timestamp': 't2'})['id'] == 2
+        assert a.count == 2 and a.last_timestamp == 't2'
+        assert b.version() != version
+
+        a.compact()
+        assert b.count == 2
+        b.append({'timestamp': 't3'})
+        assert len(a.load_all()) == 3
+
+
+def test_compaction_merges_into_snapshot():
+    """达到阈值后合并进快照，重复ID以日志中的为准"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _snapshot(tmp, [{'id': 1, 'output': 'old'}])
+        store = CaseLog(path, compact_threshold=3)
+        store.append({'id': 1, 'output': 'new'})
+        store.append({'id': 2})
+        assert os.path.getsize(log_path_for(path)) > 0
+        store.append({'id': 3})
+
+        assert os.path.getsize(log_path_for(path)) == 0
+        with open(path, encoding='utf-8') as f:
+            cases = json.load(f)
+        assert [case['id'] for case in cases] == [1, 2, 3]
+        assert cases[0]['output'] == 'new'
+        assert store.count == 3
+
+
+def test_concurrent_appends_are_not_lost():
+    """多个写入者并发追加（含中途压缩）不丢案例、不重复分配ID"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = _snapshot(tmp, [])
+        stores = [CaseLog(path, compact_threshold=25) for _ in range(4)]
+
+        def writer(store):
+            for _ in range(50):
+                store.append({'timestamp': 't'})
+
+        threads = [threading.Thread(target=writer, args=(store,)) for store in stores]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        ids = [case['id'] for case in stores[0].load_all()]
+        assert sorted(ids) == list(range(1, 201))
+        assert all(store.count == 200 for store in stores)
+
+
+if __name__ == '__main__':
+    test_append_assigns_ids_and_keeps_snapshot()
+    test_index_follows_other_writers()
+    test_compaction_merges_into_snapshot()
+    test_concurrent_appends_are_not_lost()
+    print("✅ 案例追加日志测试通过！")
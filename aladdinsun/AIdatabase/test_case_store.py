@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""测试SQLite训练案例库"""
+
+import json
+import os
+import tempfile
+
+from case_log import CaseLog
+from case_store import CaseStore, bucket_label, data_size_bucket
+
+
+def _case(key, arch, size, qps, industry=None):
+    return {
+        'id': key,
+        'input': {'total_data_size_gb': size, 'qps': qps},
+        'output': {'architecture_type': arch},
+        'feedback': {'industry': industry} if industry else None
+    }
+
+
+def test_statistics_and_filters():
+    """统计结果与原 get_statistics 结构一致，并支持按行业/分档筛选"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CaseStore(os.path.join(tmp, 'cases.db'))
+        store.import_cases([
+            _case(1, 'standalone', 50, 1000, '电商'),
+            _case(2, 'distributed', 8000, 50000, '金融'),
+            _case(3, 'distributed', 20000, 90000, '金融'),
+        ], source='test')
+
+        stats = store.statistics()
+        assert stats['total_cases'] == 3
+        assert stats['architecture_distribution'] == {'distributed': 2, 'standalone': 1}
+        assert stats['industry_distribution'] == {'电商': 1, '金融': 2}
+        assert stats['data_size_range'] == {'min': 50, 'max': 20000, 'avg': (50 + 8000 + 20000) / 3}
+        assert stats['data_size_buckets'] == {'0-100GB': 1, '5000-10000GB': 1, '10000-50000GB': 1}
+
+        finance = store.statistics(industry='金融')
+        assert finance['total_cases'] == 2 and finance['qps_range']['min'] == 50000
+        assert store.count(data_size_bucket=data_size_bucket(8000)) == 1
+        assert store.statistics(industry='医疗')['data_size_range'] == {'min': 0, 'max': 0, 'avg': 0}
+        assert bucket_label(len((100, 1000, 5000, 10000, 50000))) == '≥50000GB'
+
+
+def test_pagination_and_upsert():
+    """分页按插入顺序；相同ID重复导入时覆盖"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CaseStore(os.path.join(tmp, 'cases.db'))
+        store.import_cases([_case(i, 'distributed', i, i) for i in range(1, 8)], source='test')
+        store.upsert(_case(3, 'hybrid', 3, 3))
+
+        page = store.list_cases(limit=3, offset=3)
+        assert page['total'] == 7
+        assert [case['id'] for case in page['cases']] == [4, 5, 6]
+        assert store.get(3)['output']['architecture_type'] == 'hybrid'
+        assert store.list_cases(architecture_type='hybrid')['total'] == 1
+
+
+def test_sync_with_case_log():
+    """镜像跟随案例日志：本实例追加增量写入，日志被外部改动后重建"""
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = os.path.join(tmp, 'training_data.json')
+        with open(snapshot, 'w', encoding='utf-8') as f:
+            json.dump([_case('a', 'standalone', 10, 10)], f)
+        log = CaseLog(snapshot, compact_threshold=0)
+        store = CaseStore(os.path.join(tmp, 'training_data.db'))
+
+        assert store.sync(log) is True
+        assert store.sync(log) is False
+        store.append(log, _case('b', 'distributed', 20, 20))
+        assert store.sync(log) is False
+        assert store.count() == 2
+
+        CaseLog(snapshot, compact_threshold=0).append(_case('c', 'hybrid', 30, 30))
+        assert store.sync(log) is True
+        assert store.statistics()['architecture_distribution'] == {'distributed': 1, 'hybrid': 1, 'standalone': 1}
+
+
+def test_import_real_cases():
+    """导入 real_training_data.REAL_CASES，行业来自案例元数据"""
+    from real_training_data import REAL_CASES
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CaseStore(os.path.join(tmp, 'cases.db'))
+        assert store.import_real_cases() == len(REAL_CASES)
+        assert store.import_real_cases() == len(REAL_CASES)
+        assert store.count() == len(REAL_CASES)
+        assert store.count(industry=REAL_CASES[0]['industry']) >= 1
+
+
+if __name__ == '__main__':
+    test_statistics_and_filters()
+    test_pagination_and_upsert()
+    test_sync_with_case_log()
+    test_import_real_cases()
+    print("✅ 案例库测试通过！")
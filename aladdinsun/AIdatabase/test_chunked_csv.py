@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""测试CSV/TSV分块流式解析与运行统计"""
+
+import os
+import tempfile
+
+import advanced_file_processor
+from advanced_file_processor import AdvancedFileProcessor
+
+
+def _write_inventory(path, rows, delimiter=','):
+    header = ['系统名称', '数据量', 'QPS', 'TPS', '连接数']
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(delimiter.join(header) + '\n')
+        for i in range(rows):
+            values = [f'系统{i}', str(10 + i % 7), f'{1000 + i}', str(i % 50), str(20 + i % 3)]
+            f.write(delimiter.join(values) + '\n')
+
+
+def test_chunked_stats_match_full_scan():
+    """分块累加的统计与逐条计算一致，系统明细只保留样本"""
+    processor = AdvancedFileProcessor()
+    original = (advanced_file_processor.CSV_CHUNK_ROWS, advanced_file_processor.CSV_SYSTEMS_SAMPLE)
+    advanced_file_processor.CSV_CHUNK_ROWS = 128
+    advanced_file_processor.CSV_SYSTEMS_SAMPLE = 50
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'inventory.csv')
+            _write_inventory(path, 1000)
+            result = processor.process_csv(path)
+    finally:
+        advanced_file_processor.CSV_CHUNK_ROWS, advanced_file_processor.CSV_SYSTEMS_SAMPLE = original
+
+    expected = processor._calculate_statistics([
+        {'data_size_gb': 10 + i % 7, 'qps': 1000 + i, 'tps': i % 50, 'connections': 20 + i % 3}
+        for i in range(1000)
+    ])
+
+    assert result['success']
+    assert result['systems_total'] == 1000
+    assert result['systems_truncated']
+    assert len(result['systems']) == 50
+    assert result['systems'][0]['system_name'] == '系统0'
+    for key, value in expected.items():
+        assert abs(result['statistics'][key] - value) < 1e-6, key
+    assert result['deployment']['deployment_mode'] == '两地三中心'
+
+
+def test_tsv_with_units_and_blank_rows():
+    """制表符分隔、带单位的数据量与空行"""
+    processor = AdvancedFileProcessor()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'inventory.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('系统名称\t数据量\tQPS\n')
+            f.write('核心\t2TB\t1,200\n')
+            f.write('\t\t\n')
+            f.write('报表\t512 GB\t300\n')
+        result = processor.process_csv(path)
+
+    assert result['statistics']['total_systems'] == 2
+    assert result['statistics']['total_data_size_gb'] == 2048 + 512
+    assert result['statistics']['total_qps'] == 1500
+    assert not result['systems_truncated']
+
+
+def test_undecodable_csv_reports_error():
+    """UTF-8 和 GBK 都无法解码时返回错误，而不是空统计"""
+    processor = AdvancedFileProcessor()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'inventory.csv')
+        with open(path, 'wb') as f:
+            f.write('系统名称,数据量\n核心,'.encode('utf-8') + b'\xff\xff\xff\n')
+        result = processor.process_csv(path)
+
+    assert not result['success']
+    assert '编码' in result['error']
+
+
+def test_csv_and_excel_sizes_agree():
+    """同样内容的CSV和Excel按同一规则解析带单位的数据量，统计一致"""
+    import pandas as pd
+
+    rows = [['核心', '2TB', '1,200'], ['报表', '1,536 GB', '300'], ['日志', '512M', '100'], ['归档', '未知', '10']]
+    processor = AdvancedFileProcessor()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        csv_path = os.path.join(tmpdir, 'inventory.csv')
+        xlsx_path = os.path.join(tmpdir, 'inventory.xlsx')
+        frame = pd.DataFrame(rows, columns=['系统名称', '数据量', 'QPS'])
+        frame.to_csv(csv_path, index=False)
+        frame.to_excel(xlsx_path, sheet_name='系统清单', index=False)
+        from_csv = processor.process_csv(csv_path)['statistics']
+        from_excel = processor.process_excel(xlsx_path)['statistics']
+
+    assert from_csv['total_data_size_gb'] == 2048 + 1536 + 0.5
+    assert from_csv['total_data_size_gb'] == from_excel['total_data_size_gb']
+    assert from_csv['total_qps'] == from_excel['total_qps'] == 1610
+
+
+if __name__ == '__main__':
+    test_chunked_stats_match_full_scan()
+    test_tsv_with_units_and_blank_rows()
+    test_undecodable_csv_reports_error()
+    test_csv_and_excel_sizes_agree()
+    print("✅ CSV分块解析测试通过！")
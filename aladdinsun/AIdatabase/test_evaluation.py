@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""测试批量评估与 k 折交叉验证"""
+
+import os
+
+import numpy as np
+
+from evaluation import cross_validate, evaluate_predictor, kfold_indices, predict_retrieval, score
+from feature_pipeline import materialize
+from model import rule_based_predict
+from test_batched_training import synthetic_cases
+
+
+def test_score_confusion_and_mae():
+    """混淆矩阵行=实际、列=预测；MAE 按数量标签分别计算"""
+    cases = synthetic_cases(3)
+    matrix = materialize(cases)
+    predictions = [dict(case['output']) for case in cases]
+    predictions[0] = dict(cases[0]['output'], architecture_type='hybrid', node_count=5)
+    result = score(matrix, predictions)
+
+    actual = cases[0]['output']
+    assert result['n'] == 3 and result['correct'] == 2
+    assert np.array(result['confusion_matrix']).sum() == 3
+    assert result['confusion_matrix'][matrix.architecture[0]][2] == 1
+    assert result['mae']['node_count'] == abs(5 - actual['node_count']) / 3
+    assert result['mae']['shard_count'] == 0
+
+
+def test_stratified_folds_partition_cases():
+    """各折互不重叠、覆盖全部样本，且每折都包含各类架构"""
+    architecture = materialize(synthetic_cases(60)).architecture
+    folds = kfold_indices(architecture, 5, seed=1)
+    tested = np.concatenate([test for _, test in folds])
+    assert sorted(tested.tolist()) == list(range(len(architecture)))
+    for train, test in folds:
+        assert not set(train) & set(test)
+        assert set(architecture[test]) == set(architecture)
+
+
+def test_retrieval_and_batched_predictor():
+    """案例检索找回同类历史案例；evaluate_predictor 优先走 predict_batch"""
+    train = materialize(synthetic_cases(40, seed=1))
+    test_cases = synthetic_cases(10, seed=2)
+    predictions = predict_retrieval(train, materialize(test_cases), neighbors=3)
+    assert score(materialize(test_cases), predictions)['accuracy'] >= 0.8
+
+    class BatchOnly:
+        calls = 0
+
+        def predict_batch(self, items):
+            BatchOnly.calls += 1
+            return [rule_based_predict(item) for item in items]
+
+    result = evaluate_predictor(BatchOnly(), test_cases + [{'id': 'broken'}])
+    assert BatchOnly.calls == 1 and result['n'] == 10
+
+
+def test_cross_validate_compares_approaches_in_workers():
+    """同样的折上对比三种方法，各折在工作进程中运行"""
+    from batched_training import TrainConfig
+
+    report = cross_validate(synthetic_cases(60), k=3, train_config=TrainConfig(epochs=5, num_threads=0), workers=2)
+    assert report['n'] == 60 and report['workers'] == 2
+    assert set(report['approaches']) == {'rules', 'neural', 'retrieval'}
+    for stats in report['approaches'].values():
+        assert stats['n'] == 60 and len(stats['fold_accuracy']) == 3
+        assert np.array(stats['confusion_matrix']).sum() == 60
+    assert report['approaches']['retrieval']['accuracy'] >= 0.8
+
+    # 在调用方进程内运行时不改动其线程设置（Flask worker 中调用）
+    import torch
+    threads = torch.get_num_threads()
+    omp = os.environ.get('OMP_NUM_THREADS')
+    inline = cross_validate(synthetic_cases(60), k=3, approaches=('rules', 'retrieval'), workers=1)
+    assert inline['workers'] == 1 and set(inline['approaches']) == {'rules', 'retrieval'}
+    assert torch.get_num_threads() == threads and os.environ.get('OMP_NUM_THREADS') == omp
+
+    for k in (0, 1):
+        try:
+            cross_validate(synthetic_cases(60), k=k, approaches=('rules',), workers=1)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f'k={k} 应该被拒绝')
+
+
+if __name__ == '__main__':
+    test_score_confusion_and_mae()
+    test_stratified_folds_partition_cases()
+    test_retrieval_and_batched_predictor()
+    test_cross_validate_compares_approaches_in_workers()
+    print("✅ 评估测试通过！")
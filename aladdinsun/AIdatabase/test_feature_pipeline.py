@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""测试训练特征物化与缓存"""
+
+import json
+import os
+import tempfile
+
+import numpy as np
+import torch
+
+from batched_training import MaterializedDataset
+from case_log import CaseLog
+from feature_pipeline import FEATURE_DIM, FeatureCache, encode_architecture, extract_features, materialize
+
+
+def _case(i, arch='distributed'):
+    return {
+        'id': i,
+        'input': {'total_data_size_gb': 1000 * i, 'qps': 500 * i, 'need_high_availability': True},
+        'output': {'architecture_type': arch, 'node_count': i, 'shard_count': 2 * i, 'replica_count': 3}
+    }
+
+
+def test_materialize_matches_extract_features():
+    """物化矩阵的每一行与单独提取的特征一致"""
+    cases = [_case(i, arch) for i, arch in enumerate(['standalone', 'distributed', 'hybrid'], start=1)]
+    matrix = materialize(cases + [{'id': 'broken'}])
+
+    assert matrix.features.shape == (3, FEATURE_DIM) and matrix.features.dtype == np.float32
+    assert matrix.features.flags['C_CONTIGUOUS']
+    for row, case in zip(matrix.features, cases):
+        assert np.array_equal(row, extract_features(case['input']))
+    assert matrix.architecture.tolist() == [0, 1, 2]
+    assert matrix.counts[1].tolist() == [2, 4, 3]
+    assert encode_architecture('unknown') == 1
+
+
+def test_batches_are_zero_copy_slices():
+    """顺序批次与物化矩阵共享内存；打乱后覆盖全部样本"""
+    dataset = MaterializedDataset(materialize([_case(i) for i in range(1, 11)]))
+    batches = list(dataset.batches(4))
+    assert [len(features) for features, _ in batches] == [4, 4, 2]
+
+    features, labels = batches[1]
+    assert features.data_ptr() == dataset.features[4].data_ptr()
+    assert labels['shard_count'].tolist() == [10, 12, 14, 16]
+
+    seen = torch.cat([labels['node_count'] for _, labels in dataset.batches(3, shuffle=True)])
+    assert sorted(seen.tolist()) == list(range(1, 11))
+
+
+def test_cache_keyed_by_store_version():
+    """案例库版本不变时从磁盘加载，追加案例后重新物化"""
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = os.path.join(tmp, 'training_data.json')
+        with open(snapshot, 'w', encoding='utf-8') as f:
+            json.dump([_case(1), _case(2)], f)
+        log = CaseLog(snapshot, compact_threshold=0)
+        cache_dir = os.path.join(tmp, 'features')
+
+        loads = []
+
+        def load_cases():
+            loads.append(1)
+            return log.load_all()
+
+        first = FeatureCache(cache_dir).get(snapshot, log.version(), load_cases)
+        again = FeatureCache(cache_dir).get(snapshot, log.version(), load_cases)
+        assert len(loads) == 1 and np.array_equal(first.features, again.features)
+
+        log.append(_case(3))
+        grown = FeatureCache(cache_dir).get(snapshot, log.version(), load_cases)
+        assert len(loads) == 2 and len(grown) == 3
+        assert len(os.listdir(cache_dir)) == 1
+
+
+if __name__ == '__main__':
+    test_materialize_matches_extract_features()
+    test_batches_are_zero_copy_slices()
+    test_cache_keyed_by_store_version()
+    print("✅ 特征物化测试通过！")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""测试文件原子写入与进程间文件锁"""
+
+import os
+import tempfile
+import threading
+import time
+
+from file_io import atomic_open, atomic_write, file_lock
+
+
+def test_atomic_write_replaces_or_keeps_original():
+    """写入成功时替换目标文件；写入中途失败时保留原文件，不留下临时文件"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sub', 'data.json')
+        atomic_write(path, b'v1')
+        with open(path, 'rb') as f:
+            assert f.read() == b'v1'
+
+        try:
+            with atomic_open(path, 'w', encoding='utf-8') as f:
+                f.write('v2')
+                raise RuntimeError('中途失败')
+        except RuntimeError:
+            pass
+        with open(path, 'rb') as f:
+            assert f.read() == b'v1'
+        assert os.listdir(os.path.dirname(path)) == ['data.json']
+
+
+def test_file_lock_serializes_holders():
+    """同一锁文件上的排他锁互斥"""
+    with tempfile.TemporaryDirectory() as tmp:
+        lock_path = os.path.join(tmp, '.lock')
+        inside, overlaps = [], []
+
+        def hold():
+            with file_lock(lock_path):
+                inside.append(1)
+                overlaps.append(len(inside) > 1)
+                time.sleep(0.01)
+                inside.pop()
+
+        threads = [threading.Thread(target=hold) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(overlaps) == 5 and not any(overlaps)
+
+
+if __name__ == '__main__':
+    test_atomic_write_replaces_or_keeps_original()
+    test_file_lock_serializes_holders()
+    print("✅ 文件原子写入测试通过！")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""测试并行超参数搜索"""
+
+import json
+import os
+import random
+import tempfile
+
+from hyperparameter_search import DEFAULT_SPACE, SearchConfig, rung_budgets, sample_params, search
+from model_registry import ModelRegistry
+from test_batched_training import synthetic_cases
+
+
+def _write_cases(path, n=60):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(synthetic_cases(n), f)
+
+
+def test_budgets_and_sampling():
+    """逐次减半的轮次按 eta 递增且以 max_epochs 结束；抽样落在搜索空间内且可复现"""
+    assert rung_budgets(5, 100, 3) == [5, 15, 45, 100]
+    assert rung_budgets(1, 1, 3) == [1]
+
+    first = [sample_params(DEFAULT_SPACE, random.Random(7)) for _ in range(2)]
+    assert first[0] == first[1]
+    params = first[0]
+    assert params['hidden_dim'] in DEFAULT_SPACE['hidden_dim'][1]
+    assert 0.0 <= params['dropout'] <= 0.5
+    assert 1e-4 <= params['learning_rate'] <= 1e-2
+
+
+def _run(tmp, workers):
+    data_file = os.path.join(tmp, 'training_data.json')
+    _write_cases(data_file)
+    registry = ModelRegistry(os.path.join(tmp, 'models'))
+    config = SearchConfig(n_trials=4, min_epochs=1, max_epochs=4, eta=2, max_workers=workers, seed=0)
+    # 试验进程继承环境变量；测试结束后恢复，不影响之后的测试
+    previous = os.environ.get('FEATURE_CACHE_DISABLED')
+    os.environ['FEATURE_CACHE_DISABLED'] = '1'
+    try:
+        return registry, search(data_file, config, registry=registry)
+    finally:
+        if previous is None:
+            del os.environ['FEATURE_CACHE_DISABLED']
+        else:
+            os.environ['FEATURE_CACHE_DISABLED'] = previous
+
+
+def test_successive_halving_registers_best_as_candidate():
+    """每轮淘汰一半，最佳组合来自最后一轮并注册为候选版本；只保留最佳检查点"""
+    with tempfile.TemporaryDirectory() as tmp:
+        registry, summary = _run(tmp, workers=1)
+
+        assert [len(r['results']) for r in summary['rungs']] == [4, 2, 1]
+        assert [r['epochs'] for r in summary['rungs']] == [1, 2, 4]
+        survivors = {r['trial_id'] for r in summary['rungs'][1]['results']}
+        assert survivors <= {r['trial_id'] for r in summary['rungs'][0]['results'][:2]}
+        assert summary['best']['trial_id'] in survivors
+
+        version = summary['model_version']
+        assert registry.candidate_version() == version
+        meta = registry.get(version)
+        assert meta['source'] == 'search' and meta['config']['hidden_dim'] == summary['best']['params']['hidden_dim']
+
+        search_dir = os.path.join(registry.root, 'search', summary['search_id'])
+        assert sorted(os.listdir(search_dir)) == sorted([f"trial_{summary['best']['trial_id']:03d}.pt",
+                                                         'summary.json', 'trials.jsonl'])
+        with open(os.path.join(search_dir, 'trials.jsonl'), encoding='utf-8') as f:
+            assert len(f.readlines()) == 7
+
+
+def test_trials_run_in_worker_processes():
+    """max_workers>1 时试验在独立进程中运行"""
+    with tempfile.TemporaryDirectory() as tmp:
+        _, summary = _run(tmp, workers=2)
+        pids = {r['pid'] for r in summary['rungs'][0]['results']}
+        assert os.getpid() not in pids
+        assert summary['workers'] == 2
+
+
+if __name__ == '__main__':
+    test_budgets_and_sampling()
+    test_successive_halving_registers_best_as_candidate()
+    test_trials_run_in_worker_processes()
+    print("✅ 超参数搜索测试通过！")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""测试OCR预处理流水线选择与基准测试工具"""
+
+import os
+import json
+import tempfile
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from image_preprocessing import (
+    PIPELINES, choose_pipeline, downscale_to_target, estimate_noise, preprocess_array
+)
+from ocr_benchmark import load_labeled_samples, run_benchmark
+
+
+def _screenshot(noise_sigma=0.0, size=(600, 800)):
+    """白底黑字的合成截图，可叠加高斯噪声"""
+    image = np.full(size, 255, dtype=np.uint8)
+    cv2.putText(image, 'QPS: 50000', (40, 120), cv2.FONT_HERSHEY_SIMPLEX, 2, 0, 3)
+    if noise_sigma:
+        rng = np.random.default_rng(0)
+        image = np.clip(image + rng.normal(0, noise_sigma, size), 0, 255).astype(np.uint8)
+    return image
+
+
+def test_noise_estimate_separates_clean_and_noisy():
+    """干净截图噪声估计接近0，加噪后明显升高"""
+    assert estimate_noise(_screenshot()) < 2
+    assert estimate_noise(_screenshot(noise_sigma=25)) > 10
+
+
+def test_auto_selection():
+    """干净截图跳过去噪，重噪声图使用完整去噪"""
+    assert choose_pipeline(_screenshot()) == 'clean'
+    assert choose_pipeline(_screenshot(noise_sigma=25)) == 'full'
+
+
+def test_pipelines_return_binary_images():
+    """所有流水线输出同尺寸的二值图"""
+    gray = _screenshot(noise_sigma=5)
+    for name in PIPELINES:
+        processed, used = preprocess_array(gray, name)
+        assert used == name
+        assert processed.shape == gray.shape
+        assert set(np.unique(processed)) <= {0, 255} or name == 'full'
+
+
+def test_downscale_only_shrinks():
+    """超过目标DPI或最大边长时缩小，小图保持不变"""
+    gray = np.zeros((1000, 1000), dtype=np.uint8)
+    assert downscale_to_target(gray).shape == (1000, 1000)
+    assert downscale_to_target(gray, source_dpi=600).shape == (500, 500)
+    assert max(downscale_to_target(np.zeros((100, 5000), dtype=np.uint8)).shape) == 2500
+
+
+def test_benchmark_reports_accuracy_and_latency():
+    """基准测试按流水线汇总字段准确率和耗时"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Image.fromarray(_screenshot()).save(os.path.join(tmpdir, 'a.png'))
+        with open(os.path.join(tmpdir, 'labels.json'), 'w', encoding='utf-8') as f:
+            json.dump({'a.png': {'qps': 50000, 'tps': 100}}, f)
+
+        samples = load_labeled_samples(tmpdir)
+        report = run_benchmark(samples, ['auto', 'clean'],
+                               ocr_func=lambda image: 'QPS: 50000',
+                               extractor=lambda text: {'qps': 50000, 'tps': 0})
+
+        assert report['clean']['fields_total'] == 2
+        assert report['clean']['accuracy'] == 0.5
+        assert report['auto']['pipelines_used'] == {'clean': 1}
+        assert report['auto']['avg_total_ms'] >= 0
+
+
+if __name__ == '__main__':
+    test_noise_estimate_separates_clean_and_noisy()
+    test_auto_selection()
+    test_pipelines_return_binary_images()
+    test_downscale_only_shrinks()
+    test_benchmark_reports_accuracy_and_latency()
+    print("✅ 预处理流水线测试通过！")
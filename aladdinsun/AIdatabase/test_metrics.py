@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""测试请求级指标采集与 /metrics 输出"""
+
+import threading
+
+from flask import Flask, jsonify
+
+from metrics import Counter, Histogram, Registry, install_flask_metrics
+
+
+def test_counter_merges_thread_shards():
+    """各线程写自己的分片，抓取时合并；线程退出后计数不丢失"""
+    registry = Registry()
+    counter = Counter('test_total', '测试计数', ('kind',), registry=registry)
+
+    def work():
+        for _ in range(1000):
+            counter.inc(kind='a')
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    counter.inc(5, kind='b')
+
+    assert counter.values() == {('a',): 8000, ('b',): 5}
+    # 线程退出后计数保留在分片中，重复抓取结果不变
+    assert counter.values() == {('a',): 8000, ('b',): 5}
+    assert 'test_total{kind="a"} 8000' in registry.exposition()
+
+
+def test_shards_bounded_with_short_lived_threads():
+    """每个请求一个新线程（threaded=True 开发服务器）时分片数固定，不随线程数增长"""
+    registry = Registry()
+    histogram = Histogram('test_short_seconds', '测试耗时', registry=registry)
+    stripes = len(histogram._shards._stripes)
+
+    for _ in range(20):
+        threads = [threading.Thread(target=histogram.observe, args=(0.01,)) for _ in range(50)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    assert len(histogram._shards._stripes) == stripes
+    assert len(histogram._shards.snapshot()) == stripes
+    assert histogram.values()[()][-2] == 0
+    assert sum(histogram.values()[()][:-1]) == 1000
+
+
+def test_histogram_buckets_are_cumulative():
+    """直方图分桶累计输出，含 +Inf、sum 和 count"""
+    registry = Registry()
+    histogram = Histogram('test_seconds', '测试耗时', buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    text = registry.exposition()
+    assert 'test_seconds_bucket{le="0.1"} 2' in text
+    assert 'test_seconds_bucket{le="1"} 3' in text
+    assert 'test_seconds_bucket{le="+Inf"} 4' in text
+    assert 'test_seconds_sum 3.65' in text
+    assert 'test_seconds_count 4' in text
+
+
+def test_flask_metrics_endpoint():
+    """请求按路由规则计数，/metrics 返回 Prometheus 文本格式"""
+    app = Flask(__name__)
+    install_flask_metrics(app, 'test_app')
+
+    @app.route('/api/item/<int:item_id>')
+    def get_item(item_id):
+        return jsonify({'id': item_id})
+
+    client = app.test_client()
+    for item_id in range(3):
+        assert client.get(f'/api/item/{item_id}').status_code == 200
+    assert client.get('/missing').status_code == 404
+
+    response = client.get('/metrics')
+    text = response.get_data(as_text=True)
+    assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    assert 'http_requests_total{app="test_app",method="GET",route="/api/item/<int:item_id>",status="200"} 3' in text
+    assert 'http_requests_total{app="test_app",method="GET",route="unmatched",status="404"} 1' in text
+    assert 'http_request_duration_seconds_count{app="test_app",method="GET",route="/api/item/<int:item_id>"} 3' in text
+    assert 'http_requests_in_flight{app="test_app",route="/metrics"} 1' in text
+    assert 'predictor_stage_duration_seconds' in text
+    assert 'ocr_queue_depth' in text
+
+
+if __name__ == '__main__':
+    test_counter_merges_thread_shards()
+    test_shards_bounded_with_short_lived_threads()
+    test_histogram_buckets_are_cumulative()
+    test_flask_metrics_endpoint()
+    print("✅ 指标采集测试通过！")
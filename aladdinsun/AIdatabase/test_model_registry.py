@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""测试模型注册表、线上版本切换和影子评估"""
+
+import os
+import tempfile
+
+import torch
+
+from feature_pipeline import FEATURE_SCHEMA_VERSION
+from model_registry import ModelRegistry, ServingModel
+from torch_model import TDSQLArchitecturePredictor
+
+INPUT = {'total_data_size_gb': 5000, 'qps': 20000, 'need_high_availability': True}
+
+
+def _model(seed):
+    torch.manual_seed(seed)
+    return TDSQLArchitecturePredictor().eval()
+
+
+def test_register_versions_with_metadata_and_retention():
+    """版本号递增、元数据完整；超过保留数时清理最旧的版本，但保留线上版本"""
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(tmp, keep=2)
+        first = registry.register(_model(0), metrics={'val_accuracy': 0.9}, dataset_version='abc', promote=True)
+        assert first['version'] == 'v0001'
+        assert first['feature_schema']['version'] == FEATURE_SCHEMA_VERSION
+        assert registry.get('v0001')['metrics'] == {'val_accuracy': 0.9}
+        assert os.path.exists(os.path.join(tmp, 'v0001', 'state.pth'))
+
+        registry.register(_model(1))
+        registry.register(_model(2))
+        assert registry.versions() == ['v0001', 'v0002', 'v0003']
+
+        registry.register(_model(3))
+        assert registry.versions() == ['v0001', 'v0003', 'v0004']
+        listed = registry.list_versions()
+        assert [meta['version'] for meta in listed] == ['v0004', 'v0003', 'v0001']
+        assert listed[-1]['current'] and not listed[0]['current']
+        assert not [name for name in os.listdir(tmp) if name.startswith('.tmp_')]
+
+
+def test_serving_model_swaps_in_background():
+    """请求线程只读已加载的版本；refresh 之后才切换到新上线的版本"""
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(tmp)
+        serving = ServingModel(registry, poll_interval=0, fallback_weights_file=os.path.join(tmp, 'none.npz'))
+        assert serving.version is None and not serving.loaded
+        assert serving.predict(INPUT)['architecture_type']  # 规则预测
+
+        registry.register(_model(0), promote=True)
+        assert serving.version is None
+        assert serving.refresh() and serving.version == 'v0001' and serving.loaded
+        assert not serving.refresh()
+
+        before = serving.predict(INPUT)
+        registry.register(_model(1), promote=True)
+        registry.promote('v0001')
+        serving.refresh()
+        assert serving.version == 'v0001' and serving.predict(INPUT) == before
+
+
+def test_failed_load_is_retried():
+    """新版本加载失败时继续使用旧版本，下次检查时重试（不需要 registry.json 再次变化）"""
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(tmp)
+        registry.register(_model(0), promote=True)
+        serving = ServingModel(registry, poll_interval=0)
+        assert serving.version == 'v0001'
+
+        registry.register(_model(1), promote=True)
+        weights = registry.weights_path('v0002')
+        os.rename(weights, weights + '.bak')
+        assert serving.refresh() and serving.version == 'v0001'
+
+        os.rename(weights + '.bak', weights)
+        assert serving.refresh() and serving.version == 'v0002'
+        assert not serving.refresh()
+
+
+def test_shadow_evaluation_compares_candidate():
+    """候选版本在后台对同样的请求预测，统计一致率，不影响返回结果"""
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(tmp)
+        registry.register(_model(0), promote=True)
+        registry.register(_model(1))
+        registry.set_candidate('v0002')
+
+        serving = ServingModel(registry, poll_interval=0, shadow_sample_rate=1.0)
+        assert serving.status()['candidate'] == 'v0002'
+        primary = serving.predict_batch([INPUT, dict(INPUT, qps=100)])
+        serving.drain_shadow()
+
+        report = serving.shadow_report()
+        assert report['candidate'] == 'v0002' and report['current'] == 'v0001'
+        assert report['predictions'] == 2
+        assert 0.0 <= report['architecture_agreement'] <= 1.0
+        assert serving.predict_batch([INPUT, dict(INPUT, qps=100)]) == primary
+
+        registry.promote('v0002')
+        serving.refresh()
+        assert serving.version == 'v0002' and serving.status()['candidate'] is None
+
+
+if __name__ == '__main__':
+    test_register_versions_with_metadata_and_retention()
+    test_serving_model_swaps_in_background()
+    test_failed_load_is_retried()
+    test_shadow_evaluation_compares_candidate()
+    print("✅ 模型注册表测试通过！")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""测试多系统环境规划：逐系统并行预测与共享设备去重"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from advanced_file_processor import MultiSystemEnvironment, SystemInfo
+from multi_system_planner import MultiSystemPlanner, environment_from_result, system_from_dict
+
+
+def _environment(count):
+    systems = [
+        SystemInfo(system_name=f'系统{i}', data_size_gb=50 + i * 10, qps=500 + i * 20, tps=100 + i,
+                   connections=50, availability_requirement='99.99%' if i % 2 else '99.9%')
+        for i in range(count)
+    ]
+    return MultiSystemEnvironment(environment_name='测试环境', systems=systems, total_systems=count)
+
+
+def test_shared_infrastructure_deduplicated():
+    """数据库节点按系统累加，核心交换机/监控/防火墙只保留一套"""
+    result = MultiSystemPlanner().plan(_environment(20))
+    totals = result['totals']
+
+    assert result['total_systems'] == 20
+    assert totals['database_nodes'] == sum(s['database_nodes'] for s in result['systems'])
+    assert totals['monitoring_nodes'] < sum(s['monitoring_nodes'] for s in result['systems'])
+    assert result['shared_savings'] > 0
+    assert totals['total_initial_cost'] == (
+        totals['hardware_cost'] + totals['infrastructure_cost'] + totals['software_cost']
+    )
+
+    shared = [i for i in result['bill_of_materials']['equipment'] if i.get('shared')]
+    assert sorted(i['category'] for i in shared) == sorted(['核心交换机', '安全防火墙', '监控服务器'])
+    trainings = [i for i in result['bill_of_materials']['infrastructure_items'] if i['category'] == '技术培训']
+    assert trainings[0]['quantity'] == 1
+
+
+def test_parallel_matches_serial():
+    """线程池/进程池与串行计算的汇总一致，系统顺序保持不变"""
+    serial = MultiSystemPlanner().plan(_environment(40))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        pooled = MultiSystemPlanner(executor=executor, chunk_systems=3).plan(_environment(40))
+
+    assert [s['system_name'] for s in pooled['systems']] == [f'系统{i}' for i in range(40)]
+    assert pooled['totals'] == serial['totals']
+
+
+def test_environment_from_result():
+    """解析结果中的系统字典转换为 SystemInfo，非法数值按0处理"""
+    system = system_from_dict({'system_name': '核心', 'qps': '1200', 'data_size_gb': 'abc', 'unknown': 1})
+    assert system.qps == 1200 and system.data_size_gb == 0.0
+
+    environment = environment_from_result({
+        'systems': [{'system_name': 'a', 'qps': 100}, {'system_name': 'b', 'tps': 50}],
+        'deployment': {'deployment_mode': '同城双中心'}
+    })
+    assert environment.total_systems == 2
+    assert environment.deployment.deployment_mode == '同城双中心'
+
+
+if __name__ == '__main__':
+    test_shared_infrastructure_deduplicated()
+    test_parallel_matches_serial()
+    test_environment_from_result()
+    print("✅ 多系统规划测试通过！")
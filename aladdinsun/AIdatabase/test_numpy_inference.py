@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""测试纯 NumPy 推理引擎"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import torch
+
+from feature_pipeline import extract_features
+from model import load_predictor, rule_based_predict
+from numpy_inference import NumpyArchitecturePredictor, export_weights
+from torch_model import TDSQLArchitecturePredictor
+
+SAMPLES = [
+    {'total_data_size_gb': 50, 'qps': 500},
+    {'total_data_size_gb': 800, 'qps': 5000, 'need_high_availability': True},
+    {'total_data_size_gb': 3000, 'qps': 20000, 'source_db_types': ['MySQL']},
+    {'total_data_size_gb': 12000, 'qps': 80000, 'need_disaster_recovery': True},
+]
+
+
+def test_outputs_match_torch_model():
+    """相同权重下 NumPy 前向与 PyTorch 前向一致，预测结果相同"""
+    torch.manual_seed(0)
+    torch_model = TDSQLArchitecturePredictor()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'weights.npz')
+        export_weights(torch_model, path)
+        engine = NumpyArchitecturePredictor(path)
+        assert engine.loaded
+
+        x = np.stack([extract_features(data) for data in SAMPLES])
+        torch_model.eval()
+        with torch.no_grad():
+            expected = torch_model(torch.from_numpy(x))
+        actual = engine.forward(x)
+        for name, tensor in expected.items():
+            assert np.allclose(actual[name], tensor.numpy(), rtol=1e-5, atol=1e-5), name
+
+        for ours, theirs in zip(engine.predict_batch(SAMPLES), [torch_model.predict(data) for data in SAMPLES]):
+            assert abs(ours.pop('confidence') - theirs.pop('confidence')) < 1e-5
+            assert ours == theirs
+
+
+def test_rules_without_weights_and_hot_reload():
+    """没有权重文件时按规则预测；导出权重后下一次预测自动加载"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'weights.npz')
+        engine = load_predictor(path)
+        assert not engine.loaded
+        assert engine.predict(SAMPLES[2]) == rule_based_predict(SAMPLES[2])
+
+        export_weights(TDSQLArchitecturePredictor(), path)
+        engine.predict(SAMPLES[0])
+        assert engine.loaded
+
+
+def test_inference_does_not_import_torch():
+    """在线推理路径不导入 PyTorch"""
+    code = ('import sys; from model import load_predictor; '
+            'load_predictor("missing.npz").predict({"qps": 1}); '
+            'import training_system; '
+            'sys.exit(1 if "torch" in sys.modules else 0)')
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    assert subprocess.run([sys.executable, '-c', code], cwd=cwd).returncode == 0
+
+
+if __name__ == '__main__':
+    test_outputs_match_torch_model()
+    test_rules_without_weights_and_hot_reload()
+    test_inference_does_not_import_torch()
+    print("✅ NumPy 推理测试通过！")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""测试在线增量学习"""
+
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+
+from case_log import get_case_log
+from feature_pipeline import materialize
+from numpy_inference import NumpyArchitecturePredictor, export_weights
+from online_learning import OnlineLearner, ReplayBuffer
+from torch_model import TDSQLArchitecturePredictor
+
+
+@contextmanager
+def _feature_cache_disabled():
+    """测试期间关闭特征缓存，结束后恢复原环境变量"""
+    previous = os.environ.get('FEATURE_CACHE_DISABLED')
+    os.environ['FEATURE_CACHE_DISABLED'] = '1'
+    try:
+        yield
+    finally:
+        if previous is None:
+            del os.environ['FEATURE_CACHE_DISABLED']
+        else:
+            os.environ['FEATURE_CACHE_DISABLED'] = previous
+
+
+def _case(i, size, arch):
+    return {
+        'id': i,
+        'input': {'total_data_size_gb': size, 'qps': 1000},
+        'output': {'architecture_type': arch, 'node_count': 3 if arch == 'distributed' else 1,
+                   'shard_count': 1, 'replica_count': 2}
+    }
+
+
+def _history(n=100):
+    return [_case(i, 100 + i, 'standalone') if i % 2 else _case(i, 20000 + i, 'distributed') for i in range(n)]
+
+
+def _setup(tmp, with_weights=True):
+    data_file = os.path.join(tmp, 'training_data.json')
+    with open(data_file, 'w', encoding='utf-8') as f:
+        json.dump(_history(), f)
+    weights_file = os.path.join(tmp, 'best_model.npz')
+    if with_weights:
+        torch.manual_seed(0)
+        export_weights(TDSQLArchitecturePredictor().eval(), weights_file)
+    return data_file, weights_file
+
+
+def test_replay_buffer_is_bounded_uniform_sample():
+    """蓄水池容量固定，灌入大量历史后仍覆盖各个时期的样本"""
+    buffer = ReplayBuffer(capacity=50, seed=0)
+    buffer.extend(materialize(_history(1000)))
+    buffer.extend(materialize(_history(10)))
+    assert len(buffer) == 50 and buffer.seen == 1010
+    sample = buffer.sample(20)
+    assert len(sample) == 20 and sample.features.shape[1] == buffer.features.shape[1]
+    assert len(buffer.sample(500)) == 50
+
+
+def test_update_hot_swaps_serving_weights():
+    """一次更新导出新权重，推理引擎下次预测即换用；并记录前序漂移指标"""
+    with _feature_cache_disabled(), tempfile.TemporaryDirectory() as tmp:
+        data_file, weights_file = _setup(tmp)
+        serving = NumpyArchitecturePredictor(weights_file)
+        before = serving.forward(np.ones((1, 50), dtype=np.float32))['node_count'].copy()
+
+        learner = OnlineLearner(data_file, weights_file, steps=3, learning_rate=0.01, seed=0)
+        new_cases = [_case(1000 + i, 60000, 'distributed') for i in range(4)]
+        outcome = learner.update(new_cases)
+
+        assert outcome in ('applied', 'rejected')
+        status = learner.status()
+        assert status['replay_size'] == 104
+        assert set(status['drift']) >= {'prequential_accuracy', 'prequential_loss', 'feature_shift', 'label_shift'}
+        assert status['drift']['feature_shift'] > 0
+
+        after = serving.forward(np.ones((1, 50), dtype=np.float32))['node_count']
+        if outcome == 'applied':
+            assert not np.array_equal(before, after)
+        else:
+            assert np.array_equal(before, after)
+
+
+def test_logged_batch_is_not_counted_twice():
+    """新案例先写入案例日志再提交：回放缓冲区和漂移参考分布只按更新前的历史构建"""
+    with _feature_cache_disabled(), tempfile.TemporaryDirectory() as tmp:
+        data_file, weights_file = _setup(tmp)
+        new_cases = [_case(1000 + i, 60000, 'distributed') for i in range(4)]
+        case_log = get_case_log(data_file)
+        for case in new_cases:
+            case_log.append(case)
+
+        learner = OnlineLearner(data_file, weights_file, steps=3, learning_rate=0.01, seed=0)
+        learner.update(new_cases)
+        assert learner.status()['replay_size'] == 104
+        assert learner._replay.seen == 104
+
+
+def test_worse_update_is_rejected():
+    """更新让回放样本损失明显变差时恢复原权重，不导出"""
+    with _feature_cache_disabled(), tempfile.TemporaryDirectory() as tmp:
+        data_file, weights_file = _setup(tmp)
+        mtime = os.stat(weights_file).st_mtime_ns
+        learner = OnlineLearner(data_file, weights_file, steps=20, learning_rate=1.0, replay_ratio=0, seed=0)
+        assert learner.update([_case(2000, 50, 'hybrid')]) == 'rejected'
+        assert os.stat(weights_file).st_mtime_ns == mtime
+        assert learner.status()['updates_rejected'] == 1
+
+
+def test_submit_without_base_weights_runs_in_background():
+    """后台线程处理提交的案例；还没有导出的权重时不做更新"""
+    with _feature_cache_disabled(), tempfile.TemporaryDirectory() as tmp:
+        data_file, weights_file = _setup(tmp, with_weights=False)
+        learner = OnlineLearner(data_file, weights_file, coalesce_s=0.01, max_cpu_fraction=1.0)
+        assert learner.submit({'id': 'broken'}) is False
+        assert learner.submit(_case(3000, 500, 'standalone'))
+
+        deadline = time.time() + 10
+        while learner._queue.qsize() and time.time() < deadline:
+            time.sleep(0.05)
+        learner.stop()
+        assert learner.status()['pending'] == 0
+        assert not os.path.exists(weights_file)
+
+
+if __name__ == '__main__':
+    test_replay_buffer_is_bounded_uniform_sample()
+    test_update_hot_swaps_serving_weights()
+    test_logged_batch_is_not_counted_twice()
+    test_worse_update_is_rejected()
+    test_submit_without_base_weights_runs_in_background()
+    print("✅ 在线学习测试通过！")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""测试文件解析结果缓存"""
+
+import os
+import json
+import tempfile
+
+from parse_cache import ParseCache, hash_file
+
+
+def _make_cache(tmpdir, **kwargs):
+    return ParseCache(cache_file=os.path.join(tmpdir, 'cache.db'), **kwargs)
+
+
+def _write_file(tmpdir, name, content):
+    path = os.path.join(tmpdir, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return path
+
+
+def test_repeat_upload_hits_cache():
+    """相同内容、不同文件名的上传只解析一次"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = _make_cache(tmpdir)
+        calls = []
+
+        def parse(path):
+            calls.append(path)
+            return {'qps': 5000}
+
+        first = _write_file(tmpdir, '20251026_153535_a.json', json.dumps({'qps': 5000}))
+        second = _write_file(tmpdir, '20251026_160616_a.json', json.dumps({'qps': 5000}))
+
+        assert cache.get_or_parse(first, 'test', '1.0', parse) == {'qps': 5000}
+        assert cache.get_or_parse(second, 'test', '1.0', parse) == {'qps': 5000}
+        assert len(calls) == 1
+
+        stats = cache.get_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['hit_rate'] == 0.5
+        cache.close()
+
+
+def test_version_change_invalidates():
+    """解析器版本变化后重新解析"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = _make_cache(tmpdir)
+        path = _write_file(tmpdir, 'a.txt', 'QPS: 100')
+
+        cache.get_or_parse(path, 'test', '1.0', lambda p: {'v': 1})
+        assert cache.get_or_parse(path, 'test', '2.0', lambda p: {'v': 2}) == {'v': 2}
+        cache.close()
+
+
+def test_errors_not_cached():
+    """解析失败的结果不写入缓存"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = _make_cache(tmpdir)
+        path = _write_file(tmpdir, 'a.txt', 'broken')
+
+        cache.get_or_parse(path, 'test', '1.0', lambda p: {'error': '解析失败'})
+        assert cache.get(hash_file(path), 'test', '1.0') is None
+        assert cache.get_stats()['entries'] == 0
+        cache.close()
+
+
+def test_lru_eviction():
+    """超过条目上限时淘汰最久未访问的结果"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = _make_cache(tmpdir, max_entries=2)
+
+        cache.put('h1', 'test', '1.0', {'n': 1})
+        cache.put('h2', 'test', '1.0', {'n': 2})
+        cache.get('h1', 'test', '1.0')  # h1 变为最近访问
+        cache.put('h3', 'test', '1.0', {'n': 3})
+
+        assert cache.get('h2', 'test', '1.0') is None
+        assert cache.get('h1', 'test', '1.0') == {'n': 1}
+        assert cache.get('h3', 'test', '1.0') == {'n': 3}
+        assert cache.get_stats()['evictions'] == 1
+        cache.close()
+
+
+if __name__ == '__main__':
+    test_repeat_upload_hits_cache()
+    test_version_change_invalidates()
+    test_errors_not_cached()
+    test_lru_eviction()
+    print("✅ 解析缓存测试通过！")
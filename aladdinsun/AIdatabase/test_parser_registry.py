@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""测试按文件内容分派的解析器注册表"""
+
+import os
+import zipfile
+import tempfile
+
+from parser_registry import ParserRegistry, UnsupportedFileError, sniff_file_type
+
+
+def _write(tmpdir, name, data):
+    path = os.path.join(tmpdir, name)
+    mode = 'wb' if isinstance(data, bytes) else 'w'
+    with open(path, mode) as f:
+        f.write(data)
+    return path
+
+
+def _write_zip(tmpdir, name, members):
+    path = os.path.join(tmpdir, name)
+    with zipfile.ZipFile(path, 'w') as zf:
+        for member in members:
+            zf.writestr(member, '<xml/>')
+    return path
+
+
+def test_sniff_by_magic_bytes():
+    """按魔数识别，忽略扩展名"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        assert sniff_file_type(_write(tmpdir, 'a.xlsx', b'%PDF-1.7\n...')) == 'pdf'
+        assert sniff_file_type(_write(tmpdir, 'a.pdf', b'\x89PNG\r\n\x1a\n' + b'\x00' * 16)) == 'png'
+        assert sniff_file_type(_write(tmpdir, 'a.png', b'\xff\xd8\xff\xe0' + b'\x00' * 16)) == 'jpeg'
+        assert sniff_file_type(_write(tmpdir, 'a.xlsx', b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1' + b'\x00' * 16)) == 'xls'
+
+
+def test_sniff_zip_structure():
+    """按ZIP目录结构区分xlsx/xlsm/xlsb"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        assert sniff_file_type(_write_zip(tmpdir, 'a.xls', ['xl/workbook.xml'])) == 'xlsx'
+        assert sniff_file_type(_write_zip(tmpdir, 'b.xlsx', ['xl/workbook.xml', 'xl/vbaProject.bin'])) == 'xlsm'
+        assert sniff_file_type(_write_zip(tmpdir, 'c.xlsx', ['xl/workbook.bin'])) == 'xlsb'
+        assert sniff_file_type(_write_zip(tmpdir, 'd.xlsx', ['readme.txt'])) == 'zip'
+
+
+def test_sniff_text():
+    """识别JSON、CSV和纯文本"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        assert sniff_file_type(_write(tmpdir, 'a.txt', '{"qps": 5000}')) == 'json'
+        assert sniff_file_type(_write(tmpdir, 'a.json', '系统名称,QPS\n订单系统,5000\n用户系统,3000\n')) == 'csv'
+        assert sniff_file_type(_write(tmpdir, 'a.csv', 'QPS: 5000\n数据量: 100GB\n')) == 'txt'
+        assert sniff_file_type(_write(tmpdir, 'empty.txt', '')) == 'unknown'
+
+
+def test_dispatch_and_fail_fast():
+    """按内容分派；未注册类型和缺少依赖时在解析前拒绝"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        calls = []
+        registry = ParserRegistry()
+        registry.register('json', lambda p: calls.append(p) or 'json')
+        registry.register('pdf', lambda p: calls.append(p) or 'pdf', requires=['no_such_module_xyz'])
+
+        assert registry.dispatch(_write(tmpdir, 'mislabeled.png', '{"qps": 1}')) == 'json'
+
+        try:
+            registry.dispatch(_write(tmpdir, 'a.pdf', b'%PDF-1.4'))
+            assert False, '缺少依赖时应直接拒绝'
+        except UnsupportedFileError as e:
+            assert e.file_type == 'pdf'
+
+        try:
+            registry.dispatch(_write(tmpdir, 'a.json', b'\x89PNG\r\n\x1a\n'))
+            assert False, '未注册类型应直接拒绝'
+        except UnsupportedFileError as e:
+            assert e.file_type == 'png'
+
+        assert len(calls) == 1
+
+
+if __name__ == '__main__':
+    test_sniff_by_magic_bytes()
+    test_sniff_zip_structure()
+    test_sniff_text()
+    test_dispatch_and_fail_fast()
+    print("✅ 解析器注册表测试通过！")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""测试PDF逐页流式提取与提前终止"""
+
+import re
+
+from pdf_stream import IncrementalFieldExtractor, extract_fields_from_pages
+
+
+def _extract(text):
+    """与 DeploymentResourcePredictor._extract_params_from_text 类似的简化提取"""
+    params = {}
+    qps = re.search(r'QPS[:\s]*(\d+)', text)
+    if qps:
+        params['qps'] = int(qps.group(1))
+    tps = re.search(r'TPS[:\s]*(\d+)', text)
+    if tps:
+        params['tps'] = int(tps.group(1))
+    return params
+
+
+def _pages(texts, consumed):
+    for number, text in enumerate(texts, 1):
+        consumed.append(number)
+        yield number, text
+
+
+def test_stops_when_required_fields_found():
+    """所需字段找齐后不再读取后续页面"""
+    consumed = []
+    texts = ['封面', 'QPS: 5000', 'TPS: 2000', 'QPS: 1', '附录'] + ['正文'] * 100
+    params, info = extract_fields_from_pages(_pages(texts, consumed), _extract, ('qps', 'tps'))
+
+    assert params == {'qps': 5000, 'tps': 2000}
+    assert info['stopped_reason'] == 'all_fields_found'
+    assert consumed == [1, 2, 3]
+
+
+def test_scans_past_ten_pages():
+    """不再只看前10页"""
+    texts = ['正文'] * 30 + ['QPS: 80000']
+    params, info = extract_fields_from_pages(_pages(texts, []), _extract, ('qps',))
+
+    assert params == {'qps': 80000}
+    assert info['pages_scanned'] == 31
+
+
+def test_field_split_across_pages():
+    """字段被分页截断时依靠跨页重叠识别"""
+    incremental = IncrementalFieldExtractor(_extract, ('qps',))
+    incremental.feed('性能指标 QPS:')
+    incremental.feed(' 12000 峰值')
+
+    assert incremental.params == {'qps': 12000}
+    assert incremental.complete
+
+
+def test_missing_fields_reported():
+    """读完文档仍缺失的字段会被报告"""
+    params, info = extract_fields_from_pages(_pages(['QPS: 10'], []), _extract, ('qps', 'tps'))
+
+    assert params == {'qps': 10}
+    assert info['stopped_reason'] == 'end_of_document'
+    assert info['missing_fields'] == ['tps']
+
+
+if __name__ == '__main__':
+    test_stops_when_required_fields_found()
+    test_scans_past_ten_pages()
+    test_field_split_across_pages()
+    test_missing_fields_reported()
+    print("✅ PDF流式提取测试通过！")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""测试相同预测请求的合并计算"""
+
+import time
+import tempfile
+import threading
+
+import pytest
+
+from singleflight import SingleFlight, canonical_key
+
+
+def test_canonical_key_ignores_key_order():
+    assert canonical_key('predict', {'a': 1, 'b': [1, 2]}) == canonical_key('predict', {'b': [1, 2], 'a': 1})
+    assert canonical_key('predict', {'a': 1}) != canonical_key('predict', {'a': 2})
+    assert canonical_key('predict', {'a': 1}) != canonical_key('plan', {'a': 1})
+
+
+def test_concurrent_calls_share_one_computation():
+    """并发相同请求只计算一次，其余共享结果；结束后不保留结果"""
+    flight = SingleFlight('test', lock_dir='')
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {'nodes': 6}
+
+    results = [None] * 5
+
+    def call(i):
+        results[i] = flight.do('k', compute)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(5)]
+    threads[0].start()
+    started.wait(5)
+    for t in threads[1:]:
+        t.start()
+    time.sleep(0.2)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(result is results[0][0] for result, _ in results)
+    assert flight._calls == {}
+
+    assert flight.do('k', lambda: {'nodes': 7}) == ({'nodes': 7}, False)
+
+
+def test_error_propagates_to_waiters():
+    """leader 失败时等待者收到同一个异常，下一次调用重新计算"""
+    flight = SingleFlight('test', lock_dir='')
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError('bad input')
+
+    errors = []
+
+    def call():
+        try:
+            flight.do('k', fail)
+        except ValueError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    time.sleep(0.2)
+    release.set()
+    leader.join()
+    follower.join()
+
+    assert errors == ['bad input', 'bad input']
+    assert flight.do('k', lambda: 1) == (1, False)
+
+
+def test_cross_process_lock_file():
+    """两个实例共用锁目录（模拟两个worker进程）：后到者等待锁并读取先到者写出的结果"""
+    with tempfile.TemporaryDirectory() as lock_dir:
+        first = SingleFlight('test', lock_dir=lock_dir)
+        second = SingleFlight('test', lock_dir=lock_dir)
+        key = canonical_key('test', {'qps': 5000})
+        started, release = threading.Event(), threading.Event()
+        outcome = {}
+
+        def compute():
+            started.set()
+            release.wait(5)
+            return {'nodes': 6}
+
+        leader = threading.Thread(target=lambda: outcome.setdefault('first', first.do(key, compute)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(
+            target=lambda: outcome.setdefault('second', second.do(key, lambda: pytest.fail('不应重复计算'))))
+        follower.start()
+        time.sleep(0.2)
+        release.set()
+        leader.join()
+        follower.join()
+
+        assert outcome['first'] == ({'nodes': 6}, False)
+        assert outcome['second'] == ({'nodes': 6}, True)
+
+
+if __name__ == '__main__':
+    test_canonical_key_ignores_key_order()
+    test_concurrent_calls_share_one_computation()
+    test_error_propagates_to_waiters()
+    test_cross_process_lock_file()
+    print("✅ 合并计算测试通过！")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""测试配置类接口的ETag与预压缩响应"""
+
+import gzip
+import json
+
+from flask import Flask
+
+from static_payloads import StaticPayloadCache, build_payload, cached_json_response, get_payload_cache
+
+
+def test_payload_is_built_once_per_version():
+    """版本标记不变时不重建，变化后重建"""
+    cache = StaticPayloadCache()
+    builds = []
+
+    def builder():
+        builds.append(1)
+        return {'libraries': ['a'] * len(builds)}
+
+    first = cache.get('libs', builder, version=1)
+    assert cache.get('libs', builder, version=1) is first
+    second = cache.get('libs', builder, version=2)
+    assert len(builds) == 2
+    assert second.etag != first.etag
+
+
+def test_compression_is_deterministic():
+    """相同内容的ETag和gzip字节一致（gzip不写入时间戳）"""
+    data = {'fields': [{'name': f'field_{i}', 'label': '数据量'} for i in range(50)]}
+    a, b = build_payload(data), build_payload(data)
+    assert a.etag == b.etag and a.gzip_body == b.gzip_body
+    assert json.loads(gzip.decompress(a.gzip_body)) == data
+    assert build_payload({'ok': True}).gzip_body is None
+
+
+def test_flask_etag_and_encoding():
+    """按 Accept-Encoding 返回预压缩内容，If-None-Match 命中返回304"""
+    app = Flask(__name__)
+    data = {'fields': ['qps'] * 500}
+    get_payload_cache().invalidate('test_config')
+
+    @app.route('/config')
+    def config():
+        return cached_json_response('test_config', lambda: data)
+
+    client = app.test_client()
+    plain = client.get('/config')
+    assert plain.status_code == 200
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.get_json() == data
+    etag = plain.headers['ETag']
+
+    zipped = client.get('/config', headers={'Accept-Encoding': 'gzip'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert zipped.headers['Vary'] == 'Accept-Encoding'
+    assert json.loads(gzip.decompress(zipped.data)) == data
+    assert zipped.headers['ETag'] != etag
+
+    not_modified = client.get('/config', headers={'If-None-Match': etag, 'Accept-Encoding': 'gzip'})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b''
+    assert client.get('/config', headers={'If-None-Match': '"stale"'}).status_code == 200
+
+
+if __name__ == '__main__':
+    test_payload_is_built_once_per_version()
+    test_compression_is_deterministic()
+    test_flask_etag_and_encoding()
+    print("✅ 预计算响应测试通过！")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""测试图像表格网格检测与单元格OCR重建"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from table_grid_detector import detect_tables, ocr_table, mask_tables, has_ink
+
+
+def _draw_table(rows=4, cols=3, cell_w=120, cell_h=40, origin=(30, 50)):
+    """生成一张白底黑线的表格图，每个单元格中央画一个标记块"""
+    image = np.full((400, 500), 255, dtype=np.uint8)
+    ox, oy = origin
+    for r in range(rows + 1):
+        y = oy + r * cell_h
+        cv2.line(image, (ox, y), (ox + cols * cell_w, y), 0, 2)
+    for c in range(cols + 1):
+        x = ox + c * cell_w
+        cv2.line(image, (x, oy), (x, oy + rows * cell_h), 0, 2)
+    for r in range(rows):
+        for c in range(cols):
+            cx, cy = ox + c * cell_w + cell_w // 2, oy + r * cell_h + cell_h // 2
+            # 用方块宽度编码行列号，供伪OCR还原
+            cv2.rectangle(image, (cx - 5 - r * 3, cy - 5), (cx + 5 + c * 3, cy + 5), 0, -1)
+    return image
+
+
+def _fake_ocr(cell):
+    """伪OCR：返回标记块的宽度"""
+    ys, xs = np.where(cell < 128)
+    return str(xs.max() - xs.min() + 1) if len(xs) else ''
+
+
+def test_detect_grid():
+    """检测出表格行列数"""
+    grids = detect_tables(_draw_table())
+    assert len(grids) == 1
+    assert grids[0].n_rows == 4
+    assert grids[0].n_cols == 3
+
+
+def test_ocr_rebuilds_rows_and_columns():
+    """单元格识别结果按行列放回原位置，线程池与顺序执行结果一致"""
+    image = _draw_table()
+    grid = detect_tables(image)[0]
+
+    sequential = ocr_table(image, grid, _fake_ocr)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        parallel = ocr_table(image, grid, _fake_ocr, executor=pool, batch_size=2)
+
+    assert sequential == parallel
+    assert len(sequential) == 4 and all(len(row) == 3 for row in sequential)
+    # 同一行宽度随列号递增，同一列宽度随行号递增
+    for row in sequential:
+        widths = [int(v) for v in row]
+        assert widths == sorted(widths) and len(set(widths)) == 3
+    for c in range(3):
+        widths = [int(sequential[r][c]) for r in range(4)]
+        assert widths == sorted(widths) and len(set(widths)) == 4
+
+
+def test_blank_image_and_masking():
+    """无表格时返回空列表；涂白表格后不再有内容"""
+    blank = np.full((200, 200), 255, dtype=np.uint8)
+    assert detect_tables(blank) == []
+    assert not has_ink(blank)
+
+    image = _draw_table()
+    assert not has_ink(mask_tables(image, detect_tables(image)))
+
+
+def test_unmapped_table_falls_back_to_cell_text():
+    """表格列名映射不出系统字段时，从含单元格文字的全部OCR文本中提取系统信息"""
+    import tempfile
+    from PIL import Image
+    from advanced_file_processor import AdvancedFileProcessor
+
+    processor = AdvancedFileProcessor()
+    # 单列两行：表头"附加信息"不是系统字段，内容单元格写的是键值对
+    processor._ocr_cell = lambda cell: '附加信息' if int(_fake_ocr(cell)) <= 12 else '系统名称：核心系统'
+    processor._ocr_page = lambda image: ''
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'table.png')
+        Image.fromarray(_draw_table(rows=2, cols=1)).save(path)
+        result = processor.process_image(path)
+
+    assert result['success'], result.get('error')
+    assert len(result['tables']) == 1 and result['tables'][0]['systems'] == []
+    assert [system['system_name'] for system in result['systems']] == ['核心系统']
+
+
+if __name__ == '__main__':
+    test_detect_grid()
+    test_ocr_rebuilds_rows_and_columns()
+    test_blank_image_and_masking()
+    test_unmapped_table_falls_back_to_cell_text()
+    print("✅ 表格网格检测测试通过！")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""测试采样请求追踪"""
+
+import json
+import logging
+
+from flask import Flask, jsonify
+
+import tracing
+from tracing import install_flask_tracing, span, start_trace
+
+
+def _capture_traces():
+    """把追踪输出接到内存，返回收集到的记录列表"""
+    records = []
+
+    class _Collector(logging.Handler):
+        def emit(self, record):
+            records.append(json.loads(record.getMessage()))
+
+    trace_logger = logging.getLogger('tdsql_test_trace')
+    trace_logger.propagate = False
+    trace_logger.handlers = [_Collector()]
+    trace_logger.setLevel(logging.INFO)
+    tracing._trace_logger = trace_logger
+    return records
+
+
+def test_unsampled_span_is_noop():
+    """未采样时 span 返回共享空上下文，不记录任何内容"""
+    records = _capture_traces()
+    original = tracing.TRACE_SAMPLE_RATE
+    tracing.TRACE_SAMPLE_RATE = 0
+    try:
+        with start_trace('job') as trace:
+            assert trace is None
+            assert span('stage') is tracing._NOOP_SPAN
+    finally:
+        tracing.TRACE_SAMPLE_RATE = original
+    assert records == []
+
+
+def test_forced_trace_records_nested_spans():
+    """强制采样的追踪按嵌套关系记录各阶段，异常记录在对应阶段上"""
+    records = _capture_traces()
+    with start_trace('job', force=True, rows=3):
+        with span('parse'):
+            with span('parse.uncached', parser='csv'):
+                pass
+        try:
+            with span('predict'):
+                raise ValueError('bad row')
+        except ValueError:
+            pass
+
+    assert len(records) == 1
+    trace = records[0]
+    assert trace['name'] == 'job' and trace['attrs'] == {'rows': 3}
+    names = [s['name'] for s in trace['spans']]
+    assert names == ['parse', 'parse.uncached', 'predict']
+    assert trace['spans'][1]['parent'] == 'parse'
+    assert trace['spans'][1]['attrs'] == {'parser': 'csv'}
+    assert trace['spans'][2]['error'] == 'ValueError: bad row'
+    assert all(s['duration_ms'] >= 0 for s in trace['spans'])
+
+
+def test_flask_trace_header():
+    """请求头 X-Trace: 1 强制采样，响应带 X-Trace-Id，视图中的 span 记录到该请求"""
+    records = _capture_traces()
+    app = Flask(__name__)
+    install_flask_tracing(app, 'test_app')
+
+    @app.route('/api/echo')
+    def echo():
+        with span('serialize'):
+            return jsonify({'ok': True})
+
+    client = app.test_client()
+    original = tracing.TRACE_SAMPLE_RATE
+    tracing.TRACE_SAMPLE_RATE = 0
+    try:
+        assert 'X-Trace-Id' not in client.get('/api/echo').headers
+        response = client.get('/api/echo', headers={'X-Trace': '1'})
+    finally:
+        tracing.TRACE_SAMPLE_RATE = original
+
+    assert len(records) == 1
+    trace = records[0]
+    assert response.headers['X-Trace-Id'] == trace['trace_id']
+    assert trace['name'] == 'GET /api/echo'
+    assert trace['attrs']['status'] == 200
+    assert [s['name'] for s in trace['spans']] == ['serialize']
+    assert tracing.current_trace() is None
+
+
+if __name__ == '__main__':
+    test_unsampled_span_is_noop()
+    test_forced_trace_records_nested_spans()
+    test_flask_trace_header()
+    print("✅ 请求追踪测试通过！")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""测试上传流式接收与上传目录清理"""
+
+import io
+import os
+import time
+import hashlib
+import tempfile
+
+from werkzeug.datastructures import FileStorage
+
+from upload_ingest import UploadSweeper, ingest_upload
+
+
+def _storage(data, filename='params.json'):
+    return FileStorage(stream=io.BytesIO(data), filename=filename)
+
+
+def test_small_upload_stays_in_memory():
+    """小文件只在内存中，哈希边读边算，未解析时不产生文件"""
+    data = b'{"qps": 5000}'
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ingest_upload(_storage(data), tmpdir) as upload:
+            assert not upload.spooled
+            assert upload.content_hash == hashlib.sha256(data).hexdigest()
+            assert upload.size == len(data)
+            assert os.listdir(tmpdir) == []
+            assert upload.open().read() == data
+
+            path = upload.materialize()
+            assert path.endswith('.json')
+            with open(path, 'rb') as f:
+                assert f.read() == data
+        assert os.listdir(tmpdir) == []
+
+
+def test_large_upload_spools_once():
+    """超过阈值直接写入溢写文件，materialize 不再重复写"""
+    data = os.urandom(300 * 1024)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ingest_upload(_storage(data, 'big.pdf'), tmpdir, spool_threshold=64 * 1024) as upload:
+            assert upload.spooled
+            assert len(os.listdir(tmpdir)) == 1
+            assert upload.materialize() == upload.path
+            assert upload.content_hash == hashlib.sha256(data).hexdigest()
+            with upload.open() as f:
+                assert f.read() == data
+        assert os.listdir(tmpdir) == []
+
+
+def test_parse_skips_disk_on_cache_hit():
+    """解析缓存命中时不调用解析函数、不写文件"""
+    import parse_cache
+    from parse_cache import ParseCache
+
+    data = b'{"qps": 1}'
+    calls = []
+
+    def parse(path):
+        calls.append(path)
+        return {'qps': 1}
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        original = parse_cache._parse_cache
+        parse_cache._parse_cache = ParseCache(cache_file=os.path.join(tmpdir, 'cache.db'))
+        upload_dir = os.path.join(tmpdir, 'uploads')
+        try:
+            for _ in range(2):
+                with ingest_upload(_storage(data), upload_dir) as upload:
+                    assert upload.parse('test', '1', parse) == {'qps': 1}
+        finally:
+            parse_cache._parse_cache.close()
+            parse_cache._parse_cache = original
+
+    assert len(calls) == 1
+
+
+def test_sweeper_enforces_ttl_and_quota():
+    """过期文件和超出配额的最旧文件被删除；不是本模块写出的文件（如仓库中的示例文件）保留"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        now = time.time()
+        for name, age in [('upload_old.png', 7200), ('upload_a.png', 30), ('upload_b.png', 20),
+                          ('upload_c.png', 10), ('20251026_sample.json', 7200)]:
+            path = os.path.join(tmpdir, name)
+            with open(path, 'wb') as f:
+                f.write(b'x' * 1000)
+            os.utime(path, (now - age, now - age))
+
+        sweeper = UploadSweeper(tmpdir, quota_bytes=2000, ttl_s=3600)
+        stats = sweeper.sweep()
+
+        assert stats == {'files_removed': 2, 'bytes_removed': 2000}
+        assert sorted(os.listdir(tmpdir)) == ['20251026_sample.json', 'upload_b.png', 'upload_c.png']
+
+
+if __name__ == '__main__':
+    test_small_upload_stays_in_memory()
+    test_large_upload_spools_once()
+    test_parse_skips_disk_on_cache_hit()
+    test_sweeper_enforces_ttl_and_quota()
+    print("✅ 上传流式接收测试通过！")
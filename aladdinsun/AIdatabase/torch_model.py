@@ -0,0 +1,137 @@
+"""
+TDSQL 架构预测模型的 PyTorch 实现（仅训练时需要）
+
+在线推理使用 numpy_inference.NumpyArchitecturePredictor（通过 model.load_predictor() 加载），
+训练完成后用 numpy_inference.export_weights 把权重导出为 .npz 供推理使用。
+"""
+
+from feature_pipeline import ARCH_TYPES, FEATURE_DIM, extract_features
+from model import apply_business_rules, decode_prediction, rule_based_predict
+
+try:
+    import torch
+    import torch.nn as nn
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+    print("PyTorch 未安装，使用基于规则的预测模式")
+
+# 有 PyTorch 时模型是 nn.Module（可训练、可保存 state_dict），否则退化为规则预测器
+_ModelBase = nn.Module if TORCH_AVAILABLE else object
+
+class TDSQLArchitecturePredictor(_ModelBase):
+    """TDSQL 架构预测模型"""
+
+    def __init__(self, input_dim=FEATURE_DIM, hidden_dim=256, dropout=0.3):
+        if not TORCH_AVAILABLE:
+            print("初始化基于规则的预测器")
+            return
+        super(TDSQLArchitecturePredictor, self).__init__()
+        self.hidden_dim = hidden_dim
+        self.dropout = dropout
+
+        # 特征提取网络
+        self.feature_extractor = nn.Sequential(
+            nn.Linear(input_dim, hidden_dim),
+            nn.ReLU(),
+            nn.Dropout(dropout),
+            nn.Linear(hidden_dim, hidden_dim),
+            nn.ReLU(),
+            nn.Dropout(dropout),
+            nn.Linear(hidden_dim, 128),
+            nn.ReLU()
+        )
+
+        # 架构类型预测（单机/分布式/混合）
+        self.architecture_classifier = nn.Sequential(
+            nn.Linear(128, 64),
+            nn.ReLU(),
+            nn.Linear(64, len(ARCH_TYPES)),
+            nn.Softmax(dim=1)
+        )
+
+        # 节点数量预测
+        self.node_count_predictor = nn.Sequential(
+            nn.Linear(128, 64),
+            nn.ReLU(),
+            nn.Linear(64, 1)
+        )
+
+        # 分片数量预测
+        self.shard_count_predictor = nn.Sequential(
+            nn.Linear(128, 64),
+            nn.ReLU(),
+            nn.Linear(64, 1)
+        )
+
+        # 副本数量预测
+        self.replica_count_predictor = nn.Sequential(
+            nn.Linear(128, 32),
+            nn.ReLU(),
+            nn.Linear(32, 1)
+        )
+
+    def forward(self, x):
+        """前向传播"""
+        if not TORCH_AVAILABLE:
+            return None
+
+        features = self.feature_extractor(x)
+
+        arch_type = self.architecture_classifier(features)
+        node_count = self.node_count_predictor(features)
+        shard_count = self.shard_count_predictor(features)
+        replica_count = self.replica_count_predictor(features)
+
+        return {
+            'architecture_type': arch_type,
+            'node_count': node_count,
+            'shard_count': shard_count,
+            'replica_count': replica_count
+        }
+
+    def predict(self, data):
+        """预测 TDSQL 架构配置"""
+        if not TORCH_AVAILABLE:
+            # 使用基于规则的预测
+            return self._rule_based_predict(data)
+
+        # 提取特征
+        features = self._extract_features(data)
+
+        # 转换为张量
+        x = torch.FloatTensor(features).unsqueeze(0)
+
+        # 预测（推理时关闭 Dropout，结束后恢复原来的训练/推理状态）
+        was_training = self.training
+        self.eval()
+        try:
+            with torch.no_grad():
+                output = self.forward(x)
+        finally:
+            self.train(was_training)
+
+        # 解析结果
+        result = decode_prediction(
+            output['architecture_type'][0].numpy(),
+            output['node_count'].item(),
+            output['shard_count'].item(),
+            output['replica_count'].item()
+        )
+
+        # 基于规则的调整
+        result = self._apply_business_rules(data, result)
+
+        return result
+
+    def _rule_based_predict(self, data):
+        """基于规则的预测（不使用深度学习）"""
+        return rule_based_predict(data)
+
+    def _extract_features(self, data):
+        """从数据中提取特征向量（与训练共用 feature_pipeline 的定义）"""
+        return extract_features(data)
+
+    def _apply_business_rules(self, data, prediction):
+        """应用业务规则调整预测结果"""
+        return apply_business_rules(data, prediction)
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+采样请求追踪与分级日志
+
+追踪：每个请求按采样率决定是否记录；被采样的请求在结束时把所有阶段（span）写成一行JSON，
+输出到按大小轮转的文件。未被采样时 span() 返回共享的空上下文，只多一次 ContextVar 读取。
+
+日志：get_logger() 返回标准 logging 记录器，级别由 LOG_LEVEL 控制；
+热路径上的调试输出用 logger.debug，关闭时不做字符串格式化。
+
+用法:
+    from tracing import get_logger, span, install_flask_tracing
+    logger = get_logger(__name__)
+    install_flask_tracing(app, 'app_simple')
+
+    with span('normalize'):
+        ...
+"""
+
+import os
+import json
+import time
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+from metrics import PREDICTOR_STAGE_SECONDS
+
+# 采样率（0~1），请求头 X-Trace: 1 可强制采样单个请求
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.01))
+TRACE_FORCE_HEADER = 'X-Trace'
+
+# 追踪输出文件与轮转设置
+TRACE_FILE = os.environ.get('TRACE_FILE', os.path.join('logs', 'trace.jsonl'))
+TRACE_MAX_BYTES = int(os.environ.get('TRACE_MAX_BYTES', 20 * 1024 * 1024))
+TRACE_BACKUP_COUNT = int(os.environ.get('TRACE_BACKUP_COUNT', 5))
+
+# 日志级别
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+
+_logging_configured = False
+_logging_lock = threading.Lock()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """获取分级日志记录器（首次调用时配置输出到stderr）"""
+    global _logging_configured
+    if not _logging_configured:
+        with _logging_lock:
+            if not _logging_configured:
+                root = logging.getLogger('tdsql')
+                if not root.handlers:
+                    handler = logging.StreamHandler()
+                    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+                    root.addHandler(handler)
+                root.setLevel(LOG_LEVEL)
+                root.propagate = False
+                _logging_configured = True
+    return logging.getLogger(f'tdsql.{name}')
+
+
+class Trace:
+    """一次被采样请求的所有阶段"""
+
+    __slots__ = ('trace_id', 'name', 'attrs', 'start', 'spans', '_stack')
+
+    def __init__(self, name: str, **attrs):
+        self.trace_id = '%016x' % random.getrandbits(64)
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self._stack: List[int] = []
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        record = {
+            'name': name,
+            'parent': self.spans[self._stack[-1]]['name'] if self._stack else None,
+            'start_ms': round((time.perf_counter() - self.start) * 1000, 3),
+        }
+        if attrs:
+            record['attrs'] = attrs
+        self.spans.append(record)
+        self._stack.append(len(self.spans) - 1)
+        begin = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record['error'] = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            record['duration_ms'] = round((time.perf_counter() - begin) * 1000, 3)
+            self._stack.pop()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'timestamp': time.time(),
+            'duration_ms': round((time.perf_counter() - self.start) * 1000, 3),
+            'attrs': self.attrs,
+            'spans': self.spans,
+        }
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('tdsql_trace', default=None)
+
+
+class _NoopSpan:
+    """未采样时共享的空上下文"""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def span(name: str, **attrs):
+    """在当前追踪中记录一个阶段；当前请求未被采样时为空操作"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return trace.span(name, **attrs)
+
+
+@contextmanager
+def predictor_stage(predictor: str, stage: str):
+    """预测器阶段：总是计入 predictor_stage_duration_seconds，被采样时同时记录span"""
+    with PREDICTOR_STAGE_SECONDS.time(predictor=predictor, stage=stage), span(f'predict.{stage}', predictor=predictor):
+        yield
+
+
+def should_sample(force: bool = False) -> bool:
+    return force or (TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE)
+
+
+@contextmanager
+def start_trace(name: str, force: bool = False, **attrs):
+    """开始一次追踪（按采样率），结束时写出；未采样时 yield None"""
+    if not should_sample(force):
+        yield None
+        return
+
+    trace = Trace(name, **attrs)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        emit_trace(trace)
+
+
+# ==================== 输出 ====================
+
+_trace_logger: Optional[logging.Logger] = None
+_trace_logger_lock = threading.Lock()
+
+
+def _get_trace_logger() -> logging.Logger:
+    """追踪专用记录器：每条记录是一行JSON，写入轮转文件"""
+    global _trace_logger
+    if _trace_logger is None:
+        with _trace_logger_lock:
+            if _trace_logger is None:
+                trace_logger = logging.getLogger('tdsql_trace')
+                trace_logger.propagate = False
+                trace_logger.setLevel(logging.INFO)
+                if not trace_logger.handlers:
+                    directory = os.path.dirname(TRACE_FILE)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    handler = RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_MAX_BYTES,
+                                                  backupCount=TRACE_BACKUP_COUNT, encoding='utf-8')
+                    handler.setFormatter(logging.Formatter('%(message)s'))
+                    trace_logger.addHandler(handler)
+                _trace_logger = trace_logger
+    return _trace_logger
+
+
+def emit_trace(trace: Trace):
+    try:
+        _get_trace_logger().info(json.dumps(trace.to_dict(), ensure_ascii=False, default=str))
+    except OSError as e:
+        get_logger('tracing').warning('追踪写出失败: %s', e)
+
+
+# ==================== Flask 集成 ====================
+
+def install_flask_tracing(app, app_name: Optional[str] = None):
+    """按采样率追踪请求：请求开始时建立追踪，teardown 时写出"""
+    from flask import g, request
+
+    app_name = app_name or app.import_name
+
+    @app.before_request
+    def _trace_start():
+        force = request.headers.get(TRACE_FORCE_HEADER) == '1'
+        if not should_sample(force):
+            return
+        rule = request.url_rule
+        trace = Trace(f'{request.method} {rule.rule if rule is not None else "unmatched"}',
+                      app=app_name, path=request.path)
+        g._trace = trace
+        g._trace_token = _current_trace.set(trace)
+
+    @app.after_request
+    def _trace_status(response):
+        trace = g.get('_trace')
+        if trace is not None:
+            trace.attrs['status'] = response.status_code
+            response.headers['X-Trace-Id'] = trace.trace_id
+        return response
+
+    @app.teardown_request
+    def _trace_finish(exc):
+        trace = g.pop('_trace', None)
+        if trace is None:
+            return
+        try:
+            _current_trace.reset(g.pop('_trace_token'))
+        except (ValueError, KeyError):
+            _current_trace.set(None)
+        if exc is not None:
+            trace.attrs['error'] = f'{type(exc).__name__}: {exc}'
+        emit_trace(trace)
+
+    return app
@@ -5,90 +5,78 @@ TDSQL 架构预测模型训练系统
 
 import json
 import os
+import importlib.util
 from datetime import datetime
-import numpy as np
 
-try:
-    import torch
-    import torch.nn as nn
-    import torch.optim as optim
-    from torch.utils.data import Dataset, DataLoader
-    TORCH_AVAILABLE = True
-except ImportError:
-    TORCH_AVAILABLE = False
+from case_log import get_case_log, log_path_for
+from case_store import get_case_store
+from feature_pipeline import encode_architecture, extract_features, load_feature_matrix
+from model import MODEL_WEIGHTS_FILE, load_predictor
+from model_registry import get_model_registry
+from online_learning import ONLINE_LEARNING_ENABLED, get_online_learner
+from tracing import get_logger
+
+logger = get_logger('training')
+
+# PyTorch 只在训练时导入，在线推理进程（只用到 add_case / 统计）不加载它
+TORCH_AVAILABLE = importlib.util.find_spec('torch') is not None
+if not TORCH_AVAILABLE:
     print("⚠️  PyTorch 未安装，训练功能不可用")
-    # 创建占位类
-    class Dataset:
-        pass
 
-class TDSQLDataset(Dataset):
-    """TDSQL 训练数据集"""
+class TDSQLDataset:
+    """TDSQL 训练数据集（特征一次性物化，见 feature_pipeline；可直接交给 DataLoader）"""
     
     def __init__(self, data_file='training_data.json'):
         self.data_file = data_file
-        self.samples = self.load_data()
+        self.matrix = load_feature_matrix(data_file)
+        self._dataset = None
+    
+    @property
+    def _tensors(self):
+        if self._dataset is None:
+            from batched_training import MaterializedDataset
+            self._dataset = MaterializedDataset(self.matrix)
+        return self._dataset
     
     def load_data(self):
-        """加载训练数据"""
-        if not os.path.exists(self.data_file):
-            return []
-        
-        with open(self.data_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        """加载训练数据（快照 + 追加日志）"""
+        return get_case_log(self.data_file).load_all()
     
     def __len__(self):
-        return len(self.samples)
+        return len(self.matrix)
     
     def __getitem__(self, idx):
-        sample = self.samples[idx]
-        
-        # 提取特征
-        features = self._extract_features(sample['input'])
-        
-        # 提取标签
-        labels = {
-            'architecture_type': self._encode_architecture(sample['output']['architecture_type']),
-            'node_count': sample['output']['node_count'],
-            'shard_count': sample['output']['shard_count'],
-            'replica_count': sample['output']['replica_count']
-        }
-        
-        return torch.FloatTensor(features), labels
+        return self._tensors[idx]
+    
+    def batches(self, batch_size, shuffle=False, generator=None):
+        """按批次返回 (features, labels) 张量切片"""
+        return self._tensors.batches(batch_size, shuffle=shuffle, generator=generator)
     
     def _extract_features(self, data):
         """提取特征向量"""
-        features = np.zeros(50)
-        
-        features[0] = data.get('total_data_size_gb', 0) / 10000
-        features[1] = data.get('table_count', 0) / 1000
-        features[2] = data.get('database_count', 0) / 100
-        features[3] = data.get('qps', 0) / 100000
-        features[4] = data.get('tps', 0) / 50000
-        features[5] = data.get('concurrent_connections', 0) / 10000
-        features[6] = 1 if data.get('need_high_availability', False) else 0
-        features[7] = 1 if data.get('need_disaster_recovery', False) else 0
-        features[8] = 1 if data.get('need_read_write_split', False) else 0
-        features[12] = data.get('max_table_size_gb', 0) / 1000
-        features[13] = data.get('avg_table_size_gb', 0) / 100
-        features[14] = data.get('data_growth_rate', 0) / 100
-        
-        return features
+        return extract_features(data)
     
     def _encode_architecture(self, arch_type):
         """编码架构类型"""
-        mapping = {'standalone': 0, 'distributed': 1, 'hybrid': 2}
-        return mapping.get(arch_type, 1)
+        return encode_architecture(arch_type)
 
 
 class TrainingSystem:
     """训练系统"""
     
-    def __init__(self, model, data_file='training_data.json'):
+    def __init__(self, model=None, data_file='training_data.json'):
+        # model 为 PyTorch 网络；不传时在第一次训练时创建（在线推理进程无需加载 PyTorch）
         self.model = model
         self.data_file = data_file
         self.history_file = 'training_history.json'
-        self.best_model_file = 'best_model.pth'
+        self.weights_file = MODEL_WEIGHTS_FILE
+        self.registry = get_model_registry()
         self.training_history = []
+        self.case_log = get_case_log(data_file)
+        self.case_store = get_case_store(data_file)
+        # 新案例到达后在后台做增量更新（ONLINE_LEARNING_ENABLED=1 时启用）
+        self.online_learner = (get_online_learner(data_file, self.weights_file, registry=self.registry)
+                               if ONLINE_LEARNING_ENABLED else None)
     
     def add_case(self, input_data, output_data, feedback=None):
         """添加训练案例"""
@@ -101,154 +89,127 @@ class TrainingSystem:
             'used_for_training': False
         }
         
-        # 加载现有数据
-        cases = self._load_cases()
-        cases.append(case)
-        
-        # 保存
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(cases, f, ensure_ascii=False, indent=2)
+        # 追加一行到案例日志，不再读出并重写整个文件；同时写入案例库
+        self.case_store.append(self.case_log, case)
+        if self.online_learner is not None:
+            self.online_learner.submit(case)
         
-        print(f"✅ 案例已添加: ID={case['id']}")
+        logger.info("案例已添加: ID=%s", case['id'])
         return case['id']
     
-    def train(self, epochs=100, batch_size=32, learning_rate=0.001):
-        """训练模型"""
+    def train(self, epochs=100, batch_size=32, learning_rate=0.001, val_split=0.2, patience=10,
+              num_workers=0, num_threads=None, seed=None, promote=True, hidden_dim=256, dropout=0.3,
+              weight_decay=0.0):
+        """
+        训练模型（批量化，见 batched_training）
+
+        Args:
+            val_split: 留作验证集的比例，验证损失连续 patience 轮不下降时提前停止
+            num_workers: DataLoader 工作进程数，0 表示直接在物化特征上切片取批次
+            num_threads: torch.set_num_threads，默认取 TRAIN_NUM_THREADS 环境变量
+            promote: 训练结果注册为新版本后直接上线；False 时设为候选版本做影子评估
+            hidden_dim / dropout: 网络宽度和 Dropout 比例（仅在新建模型时使用，可由 hyperparameter_search 搜索）
+
+        Returns:
+            训练结果摘要（dict），数据不足或未安装 PyTorch 时返回 False
+        """
         if not TORCH_AVAILABLE:
-            print("❌ PyTorch 未安装，无法训练")
+            logger.warning("PyTorch 未安装，无法训练")
             return False
         
-        # 加载数据集
+        # 加载数据集（特征已物化）
         dataset = TDSQLDataset(self.data_file)
         
         if len(dataset) < 10:
-            print(f"⚠️  训练数据不足（当前: {len(dataset)}，建议: ≥10）")
+            logger.warning("训练数据不足（当前: %d，建议: ≥10）", len(dataset))
             return False
         
-        print(f"📊 开始训练，数据集大小: {len(dataset)}")
-        
-        # 创建数据加载器
-        dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=True)
-        
-        # 优化器
-        optimizer = optim.Adam(self.model.parameters(), lr=learning_rate)
-        
-        # 损失函数
-        criterion_class = nn.CrossEntropyLoss()
-        criterion_reg = nn.MSELoss()
-        
-        best_loss = float('inf')
-        
-        # 训练循环
-        for epoch in range(epochs):
-            total_loss = 0
-            
-            for features, labels in dataloader:
-                optimizer.zero_grad()
-                
-                # 前向传播
-                outputs = self.model(features)
-                
-                # 计算损失
-                loss_arch = criterion_class(outputs['architecture_type'], 
-                                           torch.LongTensor([labels['architecture_type']]))
-                loss_node = criterion_reg(outputs['node_count'], 
-                                         torch.FloatTensor([[labels['node_count']]]))
-                loss_shard = criterion_reg(outputs['shard_count'], 
-                                          torch.FloatTensor([[labels['shard_count']]]))
-                loss_replica = criterion_reg(outputs['replica_count'], 
-                                            torch.FloatTensor([[labels['replica_count']]]))
-                
-                loss = loss_arch + loss_node + loss_shard + loss_replica
-                
-                # 反向传播
-                loss.backward()
-                optimizer.step()
-                
-                total_loss += loss.item()
-            
-            avg_loss = total_loss / len(dataloader)
-            
-            if (epoch + 1) % 10 == 0:
-                print(f"Epoch [{epoch+1}/{epochs}], Loss: {avg_loss:.4f}")
-            
-            # 保存最佳模型
-            if avg_loss < best_loss:
-                best_loss = avg_loss
-                torch.save(self.model.state_dict(), self.best_model_file)
-                print(f"💾 保存最佳模型 (Loss: {best_loss:.4f})")
+        logger.info("开始训练，数据集大小: %d", len(dataset))
+        
+        from dataclasses import asdict
+        from batched_training import TrainConfig, fit
+        from numpy_inference import export_weights
+        if self.model is None:
+            from torch_model import TDSQLArchitecturePredictor
+            self.model = TDSQLArchitecturePredictor(hidden_dim=hidden_dim, dropout=dropout)
+        
+        config = TrainConfig(epochs=epochs, batch_size=batch_size, learning_rate=learning_rate,
+                             weight_decay=weight_decay, val_split=val_split, patience=patience,
+                             num_workers=num_workers, seed=seed)
+        if num_threads is not None:
+            config.num_threads = num_threads
+        result = fit(self.model, dataset.matrix, config)
+        
+        # 注册为新版本（fit 结束时模型已恢复为最佳轮次的权重），推理进程由后台线程切换
+        summary = result.to_dict()
+        meta = self.registry.register(self.model, metrics=summary, dataset_version=self.case_log.version(),
+                                      config=dict(asdict(config), hidden_dim=self.model.hidden_dim,
+                                                  dropout=self.model.dropout),
+                                      promote=promote)
+        if promote:
+            # 同时导出到 MODEL_WEIGHTS_FILE，供直接按文件加载的预测器使用
+            export_weights(self.model, self.weights_file)
+        else:
+            self.registry.set_candidate(meta['version'])
         
         # 记录训练历史
-        self._save_training_history(epochs, len(dataset), best_loss)
+        self._save_training_history(result.epochs_run, len(dataset), result.best_loss)
         
-        print(f"✅ 训练完成！最佳损失: {best_loss:.4f}")
-        return True
+        summary['model_version'] = meta['version']
+        return summary
     
-    def evaluate(self, test_data):
-        """评估模型"""
-        if not TORCH_AVAILABLE:
-            return None
-        
-        self.model.eval()
-        correct = 0
-        total = len(test_data)
-        
-        with torch.no_grad():
-            for case in test_data:
-                prediction = self.model.predict(case['input'])
-                actual = case['output']
-                
-                if prediction['architecture_type'] == actual['architecture_type']:
-                    correct += 1
-        
-        accuracy = correct / total if total > 0 else 0
-        print(f"📊 模型准确率: {accuracy*100:.2f}%")
-        return accuracy
+    def evaluate(self, test_data, report=False):
+        """
+        评估模型（批量预测，见 evaluation）
+
+        未传入 PyTorch 模型时对模型注册表中的线上版本做 NumPy 推理（没有注册版本时用导出的
+        权重文件）。默认返回架构类型准确率；report=True 时返回完整评分（准确率、混淆矩阵、
+        节点/分片/副本数 MAE）。
+        """
+        from evaluation import evaluate_predictor
+        from numpy_inference import NumpyArchitecturePredictor
+
+        if self.model is not None:
+            predictor = NumpyArchitecturePredictor.from_model(self.model)
+        else:
+            version = self.registry.current_version()
+            predictor = (NumpyArchitecturePredictor(self.registry.weights_path(version), watch=False)
+                         if version else load_predictor(self.weights_file))
+        result = evaluate_predictor(predictor, test_data)
+        logger.info("模型准确率: %.2f%%, MAE: %s", result['accuracy'] * 100, result['mae'])
+        return result if report else result['accuracy']
     
-    def get_statistics(self):
-        """获取训练统计信息"""
-        cases = self._load_cases()
-        
-        stats = {
-            'total_cases': len(cases),
-            'trained_cases': sum(1 for c in cases if c.get('used_for_training', False)),
-            'architecture_distribution': {},
-            'data_size_range': {'min': 0, 'max': 0, 'avg': 0},
-            'qps_range': {'min': 0, 'max': 0, 'avg': 0}
-        }
-        
-        if cases:
-            # 架构分布
-            for case in cases:
-                arch = case['output']['architecture_type']
-                stats['architecture_distribution'][arch] = \
-                    stats['architecture_distribution'].get(arch, 0) + 1
-            
-            # 数据量范围
-            data_sizes = [c['input']['total_data_size_gb'] for c in cases]
-            stats['data_size_range'] = {
-                'min': min(data_sizes),
-                'max': max(data_sizes),
-                'avg': sum(data_sizes) / len(data_sizes)
-            }
-            
-            # QPS 范围
-            qps_values = [c['input'].get('qps', 0) for c in cases]
-            stats['qps_range'] = {
-                'min': min(qps_values),
-                'max': max(qps_values),
-                'avg': sum(qps_values) / len(qps_values)
-            }
-        
-        return stats
+    def cross_validate(self, k=5, approaches=None, epochs=50, batch_size=32, learning_rate=0.001, workers=None,
+                       seed=0):
+        """在训练数据上做 k 折交叉验证，对比规则 / 神经网络 / 案例检索（见 evaluation.cross_validate）"""
+        from evaluation import APPROACHES, cross_validate
+
+        config = None
+        if TORCH_AVAILABLE:
+            from batched_training import TrainConfig
+            config = TrainConfig(epochs=epochs, batch_size=batch_size, learning_rate=learning_rate, num_threads=0,
+                                 seed=seed)
+        return cross_validate(self.data_file, k=k, approaches=approaches or APPROACHES, train_config=config,
+                              workers=workers, seed=seed)
+    
+    def get_statistics(self, **filters):
+        """
+        获取训练统计信息（由案例库SQL聚合得到）
+
+        Args:
+            filters: 可选 architecture_type / industry / data_size_bucket 筛选
+        """
+        self.case_store.sync(self.case_log)
+        return self.case_store.statistics(**filters)
+    
+    def list_cases(self, limit=50, offset=0, **filters):
+        """分页列出案例，筛选条件同 get_statistics"""
+        self.case_store.sync(self.case_log)
+        return self.case_store.list_cases(limit=limit, offset=offset, **filters)
     
     def _load_cases(self):
         """加载案例"""
-        if not os.path.exists(self.data_file):
-            return []
-        
-        with open(self.data_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return self.case_log.load_all()
     
     def _generate_id(self):
         """生成唯一ID"""
@@ -348,9 +309,11 @@ def create_sample_cases():
         }
     ]
     
-    # 保存示例案例
+    # 保存示例案例（同时清掉旧的追加日志，否则其中的案例会叠加在示例之上）
     with open('training_data.json', 'w', encoding='utf-8') as f:
         json.dump(cases, f, ensure_ascii=False, indent=2)
+    if os.path.exists(log_path_for('training_data.json')):
+        os.remove(log_path_for('training_data.json'))
     
     print(f"✅ 已创建 {len(cases)} 个示例训练案例")
     return cases
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+上传文件流式接收与 uploads/ 目录清理
+
+接收上传流时边读边计算SHA-256：小文件只保留在内存，超过阈值才溢写到 uploads/；
+解析缓存命中时文件根本不落盘，未命中时才写出一份临时文件交给解析器，处理完立即删除。
+后台清理线程按TTL和总字节配额清理 uploads/ 中本模块写出的临时文件，目录大小不再随请求量增长。
+"""
+
+import io
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from tracing import get_logger, span
+
+logger = get_logger(__name__)
+
+# 超过该大小的上传溢写到磁盘（字节）
+SPOOL_THRESHOLD_BYTES = int(os.environ.get('UPLOAD_SPOOL_THRESHOLD', 4 * 1024 * 1024))
+
+# uploads/ 总字节配额与文件存活时间
+UPLOAD_QUOTA_BYTES = int(os.environ.get('UPLOAD_QUOTA_BYTES', 512 * 1024 * 1024))
+UPLOAD_TTL_S = float(os.environ.get('UPLOAD_TTL_S', 3600))
+SWEEP_INTERVAL_S = float(os.environ.get('UPLOAD_SWEEP_INTERVAL_S', 300))
+
+# 本模块创建的临时文件前缀；清理线程只删除带该前缀的文件（目录中其他文件不受影响）
+UPLOAD_FILE_PREFIX = 'upload_'
+
+# 读取上传流的块大小
+READ_CHUNK_SIZE = 256 * 1024
+
+# 正在被请求使用的文件，清理线程不会删除
+_active_paths = set()
+_active_lock = threading.Lock()
+
+
+def _mark_active(path: str):
+    with _active_lock:
+        _active_paths.add(os.path.abspath(path))
+
+
+def _unmark_active(path: str):
+    with _active_lock:
+        _active_paths.discard(os.path.abspath(path))
+
+
+def _is_active(path: str) -> bool:
+    with _active_lock:
+        return os.path.abspath(path) in _active_paths
+
+
+class IngestedUpload:
+    """
+    已接收的上传文件
+
+    content_hash / size 在接收过程中得到；内容在内存中时 path 为 None，
+    需要文件路径的解析器通过 materialize() 按需写出临时文件。
+    配合 with 使用，退出时删除本次上传产生的所有临时文件。
+    """
+
+    def __init__(self, filename: str, upload_folder: str,
+                 spool_threshold: int = SPOOL_THRESHOLD_BYTES):
+        self.filename = filename
+        self.upload_folder = upload_folder
+        self.spool_threshold = spool_threshold
+        self.content_hash = ''
+        self.size = 0
+        self.path: Optional[str] = None
+        self._buffer: Optional[io.BytesIO] = io.BytesIO()
+
+    @property
+    def spooled(self) -> bool:
+        """内容是否已溢写到磁盘"""
+        return self._buffer is None
+
+    def receive(self, stream, chunk_size: int = READ_CHUNK_SIZE) -> 'IngestedUpload':
+        """从上传流读取全部内容，同时计算哈希，超过阈值时转为写文件"""
+        sha = hashlib.sha256()
+        spool_file = None
+
+        try:
+            for chunk in iter(lambda: stream.read(chunk_size), b''):
+                sha.update(chunk)
+                self.size += len(chunk)
+
+                if spool_file is None and self.size > self.spool_threshold:
+                    spool_file = self._open_temp_file()
+                    spool_file.write(self._buffer.getvalue())
+                    self._buffer = None
+
+                if spool_file is not None:
+                    spool_file.write(chunk)
+                else:
+                    self._buffer.write(chunk)
+        finally:
+            if spool_file is not None:
+                spool_file.close()
+
+        self.content_hash = sha.hexdigest()
+        return self
+
+    def _open_temp_file(self):
+        """在上传目录创建保留原扩展名的临时文件（扩展名供按后缀分发的旧解析器使用）"""
+        os.makedirs(self.upload_folder, exist_ok=True)
+        suffix = os.path.splitext(self.filename)[1].lower()
+        fd, path = tempfile.mkstemp(prefix=UPLOAD_FILE_PREFIX, suffix=suffix, dir=self.upload_folder)
+        _mark_active(path)
+        self.path = path
+        return os.fdopen(fd, 'wb')
+
+    def materialize(self) -> str:
+        """返回内容所在的文件路径，内容仍在内存时先写出"""
+        if self.path is None:
+            with self._open_temp_file() as f:
+                f.write(self._buffer.getvalue())
+        return self.path
+
+    def open(self):
+        """以二进制只读文件对象打开内容（不落盘）"""
+        if self._buffer is not None:
+            return io.BytesIO(self._buffer.getvalue())
+        return open(self.path, 'rb')
+
+    def parse(self, parser: str, version: str, parse_func: Callable[[str], Dict[str, Any]],
+              cacheable=None) -> Dict[str, Any]:
+        """
+        经解析缓存解析：按接收时算好的哈希查询，未命中才写出文件并调用 parse_func(path)
+        """
+        from parse_cache import cached_parse_content
+
+        def parse_uncached():
+            with span('parse.uncached', parser=parser):
+                return parse_func(self.materialize())
+
+        with span('parse', parser=parser, size=self.size):
+            return cached_parse_content(self.content_hash, parser, version, parse_uncached, cacheable)
+
+    def close(self):
+        """删除临时文件并释放内存"""
+        self._buffer = None
+        if self.path is not None:
+            _unmark_active(self.path)
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def ingest_upload(file_storage, upload_folder: str, filename: Optional[str] = None,
+                  spool_threshold: Optional[int] = None) -> IngestedUpload:
+    """
+    接收Flask上传文件（werkzeug FileStorage）
+
+    Args:
+        file_storage: request.files 中的文件
+        upload_folder: 溢写/临时文件目录
+        filename: 已清洗的文件名，默认使用 file_storage.filename
+        spool_threshold: 溢写阈值，默认 SPOOL_THRESHOLD_BYTES
+    """
+    upload = IngestedUpload(
+        filename or file_storage.filename,
+        upload_folder,
+        SPOOL_THRESHOLD_BYTES if spool_threshold is None else spool_threshold
+    )
+    try:
+        return upload.receive(file_storage.stream)
+    except Exception:
+        upload.close()
+        raise
+
+
+class UploadSweeper:
+    """
+    uploads/ 目录后台清理
+
+    只处理本模块写出的临时文件（UPLOAD_FILE_PREFIX 前缀），先删除超过TTL的文件，
+    总大小仍超过配额时按修改时间从旧到新删除，正在被请求使用的文件跳过。
+    """
+
+    def __init__(self, upload_folder: str, quota_bytes: int = UPLOAD_QUOTA_BYTES,
+                 ttl_s: float = UPLOAD_TTL_S, interval_s: float = SWEEP_INTERVAL_S):
+        self.upload_folder = upload_folder
+        self.quota_bytes = quota_bytes
+        self.ttl_s = ttl_s
+        self.interval_s = interval_s
+        self.files_removed = 0
+        self.bytes_removed = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sweep(self) -> Dict[str, int]:
+        """执行一次清理，返回本次删除的文件数和字节数"""
+        if not os.path.isdir(self.upload_folder):
+            return {'files_removed': 0, 'bytes_removed': 0}
+
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.upload_folder):
+            if not entry.name.startswith(UPLOAD_FILE_PREFIX):
+                continue
+            try:
+                if entry.is_file(follow_symlinks=False):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except FileNotFoundError:
+                continue
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        removed_files = 0
+        removed_bytes = 0
+
+        for mtime, size, path in entries:
+            expired = now - mtime > self.ttl_s
+            over_quota = total_bytes > self.quota_bytes
+            if not (expired or over_quota) or _is_active(path):
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning('清理上传文件失败: %s, 错误: %s', path, e)
+                continue
+            total_bytes -= size
+            removed_files += 1
+            removed_bytes += size
+
+        self.files_removed += removed_files
+        self.bytes_removed += removed_bytes
+        return {'files_removed': removed_files, 'bytes_removed': removed_bytes}
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning('上传目录清理异常: %s', e)
+
+    def start(self) -> 'UploadSweeper':
+        """启动后台清理线程（守护线程），启动时先清理一次"""
+        if self._thread is None:
+            self.sweep()
+            self._thread = threading.Thread(target=self._run, name='upload-sweeper', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+# 每个目录一个清理线程
+_sweepers: Dict[str, UploadSweeper] = {}
+_sweepers_lock = threading.Lock()
+
+
+def start_upload_sweeper(upload_folder: str) -> Optional[UploadSweeper]:
+    """启动（或返回已启动的）目录清理线程，设置 UPLOAD_SWEEPER_DISABLED=1 可关闭"""
+    if os.environ.get('UPLOAD_SWEEPER_DISABLED') == '1':
+        return None
+
+    key = os.path.abspath(upload_folder)
+    with _sweepers_lock:
+        if key not in _sweepers:
+            _sweepers[key] = UploadSweeper(upload_folder).start()
+        return _sweepers[key]
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+进程池辅助：可用 CPU 核和当前进程内顺序执行的执行器
+
+超参数搜索（hyperparameter_search）和 k 折交叉验证（evaluation）共用；不导入 PyTorch。
+"""
+
+import os
+from concurrent.futures import Future
+from typing import List
+
+
+def available_cpus() -> List[int]:
+    """当前进程可以使用的 CPU 核编号"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class InlineExecutor:
+    """max_workers=1 时在当前进程内顺序执行（调试、测试用）"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
@@ -10,21 +10,21 @@ import json
 
 def extract_pdf_text(pdf_path):
     """提取PDF文本内容"""
-    text = ""
     try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            print(f"总页数: {len(pdf_reader.pages)}")
-            
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += f"\n\n=== 第 {page_num + 1} 页 ===\n\n"
-                text += page.extract_text()
+        return ''.join(iter_pdf_page_texts(pdf_path))
     except Exception as e:
         print(f"提取PDF时出错: {e}")
         return None
-    
-    return text
+
+def iter_pdf_page_texts(pdf_path):
+    """逐页产出带页码标记的文本（惰性读取，避免反复拼接大字符串）"""
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        print(f"总页数: {len(pdf_reader.pages)}")
+        
+        for page_num, page in enumerate(pdf_reader.pages):
+            yield f"\n\n=== 第 {page_num + 1} 页 ===\n\n"
+            yield page.extract_text() or ''
 
 def analyze_elog_paper(text):
     """分析E-Log论文内容"""